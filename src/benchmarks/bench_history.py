@@ -0,0 +1,507 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: bench_history.py
+Descripcion: Historial local (SQLite) de las ejecuciones de benchmarks con
+             commit, version del modelo, maquina, rendimiento, latencias y
+             exactitud; puerta de regresiones frente a una ventana de
+             referencia e informe de tendencias.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, sys, json, sqlite3, argparse, platform,
+  subprocess, statistics, numpy, matplotlib (solo para las graficas del
+  informe)
+===============================================================================
+Uso:
+Los benchmarks (micro_benchmarks.py, sheet_throughput.py,
+dataset_io_benchmark.py, load_generator.py) agregan cada ejecucion al historial
+automaticamente (salvo con --sin-historial). Registrar a mano resultados
+JSON ya guardados:
+    python bench_history.py registrar bench_results/sheet_throughput.json
+Puerta de regresiones (codigo de salida 1 si falla):
+    python bench_history.py puerta --max-regresion 10 --max-perdida 1
+Informe de tendencias (Markdown y graficas):
+    python bench_history.py informe
+Listar las ultimas ejecuciones:
+    python bench_history.py listar
+===============================================================================
+Notas:
+- Cada ejecucion guarda: fecha, benchmark, commit de git (y si el arbol
+  tenia cambios sin confirmar), version del artefacto del modelo, version
+  de las reglas de operadores del codigo, maquina y entorno, y una fila
+  por (escenario, metrica, valor).
+- Sentido de cada metrica: 'mayor' (rendimiento: imagenes/s, hojas/s,
+  ecuaciones/s, peticiones/s), 'menor' (latencias, ns/imagen, RSS, tasa
+  de errores) y 'exactitud'
+  (fraccion entre 0 y 1).
+- Cada ejecucion incluye tambien, como escenario 'evaluacion', la precision
+  global del ultimo informe de evaluate_manual_classifier.py (operandos) y
+  de validate_classification.py (operadores), si existen.
+- Puerta: por benchmark, la ultima ejecucion se compara con la mediana de
+  las --ventana anteriores del mismo benchmark en la misma maquina. Falla
+  si una metrica de rendimiento baja mas de --max-regresion % o una
+  exactitud baja mas de --max-perdida puntos. Las metricas 'menor' se
+  muestran pero solo bloquean con --latencias.
+- Informe: 'bench_results/tendencias.md' con, por escenario y metrica, una
+  mini grafica de texto de las ultimas ejecuciones y el cambio entre la
+  primera y la ultima, y una grafica PNG por benchmark con el rendimiento
+  relativo a la primera ejecucion y las exactitudes.
+===============================================================================
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE, "..", "operands"))
+from crop_cache import version_de
+from model_artifact import REGLAS_OPERADORES, UMBRAL_PICOS
+
+historial_db = "bench_results/historial.sqlite"
+informe_md = "bench_results/tendencias.md"
+modelo_path = os.path.join(BASE, "..", "equations", "classify_digits", "modelo.npz")
+reporte_operandos = os.path.join(BASE, "..", "operands", "evaluation_report", "resumen.txt")
+reporte_operadores = os.path.join(BASE, "..", "operators", "operator_validation", "classification_report.txt")
+
+# Sentido de cada metrica (el resto no se registra)
+SENTIDOS = {
+    "imagenes_por_s": "mayor",
+    "hojas_por_s": "mayor",
+    "ecuaciones_por_s": "mayor",
+    "peticiones_por_s": "mayor",
+    "ns_por_imagen": "menor",
+    "latencia_p50_ms": "menor",
+    "latencia_p99_ms": "menor",
+    "rss_pico_mb": "menor",
+    "tasa_errores": "menor",
+    "exactitud_ecuaciones": "exactitud",
+    "exactitud_operandos": "exactitud",
+    "exactitud_operadores": "exactitud",
+}
+BARRAS = "▁▂▃▄▅▆▇█"
+
+# ==========================
+# Contexto de la ejecucion
+# ==========================
+
+def info_git():
+    """
+    (commit corto, arbol con cambios) del repositorio; (None, None) si git
+    no esta disponible.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short=12", "HEAD"], cwd=BASE, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        cambios = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        return commit, bool(cambios)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def version_modelo(ruta=modelo_path):
+    """
+    Version del artefacto del modelo (solo lee sus metadatos).
+    """
+    if not os.path.exists(ruta):
+        return None
+    with np.load(ruta, allow_pickle=False) as datos:
+        return json.loads(bytes(datos["meta"]).decode("utf-8")).get("version")
+
+def maquina_de(entorno):
+    return f"{platform.node()} ({entorno.get('procesador')}, {entorno.get('nucleos')} nucleos)"
+
+def exactitudes_evaluacion():
+    """
+    Precision global de los ultimos informes de evaluacion de operandos y
+    operadores, como fraccion.
+    """
+    exactitudes = {}
+    for metrica, ruta in (("exactitud_operandos", reporte_operandos), ("exactitud_operadores", reporte_operadores)):
+        if not os.path.exists(ruta):
+            continue
+        with open(ruta, encoding="utf-8", errors="replace") as f:
+            # "Precision global del modelo: 0.7206" o "Precision Global del Modelo: 71.74%"
+            coincidencia = re.search(r"global del modelo:\s*([0-9.]+)(%?)", f.read(), re.IGNORECASE)
+        if coincidencia:
+            exactitudes[metrica] = float(coincidencia.group(1)) / (100.0 if coincidencia.group(2) else 1.0)
+    return exactitudes
+
+# ==========================
+# Extraccion de metricas
+# ==========================
+
+def _filas(escenario, valores):
+    return [(escenario, metrica, float(valor), SENTIDOS[metrica])
+            for metrica, valor in valores.items() if metrica in SENTIDOS and valor is not None]
+
+def extraer_metricas(benchmark, documento):
+    """
+    Lista de (escenario, metrica, valor, sentido) de un documento de
+    resultados de un benchmark.
+    """
+    resultados = documento.get("resultados", [])
+    filas = []
+    if benchmark == "micro_benchmarks":
+        for r in resultados:
+            filas += _filas(f"{r['kernel']}/{r['tamano']}/{r['lote']}", r)
+    elif benchmark == "sheet_throughput":
+        for r in resultados if isinstance(resultados, list) else [resultados]:
+            escenario = f"{r['modo']}/p{r.get('procesos', 1)}/{'lote' if r.get('lote') else 'ecuacion'}"
+            filas += _filas(escenario, r)
+    elif benchmark == "dataset_io":
+        for r in resultados:
+            filas += _filas(f"{r['estrategia']}/{r['cache']}", r)
+    elif benchmark == "load_generator":
+        corpus = resultados["configuracion"]["corpus"]
+        for r in resultados["escalones"] + [resultados["saturacion"]] * bool(resultados.get("saturacion")):
+            filas += _filas(f"{corpus}/{r['escenario']}", r)
+    else:
+        raise ValueError(f"Benchmark desconocido: {benchmark}")
+    return filas
+
+# ==========================
+# Historial
+# ==========================
+
+class HistorialBenchmarks:
+    """
+    Historial de ejecuciones de benchmarks en un archivo SQLite.
+
+    Args:
+        ruta (str): Archivo SQLite del historial.
+    """
+
+    def __init__(self, ruta=historial_db):
+        self.ruta = ruta
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta)
+        with self._conexion:
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS corridas ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, fecha TEXT, benchmark TEXT, commit_git TEXT, "
+                "sucio INTEGER, version_modelo TEXT, version_reglas TEXT, maquina TEXT, entorno TEXT)"
+            )
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS metricas ("
+                "corrida INTEGER, escenario TEXT, metrica TEXT, valor REAL, sentido TEXT)"
+            )
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS metricas_corrida ON metricas (corrida)")
+
+    def registrar(self, benchmark, documento):
+        """
+        Agrega una ejecucion (documento JSON de resultados de un benchmark)
+        con su contexto y la exactitud de los informes de evaluacion.
+
+        Returns:
+            int: Id de la ejecucion.
+        """
+        entorno = documento.get("entorno", {})
+        commit, sucio = info_git()
+        filas = extraer_metricas(benchmark, documento)
+        filas += _filas("evaluacion", exactitudes_evaluacion())
+        with self._conexion:
+            cursor = self._conexion.execute(
+                "INSERT INTO corridas (fecha, benchmark, commit_git, sucio, version_modelo, version_reglas, maquina, entorno) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (entorno.get("fecha"), benchmark, commit, sucio, version_modelo(),
+                 version_de(UMBRAL_PICOS, REGLAS_OPERADORES), maquina_de(entorno), json.dumps(entorno)),
+            )
+            corrida = cursor.lastrowid
+            self._conexion.executemany("INSERT INTO metricas VALUES (?, ?, ?, ?, ?)",
+                                       [(corrida,) + fila for fila in filas])
+        return corrida
+
+    def corridas(self, benchmark=None, maquina=None, limite=None):
+        """
+        Ejecuciones como diccionarios, de la mas reciente a la mas antigua.
+        """
+        consulta = "SELECT id, fecha, benchmark, commit_git, sucio, version_modelo, version_reglas, maquina FROM corridas"
+        condiciones, parametros = [], []
+        if benchmark:
+            condiciones.append("benchmark = ?")
+            parametros.append(benchmark)
+        if maquina:
+            condiciones.append("maquina = ?")
+            parametros.append(maquina)
+        if condiciones:
+            consulta += " WHERE " + " AND ".join(condiciones)
+        consulta += " ORDER BY id DESC"
+        if limite:
+            consulta += f" LIMIT {int(limite)}"
+        columnas = ("id", "fecha", "benchmark", "commit", "sucio", "version_modelo", "version_reglas", "maquina")
+        return [dict(zip(columnas, fila)) for fila in self._conexion.execute(consulta, parametros)]
+
+    def metricas(self, corrida):
+        """
+        {(escenario, metrica): (valor, sentido)} de una ejecucion.
+        """
+        return {(e, m): (v, s) for e, m, v, s in self._conexion.execute(
+            "SELECT escenario, metrica, valor, sentido FROM metricas WHERE corrida = ?", (corrida,))}
+
+    def benchmarks(self):
+        return [fila[0] for fila in self._conexion.execute("SELECT DISTINCT benchmark FROM corridas ORDER BY benchmark")]
+
+    def cerrar(self):
+        self._conexion.close()
+
+def registrar_corrida(benchmark, documento, ruta=historial_db):
+    """
+    Agrega una ejecucion al historial e informa su id.
+    """
+    historial = HistorialBenchmarks(ruta)
+    try:
+        corrida = historial.registrar(benchmark, documento)
+    finally:
+        historial.cerrar()
+    print(f"\033[92m🗃 Ejecucion {corrida} agregada al historial: {ruta}\033[0m")
+    return corrida
+
+# ==========================
+# Puerta de regresiones
+# ==========================
+
+def comparar(actual, referencias, max_regresion=10.0, max_perdida=1.0, latencias=False):
+    """
+    Compara las metricas de una ejecucion con la mediana de las de
+    referencia.
+
+    Returns:
+        list: Diccionarios por (escenario, metrica) con la referencia, el
+        cambio (% o puntos) y si falla.
+    """
+    filas = []
+    for (escenario, metrica), (valor, sentido) in sorted(actual.items()):
+        previos = [r[(escenario, metrica)][0] for r in referencias if (escenario, metrica) in r]
+        if not previos:
+            filas.append({"escenario": escenario, "metrica": metrica, "valor": valor, "referencia": None,
+                          "cambio": None, "unidad": "", "falla": False})
+            continue
+        referencia = statistics.median(previos)
+        if sentido == "exactitud":
+            cambio, unidad = (valor - referencia) * 100.0, "pts"
+            falla = cambio < -max_perdida
+        else:
+            cambio, unidad = (100.0 * (valor - referencia) / referencia if referencia else 0.0), "%"
+            if sentido == "mayor":
+                falla = cambio < -max_regresion
+            else:
+                falla = latencias and cambio > max_regresion
+        filas.append({"escenario": escenario, "metrica": metrica, "valor": valor, "referencia": referencia,
+                      "cambio": cambio, "unidad": unidad, "falla": falla})
+    return filas
+
+def puerta(historial, benchmarks=None, ventana=5, max_regresion=10.0, max_perdida=1.0,
+           latencias=False, cualquier_maquina=False):
+    """
+    Ejecuta la puerta de regresiones sobre la ultima ejecucion de cada
+    benchmark.
+
+    Returns:
+        bool: True si ninguna metrica falla.
+    """
+    aprobada = True
+    for benchmark in benchmarks or historial.benchmarks():
+        ultimas = historial.corridas(benchmark, limite=1)
+        if not ultimas:
+            print(f"\033[93m⚠ Sin ejecuciones de {benchmark}\033[0m")
+            continue
+        actual = ultimas[0]
+        maquina = None if cualquier_maquina else actual["maquina"]
+        previas = [c for c in historial.corridas(benchmark, maquina, ventana + 1) if c["id"] != actual["id"]][:ventana]
+        print(f"\n\033[94m🚦 {benchmark}: ejecucion {actual['id']} (commit {actual['commit']}"
+              f"{'+cambios' if actual['sucio'] else ''}, modelo {actual['version_modelo']}) "
+              f"frente a {len(previas)} anteriores\033[0m")
+        if not previas:
+            print("\033[93m⚠ Sin ejecuciones de referencia: se aprueba\033[0m")
+            continue
+
+        filas = comparar(historial.metricas(actual["id"]), [historial.metricas(c["id"]) for c in previas],
+                         max_regresion, max_perdida, latencias)
+        fallas = [f for f in filas if f["falla"]]
+        for f in filas:
+            if f["referencia"] is None:
+                continue
+            color = "\033[91m" if f["falla"] else "\033[92m"
+            if f["falla"] or abs(f["cambio"]) >= max_regresion / 2 or f["unidad"] == "pts":
+                print(f"{color}{'❌' if f['falla'] else '✔'} {f['escenario']:<40} {f['metrica']:<22} "
+                      f"{formato(f['referencia']):>12} -> {formato(f['valor']):>12}  {f['cambio']:+7.2f} {f['unidad']}\033[0m")
+        if fallas:
+            aprobada = False
+            print(f"\033[91m❌ {len(fallas)} regresiones en {benchmark}\033[0m")
+        else:
+            print(f"\033[92m✅ {benchmark}: {len(filas)} metricas dentro de los limites\033[0m")
+    return aprobada
+
+# ==========================
+# Informe de tendencias
+# ==========================
+
+def formato(valor):
+    """
+    Numero legible: miles con separador, unidades con dos decimales y
+    fracciones con cuatro.
+    """
+    if abs(valor) >= 1000:
+        return f"{valor:,.0f}"
+    return f"{valor:,.2f}" if abs(valor) >= 1 else f"{valor:.4f}"
+
+def mini_grafica(valores):
+    """
+    Grafica de texto (una barra por valor) escalada entre el minimo y el
+    maximo.
+    """
+    minimo, maximo = min(valores), max(valores)
+    if maximo == minimo:
+        return BARRAS[len(BARRAS) // 2] * len(valores)
+    return "".join(BARRAS[int((v - minimo) / (maximo - minimo) * (len(BARRAS) - 1))] for v in valores)
+
+def series_de(historial, corridas):
+    """
+    {(escenario, metrica): (sentido, [valor por ejecucion o None])} en orden
+    cronologico.
+    """
+    series = {}
+    for i, corrida in enumerate(corridas):
+        for clave, (valor, sentido) in historial.metricas(corrida["id"]).items():
+            series.setdefault(clave, (sentido, [None] * len(corridas)))[1][i] = valor
+    return series
+
+def informe(historial, salida=informe_md, ultimas=20, graficas=True):
+    """
+    Escribe el informe de tendencias en Markdown y, si matplotlib esta
+    disponible, una grafica PNG por benchmark.
+    """
+    carpeta = os.path.dirname(salida) or "."
+    lineas = ["# Tendencias de los benchmarks", ""]
+    for benchmark in historial.benchmarks():
+        # Solo la maquina de la ultima ejecucion: otras no son comparables
+        maquina = historial.corridas(benchmark, limite=1)[0]["maquina"]
+        corridas = list(reversed(historial.corridas(benchmark, maquina, ultimas)))
+        series = series_de(historial, corridas)
+        lineas += [f"## {benchmark}", "",
+                   f"Maquina: {maquina}. Ejecuciones {corridas[0]['id']} a {corridas[-1]['id']} "
+                   f"({corridas[0]['fecha']} a {corridas[-1]['fecha']}), commits "
+                   f"{', '.join(dict.fromkeys(str(c['commit']) for c in corridas))}.", "",
+                   "| Escenario | Metrica | Tendencia | Primera | Ultima | Cambio |",
+                   "|---|---|---|---:|---:|---:|"]
+        for (escenario, metrica), (sentido, valores) in sorted(series.items()):
+            presentes = [v for v in valores if v is not None]
+            if sentido == "exactitud":
+                cambio = f"{(presentes[-1] - presentes[0]) * 100:+.2f} pts"
+            else:
+                cambio = f"{100 * (presentes[-1] - presentes[0]) / presentes[0]:+.1f} %" if presentes[0] else "-"
+            lineas.append(f"| {escenario} | {metrica} | {mini_grafica(presentes)} | {formato(presentes[0])} | "
+                          f"{formato(presentes[-1])} | {cambio} |")
+        lineas.append("")
+
+        if graficas:
+            ruta_png = graficar(benchmark, corridas, series, carpeta)
+            if ruta_png:
+                lineas += [f"![{benchmark}]({os.path.relpath(ruta_png, carpeta)})", ""]
+
+    with open(salida, "w", encoding="utf-8") as f:
+        f.write("\n".join(lineas))
+    print(f"\033[92m💾 Informe de tendencias guardado en: {salida}\033[0m")
+
+def graficar(benchmark, corridas, series, carpeta):
+    """
+    Rendimiento relativo a la primera ejecucion (una linea por escenario) y
+    exactitudes, por ejecucion.
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return None
+
+    x = [c["id"] for c in corridas]
+    fig, (ax_rend, ax_exac) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
+    for (escenario, metrica), (sentido, valores) in sorted(series.items()):
+        if sentido == "mayor":
+            primero = next((v for v in valores if v), None)
+            if primero:
+                ax_rend.plot(x, [100.0 * v / primero if v is not None else None for v in valores],
+                             marker=".", linewidth=1, label=f"{escenario} {metrica}")
+        elif sentido == "exactitud":
+            ax_exac.plot(x, [100.0 * v if v is not None else None for v in valores], marker="o",
+                         label=f"{escenario} {metrica}")
+    ax_rend.axhline(100, color="gray", linestyle="--", linewidth=0.8)
+    ax_rend.set_ylabel("Rendimiento (% de la primera ejecucion)")
+    ax_exac.set_ylabel("Exactitud (%)")
+    ax_exac.set_xlabel("Ejecucion")
+    ax_rend.set_title(f"Tendencias de {benchmark}")
+    for ax in (ax_rend, ax_exac):
+        if ax.get_legend_handles_labels()[0]:
+            ax.legend(fontsize=6, ncol=2, loc="best")
+        ax.grid(alpha=0.3)
+    fig.tight_layout()
+    ruta = os.path.join(carpeta, f"tendencias_{benchmark}.png")
+    fig.savefig(ruta, dpi=120)
+    plt.close(fig)
+    return ruta
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historial de benchmarks, puerta de regresiones e informe de tendencias.")
+    parser.add_argument("--historial", default=historial_db, help="Archivo SQLite del historial.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p_registrar = comandos.add_parser("registrar", help="Agregar resultados JSON ya guardados.")
+    p_registrar.add_argument("archivos", nargs="+", help="JSON de micro_benchmarks, sheet_throughput o dataset_io.")
+
+    p_puerta = comandos.add_parser("puerta", help="Comparar la ultima ejecucion con la ventana de referencia.")
+    p_puerta.add_argument("--benchmarks", nargs="+", help="Benchmarks a comprobar (por defecto, todos).")
+    p_puerta.add_argument("--ventana", type=int, default=5, help="Ejecuciones anteriores de referencia.")
+    p_puerta.add_argument("--max-regresion", type=float, default=10.0, help="Caida maxima de rendimiento (%%).")
+    p_puerta.add_argument("--max-perdida", type=float, default=1.0, help="Perdida maxima de exactitud (puntos).")
+    p_puerta.add_argument("--latencias", action="store_true", help="Fallar tambien si latencias o memoria suben mas de --max-regresion %%.")
+    p_puerta.add_argument("--cualquier-maquina", action="store_true", help="Usar referencias de cualquier maquina.")
+
+    p_informe = comandos.add_parser("informe", help="Informe de tendencias en Markdown con graficas.")
+    p_informe.add_argument("--ultimas", type=int, default=20, help="Ejecuciones por benchmark.")
+    p_informe.add_argument("--sin-graficas", action="store_true", help="No generar las graficas PNG.")
+    p_informe.add_argument("--salida", default=informe_md, help="Archivo Markdown del informe.")
+
+    p_listar = comandos.add_parser("listar", help="Listar las ultimas ejecuciones.")
+    p_listar.add_argument("--limite", type=int, default=20, help="Numero de ejecuciones.")
+
+    args = parser.parse_args()
+
+    historial = HistorialBenchmarks(args.historial)
+    try:
+        if args.comando == "registrar":
+            for archivo in args.archivos:
+                with open(archivo, encoding="utf-8") as f:
+                    documento = json.load(f)
+                corrida = historial.registrar(os.path.splitext(os.path.basename(archivo))[0], documento)
+                print(f"\033[92m🗃 {archivo}: ejecucion {corrida} agregada al historial\033[0m")
+        elif args.comando == "puerta":
+            aprobada = puerta(historial, args.benchmarks, args.ventana, args.max_regresion, args.max_perdida,
+                              args.latencias, args.cualquier_maquina)
+            print(f"\n\033[1;{'32m✅ Puerta aprobada' if aprobada else '31m❌ Puerta rechazada'}\033[0m")
+            sys.exit(0 if aprobada else 1)
+        elif args.comando == "informe":
+            informe(historial, args.salida, args.ultimas, not args.sin_graficas)
+        else:
+            for c in historial.corridas(limite=args.limite):
+                print(f"{c['id']:>5}  {c['fecha']}  {c['benchmark']:<18} {c['commit']}{'+' if c['sucio'] else ' '} "
+                      f"modelo {c['version_modelo']}  reglas {c['version_reglas']}  {c['maquina']}")
+    finally:
+        historial.cerrar()
@@ -0,0 +1,424 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: dataset_io_benchmark.py
+Descripcion: Benchmark de estrategias de lectura de los datasets de Kaggle
+             (un JPEG por archivo con cv2.imread en serie o con hilos,
+             archivo zip/tar y arreglo empaquetado en memmap), con cache de
+             paginas caliente y fria, en imagenes/s y memoria residente.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, sys, json, time, shutil, zipfile, tarfile,
+  argparse, multiprocessing, cv2, numpy
+===============================================================================
+Uso:
+Todo el corpus (operandos y operadores), todas las estrategias:
+    python dataset_io_benchmark.py
+Una muestra de 20000 imagenes, solo algunas estrategias:
+    python dataset_io_benchmark.py --limite 20000 --estrategias serial memmap
+Reteniendo todas las imagenes decodificadas en memoria (como los scripts
+de entrenamiento):
+    python dataset_io_benchmark.py --retener
+===============================================================================
+Notas:
+- Estrategias:
+    serial  cv2.imread de cada JPEG, uno tras otro.
+    hilos   cv2.imread en un ThreadPoolExecutor (--hilos); OpenCV suelta
+            el GIL al decodificar.
+    zip     un solo .zip sin compresion (los JPEG ya estan comprimidos);
+            cada miembro se decodifica con cv2.imdecode.
+    tar     igual que zip, con un .tar sin compresion leido en secuencia.
+    memmap  las imagenes ya decodificadas en un arreglo uint8 (N, 45, 45)
+            guardado como .npy y abierto con np.load(mmap_mode="r").
+- Los archivos zip, tar y memmap se construyen una vez en --trabajo
+  (bench_results/io_dataset) y se reutilizan mientras cubran las mismas
+  imagenes; --reconstruir los vuelve a generar. Se informa el tiempo de
+  construccion y el tamano de cada uno.
+- Cache fria: los datos se sacan de la cache de paginas del sistema con
+  posix_fadvise(POSIX_FADV_DONTNEED) tras un fsync. Para zip, tar y memmap
+  ademas se mide sobre una copia recien escrita (archivos nuevos, sin
+  paginas mapeadas de ejecuciones anteriores) que se borra al terminar.
+  Los JPEG sueltos se expulsan en su lugar. Donde no existe posix_fadvise
+  (Windows, macOS) la medicion fria se marca como no garantizada.
+- Cache caliente: la mejor de --repeticiones pasadas, justo despues de la
+  fria (los datos ya estan en cache).
+- Cada medicion corre en un proceso nuevo (spawn) para que la memoria
+  residente (RSS) no arrastre la de otras estrategias. Se informa la RSS
+  al empezar, la maxima (VmHWM, o ru_maxrss fuera de Linux) y la final.
+  La de memmap incluye las paginas del archivo mapeadas.
+- Todas las estrategias calculan la suma de los pixeles decodificados; si
+  alguna no coincide con las demas se avisa.
+- Los resultados se guardan en 'bench_results/dataset_io.json' y se
+  agregan al historial de bench_history.py (salvo con --sin-historial).
+===============================================================================
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from bench_history import registrar_corrida
+from micro_benchmarks import entorno
+
+corpus_dirs = {
+    "operands": "../../data/operands/raw/dataset",
+    "operators": "../../data/operators/raw/dataset",
+}
+trabajo_dir = "bench_results/io_dataset"
+output_json = "bench_results/dataset_io.json"
+
+ESTRATEGIAS = ("serial", "hilos", "zip", "tar", "memmap")
+LADO = 45
+TAMANO_TRAMO = 1024
+FRIO_GARANTIZADO = hasattr(os, "posix_fadvise")
+
+def listar_imagenes(limite=None):
+    """
+    Lista ordenada de (nombre en el archivo, ruta) de todas las imagenes,
+    con nombre '<corpus>/<clase>/<archivo>'. Con limite, toma una muestra
+    espaciada uniformemente (todas las clases quedan representadas).
+    """
+    imagenes = []
+    for corpus, carpeta in corpus_dirs.items():
+        for clase in sorted(os.listdir(carpeta)):
+            ruta_clase = os.path.join(carpeta, clase)
+            if not os.path.isdir(ruta_clase):
+                continue
+            for nombre in sorted(os.listdir(ruta_clase)):
+                imagenes.append((f"{corpus}/{clase}/{nombre}", os.path.join(ruta_clase, nombre)))
+    if limite and limite < len(imagenes):
+        paso = len(imagenes) / limite
+        imagenes = [imagenes[int(i * paso)] for i in range(limite)]
+    return imagenes
+
+def clase_de(nombre):
+    return nombre.rsplit("/", 1)[0]
+
+# ==========================
+# Formatos empaquetados
+# ==========================
+
+def rutas_formatos(trabajo):
+    return {
+        "zip": os.path.join(trabajo, "dataset.zip"),
+        "tar": os.path.join(trabajo, "dataset.tar"),
+        "memmap": os.path.join(trabajo, "imagenes.npy"),
+        "etiquetas": os.path.join(trabajo, "etiquetas.npy"),
+        "indice": os.path.join(trabajo, "indice.json"),
+    }
+
+def construir_formatos(imagenes, trabajo=trabajo_dir, reconstruir=False):
+    """
+    Construye (o reutiliza) el zip, el tar y el memmap con las imagenes
+    dadas.
+
+    Returns:
+        dict: Por formato, segundos de construccion (None si se reutilizo)
+        y tamano en MB.
+    """
+    rutas = rutas_formatos(trabajo)
+    nombres = [nombre for nombre, _ in imagenes]
+    firma = {"imagenes": len(nombres), "primera": nombres[0], "ultima": nombres[-1], "lado": LADO}
+    if not reconstruir and os.path.exists(rutas["indice"]):
+        with open(rutas["indice"], encoding="utf-8") as f:
+            indice = json.load(f)
+        if indice.get("firma") == firma and all(os.path.exists(rutas[k]) for k in ("zip", "tar", "memmap")):
+            print(f"\033[93m♻ Reutilizando los formatos empaquetados de '{trabajo}'\033[0m")
+            return {k: {"construccion_s": None, "tamano_mb": round(os.path.getsize(rutas[k]) / 2**20, 1)}
+                    for k in ("zip", "tar", "memmap")}
+
+    os.makedirs(trabajo, exist_ok=True)
+    construccion = {}
+
+    print(f"\033[94m📦 Construyendo zip y tar con {len(imagenes)} imagenes...\033[0m")
+    inicio = time.perf_counter()
+    with zipfile.ZipFile(rutas["zip"], "w", zipfile.ZIP_STORED) as zf:
+        for nombre, ruta in imagenes:
+            zf.write(ruta, nombre)
+    construccion["zip"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with tarfile.open(rutas["tar"], "w") as tar:
+        for nombre, ruta in imagenes:
+            tar.add(ruta, nombre)
+    construccion["tar"] = time.perf_counter() - inicio
+
+    print(f"\033[94m📦 Construyendo memmap ({len(imagenes)}, {LADO}, {LADO})...\033[0m")
+    inicio = time.perf_counter()
+    clases = sorted({clase_de(nombre) for nombre in nombres})
+    numero_clase = {clase: i for i, clase in enumerate(clases)}
+    arreglo = np.lib.format.open_memmap(rutas["memmap"], mode="w+", dtype=np.uint8, shape=(len(imagenes), LADO, LADO))
+    reescaladas = 0
+    for i, (_, ruta) in enumerate(imagenes):
+        img = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+        if img.shape != (LADO, LADO):
+            img = cv2.resize(img, (LADO, LADO), interpolation=cv2.INTER_AREA)
+            reescaladas += 1
+        arreglo[i] = img
+    arreglo.flush()
+    del arreglo
+    np.save(rutas["etiquetas"], np.array([numero_clase[clase_de(n)] for n in nombres], dtype=np.int16))
+    construccion["memmap"] = time.perf_counter() - inicio
+    if reescaladas:
+        print(f"\033[93m⚠ {reescaladas} imagenes no median {LADO}x{LADO} y se reescalaron en el memmap\033[0m")
+
+    with open(rutas["indice"], "w", encoding="utf-8") as f:
+        json.dump({"firma": firma, "clases": clases, "reescaladas": reescaladas}, f, indent=2)
+    for formato, segundos in construccion.items():
+        print(f"\033[92m✔ {formato:<6} {segundos:7.2f} s  {os.path.getsize(rutas[formato]) / 2**20:8.1f} MB\033[0m")
+    return {k: {"construccion_s": round(construccion[k], 3), "tamano_mb": round(os.path.getsize(rutas[k]) / 2**20, 1)}
+            for k in ("zip", "tar", "memmap")}
+
+# ==========================
+# Cache de paginas
+# ==========================
+
+def expulsar_de_cache(rutas):
+    """
+    Saca los archivos de la cache de paginas (fsync + POSIX_FADV_DONTNEED).
+    No hace nada donde posix_fadvise no existe.
+    """
+    if not FRIO_GARANTIZADO:
+        return
+    for ruta in rutas:
+        fd = os.open(ruta, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def copia_fresca(ruta):
+    """
+    Copia recien escrita de un archivo, fuera de la cache de paginas.
+    """
+    copia = ruta + ".frio"
+    shutil.copyfile(ruta, copia)
+    expulsar_de_cache([copia])
+    return copia
+
+# ==========================
+# Lectores
+# ==========================
+
+def leer_serial(imagenes, **_):
+    for nombre, ruta in imagenes:
+        yield clase_de(nombre), cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+
+def leer_hilos(imagenes, hilos=8, **_):
+    leer = lambda ruta: cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+    with ThreadPoolExecutor(hilos) as pool:
+        # Por tramos para no tener todas las imagenes pendientes a la vez
+        for i in range(0, len(imagenes), TAMANO_TRAMO):
+            tramo = imagenes[i:i + TAMANO_TRAMO]
+            for (nombre, _), img in zip(tramo, pool.map(leer, [ruta for _, ruta in tramo])):
+                yield clase_de(nombre), img
+
+def decodificar(datos):
+    return cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+def leer_zip(rutas, **_):
+    with zipfile.ZipFile(rutas["zip"]) as zf:
+        for info in zf.infolist():
+            yield clase_de(info.filename), decodificar(zf.read(info))
+
+def leer_tar(rutas, **_):
+    with tarfile.open(rutas["tar"], "r:") as tar:
+        for miembro in tar:
+            if miembro.isfile():
+                yield clase_de(miembro.name), decodificar(tar.extractfile(miembro).read())
+
+def leer_memmap(rutas, **_):
+    with open(rutas["indice"], encoding="utf-8") as f:
+        clases = json.load(f)["clases"]
+    arreglo = np.load(rutas["memmap"], mmap_mode="r")
+    etiquetas = np.load(rutas["etiquetas"])
+    for i in range(len(arreglo)):
+        yield clases[etiquetas[i]], arreglo[i]
+
+LECTORES = {"serial": leer_serial, "hilos": leer_hilos, "zip": leer_zip, "tar": leer_tar, "memmap": leer_memmap}
+
+# ==========================
+# Medicion
+# ==========================
+
+def rss_actual_mb():
+    """
+    Memoria residente actual del proceso (Linux); None si no se puede leer.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+def rss_pico_mb():
+    """
+    Memoria residente maxima del proceso. En Linux se usa VmHWM, que empieza
+    de cero en el proceso nuevo; ru_maxrss conserva el maximo del proceso
+    padre a traves del exec.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 2**10
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == "darwin" else pico / 2**10  # bytes en macOS, KB en Linux
+
+def medir(estrategia, entrada, hilos=8, retener=False):
+    """
+    Lee todas las imagenes con una estrategia (se ejecuta en un proceso
+    nuevo).
+
+    Returns:
+        dict: imagenes, segundos, suma de pixeles y RSS (MB).
+    """
+    rss_inicio = rss_actual_mb()
+    retenidas = []
+    imagenes = 0
+    suma = 0
+    inicio = time.perf_counter()
+    for _, img in LECTORES[estrategia](entrada, hilos=hilos):
+        suma += int(img.sum(dtype=np.uint64))
+        imagenes += 1
+        if retener:
+            retenidas.append(np.array(img))
+    segundos = time.perf_counter() - inicio
+    return {
+        "imagenes": imagenes,
+        "segundos": segundos,
+        "suma_pixeles": suma,
+        "rss_inicio_mb": rss_inicio,
+        "rss_pico_mb": rss_pico_mb(),
+        "rss_final_mb": rss_actual_mb(),
+    }
+
+def medir_en_proceso(estrategia, entrada, hilos=8, retener=False):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=contexto) as pool:
+        return pool.submit(medir, estrategia, entrada, hilos, retener).result()
+
+def ejecutar(estrategias=ESTRATEGIAS, limite=None, hilos=8, repeticiones=3, retener=False,
+             trabajo=trabajo_dir, reconstruir=False):
+    """
+    Mide cada estrategia en frio y en caliente.
+
+    Returns:
+        dict: Formatos construidos y resultados por estrategia y cache.
+    """
+    imagenes = listar_imagenes(limite)
+    print(f"\033[94m🗂 {len(imagenes)} imagenes en {len(corpus_dirs)} corpus\033[0m")
+    rutas = rutas_formatos(trabajo)
+    formatos = {}
+    if any(e in ("zip", "tar", "memmap") for e in estrategias):
+        formatos = construir_formatos(imagenes, trabajo, reconstruir)
+    if not FRIO_GARANTIZADO:
+        print("\033[93m⚠ posix_fadvise no disponible: la medicion en frio no esta garantizada\033[0m")
+
+    resultados = []
+    for estrategia in estrategias:
+        por_archivo = estrategia in ("serial", "hilos")
+        archivos = [ruta for _, ruta in imagenes] if por_archivo else \
+            [rutas[k] for k in (("memmap", "etiquetas") if estrategia == "memmap" else (estrategia,))]
+
+        # Frio: JPEG expulsados en su lugar; formatos empaquetados sobre copias nuevas
+        if por_archivo:
+            expulsar_de_cache(archivos)
+            entrada = imagenes
+        else:
+            entrada = dict(rutas)
+            claves = ("memmap", "etiquetas") if estrategia == "memmap" else (estrategia,)
+            for clave in claves:
+                entrada[clave] = copia_fresca(rutas[clave])
+        try:
+            mediciones = [("frio", medir_en_proceso(estrategia, entrada, hilos, retener))]
+        finally:
+            if not por_archivo:
+                for clave in claves:
+                    os.remove(entrada[clave])
+
+        # Caliente: los datos originales, ya leidos al menos una vez
+        entrada = imagenes if por_archivo else rutas
+        if not por_archivo:
+            medir_en_proceso(estrategia, entrada, hilos, False)  # Calentamiento
+        calientes = [medir_en_proceso(estrategia, entrada, hilos, retener) for _ in range(max(1, repeticiones))]
+        mediciones.append(("caliente", min(calientes, key=lambda m: m["segundos"])))
+
+        for cache, m in mediciones:
+            resultado = {
+                "estrategia": estrategia,
+                "cache": cache,
+                "frio_garantizado": FRIO_GARANTIZADO if cache == "frio" else None,
+                "imagenes": m["imagenes"],
+                "segundos": round(m["segundos"], 3),
+                "imagenes_por_s": round(m["imagenes"] / m["segundos"], 1) if m["segundos"] else None,
+                "suma_pixeles": m["suma_pixeles"],
+                "rss_inicio_mb": _redondear(m["rss_inicio_mb"]),
+                "rss_pico_mb": _redondear(m["rss_pico_mb"]),
+                "rss_final_mb": _redondear(m["rss_final_mb"]),
+            }
+            resultados.append(resultado)
+            print(f"\033[92m✔ {estrategia:<7} {cache:<9} {resultado['imagenes_por_s']:>12,.0f} img/s  "
+                  f"{resultado['segundos']:>8.2f} s  RSS pico {resultado['rss_pico_mb'] or 0:>8.1f} MB\033[0m")
+
+    sumas = {r["suma_pixeles"] for r in resultados}
+    if len(sumas) > 1:
+        print("\033[91m❌ Las estrategias no decodificaron los mismos pixeles "
+              "(el memmap reescala las imagenes que no miden 45x45)\033[0m")
+    return {"imagenes": len(imagenes), "hilos": hilos, "retener": retener, "formatos": formatos, "resultados": resultados}
+
+def _redondear(valor):
+    return round(valor, 1) if valor is not None else None
+
+def guardar_resultados(resumen, salida=output_json, historial=True):
+    documento = {"entorno": entorno(), **resumen}
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f"\n\033[92m💾 Resultados guardados en: {salida}\033[0m")
+    if historial:
+        registrar_corrida("dataset_io", documento)
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de estrategias de lectura de los datasets.")
+    parser.add_argument("--estrategias", nargs="+", choices=ESTRATEGIAS, default=list(ESTRATEGIAS), help="Estrategias a medir.")
+    parser.add_argument("--limite", type=int, help="Numero de imagenes (muestra uniforme; por defecto, todas).")
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos de la estrategia 'hilos'.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Pasadas en caliente (se informa la mejor).")
+    parser.add_argument("--retener", action="store_true", help="Conservar en memoria todas las imagenes decodificadas.")
+    parser.add_argument("--trabajo", default=trabajo_dir, help="Carpeta de los formatos empaquetados.")
+    parser.add_argument("--reconstruir", action="store_true", help="Volver a construir zip, tar y memmap.")
+    parser.add_argument("--salida", default=output_json, help="Archivo JSON de resultados.")
+    parser.add_argument("--sin-historial", action="store_true", help="No agregar la ejecucion al historial (bench_history.py).")
+    args = parser.parse_args()
+
+    print("\n\033[94m⏱ Benchmark de lectura del dataset...\033[0m")
+    resumen = ejecutar(args.estrategias, args.limite, args.hilos, args.repeticiones, args.retener,
+                       args.trabajo, args.reconstruir)
+    guardar_resultados(resumen, args.salida, not args.sin_historial)
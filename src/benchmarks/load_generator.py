@@ -0,0 +1,521 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: load_generator.py
+Descripcion: Generador de carga para el servicio HTTP (solve_server.py):
+             repite un corpus de hojas o de recortes de ecuaciones en lazo
+             abierto (QPS objetivo) o cerrado (N clientes concurrentes),
+             con percentiles de latencia tipo HdrHistogram, tasa de errores,
+             rendimiento logrado y busqueda automatica del punto de
+             saturacion.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, sys, json, glob, time, random, shlex, argparse,
+  threading, subprocess, http.client, base64, cv2 (solo corpus sintetico)
+===============================================================================
+Uso:
+Con el servidor ya levantado (python solve_server.py --port 8080):
+    python load_generator.py --modo abierto --qps 20 --duracion-s 30
+    python load_generator.py --modo cerrado --clientes 8 --corpus recortes
+Levantar el servidor con otra configuracion solo para la prueba:
+    python load_generator.py --lanzar --args-servidor "--max-lote 8 --cache-max 0" --modo cerrado --clientes 16
+Buscar el punto de saturacion (QPS x1.5 por escalon hasta que no se
+alcance el objetivo o el p99 pase de 250 ms):
+    python load_generator.py --lanzar --buscar-saturacion --qps 5 --factor 1.5 --slo-p99-ms 250
+===============================================================================
+Notas:
+- Corpus (--corpus), cargado en memoria antes de medir:
+    - "hojas": hojas escaneadas de data/equations/raw, enviadas como
+      image/png a /solve (o /solve/stream con --ruta).
+    - "recortes": ecuaciones de data/equations/processed, enviadas como
+      JSON con "recortes_b64" (0.png, 1.png y 2.png de cada carpeta).
+    - "sinteticas": --n hojas de synthetic_sheets.py codificadas en PNG.
+  Las peticiones recorren el corpus en bucle, empezando cada cliente en
+  una posicion distinta.
+- Lazo abierto: la peticion i se programa en inicio + i / qps (o con
+  llegadas de Poisson con --poisson) y su latencia se mide desde la hora
+  programada, no desde el envio. Si los --conexiones hilos estan ocupados
+  la espera cuenta como latencia, asi que la saturacion se ve en la cola
+  (sin omision coordinada).
+- Lazo cerrado: cada cliente envia una peticion, espera la respuesta y
+  envia la siguiente; la latencia es la de cada peticion.
+- Latencias en un histograma log-lineal de 3 cifras significativas (como
+  HdrHistogram), uno por hilo y combinados al final: p50, p90, p99, p99.9,
+  p99.99 y maximo, con error relativo < 0.1%.
+- Los primeros --calentamiento-s segundos de cada escalon no se miden. El
+  rendimiento logrado es peticiones (y ecuaciones) completadas por segundo
+  de la ventana medida; un error es un codigo HTTP distinto de 200 o una
+  excepcion de conexion (se cuentan por tipo).
+- Saturacion: en lazo abierto el QPS se multiplica por --factor y en lazo
+  cerrado los clientes, desde el valor inicial. Un escalon esta saturado si
+  logra menos del 90% del QPS objetivo (abierto) o mejora el rendimiento
+  menos de un 5% respecto del mejor anterior (cerrado), si su p99 supera
+  --slo-p99-ms o si la tasa de errores supera --max-errores. El punto de
+  saturacion es el ultimo escalon no saturado.
+- El servidor atiende cada conexion en su hilo y solo limita la resolucion
+  a sus workers (ver solve_server.py), asi que mas conexiones que workers
+  esperan en la cola del pool en lugar de quedar bloqueadas por conexiones
+  keep-alive inactivas. Con --cerrar-conexiones cada peticion abre su
+  propia conexion (incluye el coste de conexion). El numero de workers del
+  servidor (/health) se guarda en la configuracion.
+- En una maquina con pocos nucleos el generador compite por la CPU con el
+  servidor; para dimensionar conviene ejecutarlo en otra maquina (--url).
+- Los resultados (con /stats del servidor al final, que informa la cache y
+  los micro-lotes) se guardan en 'bench_results/load_generator.json' y se
+  agregan al historial de bench_history.py (salvo con --sin-historial).
+===============================================================================
+"""
+
+import argparse
+import base64
+import glob
+import http.client
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE, "..", "operands"))
+from bench_history import registrar_corrida
+from micro_benchmarks import entorno
+
+hojas_dir = os.path.join(BASE, "..", "..", "data", "equations", "raw")
+recortes_dir = os.path.join(BASE, "..", "..", "data", "equations", "processed")
+servidor_py = os.path.join(BASE, "..", "equations", "solve_server.py")
+output_json = "bench_results/load_generator.json"
+
+PERCENTILES = (50, 75, 90, 95, 99, 99.9, 99.99, 100)
+TIMEOUT_S = 60
+
+# ==========================
+# Histograma de latencias
+# ==========================
+
+class HistogramaLatencias:
+    """
+    Histograma log-lineal de valores enteros (microsegundos) con 3 cifras
+    significativas, como HdrHistogram: los valores menores que 2048 se
+    guardan exactos y por encima cada potencia de 2 se divide en 1024
+    cubetas.
+    """
+    BITS = 11
+    MITAD = 1 << (BITS - 1)
+
+    def __init__(self):
+        self.cuentas = {}
+        self.total = 0
+        self.suma = 0
+        self.maximo = 0
+
+    def indice(self, valor):
+        exponente = max(0, valor.bit_length() - self.BITS)
+        return exponente * self.MITAD + (valor >> exponente)
+
+    def valor_de(self, indice):
+        """
+        Mayor valor equivalente de la cubeta (cota superior, como HdrHistogram).
+        """
+        exponente = max(0, indice // self.MITAD - 1)
+        return ((indice - exponente * self.MITAD) << exponente) + (1 << exponente) - 1
+
+    def registrar(self, valor_us):
+        valor = max(0, int(valor_us))
+        i = self.indice(valor)
+        self.cuentas[i] = self.cuentas.get(i, 0) + 1
+        self.total += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def combinar(self, otro):
+        for i, n in otro.cuentas.items():
+            self.cuentas[i] = self.cuentas.get(i, 0) + n
+        self.total += otro.total
+        self.suma += otro.suma
+        self.maximo = max(self.maximo, otro.maximo)
+
+    def percentil(self, p):
+        if not self.total:
+            return None
+        if p >= 100:
+            return self.maximo
+        objetivo = max(1, -(-self.total * p // 100))
+        acumulado = 0
+        for i in sorted(self.cuentas):
+            acumulado += self.cuentas[i]
+            if acumulado >= objetivo:
+                return min(self.valor_de(i), self.maximo)
+        return self.maximo
+
+    def media(self):
+        return self.suma / self.total if self.total else None
+
+# ==========================
+# Corpus
+# ==========================
+
+def _codificar_recortes(carpeta):
+    rutas = [os.path.join(carpeta, f"{i}.png") for i in range(3)]
+    recortes = []
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            recortes.append(base64.b64encode(f.read()).decode("ascii"))
+    cuerpo = {"id": os.path.relpath(carpeta, recortes_dir), "recortes_b64": recortes}
+    return json.dumps(cuerpo).encode("utf-8"), "application/json"
+
+def cargar_corpus(tipo, limite=None, semilla=0):
+    """
+    Peticiones del corpus como lista de (cuerpo, Content-Type).
+    """
+    if tipo == "hojas":
+        rutas = sorted(glob.glob(os.path.join(hojas_dir, "*", "*.png")))[:limite]
+        corpus = []
+        for ruta in rutas:
+            with open(ruta, "rb") as f:
+                corpus.append((f.read(), "image/png"))
+    elif tipo == "recortes":
+        carpetas = sorted(glob.glob(os.path.join(recortes_dir, "*", "*", "eq_*")))[:limite]
+        corpus = [_codificar_recortes(c) for c in carpetas if os.path.exists(os.path.join(c, "2.png"))]
+    elif tipo == "sinteticas":
+        import cv2
+        from synthetic_sheets import BancoGlifos, generar_hoja_numero
+
+        banco = BancoGlifos(semilla=semilla)
+        corpus = []
+        for numero in range(limite or 50):
+            _, hoja, _ = generar_hoja_numero(numero, banco, semilla)
+            corpus.append((cv2.imencode(".png", hoja)[1].tobytes(), "image/png"))
+    else:
+        raise ValueError(f"Corpus desconocido: {tipo}")
+    if not corpus:
+        raise SystemExit(f"🚫 El corpus '{tipo}' esta vacio.")
+    return corpus
+
+# ==========================
+# Cliente
+# ==========================
+
+class Cliente:
+    """
+    Conexion HTTP/1.1 de un hilo (persistente salvo con cerrar_conexion, que
+    envia Connection: close y abre una conexion por peticion), con su
+    histograma y conteos.
+    """
+
+    def __init__(self, url, ruta, cerrar_conexion=False):
+        partes = urlsplit(url)
+        self.host, self.puerto = partes.hostname, partes.port or 80
+        self.ruta = ruta
+        self.cabeceras = {"Connection": "close"} if cerrar_conexion else {}
+        self.cerrar_conexion = cerrar_conexion
+        self.conexion = None
+        self.histograma = HistogramaLatencias()
+        self.completadas = 0
+        self.ecuaciones = 0
+        self.errores = {}
+
+    def enviar(self, cuerpo, tipo_contenido):
+        """
+        Envia una peticion y devuelve (ok, ecuaciones de la respuesta).
+        """
+        try:
+            if self.conexion is None:
+                self.conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=TIMEOUT_S)
+            self.conexion.request("POST", self.ruta, body=cuerpo,
+                                  headers=dict(self.cabeceras, **{"Content-Type": tipo_contenido}))
+            respuesta = self.conexion.getresponse()
+            datos = respuesta.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.cerrar()
+            return False, type(e).__name__
+        if self.cerrar_conexion:
+            self.cerrar()
+        if respuesta.status != 200:
+            return False, f"http_{respuesta.status}"
+        # Contar sin decodificar el JSON: una clave Eq_ID por ecuacion
+        return True, datos.count(b'"Eq_ID"')
+
+    def medir(self, cuerpo, tipo_contenido, desde, medir=True):
+        ok, detalle = self.enviar(cuerpo, tipo_contenido)
+        if not medir:
+            return
+        self.histograma.registrar((time.perf_counter() - desde) * 1e6)
+        if ok:
+            self.completadas += 1
+            self.ecuaciones += detalle
+        else:
+            self.errores[detalle] = self.errores.get(detalle, 0) + 1
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+def lazo_abierto(url, ruta, corpus, qps, duracion_s, calentamiento_s, conexiones, poisson=False, semilla=0,
+                 cerrar_conexiones=False):
+    """
+    Envia peticiones programadas a 'qps' durante calentamiento_s + duracion_s.
+    """
+    rng = random.Random(semilla)
+    bloqueo = threading.Lock()
+    siguiente = [0, 0.0]  # (numero de peticion, segundos desde el inicio)
+    clientes = [Cliente(url, ruta, cerrar_conexiones) for _ in range(conexiones)]
+    inicio = time.perf_counter() + 0.05
+    fin = calentamiento_s + duracion_s
+
+    def trabajar(cliente):
+        while True:
+            with bloqueo:
+                numero, programada = siguiente
+                siguiente[0] += 1
+                siguiente[1] += rng.expovariate(qps) if poisson else 1.0 / qps
+            if programada >= fin:
+                break
+            espera = inicio + programada - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            cuerpo, tipo = corpus[numero % len(corpus)]
+            cliente.medir(cuerpo, tipo, inicio + programada, medir=programada >= calentamiento_s)
+        cliente.cerrar()
+
+    hilos = [threading.Thread(target=trabajar, args=(c,), daemon=True) for c in clientes]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return clientes, time.perf_counter() - inicio - calentamiento_s
+
+def lazo_cerrado(url, ruta, corpus, n_clientes, duracion_s, calentamiento_s, cerrar_conexiones=False):
+    """
+    n_clientes envian peticiones una tras otra durante calentamiento_s + duracion_s.
+    """
+    clientes = [Cliente(url, ruta, cerrar_conexiones) for _ in range(n_clientes)]
+    inicio = time.perf_counter()
+    medir_desde = inicio + calentamiento_s
+    fin = medir_desde + duracion_s
+
+    def trabajar(numero, cliente):
+        posicion = numero * max(1, len(corpus) // n_clientes)
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= fin:
+                break
+            cuerpo, tipo = corpus[posicion % len(corpus)]
+            cliente.medir(cuerpo, tipo, t0, medir=t0 >= medir_desde)
+            posicion += 1
+        cliente.cerrar()
+
+    hilos = [threading.Thread(target=trabajar, args=(i, c), daemon=True) for i, c in enumerate(clientes)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return clientes, time.perf_counter() - medir_desde
+
+def ejecutar_escalon(url, ruta, corpus, modo, nivel, duracion_s=30.0, calentamiento_s=3.0, conexiones=32,
+                     poisson=False, semilla=0, cerrar_conexiones=False):
+    """
+    Un escalon de carga: 'nivel' es el QPS objetivo (abierto) o el numero de
+    clientes (cerrado).
+
+    Returns:
+        dict: Peticiones, errores, rendimiento y percentiles de latencia.
+    """
+    if modo == "abierto":
+        clientes, ventana = lazo_abierto(url, ruta, corpus, nivel, duracion_s, calentamiento_s, conexiones, poisson, semilla,
+                                         cerrar_conexiones)
+    else:
+        clientes, ventana = lazo_cerrado(url, ruta, corpus, int(nivel), duracion_s, calentamiento_s, cerrar_conexiones)
+
+    histograma = HistogramaLatencias()
+    errores = {}
+    completadas = ecuaciones = 0
+    for cliente in clientes:
+        histograma.combinar(cliente.histograma)
+        completadas += cliente.completadas
+        ecuaciones += cliente.ecuaciones
+        for tipo, n in cliente.errores.items():
+            errores[tipo] = errores.get(tipo, 0) + n
+
+    ms = lambda us: round(us / 1000.0, 3) if us is not None else None
+    resumen = {
+        "escenario": f"{modo}/{nivel}",
+        "modo": modo,
+        "qps_objetivo" if modo == "abierto" else "clientes": nivel,
+        "enviadas": histograma.total,
+        "completadas": completadas,
+        "errores": sum(errores.values()),
+        "errores_por_tipo": errores,
+        "tasa_errores": round(sum(errores.values()) / histograma.total, 4) if histograma.total else 0.0,
+        "ventana_s": round(ventana, 3),
+        "peticiones_por_s": round(completadas / ventana, 2) if ventana > 0 else 0.0,
+        "ecuaciones_por_s": round(ecuaciones / ventana, 2) if ventana > 0 else 0.0,
+        "latencia_media_ms": ms(histograma.media()),
+        "latencia_p50_ms": ms(histograma.percentil(50)),
+        "latencia_p90_ms": ms(histograma.percentil(90)),
+        "latencia_p99_ms": ms(histograma.percentil(99)),
+        "latencia_p999_ms": ms(histograma.percentil(99.9)),
+        "latencia_max_ms": ms(histograma.maximo if histograma.total else None),
+        "percentiles_ms": {str(p): ms(histograma.percentil(p)) for p in PERCENTILES},
+    }
+    color = "\033[92m" if not resumen["errores"] else "\033[93m"
+    print(f"{color}  {resumen['escenario']:<14} {resumen['peticiones_por_s']:>8.2f} pet/s  "
+          f"{resumen['ecuaciones_por_s']:>9.2f} ec/s  p50 {resumen['latencia_p50_ms']} ms  "
+          f"p99 {resumen['latencia_p99_ms']} ms  p99.9 {resumen['latencia_p999_ms']} ms  "
+          f"errores {resumen['errores']}/{resumen['enviadas']}\033[0m")
+    return resumen
+
+def esta_saturado(escalon, modo, mejor_anterior, slo_p99_ms=None, max_errores=0.01):
+    """
+    Motivo por el que un escalon se considera saturado, o None.
+    """
+    if escalon["tasa_errores"] > max_errores:
+        return f"tasa de errores {escalon['tasa_errores']:.2%}"
+    if slo_p99_ms is not None and (escalon["latencia_p99_ms"] or 0) > slo_p99_ms:
+        return f"p99 {escalon['latencia_p99_ms']} ms > {slo_p99_ms} ms"
+    if modo == "abierto" and escalon["peticiones_por_s"] < 0.9 * escalon["qps_objetivo"]:
+        return f"{escalon['peticiones_por_s']} pet/s < 90% de {escalon['qps_objetivo']}"
+    if modo == "cerrado" and mejor_anterior is not None and escalon["peticiones_por_s"] < 1.05 * mejor_anterior:
+        return f"{escalon['peticiones_por_s']} pet/s no mejora un 5% sobre {mejor_anterior}"
+    return None
+
+def buscar_saturacion(url, ruta, corpus, modo, inicial, factor=1.5, max_escalones=12, slo_p99_ms=None,
+                      max_errores=0.01, **opciones):
+    """
+    Sube la carga escalon a escalon hasta saturar el servicio.
+
+    Returns:
+        tuple: (escalones, punto de saturacion o None si ya satura el primero).
+    """
+    escalones, punto, mejor = [], None, None
+    nivel = inicial
+    for _ in range(max_escalones):
+        escalon = ejecutar_escalon(url, ruta, corpus, modo, nivel, **opciones)
+        escalones.append(escalon)
+        motivo = esta_saturado(escalon, modo, mejor, slo_p99_ms, max_errores)
+        if motivo:
+            print(f"\033[93m📉 Saturado en {escalon['escenario']}: {motivo}\033[0m")
+            break
+        punto = dict(escalon, escenario=f"saturacion/{modo}")
+        mejor = max(mejor or 0.0, escalon["peticiones_por_s"])
+        siguiente = nivel * factor
+        nivel = round(siguiente, 2) if modo == "abierto" else max(int(nivel) + 1, int(round(siguiente)))
+    return escalones, punto
+
+# ==========================
+# Servidor
+# ==========================
+
+def lanzar_servidor(puerto, argumentos=""):
+    """
+    Levanta solve_server.py en 'puerto' y espera a que responda /health.
+    """
+    comando = [sys.executable, servidor_py, "--port", str(puerto)] + shlex.split(argumentos)
+    print(f"\033[94m🚀 Levantando servidor: {' '.join(comando[1:])}\033[0m")
+    proceso = subprocess.Popen(comando, cwd=os.path.dirname(servidor_py),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.time() + 180
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise SystemExit(f"🚫 El servidor termino con codigo {proceso.returncode}")
+        if consultar("127.0.0.1", puerto, "/health") is not None:
+            return proceso
+        time.sleep(0.5)
+    proceso.terminate()
+    raise SystemExit("🚫 El servidor no respondio a /health a tiempo")
+
+def consultar(host, puerto, ruta):
+    """
+    GET de una ruta JSON del servidor; None si no responde.
+    """
+    try:
+        conexion = http.client.HTTPConnection(host, puerto, timeout=5)
+        conexion.request("GET", ruta)
+        respuesta = conexion.getresponse()
+        datos = respuesta.read()
+        conexion.close()
+        return json.loads(datos) if respuesta.status == 200 else None
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+
+def guardar_resultados(resultados, salida=output_json, historial=True):
+    documento = {"entorno": entorno(), "resultados": resultados}
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f"\n\033[92m💾 Resultados guardados en: {salida}\033[0m")
+    if historial:
+        registrar_corrida("load_generator", documento)
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generador de carga para el servicio de resolucion de ecuaciones.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="URL base del servidor.")
+    parser.add_argument("--ruta", default="/solve", choices=["/solve", "/solve/stream"], help="Ruta a la que se envian las peticiones.")
+    parser.add_argument("--corpus", default="hojas", choices=["hojas", "recortes", "sinteticas"], help="Peticiones a repetir.")
+    parser.add_argument("--n", type=int, default=None, help="Elementos del corpus (por defecto, todos; 50 hojas sinteticas).")
+    parser.add_argument("--modo", default="abierto", choices=["abierto", "cerrado"], help="Lazo abierto (QPS) o cerrado (clientes).")
+    parser.add_argument("--qps", type=float, default=10.0, help="QPS objetivo (lazo abierto) o inicial de la busqueda.")
+    parser.add_argument("--clientes", type=int, default=4, help="Clientes concurrentes (lazo cerrado) o inicial de la busqueda.")
+    parser.add_argument("--conexiones", type=int, default=32, help="Conexiones maximas en lazo abierto.")
+    parser.add_argument("--cerrar-conexiones", action="store_true", help="Enviar Connection: close (una conexion por peticion).")
+    parser.add_argument("--poisson", action="store_true", help="Llegadas de Poisson en lazo abierto (por defecto, uniformes).")
+    parser.add_argument("--duracion-s", type=float, default=30.0, help="Segundos medidos por escalon.")
+    parser.add_argument("--calentamiento-s", type=float, default=3.0, help="Segundos sin medir al inicio de cada escalon.")
+    parser.add_argument("--buscar-saturacion", action="store_true", help="Subir la carga por escalones hasta saturar.")
+    parser.add_argument("--factor", type=float, default=1.5, help="Multiplicador de la carga entre escalones.")
+    parser.add_argument("--max-escalones", type=int, default=12, help="Escalones maximos de la busqueda.")
+    parser.add_argument("--slo-p99-ms", type=float, default=None, help="p99 maximo aceptable en la busqueda.")
+    parser.add_argument("--max-errores", type=float, default=0.01, help="Tasa de errores maxima aceptable en la busqueda.")
+    parser.add_argument("--lanzar", action="store_true", help="Levantar solve_server.py en el puerto de --url para la prueba.")
+    parser.add_argument("--args-servidor", default="", help="Argumentos extra de solve_server.py con --lanzar.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de las llegadas de Poisson y del corpus sintetico.")
+    parser.add_argument("--salida", default=output_json, help="Archivo JSON de resultados.")
+    parser.add_argument("--sin-historial", action="store_true", help="No agregar la ejecucion al historial (bench_history.py).")
+    args = parser.parse_args()
+
+    print(f"\n\033[94m📦 Cargando corpus '{args.corpus}'...\033[0m")
+    corpus = cargar_corpus(args.corpus, args.n, args.semilla)
+    partes = urlsplit(args.url)
+    proceso = lanzar_servidor(partes.port or 80, args.args_servidor) if args.lanzar else None
+    salud = consultar(partes.hostname, partes.port or 80, "/health") or {}
+    workers = salud.get("workers")
+    if workers is not None:
+        print(f"\033[94m🧵 El servidor resuelve con {workers} workers\033[0m")
+
+    opciones = {"duracion_s": args.duracion_s, "calentamiento_s": args.calentamiento_s,
+                "conexiones": args.conexiones, "poisson": args.poisson, "semilla": args.semilla,
+                "cerrar_conexiones": args.cerrar_conexiones}
+    inicial = args.qps if args.modo == "abierto" else args.clientes
+    print(f"\033[94m⏱ Carga {args.modo} sobre {args.url}{args.ruta}: {len(corpus)} peticiones en el corpus\033[0m")
+    try:
+        if args.buscar_saturacion:
+            escalones, punto = buscar_saturacion(args.url, args.ruta, corpus, args.modo, inicial,
+                                                 args.factor, args.max_escalones, args.slo_p99_ms, args.max_errores,
+                                                 **opciones)
+        else:
+            escalones, punto = [ejecutar_escalon(args.url, args.ruta, corpus, args.modo, inicial, **opciones)], None
+        servidor = consultar(partes.hostname, partes.port or 80, "/stats")
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+
+    if punto:
+        print(f"\n\033[92m🏁 Punto de saturacion: {punto['peticiones_por_s']} pet/s "
+              f"({punto['ecuaciones_por_s']} ec/s) con p99 {punto['latencia_p99_ms']} ms\033[0m")
+    configuracion = {k: v for k, v in vars(args).items() if k not in ("salida", "sin_historial")}
+    configuracion["peticiones_corpus"] = len(corpus)
+    configuracion["workers_servidor"] = workers
+    guardar_resultados({"configuracion": configuracion, "escalones": escalones, "saturacion": punto,
+                        "servidor": servidor}, args.salida, not args.sin_historial)
@@ -0,0 +1,233 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: micro_benchmarks.py
+Descripcion: Micro-benchmarks de los kernels por imagen (caracteristicas de
+             tinta, histogramas, picos, rotacion y clasificadores) sobre
+             imagenes sinteticas deterministas.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, sys, json, time, argparse, tracemalloc, cv2, numpy
+===============================================================================
+Uso:
+Todos los kernels en 45x45 y 150x150 con lotes de 1, 64 y 4096:
+    python micro_benchmarks.py
+Solo algunos kernels, tamanos o lotes:
+    python micro_benchmarks.py --kernels rotate_image_45 count_peaks --tamanos 45 --lotes 64
+===============================================================================
+Notas:
+- Las imagenes se generan con una semilla fija (trazos negros sobre fondo
+  blanco), asi que dos ejecuciones miden exactamente la misma entrada.
+- Cada combinacion (kernel, tamano, lote) aplica el kernel imagen por
+  imagen sobre el lote; se repite hasta sumar --min-tiempo segundos (al
+  menos 3 veces) y se informa la mediana y el minimo en ns/imagen y el
+  rendimiento en imagenes/s.
+- Asignaciones: en una pasada aparte con tracemalloc se mide, por imagen, el
+  pico de memoria asignada durante la llamada (bytes/imagen, incluye los
+  arreglos de NumPy y OpenCV que pasan por el asignador de Python).
+- count_peaks recibe el histograma de proyeccion horizontal de cada imagen
+  (precalculado) en lugar de la imagen.
+- Los resultados se guardan en 'bench_results/micro_benchmarks.json' con
+  las versiones de Python, NumPy y OpenCV, y se agregan al historial de
+  bench_history.py (salvo con --sin-historial).
+===============================================================================
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE, "..", "operands"))
+sys.path.append(os.path.join(BASE, "..", "equations"))
+from bench_history import registrar_corrida
+from classify_equations import (
+    calcular_vector_tinta,
+    cargar_vectores_promedio,
+    clasificar_operador,
+    clasificar_operando,
+    compute_projection_histogram,
+    count_peaks,
+    rotate_image_45,
+)
+from generate_ink_density_csv import compute_tinta_por_cuadrante
+from model_artifact import UMBRAL_PICOS
+
+prototipos_csv = os.path.join(BASE, "..", "equations", "classify_digits", "promedios_por_digito.csv")
+output_json = "bench_results/micro_benchmarks.json"
+
+TAMANOS = (45, 150)
+LOTES = (1, 64, 4096)
+SEMILLA = 1234
+
+def imagen_sintetica(rng, lado):
+    """
+    Recorte sintetico: fondo blanco con 2 a 4 trazos negros y, a veces, una
+    elipse, con grosor proporcional al lado.
+    """
+    img = np.full((lado, lado), 255, dtype=np.uint8)
+    grosor = max(1, lado // 15)
+    for _ in range(rng.integers(2, 5)):
+        p1 = tuple(int(v) for v in rng.integers(lado // 8, lado - lado // 8, size=2))
+        p2 = tuple(int(v) for v in rng.integers(lado // 8, lado - lado // 8, size=2))
+        cv2.line(img, p1, p2, 0, grosor)
+    if rng.random() < 0.5:
+        centro = (lado // 2, lado // 2)
+        ejes = (int(rng.integers(lado // 6, lado // 3)), int(rng.integers(lado // 6, lado // 3)))
+        cv2.ellipse(img, centro, ejes, 0, 0, 360, 0, grosor)
+    return img
+
+def generar_imagenes(n, lado, semilla=SEMILLA):
+    """
+    Lista determinista de n imagenes sinteticas de lado x lado.
+    """
+    rng = np.random.default_rng(semilla + lado)
+    return [imagen_sintetica(rng, lado) for _ in range(n)]
+
+# Nombres de los kernels de definir_kernels (opciones de --kernels, sin
+# cargar los prototipos)
+KERNELS = (
+    "compute_tinta_por_cuadrante", "calcular_vector_tinta", "compute_projection_histogram",
+    "count_peaks", "rotate_image_45", "clasificar_operando", "clasificar_operador",
+)
+
+def definir_kernels(vectores_promedio):
+    """
+    Devuelve {nombre: (funcion(entrada), preparar(imagenes) -> entradas)}.
+    """
+    imagenes = lambda imgs: imgs
+    histogramas = lambda imgs: [compute_projection_histogram(img, axis=1) for img in imgs]
+    return {
+        "compute_tinta_por_cuadrante": (compute_tinta_por_cuadrante, imagenes),
+        "calcular_vector_tinta": (calcular_vector_tinta, imagenes),
+        "compute_projection_histogram": (lambda img: compute_projection_histogram(img, axis=1), imagenes),
+        "count_peaks": (lambda hist: count_peaks(hist, UMBRAL_PICOS), histogramas),
+        "rotate_image_45": (rotate_image_45, imagenes),
+        "clasificar_operando": (lambda img: clasificar_operando(img, vectores_promedio), imagenes),
+        "clasificar_operador": (clasificar_operador, imagenes),
+    }
+
+def medir_tiempo(funcion, entradas, min_tiempo=0.5, min_repeticiones=3, max_repeticiones=200):
+    """
+    Ejecuta funcion sobre cada entrada del lote varias veces.
+
+    Returns:
+        list: Duracion de cada repeticion en ns.
+    """
+    for entrada in entradas[:2]:
+        funcion(entrada)  # Calentamiento
+    duraciones = []
+    total = 0
+    while len(duraciones) < min_repeticiones or (total < min_tiempo * 1e9 and len(duraciones) < max_repeticiones):
+        inicio = time.perf_counter_ns()
+        for entrada in entradas:
+            funcion(entrada)
+        duracion = time.perf_counter_ns() - inicio
+        duraciones.append(duracion)
+        total += duracion
+    return duraciones
+
+def medir_asignaciones(funcion, entradas, max_entradas=256):
+    """
+    Pico de memoria asignada por llamada (media sobre a lo sumo
+    max_entradas entradas del lote), medido con tracemalloc.
+    """
+    muestras = entradas[:max_entradas]
+    picos = []
+    tracemalloc.start()
+    try:
+        for entrada in muestras:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            funcion(entrada)
+            _, pico = tracemalloc.get_traced_memory()
+            picos.append(pico - base)
+    finally:
+        tracemalloc.stop()
+    return float(np.mean(picos)) if picos else 0.0
+
+def ejecutar(kernels=None, tamanos=TAMANOS, lotes=LOTES, min_tiempo=0.5):
+    """
+    Mide cada combinacion (kernel, tamano, lote) y devuelve la lista de
+    resultados.
+    """
+    vectores_promedio = cargar_vectores_promedio(prototipos_csv)
+    definiciones = definir_kernels(vectores_promedio)
+    nombres = kernels or list(definiciones)
+    resultados = []
+
+    for lado in tamanos:
+        pool = generar_imagenes(max(lotes), lado)
+        for nombre in nombres:
+            funcion, preparar = definiciones[nombre]
+            entradas_pool = preparar(pool)
+            for lote in lotes:
+                entradas = entradas_pool[:lote]
+                duraciones = np.array(medir_tiempo(funcion, entradas, min_tiempo=min_tiempo), dtype=float)
+                ns_imagen = float(np.median(duraciones)) / lote
+                resultado = {
+                    "kernel": nombre,
+                    "tamano": lado,
+                    "lote": lote,
+                    "repeticiones": len(duraciones),
+                    "ns_por_imagen": round(ns_imagen, 1),
+                    "ns_por_imagen_min": round(float(duraciones.min()) / lote, 1),
+                    "imagenes_por_s": round(1e9 / ns_imagen, 1),
+                    "bytes_asignados_por_imagen": round(medir_asignaciones(funcion, entradas), 1),
+                }
+                resultados.append(resultado)
+                print(f"\033[92m✔ {nombre:<30} {lado:>3}x{lado:<3} lote {lote:>5}: "
+                      f"{resultado['ns_por_imagen']:>12,.0f} ns/img  {resultado['imagenes_por_s']:>12,.0f} img/s  "
+                      f"{resultado['bytes_asignados_por_imagen']:>10,.0f} B/img\033[0m")
+    return resultados
+
+def entorno():
+    """
+    Versiones y plataforma con que se midio.
+    """
+    return {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+        "semilla": SEMILLA,
+    }
+
+def guardar_resultados(resultados, salida=output_json, historial=True):
+    documento = {"entorno": entorno(), "resultados": resultados}
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f"\n\033[92m💾 Resultados guardados en: {salida}\033[0m")
+    if historial:
+        registrar_corrida("micro_benchmarks", documento)
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de los kernels por imagen.")
+    parser.add_argument("--kernels", nargs="+", choices=KERNELS, metavar="KERNEL",
+                        help=f"Kernels a medir (por defecto, todos): {', '.join(KERNELS)}.")
+    parser.add_argument("--tamanos", nargs="+", type=int, default=list(TAMANOS), help="Lados de las imagenes sinteticas.")
+    parser.add_argument("--lotes", nargs="+", type=int, default=list(LOTES), help="Tamanos de lote.")
+    parser.add_argument("--min-tiempo", type=float, default=0.5, help="Segundos minimos medidos por combinacion.")
+    parser.add_argument("--salida", default=output_json, help="Archivo JSON de resultados.")
+    parser.add_argument("--sin-historial", action="store_true", help="No agregar la ejecucion al historial (bench_history.py).")
+    args = parser.parse_args()
+
+    print("\n\033[94m⏱ Ejecutando micro-benchmarks...\033[0m")
+    guardar_resultados(ejecutar(args.kernels, args.tamanos, args.lotes, args.min_tiempo), args.salida, not args.sin_historial)
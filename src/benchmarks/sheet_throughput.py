@@ -0,0 +1,328 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: sheet_throughput.py
+Descripcion: Benchmark de extremo a extremo sobre hojas sinteticas:
+             segmentacion -> clasificacion -> evaluacion, con hojas/s,
+             ecuaciones/s, latencia por hoja (p50/p99) y exactitud.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, sys, json, time, argparse, tempfile,
+  multiprocessing, numpy, pandas (modo disco)
+===============================================================================
+Uso:
+1000 hojas en memoria con un proceso:
+    python sheet_throughput.py --hojas 1000
+100k hojas repartidas en 8 procesos:
+    python sheet_throughput.py --hojas 100000 --procesos 8
+La cadena de scripts real (extract_equations_from_image y
+procesar_todas_las_ecuaciones) sobre disco:
+    python sheet_throughput.py --hojas 1000 --modo disco
+===============================================================================
+Notas:
+- Las hojas se generan con synthetic_sheets.py (hoja n = semilla y n). La
+  generacion no se incluye en los tiempos: en modo memoria se generan
+  antes del cronometro min(--hojas, --hojas-distintas) hojas (unos 2 MB
+  cada una a escala 1) y la hoja n procesada es la n modulo ese numero;
+  los procesos de trabajo las heredan al crearse.
+- Modo memoria (por defecto): por hoja se mide segmentar_ecuaciones +
+  resolver_ecuacion de cada ecuacion (lo mismo que hace
+  procesar_todas_las_ecuaciones) + comparacion con la verdad. Con --lote
+  se usa resolver_ecuaciones (una clasificacion por hoja), como el servicio.
+  Hojas/s y ecuaciones/s salen del tiempo de pared entre el primer envio y
+  la ultima hoja, con los procesos ya creados y el modelo cargado; las
+  latencias por hoja se miden dentro de cada proceso.
+- Modo disco: se escriben las hojas, se ejecuta extract_equations_from_image
+  sobre cada una (latencia por hoja de la extraccion) y luego
+  procesar_todas_las_ecuaciones sobre la carpeta generada; su salida por
+  consola se descarta.
+- Exactitud: de ecuaciones (resultado calculado == esperado) y, si la hoja
+  se segmento con el numero esperado de ecuaciones, de operandos y
+  operadores. Las hojas con otro numero de ecuaciones cuentan como fallos
+  de segmentacion y todas sus ecuaciones como incorrectas.
+- Los resultados se guardan en 'bench_results/sheet_throughput.json' y se
+  agregan al historial de bench_history.py (salvo con --sin-historial).
+===============================================================================
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE, "..", "operands"))
+sys.path.append(os.path.join(BASE, "..", "equations"))
+import classify_equations
+import extract_test_images
+from bench_history import registrar_corrida
+from classify_equations import cargar_modelo_ecuaciones, clasificador_operadores_modelo, resolver_ecuacion, resolver_ecuaciones
+from extract_test_images import segmentar_ecuaciones
+from micro_benchmarks import entorno
+from synthetic_sheets import BancoGlifos, generar_hoja_numero, generar_hojas
+
+modelo_path = os.path.join(BASE, "..", "equations", "classify_digits", "modelo.npz")
+prototipos_csv = os.path.join(BASE, "..", "equations", "classify_digits", "promedios_por_digito.csv")
+output_json = "bench_results/sheet_throughput.json"
+
+# Estado de cada proceso de trabajo (se inicializa una vez por proceso)
+_estado = {}
+
+def generar_hojas_memoria(n_hojas, semilla=0, filas=6, escala=1.0, ruido=6.0, por_clase=200):
+    """
+    Genera las hojas 0..n_hojas-1 en memoria.
+
+    Returns:
+        list: (resultado, imagen, ecuaciones) por hoja.
+    """
+    print(f"\n\033[94m📄 Generando {n_hojas} hojas sinteticas en memoria...\033[0m")
+    banco = BancoGlifos(por_clase, semilla)
+    return [generar_hoja_numero(numero, banco, semilla, filas, escala, ruido) for numero in range(n_hojas)]
+
+def inicializar_proceso(hojas, barrera=None):
+    _estado["hojas"] = hojas
+    _estado["barrera"] = barrera
+    _estado["modelo"] = cargar_modelo_ecuaciones(modelo_path, prototipos_csv)
+
+def esperar_procesos():
+    """
+    Bloquea hasta que todos los procesos del pool esten creados y con el
+    modelo cargado (una tarea por proceso).
+    """
+    _estado["barrera"].wait()
+
+def resolver_hoja(gray, modelo, lote=False):
+    """
+    Segmenta una hoja y resuelve sus ecuaciones.
+
+    Returns:
+        tuple: (soluciones, segundos de segmentacion, segundos de clasificacion).
+    """
+    inicio = time.perf_counter()
+    ecuaciones = [tuple(recortes[:3]) for recortes in segmentar_ecuaciones(gray)]
+    medio = time.perf_counter()
+    if lote:
+        soluciones = resolver_ecuaciones(ecuaciones, modelo.vectores_promedio,
+                                         clasificar_operadores=clasificador_operadores_modelo(modelo))
+    else:
+        soluciones = [resolver_ecuacion(*ecuacion, modelo.vectores_promedio, modelo.umbral_picos, modelo.reglas)
+                      for ecuacion in ecuaciones]
+    return soluciones, medio - inicio, time.perf_counter() - medio
+
+def comparar(soluciones, verdad, resultado):
+    """
+    Cuenta aciertos de una hoja frente a su verdad de referencia.
+    """
+    conteo = {"ecuaciones": len(verdad), "correctas": 0, "operandos": 0, "operandos_ok": 0,
+              "operadores": 0, "operadores_ok": 0, "segmentacion_fallida": 0}
+    if len(soluciones) != len(verdad):
+        conteo["segmentacion_fallida"] = 1
+        return conteo
+    for sol, (op1, operador, op2) in zip(soluciones, verdad):
+        conteo["correctas"] += sol["Resultado_Calculado"] == resultado
+        conteo["operandos"] += 2
+        conteo["operandos_ok"] += (sol["Operando_1"] == op1) + (sol["Operando_2"] == op2)
+        conteo["operadores"] += 1
+        conteo["operadores_ok"] += sol["Operador"] == operador
+    return conteo
+
+def procesar_rango(inicio, fin, lote):
+    """
+    Procesa las hojas [inicio, fin) en el proceso actual.
+
+    Returns:
+        dict: Latencias por hoja (s), tiempos por etapa y conteos.
+    """
+    hojas, modelo = _estado["hojas"], _estado["modelo"]
+    latencias, segmentacion, clasificacion = [], 0.0, 0.0
+    totales = {}
+    for numero in range(inicio, fin):
+        resultado, hoja, verdad = hojas[numero % len(hojas)]
+        t0 = time.perf_counter()
+        soluciones, t_seg, t_clf = resolver_hoja(hoja, modelo, lote)
+        conteo = comparar(soluciones, verdad, resultado)
+        latencias.append(time.perf_counter() - t0)
+        segmentacion += t_seg
+        clasificacion += t_clf
+        for clave, valor in conteo.items():
+            totales[clave] = totales.get(clave, 0) + int(valor)
+    return {"latencias": latencias, "segmentacion_s": segmentacion, "clasificacion_s": clasificacion, "conteos": totales}
+
+def resumir(latencias, conteos, duracion, extra=None):
+    """
+    Metricas finales a partir de las latencias por hoja y los conteos.
+    """
+    latencias = np.asarray(latencias) * 1000.0
+    hojas = len(latencias)
+    ecuaciones = conteos.get("ecuaciones", 0)
+    resumen = {
+        "hojas": hojas,
+        "ecuaciones": ecuaciones,
+        "duracion_s": round(duracion, 3),
+        "hojas_por_s": round(hojas / duracion, 2) if duracion else 0.0,
+        "ecuaciones_por_s": round(ecuaciones / duracion, 2) if duracion else 0.0,
+        "latencia_p50_ms": round(float(np.percentile(latencias, 50)), 3) if hojas else None,
+        "latencia_p99_ms": round(float(np.percentile(latencias, 99)), 3) if hojas else None,
+        "latencia_max_ms": round(float(latencias.max()), 3) if hojas else None,
+        "exactitud_ecuaciones": round(conteos.get("correctas", 0) / ecuaciones, 4) if ecuaciones else None,
+        "exactitud_operandos": round(conteos.get("operandos_ok", 0) / conteos["operandos"], 4) if conteos.get("operandos") else None,
+        "exactitud_operadores": round(conteos.get("operadores_ok", 0) / conteos["operadores"], 4) if conteos.get("operadores") else None,
+        "hojas_segmentacion_fallida": conteos.get("segmentacion_fallida", 0),
+    }
+    resumen.update(extra or {})
+    return resumen
+
+def benchmark_memoria(n_hojas, procesos=1, semilla=0, filas=6, escala=1.0, ruido=6.0, lote=False, por_clase=200,
+                      distintas=128):
+    """
+    Benchmark en memoria, opcionalmente repartido en varios procesos.
+    """
+    tramo = max(1, -(-n_hojas // (procesos * 4)))
+    rangos = [(i, min(i + tramo, n_hojas)) for i in range(0, n_hojas, tramo)]
+    latencias, conteos, segmentacion, clasificacion = [], {}, 0.0, 0.0
+
+    def acumular(parcial):
+        nonlocal segmentacion, clasificacion
+        latencias.extend(parcial["latencias"])
+        segmentacion += parcial["segmentacion_s"]
+        clasificacion += parcial["clasificacion_s"]
+        for clave, valor in parcial["conteos"].items():
+            conteos[clave] = conteos.get(clave, 0) + valor
+        print(f"\033[92m✔ {len(latencias)}/{n_hojas} hojas procesadas...\033[0m")
+
+    hojas = generar_hojas_memoria(min(n_hojas, distintas), semilla, filas, escala, ruido, por_clase)
+    if procesos <= 1:
+        inicializar_proceso(hojas)
+        inicio = time.perf_counter()
+        for a, b in rangos:
+            acumular(procesar_rango(a, b, lote))
+        duracion = time.perf_counter() - inicio
+    else:
+        barrera = multiprocessing.Barrier(procesos)
+        with ProcessPoolExecutor(procesos, initializer=inicializar_proceso, initargs=(hojas, barrera)) as pool:
+            # Crear los procesos y cargar el modelo fuera del cronometro
+            for futuro in [pool.submit(esperar_procesos) for _ in range(procesos)]:
+                futuro.result()
+            inicio = time.perf_counter()
+            futuros = [pool.submit(procesar_rango, a, b, lote) for a, b in rangos]
+            for futuro in futuros:
+                acumular(futuro.result())
+            duracion = time.perf_counter() - inicio
+    print(f"\033[93m⏱ Tiempo de pared: {duracion:.2f} s (latencias sumadas: {sum(latencias):.2f} s)\033[0m")
+
+    return resumir(latencias, conteos, duracion, {
+        "modo": "memoria",
+        "procesos": procesos,
+        "lote": lote,
+        "hojas_distintas": len(hojas),
+        "segmentacion_ms_por_hoja": round(1000.0 * segmentacion / max(len(latencias), 1), 3),
+        "clasificacion_ms_por_hoja": round(1000.0 * clasificacion / max(len(latencias), 1), 3),
+    })
+
+def benchmark_disco(n_hojas, semilla=0, filas=6, escala=1.0, ruido=6.0, por_clase=200):
+    """
+    Ejecuta la cadena real de scripts sobre hojas escritas en disco.
+    """
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory(prefix="inksolver_bench_") as tmp:
+        raw, processed = os.path.join(tmp, "raw"), os.path.join(tmp, "processed") + os.sep
+        generar_hojas(n_hojas, raw, semilla, filas, escala, ruido, por_clase)
+        extract_test_images.output_base_folder = processed
+        classify_equations.eq_base_folder = processed
+        classify_equations.output_csv = os.path.join(tmp, "ecuaciones_clasificadas.csv")
+
+        print(f"\n\033[94m⏱ Extrayendo ecuaciones de {n_hojas} hojas...\033[0m")
+        latencias = []
+        inicio = time.perf_counter()
+        with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+            for resultado in sorted(os.listdir(raw)):
+                carpeta = os.path.join(raw, resultado)
+                if not os.path.isdir(carpeta):
+                    continue
+                for nombre in sorted(os.listdir(carpeta)):
+                    t0 = time.perf_counter()
+                    extract_test_images.extract_equations_from_image(
+                        os.path.join(carpeta, nombre), resultado, nombre.split("_")[1].split(".")[0])
+                    latencias.append(time.perf_counter() - t0)
+            extraccion = time.perf_counter() - inicio
+
+            # Las rutas del modelo de classify_equations son relativas a su carpeta
+            directorio = os.getcwd()
+            os.chdir(os.path.join(BASE, "..", "equations"))
+            try:
+                inicio_clasificacion = time.perf_counter()
+                classify_equations.procesar_todas_las_ecuaciones()
+                clasificacion = time.perf_counter() - inicio_clasificacion
+            finally:
+                os.chdir(directorio)
+
+        df = pd.read_csv(classify_equations.output_csv)
+        verdad = pd.read_csv(os.path.join(raw, "verdad.csv"))
+        verdad["Eq_ID"] = verdad["Hoja"].str.replace(r"^\d+/|\.png$", "", regex=True) + "_" + verdad["Eq_ID"]
+        unido = verdad.merge(df, on="Eq_ID", how="left", suffixes=("_Real", ""))
+        conteos = {
+            "ecuaciones": len(verdad),
+            "correctas": int(unido["Es_Correcta"].fillna(False).astype(bool).sum()),
+            "operandos": 2 * len(verdad),
+            "operandos_ok": int((unido["Operando_1"] == unido["Operando_1_Real"]).sum()
+                                + (unido["Operando_2"] == unido["Operando_2_Real"]).sum()),
+            "operadores": len(verdad),
+            "operadores_ok": int((unido["Operador"] == unido["Operador_Real"]).sum()),
+            "segmentacion_fallida": int(unido["Operador"].isna().sum()),
+        }
+
+    resumen = resumir(latencias, conteos, extraccion + clasificacion, {
+        "modo": "disco",
+        "extraccion_s": round(extraccion, 3),
+        "clasificacion_s": round(clasificacion, 3),
+    })
+    resumen["hojas_segmentacion_fallida"] = None
+    resumen["ecuaciones_sin_resultado"] = conteos["segmentacion_fallida"]
+    return resumen
+
+def guardar_resultados(resumen, salida=output_json, historial=True):
+    documento = {"entorno": entorno(), "resultados": resumen}
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    print(f"\n\033[92m💾 Resultados guardados en: {salida}\033[0m")
+    if historial:
+        registrar_corrida("sheet_throughput", documento)
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo sobre hojas sinteticas.")
+    parser.add_argument("--hojas", type=int, default=1000, help="Numero de hojas.")
+    parser.add_argument("--modo", choices=["memoria", "disco"], default="memoria", help="En memoria o con la cadena de scripts sobre disco.")
+    parser.add_argument("--procesos", type=int, default=1, help="Procesos de trabajo (modo memoria).")
+    parser.add_argument("--hojas-distintas", type=int, default=128, help="Hojas generadas antes de medir (modo memoria); se repiten en ciclo.")
+    parser.add_argument("--lote", action="store_true", help="Clasificar cada hoja en un lote (resolver_ecuaciones).")
+    parser.add_argument("--filas", type=int, default=6, help="Filas de ecuaciones por hoja.")
+    parser.add_argument("--escala", type=float, default=1.0, help="Factor de resolucion de las hojas.")
+    parser.add_argument("--ruido", type=float, default=6.0, help="Ruido gaussiano de las hojas.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de la serie de hojas.")
+    parser.add_argument("--salida", default=output_json, help="Archivo JSON de resultados.")
+    parser.add_argument("--sin-historial", action="store_true", help="No agregar la ejecucion al historial (bench_history.py).")
+    args = parser.parse_args()
+
+    print(f"\n\033[94m⏱ Benchmark de hojas ({args.modo}): {args.hojas} hojas\033[0m")
+    if args.modo == "memoria":
+        resumen = benchmark_memoria(args.hojas, args.procesos, args.semilla, args.filas, args.escala, args.ruido, args.lote,
+                                   distintas=args.hojas_distintas)
+    else:
+        resumen = benchmark_disco(args.hojas, args.semilla, args.filas, args.escala, args.ruido)
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    guardar_resultados(resumen, args.salida, not args.sin_historial)
@@ -0,0 +1,434 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: soak_test.py
+Descripcion: Prueba de resistencia (soak) del solucionador: repite un corpus
+             en bucle durante millones de llamadas, en el mismo proceso o
+             contra el servicio HTTP, muestrea RSS, descriptores de archivo
+             e hilos, toma fotos de tracemalloc por sitio de asignacion y
+             detecta crecimientos monotonos (fugas).
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, sys, json, time, argparse, threading,
+  tracemalloc, cv2, numpy
+- load_generator.py (corpus, clientes HTTP y arranque del servidor)
+===============================================================================
+Uso:
+Un millon de llamadas en el mismo proceso (o 8 horas, lo que ocurra antes):
+    python soak_test.py --modo proceso --llamadas 1000000 --duracion-s 28800
+Contra el servicio, levantado para la prueba con 4 clientes:
+    python soak_test.py --modo servicio --lanzar --clientes 4 --args-servidor "--max-lote 8"
+Prueba corta sin tracemalloc (solo RSS, descriptores e hilos):
+    python soak_test.py --llamadas 20000 --sin-tracemalloc
+===============================================================================
+Notas:
+- Modo proceso: cada llamada decodifica la peticion del corpus (PNG de una
+  hoja o JSON de recortes, como load_generator.py) y la resuelve con
+  resolver_tarea y un SolucionadorPorNiveles con cache de recortes, igual
+  que solve_stream.py y solve_server.py. Las fotos de tracemalloc
+  (stage_timing.foto_memoria, MARCOS_TRACEMALLOC marcos) se agrupan por el
+  sitio del proyecto mas reciente de cada pila.
+- Modo servicio: --clientes hilos envian peticiones en lazo cerrado y se
+  muestrean RSS, descriptores e hilos del proceso servidor (/proc/<pid>),
+  lanzado con --lanzar o indicado con --pid. Sin acceso a su tracemalloc,
+  las fugas se detectan solo por RSS, descriptores e hilos.
+- Cada --intervalo-s segundos se toma una muestra (RSS, descriptores,
+  hilos y memoria trazada por Python) y cada --intervalo-fotos-s una foto
+  de tracemalloc. tracemalloc hace las llamadas varias veces mas lentas;
+  las llamadas por segundo de la prueba no son representativas.
+- Deteccion: se descarta la primera fraccion --calentamiento de las
+  muestras (cache llenandose, arenas del asignador), el resto se divide en
+  5 ventanas y una serie crece de forma monotona si la mediana de cada
+  ventana supera a la anterior. Es una fuga si ademas crece mas que su
+  umbral entre la primera y la ultima ventana: --umbral-rss-mb para RSS,
+  --umbral-sitio-kb por sitio de asignacion y cualquier aumento para
+  descriptores e hilos. Tambien se informa la pendiente (por hora y por
+  millon de llamadas).
+- El informe se guarda en 'bench_results/soak/<modo>_<fecha>.json' (con
+  todas las muestras) y '.md' (veredicto y graficas de texto). El codigo de
+  salida es 1 si se detecto alguna fuga y 2 si alguna serie del proceso no
+  tuvo VENTANAS muestras tras el calentamiento (prueba demasiado corta para
+  el --intervalo-s elegido): sin muestras no hay veredicto de memoria.
+===============================================================================
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE, "..", "operands"))
+sys.path.append(os.path.join(BASE, "..", "equations"))
+from bench_history import mini_grafica
+from classify_equations import cargar_modelo_ecuaciones
+from crop_cache import CacheClasificaciones
+from load_generator import Cliente, cargar_corpus, lanzar_servidor
+from micro_benchmarks import entorno
+from solve_stream import interpretar_registro, resolver_tarea
+from solver_tiers import SolucionadorPorNiveles
+from stage_timing import MARCOS_TRACEMALLOC, foto_memoria, sitios_de
+
+modelo_path = os.path.join(BASE, "..", "equations", "classify_digits", "modelo.npz")
+prototipos_csv = os.path.join(BASE, "..", "equations", "classify_digits", "promedios_por_digito.csv")
+output_dir = "bench_results/soak"
+
+VENTANAS = 5
+SITIOS_INFORME = 10
+_ARCHIVO = os.path.abspath(__file__)
+
+# ==========================
+# Muestreo del proceso
+# ==========================
+
+def leer_proceso(pid="self"):
+    """
+    RSS (MB), descriptores de archivo abiertos e hilos de un proceso (Linux).
+    """
+    rss = hilos = None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    rss = int(linea.split()[1]) / 1024
+                elif linea.startswith("Threads:"):
+                    hilos = int(linea.split()[1])
+        descriptores = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        return {"rss_mb": rss, "descriptores": None, "hilos": hilos}
+    return {"rss_mb": rss, "descriptores": descriptores, "hilos": hilos}
+
+def sitios_sin_arnes(tamanos):
+    """
+    Bytes por sitio de asignacion sin las asignaciones hechas directamente
+    por este archivo (muestras y fotos guardadas). Lo asignado mas abajo en
+    una llamada del arnes si cuenta.
+    """
+    rutas = {}
+    propias = lambda archivo: rutas.setdefault(archivo, os.path.abspath(archivo) == _ARCHIVO)
+    return dict(sitios_de({marcos: tamano for marcos, tamano in tamanos.items()
+                           if marcos and not propias(marcos[0][0])}))
+
+class Muestreador:
+    """
+    Series de muestras del proceso y de sitios de asignacion a lo largo de
+    la prueba.
+    """
+
+    def __init__(self, pid="self", intervalo_s=10.0, intervalo_fotos_s=60.0, fotos=True):
+        self.pid = pid
+        self.intervalo_s = intervalo_s
+        self.intervalo_fotos_s = intervalo_fotos_s
+        self.fotos = fotos
+        self.muestras = []
+        self.fotos_sitios = []  # [(segundos, llamadas, {sitio: bytes})]
+        self.inicio = time.perf_counter()
+        self._proxima = self.inicio
+        self._proxima_foto = self.inicio
+
+    def tal_vez_muestrear(self, llamadas, ecuaciones, forzar=False):
+        ahora = time.perf_counter()
+        if ahora < self._proxima and not forzar:
+            return False
+        self._proxima = ahora + self.intervalo_s
+        muestra = {"segundos": round(ahora - self.inicio, 3), "llamadas": llamadas, "ecuaciones": ecuaciones}
+        muestra.update(leer_proceso(self.pid))
+        if tracemalloc.is_tracing():
+            muestra["python_mb"] = round(tracemalloc.get_traced_memory()[0] / (1024 * 1024), 3)
+        self.muestras.append(muestra)
+        if self.fotos and tracemalloc.is_tracing() and ahora >= self._proxima_foto:
+            self.fotos_sitios.append((muestra["segundos"], llamadas, sitios_sin_arnes(foto_memoria())))
+            # La foto puede tardar segundos: el intervalo cuenta desde que termina
+            self._proxima_foto = time.perf_counter() + self.intervalo_fotos_s
+            self._proxima = time.perf_counter() + self.intervalo_s
+        por_s = llamadas / (ahora - self.inicio) if ahora > self.inicio else 0.0
+        print(f"\033[92m  {muestra['segundos']:>9.0f} s  {llamadas:>10} llamadas ({por_s:7.1f}/s)  "
+              f"RSS {muestra['rss_mb']:8.1f} MB  fds {muestra['descriptores']}  hilos {muestra['hilos']}"
+              + (f"  python {muestra['python_mb']:.1f} MB" if "python_mb" in muestra else "") + "\033[0m")
+        return True
+
+# ==========================
+# Deteccion de crecimiento
+# ==========================
+
+def analizar_serie(tiempos_s, llamadas, valores, umbral, calentamiento=0.25):
+    """
+    Crecimiento de una serie tras el calentamiento: monotono si la mediana
+    de cada una de las VENTANAS supera a la anterior; fuga si ademas crece
+    mas que 'umbral'.
+    """
+    puntos = [(t, n, v) for t, n, v in zip(tiempos_s, llamadas, valores) if v is not None]
+    puntos = puntos[int(len(puntos) * calentamiento):]
+    if len(puntos) < VENTANAS:
+        return {"muestras": len(puntos), "fuga": False, "monotona": None, "crecimiento": None}
+    t, n, v = (np.asarray(columna, dtype=float) for columna in zip(*puntos))
+    medianas = [float(np.median(ventana)) for ventana in np.array_split(v, VENTANAS)]
+    monotona = all(b > a for a, b in zip(medianas, medianas[1:]))
+    crecimiento = medianas[-1] - medianas[0]
+    pendiente_s = float(np.polyfit(t, v, 1)[0]) if np.ptp(t) > 0 else 0.0
+    pendiente_llamada = float(np.polyfit(n, v, 1)[0]) if np.ptp(n) > 0 else 0.0
+    return {
+        "muestras": len(puntos),
+        "inicio": round(float(v[0]), 3),
+        "fin": round(float(v[-1]), 3),
+        "medianas": [round(m, 3) for m in medianas],
+        "crecimiento": round(crecimiento, 3),
+        "pendiente_por_hora": round(pendiente_s * 3600, 4),
+        "pendiente_por_millon": round(pendiente_llamada * 1e6, 4),
+        "monotona": monotona,
+        "fuga": monotona and crecimiento > umbral,
+        "grafica": mini_grafica(list(v[-60:])),
+    }
+
+def analizar(muestreador, umbral_rss_mb=5.0, umbral_sitio_kb=256.0, calentamiento=0.25):
+    """
+    Analiza RSS, memoria de Python, descriptores, hilos y sitios de
+    asignacion.
+
+    Returns:
+        dict: {"series": {...}, "sitios": {...}, "fugas": [nombres],
+        "insuficientes": [series sin VENTANAS muestras tras el calentamiento]}.
+    """
+    muestras = muestreador.muestras
+    tiempos_s = [m["segundos"] for m in muestras]
+    llamadas = [m["llamadas"] for m in muestras]
+    umbrales = {"rss_mb": umbral_rss_mb, "python_mb": umbral_rss_mb, "descriptores": 0.5, "hilos": 0.5}
+    series = {}
+    for nombre, umbral in umbrales.items():
+        if any(m.get(nombre) is not None for m in muestras):
+            series[nombre] = analizar_serie(tiempos_s, llamadas, [m.get(nombre) for m in muestras], umbral, calentamiento)
+
+    sitios = {}
+    fotos = muestreador.fotos_sitios
+    if fotos:
+        tiempos_f = [f[0] for f in fotos]
+        llamadas_f = [f[1] for f in fotos]
+        for sitio in set().union(*(f[2] for f in fotos)):
+            kb = [f[2].get(sitio, 0) / 1024 for f in fotos]
+            analisis = analizar_serie(tiempos_f, llamadas_f, kb, umbral_sitio_kb, calentamiento)
+            if analisis["fuga"] or (analisis["crecimiento"] or 0) > 0:
+                sitios[sitio] = analisis
+        sitios = dict(sorted(sitios.items(), key=lambda s: -s[1]["crecimiento"]))
+
+    fugas = [nombre for nombre, a in series.items() if a["fuga"]] + [sitio for sitio, a in sitios.items() if a["fuga"]]
+    insuficientes = [nombre for nombre, a in series.items() if a["crecimiento"] is None]
+    return {"series": series, "sitios": sitios, "fugas": fugas, "insuficientes": insuficientes}
+
+# ==========================
+# Conductores
+# ==========================
+
+def soak_proceso(corpus, muestreador, llamadas_max, duracion_s, cache_max=4096):
+    """
+    Resuelve el corpus en bucle en este proceso.
+    """
+    modelo = cargar_modelo_ecuaciones(modelo_path, prototipos_csv)
+    cache = CacheClasificaciones(capacidad=cache_max) if cache_max > 0 else None
+    solucionador = SolucionadorPorNiveles.desde_modelo(modelo, cache=cache)
+    resolver_lote = solucionador.resolver_lote()
+    fin = time.perf_counter() + duracion_s
+    llamadas = ecuaciones = errores = 0
+    muestreador.tal_vez_muestrear(0, 0)
+    with open(os.devnull, "w") as nulo:
+        while llamadas < llamadas_max and time.perf_counter() < fin:
+            cuerpo, tipo_contenido = corpus[llamadas % len(corpus)]
+            try:
+                # Las advertencias de segmentacion por hoja van a stderr
+                with contextlib.redirect_stderr(nulo):
+                    if tipo_contenido.startswith("image/"):
+                        img = cv2.imdecode(np.frombuffer(cuerpo, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+                        id_entrada, tipo, datos = str(llamadas), "hoja", img
+                    else:
+                        id_entrada, tipo, datos, _ = interpretar_registro(json.loads(cuerpo), str(llamadas))
+                    ecuaciones += len(resolver_tarea(id_entrada, tipo, datos, solucionador.vectores_promedio, resolver_lote))
+            except Exception as e:
+                errores += 1
+                if errores <= 5:
+                    print(f"\033[91m❌ Llamada {llamadas}: {e}\033[0m")
+            llamadas += 1
+            muestreador.tal_vez_muestrear(llamadas, ecuaciones)
+    # Muestra final con el solucionador aun vivo
+    muestreador.tal_vez_muestrear(llamadas, ecuaciones, forzar=True)
+    return {"llamadas": llamadas, "ecuaciones": ecuaciones, "errores": errores,
+            "cache": cache.metricas() if cache is not None else None}
+
+def soak_servicio(url, corpus, muestreador, llamadas_max, duracion_s, n_clientes=4):
+    """
+    n_clientes envian el corpus en bucle al servicio mientras se muestrea el
+    proceso servidor.
+    """
+    clientes = [Cliente(url, "/solve") for _ in range(n_clientes)]
+    detener = threading.Event()
+    enviadas = [0]
+    bloqueo = threading.Lock()
+
+    def trabajar(cliente):
+        while not detener.is_set():
+            with bloqueo:
+                numero = enviadas[0]
+                if numero >= llamadas_max:
+                    break
+                enviadas[0] += 1
+            cuerpo, tipo = corpus[numero % len(corpus)]
+            cliente.medir(cuerpo, tipo, time.perf_counter())
+        cliente.cerrar()
+
+    hilos = [threading.Thread(target=trabajar, args=(c,), daemon=True) for c in clientes]
+    for hilo in hilos:
+        hilo.start()
+    fin = time.perf_counter() + duracion_s
+    while any(hilo.is_alive() for hilo in hilos) and time.perf_counter() < fin:
+        muestreador.tal_vez_muestrear(sum(c.completadas for c in clientes), sum(c.ecuaciones for c in clientes))
+        time.sleep(min(1.0, muestreador.intervalo_s))
+    muestreador.tal_vez_muestrear(sum(c.completadas for c in clientes), sum(c.ecuaciones for c in clientes), forzar=True)
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+    errores = {}
+    for cliente in clientes:
+        for tipo, n in cliente.errores.items():
+            errores[tipo] = errores.get(tipo, 0) + n
+    return {"llamadas": sum(c.completadas for c in clientes) + sum(errores.values()),
+            "ecuaciones": sum(c.ecuaciones for c in clientes), "errores": sum(errores.values()),
+            "errores_por_tipo": errores}
+
+# ==========================
+# Informe
+# ==========================
+
+def escribir_informe(documento, ruta_md):
+    analisis = documento["analisis"]
+    lineas = [f"# Prueba de resistencia ({documento['configuracion']['modo']})", ""]
+    totales = documento["totales"]
+    lineas.append(f"- Fecha: {documento['entorno']['fecha']}")
+    lineas.append(f"- Duracion: {documento['duracion_s']:.0f} s, {totales['llamadas']} llamadas, "
+                  f"{totales['ecuaciones']} ecuaciones, {totales['errores']} errores")
+    if analisis["fugas"]:
+        veredicto = f"crecimiento detectado en {len(analisis['fugas'])} series"
+    elif analisis["insuficientes"]:
+        veredicto = f"muestras insuficientes en {', '.join(analisis['insuficientes'])}"
+    else:
+        veredicto = "memoria estable"
+    lineas += [f"- Veredicto: **{veredicto}**", "", "## Proceso", "",
+               "| Serie | Inicio | Fin | Crecimiento | Por hora | Por millon de llamadas | Monotona | Fuga | Tendencia |",
+               "|---|---|---|---|---|---|---|---|---|"]
+    for nombre, a in analisis["series"].items():
+        if a.get("crecimiento") is None:
+            lineas.append(f"| {nombre} | | | | | | | | ({a['muestras']} muestras) |")
+            continue
+        lineas.append(f"| {nombre} | {a['inicio']} | {a['fin']} | {a['crecimiento']:+} | {a['pendiente_por_hora']:+} | "
+                      f"{a['pendiente_por_millon']:+} | {'si' if a['monotona'] else 'no'} | "
+                      f"{'**si**' if a['fuga'] else 'no'} | `{a['grafica']}` |")
+    if analisis["sitios"]:
+        lineas += ["", "## Sitios de asignacion que crecen (KB)", "",
+                   "| Sitio | Inicio | Fin | Crecimiento | Por millon de llamadas | Fuga | Tendencia |",
+                   "|---|---|---|---|---|---|---|"]
+        for sitio, a in list(analisis["sitios"].items())[:SITIOS_INFORME]:
+            lineas.append(f"| `{sitio}` | {a['inicio']} | {a['fin']} | {a['crecimiento']:+} | "
+                          f"{a['pendiente_por_millon']:+} | {'**si**' if a['fuga'] else 'no'} | `{a['grafica']}` |")
+    with open(ruta_md, "w", encoding="utf-8") as f:
+        f.write("\n".join(lineas) + "\n")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de resistencia con deteccion de fugas.")
+    parser.add_argument("--modo", default="proceso", choices=["proceso", "servicio"], help="En este proceso o contra solve_server.py.")
+    parser.add_argument("--corpus", default="hojas", choices=["hojas", "recortes", "sinteticas"], help="Peticiones a repetir (ver load_generator.py).")
+    parser.add_argument("--n", type=int, default=None, help="Elementos del corpus.")
+    parser.add_argument("--llamadas", type=int, default=1_000_000, help="Llamadas maximas.")
+    parser.add_argument("--duracion-s", type=float, default=8 * 3600, help="Duracion maxima en segundos.")
+    parser.add_argument("--intervalo-s", type=float, default=10.0, help="Segundos entre muestras de RSS, descriptores e hilos.")
+    parser.add_argument("--intervalo-fotos-s", type=float, default=60.0, help="Segundos entre fotos de tracemalloc (modo proceso).")
+    parser.add_argument("--sin-tracemalloc", action="store_true", help="No trazar asignaciones (solo RSS, descriptores e hilos).")
+    parser.add_argument("--cache-max", type=int, default=4096, help="Entradas de la cache de recortes (modo proceso; 0 = sin cache).")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="URL del servidor (modo servicio).")
+    parser.add_argument("--lanzar", action="store_true", help="Levantar solve_server.py en el puerto de --url (modo servicio).")
+    parser.add_argument("--args-servidor", default="", help="Argumentos extra de solve_server.py con --lanzar.")
+    parser.add_argument("--pid", type=int, default=None, help="PID del servidor a muestrear si no se lanza.")
+    parser.add_argument("--clientes", type=int, default=4, help="Clientes concurrentes (modo servicio).")
+    parser.add_argument("--calentamiento", type=float, default=0.25, help="Fraccion inicial de muestras que no se analiza.")
+    parser.add_argument("--umbral-rss-mb", type=float, default=5.0, help="Crecimiento de RSS que se considera fuga.")
+    parser.add_argument("--umbral-sitio-kb", type=float, default=256.0, help="Crecimiento por sitio de asignacion que se considera fuga.")
+    parser.add_argument("--salida", default=output_dir, help="Carpeta del informe.")
+    args = parser.parse_args()
+
+    print(f"\n\033[94m📦 Cargando corpus '{args.corpus}'...\033[0m")
+    corpus = cargar_corpus(args.corpus, args.n)
+    proceso = None
+    if args.modo == "servicio":
+        if args.lanzar:
+            proceso = lanzar_servidor(urlsplit(args.url).port or 80, args.args_servidor)
+        pid = proceso.pid if proceso else args.pid
+        if pid is None:
+            print("\033[93m⚠️ Sin --lanzar ni --pid no se puede muestrear el servidor; se muestrea este proceso.\033[0m")
+        muestreador = Muestreador(pid or "self", args.intervalo_s, fotos=False)
+    else:
+        if not args.sin_tracemalloc:
+            tracemalloc.start(MARCOS_TRACEMALLOC)
+        muestreador = Muestreador("self", args.intervalo_s, args.intervalo_fotos_s, fotos=not args.sin_tracemalloc)
+
+    print(f"\033[94m⏱ Prueba de resistencia ({args.modo}): hasta {args.llamadas} llamadas o {args.duracion_s:.0f} s\033[0m")
+    try:
+        if args.modo == "proceso":
+            totales = soak_proceso(corpus, muestreador, args.llamadas, args.duracion_s, args.cache_max)
+        else:
+            totales = soak_servicio(args.url, corpus, muestreador, args.llamadas, args.duracion_s, args.clientes)
+    except KeyboardInterrupt:
+        print("\n\033[93m⏹ Prueba interrumpida; se analizan las muestras tomadas.\033[0m")
+        totales = {"llamadas": muestreador.muestras[-1]["llamadas"] if muestreador.muestras else 0,
+                   "ecuaciones": muestreador.muestras[-1]["ecuaciones"] if muestreador.muestras else 0,
+                   "errores": None}
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+    duracion = time.perf_counter() - muestreador.inicio
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    analisis = analizar(muestreador, args.umbral_rss_mb, args.umbral_sitio_kb, args.calentamiento)
+    configuracion = {k: v for k, v in vars(args).items() if k != "salida"}
+    configuracion["peticiones_corpus"] = len(corpus)
+    documento = {"entorno": entorno(), "configuracion": configuracion, "duracion_s": round(duracion, 3),
+                 "totales": totales, "analisis": analisis, "muestras": muestreador.muestras,
+                 "fotos": [{"segundos": s, "llamadas": n, "sitios_kb": {k: round(v / 1024, 1) for k, v in sitios.items()
+                                                                          if v >= 64 * 1024}}
+                           for s, n, sitios in muestreador.fotos_sitios]}
+
+    os.makedirs(args.salida, exist_ok=True)
+    base = os.path.join(args.salida, f"{args.modo}_{time.strftime('%Y%m%d_%H%M%S')}")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(documento, f, indent=2, ensure_ascii=False)
+    escribir_informe(documento, base + ".md")
+
+    print(f"\n\033[94m🧪 {totales['llamadas']} llamadas en {duracion:.0f} s\033[0m")
+    for nombre, a in analisis["series"].items():
+        if a.get("crecimiento") is not None:
+            color = "\033[91m" if a["fuga"] else "\033[92m"
+            print(f"{color}  {nombre:<14} {a['inicio']:>10} -> {a['fin']:<10} {a['crecimiento']:+10.3f}  "
+                  f"{a['pendiente_por_hora']:+10.3f}/h  {a['grafica']}\033[0m")
+    for sitio, a in list(analisis["sitios"].items())[:SITIOS_INFORME]:
+        color = "\033[91m" if a["fuga"] else "\033[90m"
+        print(f"{color}  {a['crecimiento']:+10.1f} KB  {sitio}\033[0m")
+    print(f"\033[92m💾 Informe guardado en: {base}.md y {base}.json\033[0m")
+    if analisis["fugas"]:
+        print(f"\033[91m🚨 Crecimiento monotono detectado: {', '.join(analisis['fugas'])}\033[0m")
+        sys.exit(1)
+    if analisis["insuficientes"]:
+        print(f"\033[93m⚠️ Muestras insuficientes tras el calentamiento en: {', '.join(analisis['insuficientes'])} "
+              f"(se necesitan {VENTANAS}); alargue la prueba o reduzca --intervalo-s.\033[0m")
+        sys.exit(2)
+    print("\033[92m✅ Memoria estable: sin crecimiento monotono por encima de los umbrales.\033[0m")
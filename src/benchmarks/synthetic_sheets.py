@@ -0,0 +1,219 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: synthetic_sheets.py
+Descripcion: Generador de hojas de prueba sinteticas con el formato de
+             docs/format/Testing_Format.pdf (filas de 10 cuadros, dos
+             ecuaciones por fila) usando digitos y operadores de los
+             datasets de Kaggle, con su verdad de referencia.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: os, csv, argparse, cv2, numpy
+===============================================================================
+Uso:
+Generar 100 hojas (10 por resultado) en 'synthetic_sheets/':
+    python synthetic_sheets.py --hojas 100
+Con otra resolucion y mas ruido:
+    python synthetic_sheets.py --hojas 100 --escala 0.8 --ruido 12 --salida hojas_escala_08
+===============================================================================
+Notas:
+- Cada hoja mide 1600x1236 px (por --escala) y tiene hasta 6 filas de 10
+  cuadros de 120 px: ecuacion 1 en los cuadros 0-3 (operando, operador,
+  operando, "="), cuadros 4 y 5 vacios y ecuacion 2 en los cuadros 6-9,
+  igual que las hojas escaneadas de data/equations/raw.
+- Como en los datos reales, todas las ecuaciones de una hoja dan el mismo
+  resultado (0 a 9), que es la carpeta donde se guarda la hoja. Las
+  ecuaciones se sortean entre todas las combinaciones de digitos y
+  operadores (sum, sub, times, div con division entera) con ese resultado.
+- Los glifos (45x45) se toman al azar de data/operands/raw/dataset y
+  data/operators/raw/dataset, se escalan al interior del cuadro, se
+  engrosan para parecerse al trazo de marcador y se pegan con un pequeno
+  desplazamiento aleatorio.
+- --ruido es la desviacion estandar del ruido gaussiano (niveles de gris);
+  ademas se agregan motas sueltas como las del escaner.
+- Las filas se separan 160 px (por --escala) para que ninguna caja cruce el
+  agrupamiento por filas de iterar_filas_ecuaciones (y // 80). Con --escala
+  fuera de [0.6, 1.5] los cuadros salen del rango de tamano que acepta la
+  segmentacion.
+- Una misma semilla produce exactamente las mismas hojas. La verdad de
+  referencia se guarda en 'verdad.csv' (una fila por ecuacion).
+===============================================================================
+"""
+
+import argparse
+import csv
+import os
+
+import cv2
+import numpy as np
+
+operandos_dir = "../../data/operands/raw/dataset"
+operadores_dir = "../../data/operators/raw/dataset"
+output_dir = "synthetic_sheets"
+
+ANCHO_HOJA, ALTO_HOJA = 1600, 1236
+LADO_CUADRO = 120
+GROSOR_CUADRO = 4
+X_CUADROS = (42, 200, 360, 514, 674, 831, 984, 1140, 1290, 1440)
+Y_PRIMERA_FILA = 15
+SEPARACION_FILAS = 160
+MAX_FILAS = 6
+OPERADORES = ("sum", "sub", "times", "div")
+
+def evaluar(op1, op2, operador):
+    """
+    Resultado de la ecuacion con la misma semantica que evaluar_operacion.
+    """
+    if operador == "sum":
+        return op1 + op2
+    if operador == "sub":
+        return op1 - op2
+    if operador == "times":
+        return op1 * op2
+    return op1 // op2 if op2 != 0 else None
+
+def ecuaciones_por_resultado():
+    """
+    {resultado: [(op1, operador, op2), ...]} para los resultados 0 a 9.
+    """
+    combinaciones = {r: [] for r in range(10)}
+    for op1 in range(10):
+        for op2 in range(10):
+            for operador in OPERADORES:
+                r = evaluar(op1, op2, operador)
+                if r in combinaciones:
+                    combinaciones[r].append((op1, operador, op2))
+    return combinaciones
+
+class BancoGlifos:
+    """
+    Muestra de glifos por clase cargada una sola vez en memoria.
+
+    Args:
+        por_clase (int): Glifos por clase (digitos 0-9, operadores y "=").
+        semilla (int): Semilla del muestreo de archivos.
+    """
+
+    def __init__(self, por_clase=200, semilla=0, operandos_path=operandos_dir, operadores_path=operadores_dir):
+        rng = np.random.default_rng(semilla)
+        carpetas = {str(d): os.path.join(operandos_path, str(d)) for d in range(10)}
+        carpetas.update({c: os.path.join(operadores_path, c) for c in OPERADORES + ("equals",)})
+        self.glifos = {}
+        for clase, carpeta in carpetas.items():
+            archivos = sorted(os.listdir(carpeta))
+            elegidos = rng.choice(len(archivos), size=min(por_clase, len(archivos)), replace=False)
+            imgs = [cv2.imread(os.path.join(carpeta, archivos[i]), cv2.IMREAD_GRAYSCALE) for i in elegidos]
+            self.glifos[clase] = [img for img in imgs if img is not None]
+
+    def sortear(self, clase, rng):
+        opciones = self.glifos[str(clase)]
+        return opciones[rng.integers(len(opciones))]
+
+def pegar_glifo(hoja, glifo, x, y, lado, rng):
+    """
+    Escala el glifo al interior de un cuadro, engrosa el trazo y lo pega
+    (minimo pixel a pixel) con un desplazamiento aleatorio.
+    """
+    interior = int(lado * 0.62)
+    escalado = cv2.resize(glifo, (interior, interior), interpolation=cv2.INTER_LINEAR)
+    escalado = cv2.erode(escalado, np.ones((3, 3), np.uint8))
+    margen = (lado - interior) // 2
+    dx, dy = (int(v) for v in rng.integers(-lado // 20, lado // 20 + 1, size=2))
+    x0, y0 = x + margen + dx, y + margen + dy
+    region = hoja[y0:y0 + interior, x0:x0 + interior]
+    np.minimum(region, escalado, out=region)
+
+def generar_hoja(rng, banco, resultado, filas=MAX_FILAS, escala=1.0, ruido=6.0):
+    """
+    Dibuja una hoja cuyas ecuaciones dan 'resultado'.
+
+    Returns:
+        tuple: (imagen en escala de grises, lista de (op1, operador, op2)
+        en el orden de lectura: fila por fila, izquierda y derecha).
+    """
+    hoja = np.full((ALTO_HOJA, ANCHO_HOJA), 255, dtype=np.uint8)
+    combinaciones = ecuaciones_por_resultado()[resultado]
+    ecuaciones = []
+
+    for fila in range(filas):
+        y_fila = Y_PRIMERA_FILA + fila * SEPARACION_FILAS
+        for eq_num in range(2):
+            op1, operador, op2 = combinaciones[rng.integers(len(combinaciones))]
+            ecuaciones.append((op1, operador, op2))
+            for i, clase in enumerate((op1, operador, op2, "equals")):
+                x = X_CUADROS[eq_num * 6 + i] + int(rng.integers(-2, 3))
+                y = y_fila + int(rng.integers(-2, 3))
+                pegar_glifo(hoja, banco.sortear(clase, rng), x, y, LADO_CUADRO, rng)
+        for x in X_CUADROS:
+            x += int(rng.integers(-2, 3))
+            y = y_fila + int(rng.integers(-2, 3))
+            cv2.rectangle(hoja, (x, y), (x + LADO_CUADRO, y + LADO_CUADRO), 40, GROSOR_CUADRO)
+
+    # Ruido del escaner: gaussiano y motas sueltas
+    if ruido > 0:
+        hoja = np.clip(hoja + rng.normal(0, ruido, hoja.shape), 0, 255).astype(np.uint8)
+    motas = np.full_like(hoja, 255)
+    for _ in range(int(rng.integers(20, 60))):
+        cx, cy = int(rng.integers(ANCHO_HOJA)), int(rng.integers(ALTO_HOJA))
+        cv2.circle(motas, (cx, cy), int(rng.integers(1, 3)), int(rng.integers(80, 200)), -1)
+    np.minimum(hoja, motas, out=hoja)  # Las motas solo oscurecen (no abren los bordes)
+
+    if escala != 1.0:
+        hoja = cv2.resize(hoja, (int(ANCHO_HOJA * escala), int(ALTO_HOJA * escala)), interpolation=cv2.INTER_AREA)
+    return hoja, ecuaciones
+
+def generar_hoja_numero(numero, banco, semilla=0, filas=MAX_FILAS, escala=1.0, ruido=6.0):
+    """
+    Hoja numero 'numero' de una serie: su resultado es numero % 10 y su
+    contenido depende solo de (semilla, numero).
+
+    Returns:
+        tuple: (resultado, imagen, ecuaciones).
+    """
+    rng = np.random.default_rng((semilla, numero))
+    resultado = numero % 10
+    hoja, ecuaciones = generar_hoja(rng, banco, resultado, filas, escala, ruido)
+    return resultado, hoja, ecuaciones
+
+def generar_hojas(n_hojas, salida=output_dir, semilla=0, filas=MAX_FILAS, escala=1.0, ruido=6.0, por_clase=200):
+    """
+    Genera n_hojas en salida/<resultado>/<resultado>_<n>.png y la verdad de
+    referencia en salida/verdad.csv.
+    """
+    print(f"\n\033[94m📄 Generando {n_hojas} hojas sinteticas en '{salida}'...\033[0m")
+    banco = BancoGlifos(por_clase, semilla)
+    os.makedirs(salida, exist_ok=True)
+    verdad_path = os.path.join(salida, "verdad.csv")
+    with open(verdad_path, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["Hoja", "Eq_ID", "Operando_1", "Operador", "Operando_2", "Resultado_Esperado"])
+        for numero in range(n_hojas):
+            resultado, hoja, ecuaciones = generar_hoja_numero(numero, banco, semilla, filas, escala, ruido)
+            carpeta = os.path.join(salida, str(resultado))
+            os.makedirs(carpeta, exist_ok=True)
+            nombre = f"{resultado}_{numero // 10 + 1}.png"
+            cv2.imwrite(os.path.join(carpeta, nombre), hoja)
+            for i, (op1, operador, op2) in enumerate(ecuaciones):
+                escritor.writerow([os.path.join(str(resultado), nombre), f"eq_{i}", op1, operador, op2, resultado])
+            if (numero + 1) % 100 == 0 or numero + 1 == n_hojas:
+                print(f"\033[92m✔ {numero + 1}/{n_hojas} hojas generadas...\033[0m")
+    print(f"\033[1;32m✅ Verdad de referencia guardada en: {verdad_path}\033[0m")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera hojas de prueba sinteticas con su verdad de referencia.")
+    parser.add_argument("--hojas", type=int, default=100, help="Numero de hojas.")
+    parser.add_argument("--filas", type=int, default=MAX_FILAS, help="Filas de ecuaciones por hoja (1 a 6).")
+    parser.add_argument("--escala", type=float, default=1.0, help="Factor de resolucion respecto a 1600x1236.")
+    parser.add_argument("--ruido", type=float, default=6.0, help="Desviacion estandar del ruido gaussiano.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de la serie de hojas.")
+    parser.add_argument("--glifos", type=int, default=200, help="Glifos muestreados por clase.")
+    parser.add_argument("--salida", default=output_dir, help="Carpeta de salida.")
+    args = parser.parse_args()
+
+    generar_hojas(args.hojas, args.salida, args.semilla, min(args.filas, MAX_FILAS), args.escala, args.ruido, args.glifos)
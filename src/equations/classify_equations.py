@@ -1,22 +1,40 @@
 import os
+import sys
 import cv2
 import numpy as np
-import pandas as pd
 from scipy.spatial.distance import euclidean
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from crop_cache import CacheClasificaciones
+from results_ledger import RegistroResultados, leer_archivos
+from model_artifact import REGLAS_OPERADORES, UMBRAL_PICOS, cargar_modelo_servido, clasificar_por_reglas
+from operands_kmeans_prototypes import clasificar_multi_prototipo
+from operands_two_stage_classifier import UMBRAL_MARGEN, clasificar_dos_etapas, consultar_knn, prototipos_de_indice
+from item_tracing import activar_desde_entorno as activar_trazas, trazas
+from profiling import activar_desde_argumentos as activar_perfil, agregar_argumentos as agregar_argumentos_perfil
+from stage_timing import activar_desde_entorno, tiempos
+
 # =============================================================================
 # CONFIGURACIÓN DE RUTAS
 # =============================================================================
 
 eq_base_folder = "../../data/equations/processed/"
 prototipos_csv = "classify_digits/promedios_por_digito.csv"
+modelo_path = "classify_digits/modelo.npz"
+caracteristicas_dir = "../operands/csv_por_digito"
+indice_knn_path = "classify_digits/indice_kdtree"
+prototipos_kmeans_csv = "../operands/csv_por_digito/prototipos_kmeans.csv"
 output_csv = "test_analysis/ecuaciones_clasificadas.csv"
+cache_recortes_path = "classify_digits/cache_recortes.sqlite"
+registro_path = "test_analysis/registro_ecuaciones.sqlite"
 
 # =============================================================================
 # FUNCIONES PARA CLASIFICACIÓN DE OPERANDOS
 # =============================================================================
 
 def cargar_vectores_promedio(csv_path):
+    import pandas as pd  # Solo para leer el CSV; el artefacto no lo necesita
+
     df = pd.read_csv(csv_path)
     return {
         int(row["Digito"]): row[[f"P. Cuadrante {i}" for i in range(1, 10)]].values.astype(float)
@@ -34,11 +52,102 @@ def calcular_vector_tinta(img, size=(3, 3)):
             vector.append(tinta)
     return np.array(vector, dtype=float)
 
+def calcular_vector_porcentaje(img, size=(3, 3), umbral=200):
+    """
+    Calcula el porcentaje de tinta por cuadrante igual que
+    compute_tinta_por_cuadrante en los CSV de entrenamiento (píxel <= umbral
+    cuenta como tinta, redondeado a 4 decimales), para poder comparar un
+    recorte contra las características individuales de entrenamiento.
+    """
+    h, w = img.shape
+    dh, dw = h // size[0], w // size[1]
+    vector = []
+    for i in range(size[0]):
+        for j in range(size[1]):
+            block = img[i*dh:(i+1)*dh, j*dw:(j+1)*dw]
+            vector.append(round(np.count_nonzero(block <= umbral) / block.size, 4))
+    return np.array(vector, dtype=float)
+
 def clasificar_operando(img, vectores_promedio):
-    vector = calcular_vector_tinta(img)
+    with tiempos.etapa("caracteristicas_operando"):
+        vector = calcular_vector_tinta(img)
     distancias = {d: euclidean(vector, prototipo) for d, prototipo in vectores_promedio.items()}
     return min(distancias, key=distancias.get)
 
+def matriz_prototipos(vectores_promedio):
+    """
+    Apila los prototipos en una matriz (10, 9) junto con sus etiquetas,
+    conservando el orden del diccionario.
+    """
+    digitos = np.array(list(vectores_promedio.keys()))
+    matriz = np.vstack([vectores_promedio[d] for d in digitos]).astype(float)
+    return digitos, matriz
+
+def clasificar_operandos_lote(imgs, vectores_promedio):
+    """
+    Clasifica un lote de operandos con una sola operación vectorizada de
+    distancias contra todos los prototipos. Equivale a aplicar
+    clasificar_operando a cada imagen.
+
+    Parámetros:
+    - imgs: lista de recortes en escala de grises (pueden tener tamaños distintos).
+    - vectores_promedio: prototipos por dígito.
+
+    Retorna:
+    - Lista de dígitos predichos, en el mismo orden que imgs.
+    """
+    if len(imgs) == 0:
+        return []
+    digitos, matriz = matriz_prototipos(vectores_promedio)
+    with tiempos.etapa("caracteristicas_operando"):
+        vectores = np.vstack([calcular_vector_tinta(img) for img in imgs])
+    distancias = np.sqrt(((vectores[:, None, :] - matriz[None, :, :]) ** 2).sum(axis=2))
+    return [int(d) for d in digitos[np.argmin(distancias, axis=1)]]
+
+def clasificar_operandos_knn(imgs, indice, k=5):
+    """
+    Clasifica un lote de operandos por voto de sus k vecinos más cercanos
+    entre todas las características de entrenamiento (índice espacial de
+    operands_two_stage_classifier).
+
+    Retorna:
+    - Lista de dígitos predichos, en el mismo orden que imgs.
+    """
+    if len(imgs) == 0:
+        return []
+    vectores = np.vstack([calcular_vector_porcentaje(img) for img in imgs])
+    return [int(d) for d in consultar_knn(indice, vectores, k=k)]
+
+def clasificar_operandos_multi_prototipo(imgs, digitos, prototipos):
+    """
+    Clasifica un lote de operandos por el más cercano de los K prototipos
+    por dígito entrenados con operands_kmeans_prototypes.
+
+    Retorna:
+    - Lista de dígitos predichos, en el mismo orden que imgs.
+    """
+    if len(imgs) == 0:
+        return []
+    vectores = np.vstack([calcular_vector_porcentaje(img) for img in imgs])
+    return [int(d) for d in clasificar_multi_prototipo(vectores, digitos, prototipos)]
+
+def clasificar_operandos_dos_etapas(imgs, indice, umbral_margen=UMBRAL_MARGEN, k=5):
+    """
+    Clasifica un lote de operandos con el clasificador de dos etapas: el
+    prototipo más cercano si su margen sobre el segundo supera el umbral y,
+    si no, k-NN sobre el índice de entrenamiento. Los prototipos son los
+    del mismo índice (ver operands_two_stage_classifier.py), no los servidos.
+
+    Retorna:
+    - Lista de dígitos predichos, en el mismo orden que imgs.
+    """
+    if len(imgs) == 0:
+        return []
+    digitos, matriz = prototipos_de_indice(indice)
+    vectores = np.vstack([calcular_vector_porcentaje(img) for img in imgs])
+    predicciones, _, _ = clasificar_dos_etapas(vectores, digitos, matriz, indice, umbral_margen=umbral_margen, k=k)
+    return [int(d) for d in predicciones]
+
 # =============================================================================
 # FUNCIONES PARA CLASIFICACIÓN DE OPERADORES
 # =============================================================================
@@ -74,28 +183,74 @@ def rotate_image_45(img):
     x, y, w, h = cv2.boundingRect(coords)
     return rotated[y:y+h, x:x+w]
 
-def clasificar_operador(img):
-    h_proj = compute_projection_histogram(img, axis=1)
-    v_proj = compute_projection_histogram(img, axis=0)
-    h_peaks = count_peaks(h_proj, 0.8)
-    v_peaks = count_peaks(v_proj, 0.8)
-
-    rotated = rotate_image_45(img)
-    h_proj_rot = compute_projection_histogram(rotated, axis=1)
-    h_peaks_rot = count_peaks(h_proj_rot, 0.8)
-
-    if h_peaks == 0 and v_peaks == 0 and (h_peaks_rot > 2 or h_peaks_rot == 0):
-        return "div"
-    elif h_peaks == 2 and v_peaks == 0:
-        return "equals"
-    elif h_peaks == 1 and v_peaks == 0:
-        return "sub"
-    elif h_peaks == 1 and v_peaks == 1:
-        return "sum"
-    elif h_peaks == 0 and v_peaks == 0 and h_peaks_rot <= 2:
-        return "times"
-    else:
-        return "Desconocido"
+def clasificar_operador(img, umbral_picos=UMBRAL_PICOS, reglas=REGLAS_OPERADORES):
+    with tiempos.etapa("caracteristicas_operador"):
+        h_proj = compute_projection_histogram(img, axis=1)
+        v_proj = compute_projection_histogram(img, axis=0)
+        h_peaks = count_peaks(h_proj, umbral_picos)
+        v_peaks = count_peaks(v_proj, umbral_picos)
+
+        rotated = rotate_image_45(img)
+        h_proj_rot = compute_projection_histogram(rotated, axis=1)
+        h_peaks_rot = count_peaks(h_proj_rot, umbral_picos)
+
+    # Tabla de reglas del artefacto del modelo (ver model_artifact.py)
+    return clasificar_por_reglas(h_peaks, v_peaks, h_peaks_rot, reglas)
+
+def proyecciones_lote(imgs, axis=0):
+    """
+    Proyecciones de varias imágenes de distinto tamaño apiladas en (n, L),
+    rellenas con 0, junto con la longitud real de cada una. Se rellenan los
+    histogramas y no las imágenes, para que una imagen grande no multiplique
+    la memoria del lote.
+    """
+    proyecciones = [compute_projection_histogram(img, axis=axis) for img in imgs]
+    longitudes = np.array([len(p) for p in proyecciones])
+    hists = np.zeros((len(imgs), longitudes.max(initial=0)), dtype=np.int64)
+    for i, proyeccion in enumerate(proyecciones):
+        hists[i, :len(proyeccion)] = proyeccion
+    return hists, longitudes
+
+def contar_picos_lote(hists, longitudes, threshold=0.5):
+    """
+    count_peaks sobre las filas de hists (n, L) a la vez. Un pico es la
+    entrada a un tramo bajo el umbral; el relleno más allá de cada longitud
+    y los histogramas vacíos se fijan en 1.0 para no sumar picos.
+    """
+    maximos = hists.max(axis=1)
+    normalizados = hists / np.where(maximos > 0, maximos, 1)[:, None]
+    normalizados[np.arange(hists.shape[1])[None, :] >= longitudes[:, None]] = 1.0
+    normalizados[maximos == 0] = 1.0
+    bajo = normalizados < threshold
+    entradas = bajo.copy()
+    entradas[:, 1:] &= ~bajo[:, :-1]
+    return entradas.sum(axis=1)
+
+def clasificar_operadores_lote(imgs, umbral_picos=UMBRAL_PICOS, reglas=REGLAS_OPERADORES, bloque=256):
+    """
+    Clasifica un lote de operadores. El conteo de picos se hace sobre los
+    histogramas apilados del lote (en bloques de 'bloque' imágenes); cada
+    proyección es una suma de NumPy por imagen y la rotación de 45° sigue
+    siendo una llamada a cv2 por imagen, porque cada imagen tiene su propio
+    tamaño.
+    """
+    operadores = []
+    for desde in range(0, len(imgs), bloque):
+        parte = imgs[desde:desde + bloque]
+        with tiempos.etapa("caracteristicas_operador"):
+            h_peaks = contar_picos_lote(*proyecciones_lote(parte, axis=1), umbral_picos)
+            v_peaks = contar_picos_lote(*proyecciones_lote(parte, axis=0), umbral_picos)
+            rotadas = [rotate_image_45(img) for img in parte]
+            h_peaks_rot = contar_picos_lote(*proyecciones_lote(rotadas, axis=1), umbral_picos)
+        operadores.extend(clasificar_por_reglas(int(h), int(v), int(r), reglas)
+                          for h, v, r in zip(h_peaks, v_peaks, h_peaks_rot))
+    return operadores
+
+def clasificador_operadores_modelo(modelo):
+    """
+    Función (imgs) -> operadores con el umbral y las reglas de un modelo.
+    """
+    return lambda imgs: clasificar_operadores_lote(imgs, modelo.umbral_picos, modelo.reglas)
 
 # =============================================================================
 # EVALUADOR DE OPERACIÓN
@@ -116,14 +271,106 @@ def evaluar_operacion(op1, op2, operador):
     except Exception:
         return None
 
+def resolver_ecuacion(op1_img, oper_img, op2_img, vectores_promedio, umbral_picos=UMBRAL_PICOS,
+                      reglas=REGLAS_OPERADORES, cache=None, version=None):
+    """
+    Clasifica los tres recortes de una ecuación y calcula su resultado.
+
+    Parámetros:
+    - op1_img, oper_img, op2_img: recortes en escala de grises (operando,
+      operador, operando).
+    - vectores_promedio: prototipos por dígito de cargar_vectores_promedio.
+    - umbral_picos, reglas: reglas de operadores (por defecto las del modelo base).
+    - cache, version: CacheClasificaciones y versión del modelo con que se
+      memoiza cada recorte (opcional, ver crop_cache.py).
+
+    Retorna:
+    - Diccionario con Operando_1, Operador, Operando_2 y Resultado_Calculado.
+    """
+    if cache is None:
+        op1 = clasificar_operando(op1_img, vectores_promedio)
+        operador = clasificar_operador(oper_img, umbral_picos, reglas)
+        op2 = clasificar_operando(op2_img, vectores_promedio)
+    else:
+        clasificar = lambda img: clasificar_operando(img, vectores_promedio)
+        op1 = cache.clasificar(op1_img, "operando_prototipo", version, clasificar)
+        operador = cache.clasificar(oper_img, "operador", version,
+                                    lambda img: clasificar_operador(img, umbral_picos, reglas))
+        op2 = cache.clasificar(op2_img, "operando_prototipo", version, clasificar)
+    return {
+        "Operando_1": op1,
+        "Operador": operador,
+        "Operando_2": op2,
+        "Resultado_Calculado": evaluar_operacion(op1, op2, operador),
+    }
+
+def resolver_ecuaciones(ecuaciones, vectores_promedio, clasificar_operandos=None, clasificar_operadores=None):
+    """
+    Resuelve varias ecuaciones a la vez: todos los operandos se clasifican en
+    un único lote y todos los operadores en otro.
+
+    Parámetros:
+    - ecuaciones: lista de tuplas (op1_img, oper_img, op2_img).
+    - vectores_promedio: prototipos por dígito.
+    - clasificar_operandos: función (imgs) -> dígitos que sustituye al
+      clasificador por prototipos (por ejemplo, k-NN).
+    - clasificar_operadores: función (imgs) -> operadores que sustituye a
+      las reglas de picos (por ejemplo, plantillas de píxeles).
+
+    Retorna:
+    - Lista de diccionarios como los de resolver_ecuacion, en el mismo orden.
+    """
+    operandos = [img for op1, _, op2 in ecuaciones for img in (op1, op2)]
+    if clasificar_operandos is None:
+        digitos = clasificar_operandos_lote(operandos, vectores_promedio)
+    else:
+        digitos = clasificar_operandos(operandos)
+    if clasificar_operadores is None:
+        clasificar_operadores = clasificar_operadores_lote
+    operadores = clasificar_operadores([oper for _, oper, _ in ecuaciones])
+
+    resultados = []
+    for i, operador in enumerate(operadores):
+        op1, op2 = digitos[2 * i], digitos[2 * i + 1]
+        resultados.append({
+            "Operando_1": op1,
+            "Operador": operador,
+            "Operando_2": op2,
+            "Resultado_Calculado": evaluar_operacion(op1, op2, operador),
+        })
+    return resultados
+
 # =============================================================================
 # PROCESAMIENTO GENERAL
 # =============================================================================
 
-def procesar_todas_las_ecuaciones():
-    print("🔎 Cargando vectores promedio de operandos...")
-    vectores_prom = cargar_vectores_promedio(prototipos_csv)
+def cargar_modelo_ecuaciones(ruta_modelo=modelo_path, csv_path=prototipos_csv):
+    """
+    Carga el artefacto del modelo (model_artifact.py). Si no existe, arma el
+    modelo en memoria con el CSV de prototipos y las reglas por defecto; su
+    versión es la de un artefacto con solo esos prototipos (sin k-means ni
+    KD-tree), no la de un artefacto construido con 'model_artifact.py
+    construir'.
+    """
+    return cargar_modelo_servido(ruta_modelo, csv_path)
+
+def procesar_todas_las_ecuaciones(cache=None, registro=None):
+    """
+    Clasifica todas las ecuaciones de eq_base_folder y guarda output_csv.
+    Con una CacheClasificaciones, los recortes ya vistos con la misma
+    versión del modelo no se vuelven a clasificar. Con un
+    RegistroResultados (results_ledger.py), las ecuaciones cuyos recortes y
+    versión del modelo no cambiaron se toman del registro sin leerlas.
+    """
+    import pandas as pd
+
+    print("🔎 Cargando modelo de operandos y operadores...")
+    with tiempos.etapa("cargar_modelo"):
+        modelo = cargar_modelo_ecuaciones()
+    vectores_prom = modelo.vectores_promedio
+    print(f"🏷 Versión del modelo: {modelo.version}")
     resultados = []
+    ids_presentes = set()
 
     total_eq = 0
 
@@ -140,52 +387,108 @@ def procesar_todas_las_ecuaciones():
             for eq_folder in sorted(os.listdir(imagen_path)):
                 eq_path = os.path.join(imagen_path, eq_folder)
                 eq_id = f"{resultado}_{imagen_id}_{eq_folder}"
+                rutas = [os.path.join(eq_path, f"{i}.png") for i in range(3)]
                 total_eq += 1
 
+                if registro is not None:
+                    with tiempos.etapa("registro"):
+                        fila = registro.vigente(eq_id, rutas, modelo.version)
+                    if fila is not None:
+                        resultados.append(fila)
+                        ids_presentes.add(eq_id)
+                        continue
+
                 print(f"🔧 Clasificando {eq_id}...")
 
                 try:
-                    op1_img = cv2.imread(os.path.join(eq_path, "0.png"), cv2.IMREAD_GRAYSCALE)
-                    oper_img = cv2.imread(os.path.join(eq_path, "1.png"), cv2.IMREAD_GRAYSCALE)
-                    op2_img = cv2.imread(os.path.join(eq_path, "2.png"), cv2.IMREAD_GRAYSCALE)
-
-                    if op1_img is None or oper_img is None or op2_img is None:
-                        print(f"⚠️ Archivos faltantes en {eq_id}, se omite.")
-                        continue
-
-                    op1 = clasificar_operando(op1_img, vectores_prom)
-                    operador = clasificar_operador(oper_img)
-                    op2 = clasificar_operando(op2_img, vectores_prom)
+                    with trazas.item("ecuacion", eq_id, entrada=rutas):
+                        # Los bytes se leen una sola vez: se decodifican para
+                        # clasificar y el registro hashea esos mismos bytes
+                        with tiempos.etapa("leer"):
+                            try:
+                                datos = leer_archivos(rutas)
+                            except FileNotFoundError:
+                                datos = None
+                        if datos is None:
+                            print(f"⚠️ Archivos faltantes en {eq_id}, se omite.")
+                            continue
+                        with tiempos.etapa("decodificar"):
+                            op1_img, oper_img, op2_img = (
+                                cv2.imdecode(np.frombuffer(contenido, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+                                for contenido in datos
+                            )
+
+                        if op1_img is None or oper_img is None or op2_img is None:
+                            print(f"⚠️ Recortes ilegibles en {eq_id}, se omite.")
+                            continue
+
+                        with tiempos.etapa("clasificar"):
+                            sol = resolver_ecuacion(op1_img, oper_img, op2_img, vectores_prom,
+                                                    modelo.umbral_picos, modelo.reglas,
+                                                    cache=cache, version=modelo.version)
+                        trazas.anotar(operador=sol["Operador"], resultado=sol["Resultado_Calculado"])
                     resultado_esperado = int(resultado)
-                    resultado_calculado = evaluar_operacion(op1, op2, operador)
+                    resultado_calculado = sol["Resultado_Calculado"]
                     es_correcta = resultado_calculado == resultado_esperado
 
-                    resultados.append([
-                        eq_id, op1, operador, op2,
-                        resultado_esperado, resultado_calculado, es_correcta
-                    ])
+                    fila = [
+                        eq_id, sol["Operando_1"], sol["Operador"], sol["Operando_2"],
+                        resultado_esperado, resultado_calculado, es_correcta, modelo.version
+                    ]
+                    resultados.append(fila)
+                    if registro is not None:
+                        registro.anotar(eq_id, rutas, modelo.version, fila, datos=datos)
+                        ids_presentes.add(eq_id)
 
                 except Exception as e:
                     print(f"❌ Error en {eq_id}: {e}")
                     continue
 
-    df = pd.DataFrame(
-        resultados,
-        columns=[
-            "Eq_ID", "Operando_1", "Operador", "Operando_2",
-            "Resultado_Esperado", "Resultado_Calculado", "Es_Correcta"
-        ]
-    )
+    with tiempos.etapa("escribir_csv"):
+        df = pd.DataFrame(
+            resultados,
+            columns=[
+                "Eq_ID", "Operando_1", "Operador", "Operando_2",
+                "Resultado_Esperado", "Resultado_Calculado", "Es_Correcta", "Version_Modelo"
+            ]
+        )
 
-    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
-    df.to_csv(output_csv, index=False)
+        os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+        df.to_csv(output_csv, index=False)
 
     print(f"\n✅ Proceso completado. Resultados guardados en: {output_csv}")
     print(f"🔢 Total de ecuaciones procesadas: {len(df)}")
+    if registro is not None:
+        with tiempos.etapa("registro"):
+            eliminadas = registro.confirmar(ids_presentes)
+        print(f"📒 Registro: {registro.reutilizadas} reutilizadas, {registro.clasificadas} clasificadas, "
+              f"{eliminadas} eliminadas ({registro.ruta})")
+    if cache is not None:
+        print(f"🗃 Caché de recortes: {cache.metricas()}")
 
 # =============================================================================
 # EJECUCIÓN
 # =============================================================================
 
 if __name__ == "__main__":
-    procesar_todas_las_ecuaciones()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Clasifica y resuelve todas las ecuaciones procesadas.")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar la caché de recortes en disco.")
+    parser.add_argument("--cache", default=cache_recortes_path, help="Archivo SQLite de la caché de recortes.")
+    parser.add_argument("--sin-registro", action="store_true", help="Reclasificar todas las ecuaciones sin usar el registro.")
+    parser.add_argument("--registro", default=registro_path, help="Archivo SQLite del registro de resultados.")
+    agregar_argumentos_perfil(parser)
+    args = parser.parse_args()
+
+    activar_perfil(args, "classify_equations")
+
+    activar_desde_entorno("classify_equations")
+    activar_trazas("classify_equations")
+    cache = None if args.sin_cache else CacheClasificaciones(capacidad=4096, ruta_disco=args.cache)
+    registro = None if args.sin_registro else RegistroResultados(args.registro)
+    procesar_todas_las_ecuaciones(cache, registro)
+    if cache is not None:
+        cache.cerrar()
+    if registro is not None:
+        registro.cerrar()
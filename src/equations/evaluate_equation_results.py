@@ -36,6 +36,9 @@ def evaluar_resultados(path_csv, path_salida_txt="resumen_resultados_ecuaciones.
         f"❌ Incorrectas: {incorrectas}\n"
         f"🎯 Exactitud global: {accuracy:.2%}\n"
     )
+    if "Version_Modelo" in df.columns:
+        versiones = ", ".join(str(v) for v in df["Version_Modelo"].dropna().unique())
+        resumen += f"🏷 Versión del modelo: {versiones}\n"
 
     # Mostrar en consola
     print(resumen)
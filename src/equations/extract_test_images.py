@@ -2,12 +2,79 @@ import cv2
 import numpy as np
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from item_tracing import activar_desde_entorno as activar_trazas, trazas
+from profiling import activar_desde_entorno as activar_perfil
+from stage_timing import activar_desde_entorno, tiempos
 
 # Rutas base
 input_folder = "../../data/equations/raw/"
 output_base_folder = "../../data/equations/processed/"
 
-os.makedirs(output_base_folder, exist_ok=True)
+def iterar_filas_ecuaciones(gray):
+    """
+    Detecta los cuadros de una hoja en escala de grises y genera, fila por
+    fila, los recortes binarizados de sus ecuaciones (dos por fila). Los
+    recortes de cada fila se calculan solo cuando se consume esa fila.
+
+    Args:
+        gray (numpy.ndarray): Imagen de la hoja en escala de grises.
+
+    Yields:
+        list: Ecuaciones de la fila; cada una es una lista con sus 4 recortes.
+    """
+    with tiempos.etapa("umbral"):
+        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
+
+    with tiempos.etapa("segmentar"):
+        # Detección de contornos
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        bounding_boxes = [cv2.boundingRect(cnt) for cnt in contours]
+        trazas.anotar(contornos=len(contours))
+        bounding_boxes = sorted(bounding_boxes, key=lambda b: (b[1], b[0]))  # por fila y columna
+
+        # Agrupar cuadros por fila
+        row_dict = {}
+        for x, y, w, h in bounding_boxes:
+            if 50 < w < 200 and 50 < h < 200:
+                row = y // 80
+                if row not in row_dict:
+                    row_dict[row] = []
+                row_dict[row].append((x, y, w, h))
+
+    for row in sorted(row_dict.keys()):
+        boxes = sorted(row_dict[row], key=lambda b: b[0])
+        if len(boxes) != 10:
+            print(f"⚠️ Advertencia: se esperaban 10 cuadros en la fila {row}, pero se detectaron {len(boxes)}", file=sys.stderr)
+            continue
+
+        ecuaciones_fila = []
+        with tiempos.etapa("recortar"):
+            for eq_num in range(2):  # dos ecuaciones por fila
+                start = eq_num * 6  # ecuación 1: 0–3, ecuación 2: 6–9
+                recortes = []
+                for i in range(4):  # solo 4 cuadros por ecuación
+                    x, y, w, h = boxes[start + i]
+                    border = 10
+                    cropped = gray[y+border:y+h-border, x+border:x+w-border]
+                    _, bw_cropped = cv2.threshold(cropped, 145, 255, cv2.THRESH_BINARY)
+                    recortes.append(bw_cropped)
+                ecuaciones_fila.append(recortes)
+        yield ecuaciones_fila
+
+def segmentar_ecuaciones(gray):
+    """
+    Devuelve, en orden, los recortes de todas las ecuaciones de la hoja.
+
+    Args:
+        gray (numpy.ndarray): Imagen de la hoja en escala de grises.
+
+    Returns:
+        list: Lista de ecuaciones; cada una es una lista con sus 4 recortes.
+    """
+    return [ecuacion for fila in iterar_filas_ecuaciones(gray) for ecuacion in fila]
 
 def extract_equations_from_image(image_path, resultado, image_id):
     """
@@ -21,60 +88,44 @@ def extract_equations_from_image(image_path, resultado, image_id):
     """
     print(f"\n🔴 Procesando imagen: {image_path}...")
 
-    # Cargar y preprocesar imagen
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-
-    # Detección de contornos
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    bounding_boxes = [cv2.boundingRect(cnt) for cnt in contours]
-    bounding_boxes = sorted(bounding_boxes, key=lambda b: (b[1], b[0]))  # por fila y columna
-
-    # Agrupar cuadros por fila
-    row_dict = {}
-    for x, y, w, h in bounding_boxes:
-        if 50 < w < 200 and 50 < h < 200:
-            row = y // 80
-            if row not in row_dict:
-                row_dict[row] = []
-            row_dict[row].append((x, y, w, h))
-
-    eq_counter = 0  # contador global por imagen
-    for row in sorted(row_dict.keys()):
-        boxes = sorted(row_dict[row], key=lambda b: b[0])
-        if len(boxes) != 10:
-            print(f"⚠️ Advertencia: se esperaban 10 cuadros en la fila {row}, pero se detectaron {len(boxes)}")
-            continue
+    with trazas.item("hoja", f"{resultado}_{image_id}", entrada=image_path):
+        # Cargar y preprocesar imagen
+        with tiempos.etapa("decodificar"):
+            img = cv2.imread(image_path)
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-        for eq_num in range(2):  # dos ecuaciones por fila
+        eq_counter = 0  # contador global por imagen
+        for recortes in segmentar_ecuaciones(gray):
             eq_folder = os.path.join(output_base_folder, resultado, image_id, f"eq_{eq_counter}")
             os.makedirs(eq_folder, exist_ok=True)
 
-            start = eq_num * 6  # ecuación 1: 0–3, ecuación 2: 6–9
-            for i in range(4):  # solo 4 cuadros por ecuación
-                x, y, w, h = boxes[start + i]
-                border = 10
-                cropped = gray[y+border:y+h-border, x+border:x+w-border]
-                _, bw_cropped = cv2.threshold(cropped, 145, 255, cv2.THRESH_BINARY)
-                output_filename = f"{i}.png"
-                cv2.imwrite(os.path.join(eq_folder, output_filename), bw_cropped)
+            with tiempos.etapa("escribir"):
+                for i, bw_cropped in enumerate(recortes):
+                    output_filename = f"{i}.png"
+                    cv2.imwrite(os.path.join(eq_folder, output_filename), bw_cropped)
 
             eq_counter += 1  # avanzar al siguiente número de ecuación
+        trazas.anotar(ecuaciones=eq_counter)
 
     print(f"✅ Imagen procesada y ecuaciones extraídas: {image_id} ({eq_counter} ecuaciones)")
 
-# Procesar todas las carpetas (0 a 9) dentro de raw
-for resultado in os.listdir(input_folder):
-    resultado_path = os.path.join(input_folder, resultado)
-    if not os.path.isdir(resultado_path):
-        continue
+if __name__ == "__main__":
+    activar_desde_entorno("extract_equations")
+    activar_perfil("extract_equations")
+    activar_trazas("extract_equations")
+    os.makedirs(output_base_folder, exist_ok=True)
+
+    # Procesar todas las carpetas (0 a 9) dentro de raw
+    for resultado in os.listdir(input_folder):
+        resultado_path = os.path.join(input_folder, resultado)
+        if not os.path.isdir(resultado_path):
+            continue
 
-    for filename in os.listdir(resultado_path):
-        match = re.match(rf"{resultado}_(\d+)\.png", filename)
-        if match:
-            image_id = match.group(1)
-            image_path = os.path.join(resultado_path, filename)
-            extract_equations_from_image(image_path, resultado, image_id)
+        for filename in os.listdir(resultado_path):
+            match = re.match(rf"{resultado}_(\d+)\.png", filename)
+            if match:
+                image_id = match.group(1)
+                image_path = os.path.join(resultado_path, filename)
+                extract_equations_from_image(image_path, resultado, image_id)
 
-print("\n✅ PROCESO COMPLETO: TODAS LAS ECUACIONES FUERON EXTRAÍDAS Y ORGANIZADAS.")
+    print("\n✅ PROCESO COMPLETO: TODAS LAS ECUACIONES FUERON EXTRAÍDAS Y ORGANIZADAS.")
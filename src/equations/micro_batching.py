@@ -0,0 +1,194 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: micro_batching.py
+Descripcion: Agrupa en micro-lotes las ecuaciones enviadas por peticiones
+             concurrentes para clasificarlas juntas y repartir los resultados.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: NumPy (a traves de classify_equations)
+===============================================================================
+Uso:
+    agrupador = AgrupadorMicroLotes(vectores_promedio, max_espera_ms=5, max_lote=64)
+    resultados = agrupador.resolver_ecuaciones([(op1_img, oper_img, op2_img)])
+    agrupador.cerrar()
+===============================================================================
+Notas:
+- Un lote se despacha cuando alcanza max_lote ecuaciones o cuando la mas
+  antigua lleva max_espera_ms esperando, lo que ocurra primero.
+- Cada lote se resuelve con resolver_ecuaciones (operandos y operadores
+  clasificados en bloque) y cada llamador recibe solo sus resultados. Las
+  ecuaciones de un lote se agrupan por modelo segun la identidad de sus
+  objetos (prototipos y clasificadores), asi que un mismo modelo da una
+  sola llamada por lote aunque cada peticion arme su propia tupla.
+- metricas() expone la profundidad de la cola y los tamanos de lote.
+===============================================================================
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from classify_equations import resolver_ecuaciones
+
+class AgrupadorMicroLotes:
+    """
+    Cola compartida que agrupa ecuaciones de varios llamadores en lotes.
+
+    Args:
+        vectores_promedio (dict): Prototipos por digito.
+        max_espera_ms (float): Espera maxima de la primera ecuacion de un lote.
+        max_lote (int): Numero maximo de ecuaciones por lote.
+        hilos (int): Hilos que despachan lotes en paralelo.
+        clasificar_operadores (callable, opcional): Clasificador de operadores
+            del modelo (por defecto, las reglas de picos base).
+    """
+
+    def __init__(self, vectores_promedio, max_espera_ms=5.0, max_lote=64, hilos=1, clasificar_operadores=None):
+        self.vectores_promedio = vectores_promedio
+        self.clasificar_operadores = clasificar_operadores
+        self.max_espera = max_espera_ms / 1000.0
+        self.max_lote = max_lote
+        self.cola = queue.Queue()
+        self._bloqueo = threading.Lock()
+        self._contadores = {
+            "lotes": 0,
+            "ecuaciones": 0,
+            "profundidad_max": 0,
+            "espera_total_s": 0.0,
+        }
+        self._tamanos_lote = {}
+        self._activo = True
+        self._hilos = [
+            threading.Thread(target=self._despachar, name=f"micro-lotes-{i}", daemon=True)
+            for i in range(hilos)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def enviar(self, op1_img, oper_img, op2_img, modelo=None):
+        """
+        Encola una ecuacion y devuelve un Future con su resultado.
+
+        modelo es una tupla (vectores_promedio, clasificar_operadores,
+        clasificar_operandos) con la que resolver la ecuacion; por defecto,
+        la del agrupador. Tras una recarga
+        del modelo, las ecuaciones encoladas con el anterior se resuelven con
+        el anterior.
+        """
+        if not self._activo:
+            raise RuntimeError("el agrupador de micro-lotes esta cerrado")
+        futuro = Future()
+        modelo = modelo or (self.vectores_promedio, self.clasificar_operadores, None)
+        self.cola.put(((op1_img, oper_img, op2_img), futuro, time.perf_counter(), modelo))
+        profundidad = self.cola.qsize()
+        with self._bloqueo:
+            if profundidad > self._contadores["profundidad_max"]:
+                self._contadores["profundidad_max"] = profundidad
+        return futuro
+
+    def resolver_ecuaciones(self, ecuaciones, vectores_promedio=None, clasificar_operadores=None,
+                            clasificar_operandos=None):
+        """
+        Encola varias ecuaciones y espera sus resultados (mismo orden).
+        Sin prototipos tiene la misma firma que un resolver de lote; con
+        ellos, las ecuaciones se resuelven con ese modelo (y, si se dan,
+        con sus clasificadores, por ejemplo con cache).
+        """
+        modelo = None
+        if vectores_promedio is not None:
+            modelo = (vectores_promedio, clasificar_operadores, clasificar_operandos)
+        futuros = [self.enviar(*ecuacion, modelo=modelo) for ecuacion in ecuaciones]
+        return [futuro.result() for futuro in futuros]
+
+    def _recolectar(self):
+        """
+        Bloquea hasta tener al menos una ecuacion y completa el lote hasta
+        max_lote o hasta que vence la espera de la primera.
+        """
+        primero = self.cola.get()
+        if primero is None:
+            return None
+        lote = [primero]
+        limite = primero[2] + self.max_espera
+        while len(lote) < self.max_lote:
+            restante = limite - time.perf_counter()
+            try:
+                item = self.cola.get(timeout=restante) if restante > 0 else self.cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.cola.put(None)  # Propagar la senal de cierre a otros hilos
+                break
+            lote.append(item)
+        return lote
+
+    def _despachar(self):
+        while True:
+            lote = self._recolectar()
+            if lote is None:
+                self.cola.put(None)
+                return
+
+            inicio = time.perf_counter()
+            # Normalmente hay un solo modelo; durante una recarga, uno por version.
+            # Se agrupa por los objetos del modelo y no por la tupla, que cada
+            # llamada a enviar() construye de nuevo
+            grupos = {}
+            for item in lote:
+                grupos.setdefault(tuple(map(id, item[3])), []).append(item)
+            for grupo in grupos.values():
+                vectores_promedio, clasificar_operadores, clasificar_operandos = grupo[0][3]
+                try:
+                    resultados = resolver_ecuaciones([item[0] for item in grupo], vectores_promedio,
+                                                     clasificar_operandos=clasificar_operandos,
+                                                     clasificar_operadores=clasificar_operadores)
+                except Exception as e:
+                    for item in grupo:
+                        item[1].set_exception(e)
+                    continue
+
+                for item, resultado in zip(grupo, resultados):
+                    item[1].set_result(resultado)
+
+            with self._bloqueo:
+                self._contadores["lotes"] += 1
+                self._contadores["ecuaciones"] += len(lote)
+                self._contadores["espera_total_s"] += sum(inicio - item[2] for item in lote)
+                self._tamanos_lote[len(lote)] = self._tamanos_lote.get(len(lote), 0) + 1
+
+    def metricas(self):
+        """
+        Devuelve un diccionario con la profundidad actual y maxima de la cola,
+        el numero de lotes y ecuaciones, el tamano medio de lote, la espera
+        media en cola y la distribucion de tamanos de lote.
+        """
+        with self._bloqueo:
+            lotes = self._contadores["lotes"]
+            ecuaciones = self._contadores["ecuaciones"]
+            return {
+                "profundidad_cola": self.cola.qsize(),
+                "profundidad_max": self._contadores["profundidad_max"],
+                "lotes": lotes,
+                "ecuaciones": ecuaciones,
+                "tamano_lote_medio": ecuaciones / lotes if lotes else 0.0,
+                "espera_media_ms": 1000.0 * self._contadores["espera_total_s"] / ecuaciones if ecuaciones else 0.0,
+                "tamanos_lote": dict(sorted(self._tamanos_lote.items())),
+                "max_espera_ms": self.max_espera * 1000.0,
+                "max_lote": self.max_lote,
+            }
+
+    def cerrar(self):
+        """
+        Detiene los hilos despues de vaciar la cola.
+        """
+        self._activo = False
+        self.cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
@@ -0,0 +1,144 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: model_reloader.py
+Descripcion: Recarga en caliente del artefacto del modelo en los solucionadores
+             de larga duracion: vigila el archivo, carga la version nueva en
+             segundo plano y la publica con un cambio atomico de referencia.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: NumPy (a traves de model_artifact)
+===============================================================================
+Uso:
+    recargador = RecargadorModelo("classify_digits/modelo.npz",
+                                  lambda modelo: SolucionadorPorNiveles.desde_modelo(modelo),
+                                  intervalo_s=2)
+    solucionador = recargador.actual()   # al inicio de cada peticion
+    recargador.detener()
+===============================================================================
+Notas:
+- Un hilo revisa cada intervalo_s el os.stat del artefacto (mtime, tamano e
+  inodo). Si cambio, lo carga y compara su version (hash del contenido): un
+  archivo reescrito con el mismo contenido no provoca recarga.
+- El solucionador nuevo se construye y se calienta fuera del camino de las
+  peticiones; despues se publica asignando una sola referencia. Cada
+  peticion toma actual() una vez al empezar, asi que las que estan en curso
+  terminan con el modelo anterior y las nuevas usan el nuevo, sin pausas.
+- Un artefacto invalido o a medio copiar se registra como error y se
+  reintenta en la siguiente revision; el modelo activo no cambia.
+- metricas() informa la version activa, el numero de recargas y errores.
+===============================================================================
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from model_artifact import cargar_modelo
+
+class RecargadorModelo:
+    """
+    Mantiene el solucionador activo y lo reemplaza cuando cambia el artefacto.
+
+    Args:
+        ruta (str): Archivo del artefacto del modelo.
+        fabrica (callable): Funcion (ModeloInkSolver) -> solucionador.
+        intervalo_s (float): Segundos entre revisiones del archivo.
+        modelo (ModeloInkSolver, opcional): Modelo ya cargado para el inicio.
+    """
+
+    def __init__(self, ruta, fabrica, intervalo_s=2.0, modelo=None):
+        self.ruta = ruta
+        self.fabrica = fabrica
+        self.intervalo_s = intervalo_s
+        self._firma = self._firma_archivo()
+        modelo = modelo or cargar_modelo(ruta)
+        self._actual = fabrica(modelo)
+        self.version = modelo.version
+        self.recargas = 0
+        self.errores = 0
+        self.ultimo_error = None
+        self.ultima_recarga = None
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._vigilar, name="recarga-modelo", daemon=True)
+        self._hilo.start()
+
+    def actual(self):
+        """
+        Solucionador activo. Se llama una vez por peticion y se usa hasta
+        que la peticion termina.
+        """
+        return self._actual
+
+    def _firma_archivo(self):
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return estado.st_mtime_ns, estado.st_size, estado.st_ino
+
+    def revisar(self):
+        """
+        Revisa el artefacto una vez y recarga si su contenido cambio.
+
+        Returns:
+            bool: True si se publico un modelo nuevo.
+        """
+        firma = self._firma_archivo()
+        if firma is None or firma == self._firma:
+            return False
+        try:
+            modelo = cargar_modelo(self.ruta)
+            if modelo.version == self.version:
+                self._firma = firma
+                return False
+            inicio = time.perf_counter()
+            nuevo = self.fabrica(modelo)
+        except Exception as e:
+            # Se reintenta en la proxima revision (por ejemplo, copia a medias)
+            self.errores += 1
+            self.ultimo_error = str(e)
+            print(f"⚠️ No se pudo recargar {self.ruta}: {e}", file=sys.stderr)
+            return False
+
+        anterior = self.version
+        self._actual = nuevo  # Cambio atomico de referencia
+        self.version = modelo.version
+        self._firma = firma
+        self.recargas += 1
+        self.ultima_recarga = time.strftime("%Y-%m-%d %H:%M:%S")
+        print(f"🔄 Modelo recargado: {anterior} -> {self.version} "
+              f"({(time.perf_counter() - inicio) * 1000:.0f} ms)", file=sys.stderr)
+        return True
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo_s):
+            self.revisar()
+
+    def metricas(self):
+        return {
+            "version_activa": self.version,
+            "recargas": self.recargas,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error,
+            "ultima_recarga": self.ultima_recarga,
+            "intervalo_s": self.intervalo_s,
+        }
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+def solucionador_actual(fuente):
+    """
+    Devuelve el solucionador a usar en una peticion: el activo de un
+    RecargadorModelo o la propia fuente si es un solucionador fijo.
+    """
+    return fuente.actual() if isinstance(fuente, RecargadorModelo) else fuente
@@ -0,0 +1,324 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: prometheus_metrics.py
+Descripcion: Metricas de los solucionadores de larga duracion (solve_server.py
+             y solve_stream.py) en formato de texto de Prometheus, sin
+             dependencias externas: peticiones, ecuaciones y hojas
+             procesadas, latencias por etapa y por lote, tamanos de lote,
+             cache, colas, version del modelo y distribucion de predicciones.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: ninguna (http.server para servir_metricas)
+- stage_timing.py (histogramas por etapa) y model_reloader.py
+===============================================================================
+Uso:
+    python solve_server.py --port 8080
+    curl -s localhost:8080/metrics
+En modo por lotes, con un puerto aparte solo para /metrics:
+    ls ../../data/equations/raw/*/*.png | python solve_stream.py --metricas-puerto 9108 > /dev/null
+Configuracion de Prometheus:
+    scrape_configs:
+      - job_name: inksolver
+        static_configs: [{targets: ["localhost:8080"]}]
+En el codigo:
+    from prometheus_metrics import metricas
+    metricas.hojas.inc()
+    print(metricas.exponer())
+===============================================================================
+Notas:
+- Formato de exposicion de texto 0.0.4 (Content-Type
+  text/plain; version=0.0.4). Contadores con sufijo _total, histogramas
+  acumulativos con _bucket{le=...}, _sum y _count; latencias en segundos.
+- Metricas (prefijo inksolver_):
+    - peticiones_total{ruta,codigo} y peticion_segundos{ruta}: HTTP.
+    - entradas_total{resultado}: entradas de solve_stream (ok o error).
+    - hojas_total, ecuaciones_total{nivel}: trabajo procesado.
+    - lote_segundos{nivel}, lote_ecuaciones{nivel}: resolucion por lote.
+    - etapa_segundos{etapa}: etapas de stage_timing.py (umbral, segmentar,
+      recortar, caracteristicas_operando, ...), recibidas como oyente.
+    - predicciones_total{tipo,clase}: operandos (0-9) y operadores
+      (sum, sub, times, div, equals, Desconocido) predichos; su proporcion
+      permite alertar de una deriva, por ejemplo si sube "Desconocido".
+    - resultados_total{resultado}: ecuaciones con resultado calculado o
+      sin resultado (operador desconocido o division por cero).
+    - modelo_info{version}, modelo_recargas_total, modelo_errores_recarga_total.
+    - cache_consultas_total{resultado}, cache_tasa_aciertos, cache_entradas.
+    - micro_lotes_cola, micro_lotes_cola_max, micro_lotes_total,
+      micro_lotes_ecuaciones_total (con --max-lote > 1).
+    - peticiones_en_cola: resoluciones que esperan un worker del pool.
+    - proceso_rss_bytes, proceso_inicio_segundos.
+- Las metricas de cache, colas y modelo se leen al exponer (recolectores),
+  asi que no cuestan nada entre raspados.
+- Las etiquetas tienen valores acotados (rutas conocidas, niveles, clases);
+  una ruta desconocida se cuenta como "otra".
+===============================================================================
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from model_reloader import RecargadorModelo, solucionador_actual
+from stage_timing import leer_rss_mb, tiempos
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites de los histogramas: latencias (s) y ecuaciones por lote
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LIMITES_LOTE = (1, 2, 4, 8, 16, 32, 64, 128)
+
+def escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def formatear_etiquetas(nombres, valores, extra=""):
+    partes = [f'{n}="{escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+def formatear_valor(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Contador:
+    """
+    Contador monotono con etiquetas.
+    """
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._bloqueo = threading.Lock()
+
+    def inc(self, valor=1, *etiquetas):
+        with self._bloqueo:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + valor
+
+    def muestras(self):
+        with self._bloqueo:
+            valores = dict(self._valores)
+        if not valores and not self.etiquetas:
+            valores = {(): 0}
+        for etiquetas, valor in sorted(valores.items()):
+            yield self.nombre, formatear_etiquetas(self.etiquetas, etiquetas), valor
+
+class Histograma:
+    """
+    Histograma acumulativo con etiquetas.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}  # etiquetas -> [cubetas..., suma, cuenta]
+        self._bloqueo = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        cubeta = bisect.bisect_left(self.limites, valor)
+        with self._bloqueo:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[cubeta] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def muestras(self):
+        with self._bloqueo:
+            series = {etiquetas: list(serie) for etiquetas, serie in self._series.items()}
+        for etiquetas, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, n in zip(self.limites + (float("inf"),), serie):
+                acumulado += n
+                yield (f"{self.nombre}_bucket",
+                       formatear_etiquetas(self.etiquetas, etiquetas, f'le="{formatear_valor(float(limite))}"'), acumulado)
+            yield f"{self.nombre}_sum", formatear_etiquetas(self.etiquetas, etiquetas), serie[-2]
+            yield f"{self.nombre}_count", formatear_etiquetas(self.etiquetas, etiquetas), serie[-1]
+
+class RegistroMetricas:
+    """
+    Metricas del proceso y recolectores que se leen al exponer.
+    """
+
+    def __init__(self, prefijo="inksolver"):
+        self.prefijo = prefijo
+        self._metricas = []
+        self._recolectores = []
+        self._bloqueo = threading.Lock()
+        self._observando_etapas = False
+        self.inicio = time.time()
+
+        self.peticiones = self.contador("peticiones_total", "Peticiones HTTP atendidas.", ("ruta", "codigo"))
+        self.duracion_peticion = self.histograma("peticion_segundos", "Duracion de las peticiones HTTP.", ("ruta",))
+        self.entradas = self.contador("entradas_total", "Entradas de solve_stream procesadas.", ("resultado",))
+        self.hojas = self.contador("hojas_total", "Hojas completas procesadas.")
+        self.ecuaciones = self.contador("ecuaciones_total", "Ecuaciones resueltas por nivel.", ("nivel",))
+        self.duracion_lote = self.histograma("lote_segundos", "Duracion de cada lote de clasificacion.", ("nivel",))
+        self.tamano_lote = self.histograma("lote_ecuaciones", "Ecuaciones por lote de clasificacion.", ("nivel",),
+                                           limites=LIMITES_LOTE)
+        self.duracion_etapa = self.histograma("etapa_segundos", "Duracion de cada etapa del pipeline.", ("etapa",))
+        self.predicciones = self.contador("predicciones_total", "Clases predichas por tipo de recorte.", ("tipo", "clase"))
+        self.resultados = self.contador("resultados_total", "Ecuaciones con y sin resultado calculado.", ("resultado",))
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        metrica = Contador(f"{self.prefijo}_{nombre}", ayuda, etiquetas)
+        with self._bloqueo:
+            self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        metrica = Histograma(f"{self.prefijo}_{nombre}", ayuda, etiquetas, limites)
+        with self._bloqueo:
+            self._metricas.append(metrica)
+        return metrica
+
+    def recolector(self, funcion):
+        """
+        Registra funcion() -> [(nombre, tipo, ayuda, [(etiquetas, valor)])],
+        que se llama en cada exposicion. nombre va sin prefijo y etiquetas
+        es un dict.
+        """
+        with self._bloqueo:
+            self._recolectores.append(funcion)
+
+    def observar_etapas(self):
+        """
+        Empieza a recibir las etapas de stage_timing.py en etapa_segundos.
+        """
+        if not self._observando_etapas:
+            self._observando_etapas = True
+            tiempos.observar(self._etapa)
+
+    def _etapa(self, nombre, _inicio_ns, duracion_ns):
+        self.duracion_etapa.observar(duracion_ns / 1e9, nombre)
+
+    def registrar_resultados(self, nivel, resultados, duracion_s):
+        """
+        Cuenta un lote resuelto: ecuaciones, latencia, tamano y predicciones.
+        """
+        self.ecuaciones.inc(len(resultados), nivel)
+        self.duracion_lote.observar(duracion_s, nivel)
+        self.tamano_lote.observar(len(resultados), nivel)
+        for resultado in resultados:
+            self.predicciones.inc(1, "operando", str(resultado.get("Operando_1")))
+            self.predicciones.inc(1, "operando", str(resultado.get("Operando_2")))
+            self.predicciones.inc(1, "operador", str(resultado.get("Operador")))
+            self.resultados.inc(1, "calculado" if resultado.get("Resultado_Calculado") is not None else "sin_resultado")
+
+    def exponer(self):
+        """
+        Texto de exposicion de Prometheus de todas las metricas.
+        """
+        lineas = []
+        for metrica in list(self._metricas):
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            for nombre, etiquetas, valor in metrica.muestras():
+                lineas.append(f"{nombre}{etiquetas} {formatear_valor(valor)}")
+        for funcion in list(self._recolectores):
+            for nombre, tipo, ayuda, muestras in funcion():
+                nombre = f"{self.prefijo}_{nombre}"
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for etiquetas, valor in muestras:
+                    lineas.append(f"{nombre}{formatear_etiquetas(etiquetas.keys(), etiquetas.values())} {formatear_valor(valor)}")
+        return "\n".join(lineas) + "\n"
+
+# Registro global del proceso
+metricas = RegistroMetricas()
+
+def recolector_proceso():
+    actual, _ = leer_rss_mb()
+    return [
+        ("proceso_rss_bytes", "gauge", "Memoria residente del proceso.", [({}, int(actual * 1024 * 1024))]),
+        ("proceso_inicio_segundos", "gauge", "Inicio del proceso (epoch).", [({}, metricas.inicio)]),
+    ]
+
+metricas.recolector(recolector_proceso)
+
+def recolector_solucionador(fuente, agrupador=None, pool=None):
+    """
+    Recolector de la version del modelo, sus recargas, la cache de recortes
+    y las colas (micro-lotes y peticiones esperando un worker).
+
+    Args:
+        fuente: SolucionadorPorNiveles o RecargadorModelo.
+        agrupador (AgrupadorMicroLotes, opcional).
+        pool (ThreadPoolExecutor, opcional): Pool de workers del servidor.
+    """
+    def recolectar():
+        solucionador = solucionador_actual(fuente)
+        familias = [("modelo_info", "gauge", "Version del modelo activo.", [({"version": solucionador.version_modelo}, 1)])]
+        if isinstance(fuente, RecargadorModelo):
+            familias.append(("modelo_recargas_total", "counter", "Recargas del modelo en caliente.", [({}, fuente.recargas)]))
+            familias.append(("modelo_errores_recarga_total", "counter", "Recargas fallidas del modelo.", [({}, fuente.errores)]))
+        if solucionador.cache is not None:
+            cache = solucionador.cache.metricas()
+            familias += [
+                ("cache_consultas_total", "counter", "Consultas a la cache de recortes.", [
+                    ({"resultado": "acierto_memoria"}, cache["aciertos"] - cache["aciertos_disco"]),
+                    ({"resultado": "acierto_disco"}, cache["aciertos_disco"]),
+                    ({"resultado": "fallo"}, cache["fallos"]),
+                ]),
+                ("cache_tasa_aciertos", "gauge", "Aciertos / consultas de la cache de recortes.", [({}, cache["tasa_aciertos"])]),
+                ("cache_entradas", "gauge", "Entradas en la cache de recortes en memoria.", [({}, cache["entradas"])]),
+                ("cache_desalojos_total", "counter", "Entradas desalojadas de la cache.", [({}, cache["desalojos"])]),
+            ]
+        if agrupador is not None:
+            lotes = agrupador.metricas()
+            familias += [
+                ("micro_lotes_cola", "gauge", "Ecuaciones esperando en la cola de micro-lotes.", [({}, lotes["profundidad_cola"])]),
+                ("micro_lotes_cola_max", "gauge", "Profundidad maxima de la cola de micro-lotes.", [({}, lotes["profundidad_max"])]),
+                ("micro_lotes_total", "counter", "Micro-lotes despachados.", [({}, lotes["lotes"])]),
+                ("micro_lotes_ecuaciones_total", "counter", "Ecuaciones resueltas en micro-lotes.", [({}, lotes["ecuaciones"])]),
+            ]
+        if pool is not None:
+            familias.append(("peticiones_en_cola", "gauge", "Resoluciones esperando un worker del pool.",
+                             [({}, pool._work_queue.qsize())]))
+        return familias
+    return recolectar
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def log_message(self, formato, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        datos = metricas.exponer().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTENIDO)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+def servir_metricas(puerto, host="127.0.0.1"):
+    """
+    Sirve GET /metrics en un hilo aparte (para procesos sin servidor HTTP
+    propio, como solve_stream.py).
+
+    Returns:
+        ThreadingHTTPServer: El servidor (shutdown() para detenerlo).
+    """
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    return servidor
@@ -0,0 +1,161 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: results_ledger.py
+Descripcion: Registro persistente de resultados por ecuacion (id, firma y
+             hash de los recortes y version del modelo) para que una nueva
+             ejecucion solo clasifique las ecuaciones que cambiaron.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: ninguna (os, json, sqlite3, hashlib)
+===============================================================================
+Uso:
+    registro = RegistroResultados("test_analysis/registro_ecuaciones.sqlite")
+    fila = registro.vigente(eq_id, rutas, modelo.version)
+    if fila is None:
+        datos = leer_archivos(rutas)
+        ...  # clasificar
+        registro.anotar(eq_id, rutas, modelo.version, fila_nueva, datos)
+    registro.confirmar(ids_presentes)
+===============================================================================
+Notas:
+- Cada entrada guarda la firma de los tres recortes (mtime y tamano de cada
+  archivo), el hash BLAKE2b de su contenido, la version del modelo y la
+  fila de resultados.
+- Una ecuacion se reutiliza sin leer sus imagenes si su firma y la version
+  del modelo coinciden. Si solo cambio la firma (archivo copiado o tocado)
+  se compara el hash del contenido y, si coincide, se reutiliza tambien.
+- El registro se carga completo en memoria al abrirlo y los cambios se
+  escriben en una sola transaccion en confirmar(), que ademas borra las
+  ecuaciones que ya no existen.
+===============================================================================
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+def firma_archivos(rutas):
+    """
+    Firma barata de un grupo de archivos: (mtime_ns, tamano) de cada uno.
+    Devuelve None si falta alguno.
+    """
+    partes = []
+    for ruta in rutas:
+        try:
+            estado = os.stat(ruta)
+        except FileNotFoundError:
+            return None
+        partes.append(f"{estado.st_mtime_ns}:{estado.st_size}")
+    return "|".join(partes)
+
+def leer_archivos(rutas):
+    """
+    Lee el contenido binario de cada archivo.
+    """
+    datos = []
+    for ruta in rutas:
+        with open(ruta, "rb") as f:
+            datos.append(f.read())
+    return datos
+
+def hash_contenido(datos):
+    """
+    Hash BLAKE2b (32 caracteres hex) del contenido de un grupo de archivos.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for contenido in datos:
+        h.update(len(contenido).to_bytes(8, "little"))
+        h.update(contenido)
+    return h.hexdigest()
+
+class RegistroResultados:
+    """
+    Registro de resultados por ecuacion en un archivo SQLite.
+
+    Args:
+        ruta (str): Archivo SQLite del registro.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta)
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS ecuaciones ("
+            "eq_id TEXT PRIMARY KEY, firma TEXT, hash TEXT, version TEXT, fila TEXT)"
+        )
+        self._entradas = {
+            eq_id: (firma, hash_, version, fila)
+            for eq_id, firma, hash_, version, fila in self._conexion.execute("SELECT * FROM ecuaciones")
+        }
+        self._cambios = {}
+        self.reutilizadas = 0
+        self.clasificadas = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def vigente(self, eq_id, rutas, version):
+        """
+        Devuelve la fila guardada de la ecuacion si sus recortes y la version
+        del modelo no cambiaron; si no, None.
+        """
+        entrada = self._entradas.get(eq_id)
+        if entrada is None or entrada[2] != version:
+            return None
+        firma = firma_archivos(rutas)
+        if firma is None:
+            return None
+        if firma != entrada[0]:
+            # Archivos tocados o copiados: decide el contenido
+            if hash_contenido(leer_archivos(rutas)) != entrada[1]:
+                return None
+            self._cambios[eq_id] = (firma,) + entrada[1:]
+            self._entradas[eq_id] = self._cambios[eq_id]
+        self.reutilizadas += 1
+        return json.loads(entrada[3])
+
+    def anotar(self, eq_id, rutas, version, fila, datos=None):
+        """
+        Guarda el resultado recien calculado de una ecuacion. datos es el
+        contenido ya leido de los recortes (se lee de nuevo si no se da).
+        """
+        datos = datos if datos is not None else leer_archivos(rutas)
+        entrada = (firma_archivos(rutas), hash_contenido(datos), version, json.dumps(fila))
+        self._entradas[eq_id] = entrada
+        self._cambios[eq_id] = entrada
+        self.clasificadas += 1
+
+    def confirmar(self, ids_presentes=None):
+        """
+        Escribe los cambios pendientes y, si se indica el conjunto de ids
+        presentes, borra las ecuaciones que ya no existen.
+
+        Returns:
+            int: Numero de entradas eliminadas.
+        """
+        eliminadas = []
+        if ids_presentes is not None:
+            eliminadas = [eq_id for eq_id in self._entradas if eq_id not in ids_presentes]
+        with self._conexion:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO ecuaciones VALUES (?, ?, ?, ?, ?)",
+                [(eq_id,) + entrada for eq_id, entrada in self._cambios.items()],
+            )
+            self._conexion.executemany("DELETE FROM ecuaciones WHERE eq_id = ?", [(e,) for e in eliminadas])
+        for eq_id in eliminadas:
+            del self._entradas[eq_id]
+        self._cambios = {}
+        return len(eliminadas)
+
+    def cerrar(self):
+        self._conexion.close()
@@ -0,0 +1,376 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: solve_server.py
+Descripcion: Servicio HTTP local que resuelve hojas completas o ecuaciones de
+             tres recortes y responde con operandos, operador y resultado.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: OpenCV (cv2), NumPy, Pandas, scipy
+- Solo se usa la libreria estandar (http.server) para el servidor.
+===============================================================================
+Uso:
+    python solve_server.py --port 8080
+    python solve_server.py --port 8080 --perfil --perfil-muestreo-ms 5
+    curl -s -X POST localhost:8080/solve -d '{"hoja": "../../data/equations/raw/0/0_1.png"}'
+    curl -s -X POST localhost:8080/solve --data-binary @hoja.png -H "Content-Type: image/png"
+    curl -sN -X POST localhost:8080/solve/stream --data-binary @hoja.png -H "Content-Type: image/png"
+    curl -s localhost:8080/metrics
+===============================================================================
+Notas:
+- POST /solve acepta un objeto JSON con las mismas claves que solve_stream.py
+  ("hoja", "hoja_b64", "recortes", "recortes_b64") o la imagen de una hoja
+  completa directamente en el cuerpo (Content-Type: image/*).
+- La respuesta es {"version_modelo": ..., "ecuaciones": [...]} con un
+  registro por ecuacion; /health tambien informa la version del modelo.
+- POST /solve/stream acepta lo mismo pero responde NDJSON en chunks: cada
+  ecuacion se envia en cuanto su fila de la hoja se segmenta y clasifica.
+- GET /health devuelve el estado del servicio.
+- Los prototipos se cargan una sola vez al iniciar el servidor.
+- Cada conexion se atiende en su propio hilo y solo la interpretacion del
+  cuerpo y la resolucion pasan por un pool acotado de --workers hilos (por
+  defecto, el numero de nucleos); una conexion keep-alive inactiva no
+  bloquea a otros clientes.
+- Los errores de la entrada (JSON o imagen invalidos, menos de 3 recortes)
+  responden 400; los fallos internos, 500. Un cuerpo mayor que MAX_CUERPO
+  responde 413 sin leerlo y cierra la conexion (los bytes sin leer
+  corromperian la siguiente peticion keep-alive).
+- Con --max-lote > 1 las ecuaciones de peticiones concurrentes se agrupan en
+  micro-lotes (ver micro_batching.py) cuando se resuelven en el nivel
+  "prototipo"; GET /stats expone sus metricas. La espera del micro-lote
+  ocurre en el hilo de la conexion y no en el pool (la decodificacion, la
+  segmentacion y los demas niveles siguen en los workers), asi que el lote
+  no queda limitado a --workers ecuaciones.
+- Con --recargar-s N el artefacto del modelo se revisa cada N segundos y,
+  si cambia, se recarga en segundo plano sin detener el servicio (ver
+  model_reloader.py). Cada peticion termina con el modelo con el que empezo;
+  /health y /stats informan la version activa y las recargas.
+- Los recortes repetidos (casillas en blanco, hojas reenviadas) se sirven
+  desde la cache de clasificaciones (--cache-max, --cache-disco; ver
+  crop_cache.py); /stats informa aciertos, fallos y desalojos.
+- Cada peticion puede traer un presupuesto de latencia ("presupuesto_ms" en
+  el JSON o la cabecera X-Presupuesto-Ms) que elige el nivel de
+  clasificacion (ver solver_tiers.py); /stats informa la latencia por nivel.
+- GET /metrics expone las mismas metricas en formato de texto de Prometheus
+  (ver prometheus_metrics.py), mas peticiones por ruta y codigo, latencias
+  por peticion y etapa, tamanos de lote, cola de peticiones y distribucion
+  de predicciones por operando y operador.
+===============================================================================
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+from micro_batching import AgrupadorMicroLotes
+from model_reloader import RecargadorModelo, solucionador_actual
+from profiling import activar_desde_argumentos as activar_perfil, agregar_argumentos as agregar_argumentos_perfil
+from prometheus_metrics import TIPO_CONTENIDO, metricas, recolector_solucionador
+from solve_stream import (
+    agregar_argumentos_modelo,
+    crear_solucionador,
+    crear_recargador,
+    decodificar_imagen,
+    interpretar_registro,
+    iterar_tarea,
+    resolver_tarea,
+)
+
+# Tamano maximo del cuerpo de una peticion (bytes)
+MAX_CUERPO = 32 * 1024 * 1024
+
+# Rutas con etiqueta propia en las metricas (el resto cuenta como "otra")
+RUTAS = ("/solve", "/solve/stream", "/health", "/stats", "/metrics")
+
+# Marca de fin de un generador ejecutado paso a paso en el pool
+_FIN = object()
+
+class ServidorInkSolver(ThreadingMixIn, HTTPServer):
+    """
+    Servidor HTTP que atiende cada conexion en su propio hilo y ejecuta la
+    resolucion en un pool de hilos de tamano fijo; mantiene el modelo
+    cargado en memoria durante toda su vida. Una conexion keep-alive
+    inactiva solo ocupa su hilo, nunca un worker del pool.
+
+    solucionador puede ser un SolucionadorPorNiveles fijo o un
+    RecargadorModelo, en cuyo caso cada peticion usa el activo al empezar.
+    """
+
+    request_queue_size = 128  # El valor por defecto (5) rechaza rafagas de clientes
+    daemon_threads = True
+    block_on_close = False  # No esperar a las conexiones keep-alive al cerrar
+
+    def __init__(self, direccion, solucionador, workers=None, agrupador=None):
+        super().__init__(direccion, ManejadorSolve)
+        self.fuente_modelo = solucionador
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.agrupador = agrupador
+        metricas.observar_etapas()
+        metricas.recolector(recolector_solucionador(solucionador, agrupador, self.pool))
+
+    @property
+    def solucionador(self):
+        """
+        Solucionador activo (cambia tras una recarga del modelo).
+        """
+        return solucionador_actual(self.fuente_modelo)
+
+    def resolver_lote(self, presupuesto_ms=None, solucionador=None):
+        """
+        Devuelve el resolver de lotes de una peticion: el solucionador por
+        niveles con su presupuesto, que delega el nivel "prototipo" en el
+        agrupador de micro-lotes si esta activo.
+        """
+        solucionador = solucionador or self.solucionador
+        resolver_rapido = None
+        ejecutar = None
+        if self.agrupador:
+            resolver_rapido = lambda ecuaciones: self.agrupador.resolver_ecuaciones(
+                ecuaciones, solucionador.vectores_promedio, solucionador.clasificar_operadores,
+                solucionador.niveles["prototipo"])
+            # La tarea corre en el hilo de la conexion (ver registros_tarea):
+            # los demas niveles se resuelven en el pool
+            ejecutar = self.ejecutar
+        return solucionador.resolver_lote(presupuesto_ms, resolver_rapido=resolver_rapido, ejecutar=ejecutar)
+
+    def registros_tarea(self, id_entrada, tipo, datos, vectores_promedio, resolver_lote):
+        """
+        Generador de los resultados de una tarea para /solve/stream.
+
+        Sin micro-lotes cada paso avanza en el pool de workers. Con
+        micro-lotes el generador corre en el hilo de la conexion y solo la
+        segmentacion de cada fila y los niveles que no pasan por el agrupador
+        ocupan un worker: la espera de un micro-lote no retiene workers, asi
+        que un lote puede juntar hasta --max-lote ecuaciones de conexiones
+        distintas aunque --workers sea menor.
+        """
+        if self.agrupador:
+            return iterar_tarea(id_entrada, tipo, datos, vectores_promedio, resolver_lote=resolver_lote,
+                                envolver_filas=self.iterar_en_pool)
+        return self.iterar_en_pool(iterar_tarea(id_entrada, tipo, datos, vectores_promedio, resolver_lote=resolver_lote))
+
+    def estadisticas(self):
+        solucionador = self.solucionador
+        estado = {"workers": self.workers, "version_modelo": solucionador.version_modelo,
+                  "niveles": solucionador.metricas()}
+        if isinstance(self.fuente_modelo, RecargadorModelo):
+            estado["recarga_modelo"] = self.fuente_modelo.metricas()
+        if solucionador.cache is not None:
+            estado["cache_recortes"] = solucionador.cache.metricas()
+        if self.agrupador:
+            estado["micro_lotes"] = self.agrupador.metricas()
+        return estado
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        """
+        Ejecuta funcion en el pool de workers y espera su resultado.
+        """
+        return self.pool.submit(funcion, *args, **kwargs).result()
+
+    def iterar_en_pool(self, registros):
+        """
+        Recorre un generador avanzando cada paso en el pool de workers: en
+        /solve/stream cada fila de la hoja ocupa un worker solo mientras se
+        segmenta y clasifica, no mientras se envia.
+        """
+        while True:
+            registro = self.ejecutar(next, registros, _FIN)
+            if registro is _FIN:
+                return
+            yield registro
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        if self.agrupador:
+            self.agrupador.cerrar()
+        if isinstance(self.fuente_modelo, RecargadorModelo):
+            self.fuente_modelo.detener()
+
+class ManejadorSolve(BaseHTTPRequestHandler):
+    """
+    Manejador de las rutas /solve, /solve/stream, /health, /stats y /metrics.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = 30  # Cerrar conexiones keep-alive inactivas para liberar sus hilos
+
+    def log_message(self, formato, *args):
+        pass  # Silenciar el log por peticion de http.server
+
+    def handle_one_request(self):
+        """
+        Atiende una peticion y la cuenta en las metricas con su ruta, codigo
+        y duracion (hasta el ultimo chunk en /solve/stream).
+        """
+        self.codigo = None
+        inicio = time.perf_counter()
+        super().handle_one_request()
+        if self.codigo is not None:
+            ruta = getattr(self, "path", "")
+            ruta = ruta if ruta in RUTAS else "otra"
+            metricas.peticiones.inc(1, ruta, str(self.codigo))
+            metricas.duracion_peticion.observar(time.perf_counter() - inicio, ruta)
+
+    def send_response(self, codigo, mensaje=None):
+        self.codigo = codigo
+        super().send_response(codigo, mensaje)
+
+    def enviar_texto(self, codigo, texto, tipo_contenido):
+        datos = texto.encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo_contenido)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def enviar_json(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def enviar_chunk(self, datos):
+        self.wfile.write(f"{len(datos):X}\r\n".encode("ascii") + datos + b"\r\n")
+        self.wfile.flush()
+
+    def enviar_ndjson(self, registros):
+        """
+        Envia los registros como NDJSON con Transfer-Encoding: chunked, un
+        chunk por registro. Un error a mitad de respuesta se envia como un
+        registro con "error" antes de cerrar el stream.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for registro in registros:
+                self.enviar_chunk((json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8"))
+        except Exception as e:
+            self.enviar_chunk((json.dumps({"error": str(e)}, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def leer_cuerpo(self):
+        """
+        Lee el cuerpo de la peticion. Devuelve None si supera MAX_CUERPO: no
+        se lee y la conexion se marca para cerrarse tras la respuesta.
+        """
+        longitud = int(self.headers.get("Content-Length", 0))
+        if longitud < 0:
+            raise ValueError(f"Content-Length invalido ({longitud})")
+        if longitud > MAX_CUERPO:
+            self.close_connection = True
+            return None
+        return self.rfile.read(longitud)
+
+    def interpretar_peticion(self, cuerpo):
+        """
+        Convierte el cuerpo de la peticion en una tarea
+        (id, tipo, datos, presupuesto_ms).
+        """
+        tipo_contenido = self.headers.get("Content-Type", "")
+        if tipo_contenido.startswith("image/"):
+            img = decodificar_imagen(cuerpo, "la imagen del cuerpo")
+            presupuesto_ms = self.headers.get("X-Presupuesto-Ms")
+            return "hoja", "hoja", img, float(presupuesto_ms) if presupuesto_ms else None
+        return interpretar_registro(json.loads(cuerpo or b"{}"), "0")
+
+    def do_GET(self):
+        if self.path == "/health":
+            estado = {"estado": "ok", "workers": self.server.workers,
+                      "version_modelo": self.server.solucionador.version_modelo}
+            if isinstance(self.server.fuente_modelo, RecargadorModelo):
+                estado["recargas_modelo"] = self.server.fuente_modelo.recargas
+            self.enviar_json(200, estado)
+        elif self.path == "/stats":
+            self.enviar_json(200, self.server.estadisticas())
+        elif self.path == "/metrics":
+            self.enviar_texto(200, metricas.exponer(), TIPO_CONTENIDO)
+        else:
+            self.enviar_json(404, {"error": f"ruta no encontrada: {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/solve", "/solve/stream"):
+            self.enviar_json(404, {"error": f"ruta no encontrada: {self.path}"})
+            return
+        try:
+            cuerpo = self.leer_cuerpo()
+            if cuerpo is None:
+                self.enviar_json(413, {"error": f"cuerpo demasiado grande (maximo {MAX_CUERPO} bytes)"})
+                return
+            id_entrada, tipo, datos, presupuesto_ms = self.server.ejecutar(self.interpretar_peticion, cuerpo)
+        except Exception as e:
+            self.enviar_json(400, {"error": str(e)})
+            return
+
+        # El modelo se fija al inicio: una recarga no afecta a esta peticion
+        solucionador = self.server.solucionador
+        resolver_lote = self.server.resolver_lote(presupuesto_ms, solucionador)
+        if self.path == "/solve/stream":
+            self.enviar_ndjson(self.server.registros_tarea(id_entrada, tipo, datos, solucionador.vectores_promedio,
+                                                           resolver_lote))
+            return
+        try:
+            if self.server.agrupador:
+                resultados = list(self.server.registros_tarea(id_entrada, tipo, datos, solucionador.vectores_promedio,
+                                                              resolver_lote))
+            else:
+                resultados = self.server.ejecutar(resolver_tarea, id_entrada, tipo, datos,
+                                                  solucionador.vectores_promedio, resolver_lote=resolver_lote)
+        except ValueError as e:
+            # Entrada que no se puede resolver (por ejemplo, menos de 3 recortes)
+            self.enviar_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.enviar_json(500, {"error": str(e)})
+            return
+        self.enviar_json(200, {"version_modelo": solucionador.version_modelo, "ecuaciones": resultados})
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP local para resolver ecuaciones manuscritas.")
+    parser.add_argument("--host", default="127.0.0.1", help="Direccion de escucha.")
+    parser.add_argument("--port", type=int, default=8080, help="Puerto de escucha.")
+    agregar_argumentos_modelo(parser)
+    parser.add_argument("--workers", type=int, default=None, help="Hilos de resolucion del pool (por defecto, numero de nucleos).")
+    parser.add_argument("--max-lote", type=int, default=1, help="Ecuaciones maximas por micro-lote (1 = sin micro-lotes).")
+    parser.add_argument("--max-espera-ms", type=float, default=5.0, help="Espera maxima para completar un micro-lote.")
+    agregar_argumentos_perfil(parser)
+    args = parser.parse_args()
+    activar_perfil(args, "solve_server")
+
+    solucionador = crear_recargador(args) if args.recargar_s > 0 else crear_solucionador(args)
+    activo = solucionador_actual(solucionador)
+
+    agrupador = None
+    if args.max_lote > 1:
+        agrupador = AgrupadorMicroLotes(activo.vectores_promedio, max_espera_ms=args.max_espera_ms, max_lote=args.max_lote,
+                                        clasificar_operadores=activo.clasificar_operadores)
+        print(f"\033[94m📦 Micro-lotes activos: hasta {args.max_lote} ecuaciones o {args.max_espera_ms} ms\033[0m")
+
+    servidor = ServidorInkSolver((args.host, args.port), solucionador, workers=args.workers, agrupador=agrupador)
+    print(f"\033[92m✅ Servidor escuchando en http://{args.host}:{args.port} ({servidor.workers} workers)\033[0m")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n\033[93m⏹ Deteniendo servidor...\033[0m")
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
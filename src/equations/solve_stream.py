@@ -0,0 +1,370 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: solve_stream.py
+Descripcion: Modo por lotes NDJSON: lee hojas o ecuaciones desde stdin y
+             escribe en stdout un resultado JSON por ecuacion resuelta.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: OpenCV (cv2), NumPy, Pandas, scipy
+===============================================================================
+Uso:
+    ls ../../data/equations/raw/*/*.png | python solve_stream.py
+    cat entradas.ndjson | python solve_stream.py --workers 4 > resultados.ndjson
+    ls ../../data/equations/raw/*/*.png | python solve_stream.py --perfil --perfil-muestreo-ms 2 > /dev/null
+    tail -f entradas.ndjson | python solve_stream.py --metricas-puerto 9108 >> resultados.ndjson
+===============================================================================
+Notas:
+- Cada linea de entrada puede ser:
+    - una ruta a una hoja completa (archivo de imagen),
+    - una ruta a una carpeta de ecuacion (con 0.png, 1.png y 2.png),
+    - un objeto JSON con "id" (opcional), "presupuesto_ms" (opcional) y una
+      de estas claves: "hoja" (ruta), "hoja_b64" (imagen en base64),
+      "recortes" (3 rutas) o "recortes_b64" (3 imagenes en base64).
+- El modelo se carga una sola vez al inicio desde el artefacto versionado
+  (--modelo, ver model_artifact.py), que incluye prototipos, reglas de
+  operadores y, si se construyeron, el indice k-NN (--knn) y los K
+  prototipos por digito (--kmeans). Sin artefacto se usan los CSV.
+- Cada resultado lleva la version del modelo en "Version_Modelo".
+- Con --recargar-s N el artefacto se revisa cada N segundos y, si cambia,
+  se recarga en segundo plano (ver model_reloader.py); cada entrada se
+  resuelve completa con el modelo activo al empezarla.
+- Las clasificaciones de recortes se memoizan por hash del recorte y
+  version del modelo (--cache-max entradas en memoria, --cache-disco para
+  un nivel persistente; ver crop_cache.py).
+- El nivel de clasificacion se elige segun el presupuesto de latencia (ver
+  solver_tiers.py) y se informa en la clave "Nivel" de cada resultado.
+- Cada resultado se escribe y se vacia (flush) apenas esta disponible; en
+  una hoja, cada fila se emite en cuanto se segmenta y clasifica.
+- Con --workers N las entradas se procesan en paralelo, pero los resultados
+  se emiten en el mismo orden de entrada.
+- Los mensajes de progreso y errores van a stderr; stdout solo lleva NDJSON.
+- Con --metricas-puerto N se sirve GET /metrics en formato Prometheus
+  mientras el proceso lee stdin (ver prometheus_metrics.py), util cuando
+  el stream es de larga duracion (por ejemplo, alimentado con tail -f).
+===============================================================================
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from classify_equations import (
+    UMBRAL_MARGEN,
+    caracteristicas_dir,
+    cargar_modelo_ecuaciones,
+    indice_knn_path,
+    modelo_path,
+    prototipos_csv,
+    prototipos_kmeans_csv,
+    resolver_ecuaciones,
+)
+from operands_kmeans_prototypes import cargar_prototipos_kmeans
+from operands_two_stage_classifier import cargar_indice_knn
+from crop_cache import CacheClasificaciones
+from extract_test_images import iterar_filas_ecuaciones
+from model_reloader import RecargadorModelo, solucionador_actual
+from profiling import activar_desde_argumentos as activar_perfil, agregar_argumentos as agregar_argumentos_perfil
+from prometheus_metrics import metricas, recolector_solucionador, servir_metricas
+from solver_tiers import SolucionadorPorNiveles
+
+def decodificar_imagen(datos, origen="imagen"):
+    """
+    Decodifica los bytes de una imagen (PNG, JPG, ...) a escala de grises.
+    Bytes vacios o que no son una imagen dan ValueError("imagen invalida ...")
+    en lugar del error interno de OpenCV.
+    """
+    try:
+        img = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_GRAYSCALE) if datos else None
+    except cv2.error:
+        img = None
+    if img is None:
+        raise ValueError(f"imagen invalida: no se pudo decodificar {origen}")
+    return img
+
+def decodificar_b64(texto):
+    """
+    Decodifica una imagen codificada en base64 a escala de grises.
+
+    Args:
+        texto (str): Imagen (PNG, JPG, ...) codificada en base64.
+
+    Returns:
+        numpy.ndarray: Imagen en escala de grises.
+    """
+    try:
+        datos = base64.b64decode(texto)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError("imagen invalida: base64 mal formado") from None
+    return decodificar_imagen(datos, "la imagen en base64")
+
+def leer_imagen(ruta):
+    """
+    Lee una imagen en escala de grises y falla si no existe o esta corrupta.
+    """
+    img = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"no se pudo leer la imagen: {ruta}")
+    return img
+
+def interpretar_registro(registro, id_defecto):
+    """
+    Convierte un registro JSON de entrada en una tarea de resolucion.
+
+    Args:
+        registro (dict): Objeto con "id" y "presupuesto_ms" (opcionales) y
+            una de las claves "hoja", "hoja_b64", "recortes" o "recortes_b64".
+        id_defecto (str): Id usado si el registro no trae uno.
+
+    Returns:
+        tuple: (id, tipo, datos, presupuesto_ms) donde tipo es "hoja" o
+        "recortes" y presupuesto_ms puede ser None.
+    """
+    id_entrada = str(registro.get("id", id_defecto))
+    presupuesto_ms = registro.get("presupuesto_ms")
+    if presupuesto_ms is not None:
+        presupuesto_ms = float(presupuesto_ms)
+    if "hoja" in registro:
+        return id_entrada, "hoja", leer_imagen(registro["hoja"]), presupuesto_ms
+    if "hoja_b64" in registro:
+        return id_entrada, "hoja", decodificar_b64(registro["hoja_b64"]), presupuesto_ms
+    for clave, leer in (("recortes", leer_imagen), ("recortes_b64", decodificar_b64)):
+        if clave in registro:
+            if len(registro[clave]) < 3:
+                raise ValueError("una ecuacion necesita 3 recortes")
+            return id_entrada, "recortes", [leer(r) for r in registro[clave]], presupuesto_ms
+    raise ValueError("se esperaba 'hoja', 'hoja_b64', 'recortes' o 'recortes_b64'")
+
+def interpretar_linea(linea, numero):
+    """
+    Convierte una linea de entrada (ruta u objeto JSON) en una tarea de
+    resolucion. El numero de linea se usa como id por defecto.
+    """
+    linea = linea.strip()
+    if linea.startswith("{"):
+        return interpretar_registro(json.loads(linea), numero)
+
+    if os.path.isdir(linea):
+        recortes = [leer_imagen(os.path.join(linea, f"{i}.png")) for i in range(3)]
+        return linea, "recortes", recortes, None
+    return linea, "hoja", leer_imagen(linea), None
+
+def iterar_tarea(id_entrada, tipo, datos, vectores_promedio, resolver_lote=None, envolver_filas=None):
+    """
+    Resuelve una tarea ya interpretada y genera un resultado por ecuacion.
+
+    Las hojas se procesan fila a fila: cada fila se segmenta y sus dos
+    ecuaciones se clasifican en un lote antes de pasar a la siguiente, de
+    modo que el primer resultado sale tras el trabajo de una sola fila.
+    resolver_lote permite sustituir la resolucion por lotes (por ejemplo,
+    por un AgrupadorMicroLotes); por defecto se usa resolver_ecuaciones.
+    envolver_filas(filas) permite segmentar en otro hilo (solve_server.py
+    avanza cada fila en su pool de workers).
+    """
+    if resolver_lote is None:
+        resolver_lote = lambda ecuaciones: resolver_ecuaciones(ecuaciones, vectores_promedio)
+
+    if tipo == "recortes":
+        if len(datos) < 3:
+            raise ValueError("una ecuacion necesita 3 recortes")
+        yield dict(Eq_ID=id_entrada, **resolver_lote([tuple(datos[:3])])[0])
+        return
+
+    filas = iterar_filas_ecuaciones(datos)
+    if envolver_filas is not None:
+        filas = envolver_filas(filas)
+    n = 0
+    for fila in filas:
+        for sol in resolver_lote([tuple(recortes[:3]) for recortes in fila]):
+            yield dict(Eq_ID=f"{id_entrada}_eq_{n}", **sol)
+            n += 1
+    metricas.hojas.inc()
+
+def resolver_tarea(id_entrada, tipo, datos, vectores_promedio, resolver_lote=None):
+    """
+    Resuelve una tarea completa y devuelve la lista de resultados.
+    """
+    return list(iterar_tarea(id_entrada, tipo, datos, vectores_promedio, resolver_lote))
+
+def iterar_entrada(linea, numero, solucionador, presupuesto_defecto=None):
+    """
+    Resuelve una linea de entrada y genera sus resultados JSON (uno por
+    ecuacion) a medida que estan listos. Un error se emite como un registro
+    con "error" y termina la entrada. solucionador puede ser un
+    RecargadorModelo: la entrada se resuelve con el modelo activo al empezar.
+    """
+    solucionador = solucionador_actual(solucionador)
+    id_entrada = str(numero)
+    try:
+        id_entrada, tipo, datos, presupuesto_ms = interpretar_linea(linea, numero)
+        if presupuesto_ms is None:
+            presupuesto_ms = presupuesto_defecto
+        yield from iterar_tarea(id_entrada, tipo, datos, solucionador.vectores_promedio,
+                                resolver_lote=solucionador.resolver_lote(presupuesto_ms))
+    except Exception as e:
+        metricas.entradas.inc(1, "error")
+        yield {"Eq_ID": id_entrada, "error": str(e)}
+        return
+    metricas.entradas.inc(1, "ok")
+
+def resolver_entrada(linea, numero, solucionador, presupuesto_defecto=None):
+    """
+    Resuelve una linea de entrada y devuelve la lista completa de resultados.
+    """
+    return list(iterar_entrada(linea, numero, solucionador, presupuesto_defecto))
+
+def escribir_resultados(resultados, salida):
+    """
+    Escribe los resultados como NDJSON y vacia el buffer de inmediato.
+    """
+    for resultado in resultados:
+        salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    salida.flush()
+
+def lineas_validas(entrada):
+    """
+    Itera las lineas no vacias de la entrada junto con su numero.
+    """
+    for numero, linea in enumerate(entrada):
+        if linea.strip():
+            yield numero, linea
+
+def procesar_stream(entrada, salida, solucionador, workers=1, presupuesto_ms=None):
+    """
+    Procesa la entrada linea a linea y escribe los resultados en orden.
+
+    Con workers > 1 se mantiene una ventana acotada de tareas en vuelo
+    (2 por worker), de modo que la memoria no crece con la entrada y los
+    resultados salen en el orden de las lineas.
+
+    Returns:
+        int: Numero de entradas procesadas.
+    """
+    total = 0
+    if workers <= 1:
+        for numero, linea in lineas_validas(entrada):
+            for resultado in iterar_entrada(linea, numero, solucionador, presupuesto_ms):
+                escribir_resultados([resultado], salida)
+            total += 1
+        return total
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pendientes = deque()
+        for numero, linea in lineas_validas(entrada):
+            pendientes.append(pool.submit(resolver_entrada, linea, numero, solucionador, presupuesto_ms))
+            if len(pendientes) >= 2 * workers:
+                escribir_resultados(pendientes.popleft().result(), salida)
+                total += 1
+        while pendientes:
+            escribir_resultados(pendientes.popleft().result(), salida)
+            total += 1
+    return total
+
+def crear_cache(args):
+    """
+    Crea la cache de clasificaciones de recortes (None si --cache-max es 0).
+    """
+    if args.cache_max <= 0:
+        return None
+    return CacheClasificaciones(capacidad=args.cache_max, ruta_disco=args.cache_disco)
+
+def crear_solucionador(args, modelo=None, cache=None):
+    """
+    Carga el modelo una sola vez (o usa el ya cargado) y construye el
+    solucionador por niveles a partir de los argumentos comunes de linea de
+    comandos. Sin cache explicita se crea una con crear_cache.
+    """
+    if cache is None:
+        cache = crear_cache(args)
+    if modelo is None:
+        print(f"🔎 Cargando modelo desde {args.modelo or args.prototipos}...", file=sys.stderr)
+        modelo = cargar_modelo_ecuaciones(args.modelo, args.prototipos)
+    print(f"🏷 Version del modelo: {modelo.version}", file=sys.stderr)
+
+    # El indice y los prototipos de k-means salen del artefacto si los incluye
+    indice_knn = None
+    if args.knn and not modelo.tiene_indice:
+        print(f"🔎 Cargando indice k-NN desde {args.indice_knn}...", file=sys.stderr)
+        indice_knn = cargar_indice_knn(args.indice_knn, args.caracteristicas, metrica=args.metrica)
+    prototipos_kmeans = None
+    if args.kmeans and modelo.prototipos_kmeans is None:
+        print(f"🔎 Cargando prototipos k-means desde {args.prototipos_kmeans}...", file=sys.stderr)
+        prototipos_kmeans = cargar_prototipos_kmeans(args.prototipos_kmeans)
+    return SolucionadorPorNiveles.desde_modelo(
+        modelo, knn=args.knn, kmeans=args.kmeans, k=args.k, umbral_margen=args.umbral_margen,
+        metrica=args.metrica, indice_knn=indice_knn, prototipos_kmeans=prototipos_kmeans, cache=cache)
+
+def crear_recargador(args):
+    """
+    Construye un RecargadorModelo que vigila el artefacto (--modelo) cada
+    --recargar-s segundos y crea el solucionador de cada version nueva con
+    los mismos argumentos y la misma cache de recortes.
+    """
+    if not args.modelo or not os.path.exists(args.modelo):
+        raise SystemExit(f"🚫 --recargar-s requiere un artefacto de modelo existente (--modelo {args.modelo!r})")
+    print(f"🔄 Recarga del modelo activa: {args.modelo} cada {args.recargar_s} s", file=sys.stderr)
+    cache = crear_cache(args)
+    return RecargadorModelo(args.modelo, lambda modelo: crear_solucionador(args, modelo, cache), intervalo_s=args.recargar_s)
+
+def agregar_argumentos_modelo(parser):
+    """
+    Agrega los argumentos de carga de modelo y niveles compartidos por los
+    puntos de entrada del solucionador.
+    """
+    parser.add_argument("--modelo", default=modelo_path, help="Artefacto del modelo (model_artifact.py); vacio para usar los CSV.")
+    parser.add_argument("--prototipos", default=prototipos_csv, help="CSV de vectores promedio por digito (si no hay artefacto).")
+    parser.add_argument("--knn", action="store_true", help="Activa los niveles dos_etapas y knn sobre las caracteristicas de entrenamiento.")
+    parser.add_argument("--indice-knn", default=indice_knn_path, help="Carpeta del KD-tree persistente (se construye si no existe).")
+    parser.add_argument("--caracteristicas", default=caracteristicas_dir, help="Carpeta con los CSV digito_N.csv.")
+    parser.add_argument("--k", type=int, default=5, help="Vecinos de los niveles con k-NN.")
+    parser.add_argument("--metrica", default="euclidean", choices=["euclidean", "manhattan", "chebyshev"], help="Metrica de los niveles con k-NN.")
+    parser.add_argument("--kmeans", action="store_true", help="Activa el nivel multi_prototipo (K prototipos por digito).")
+    parser.add_argument("--prototipos-kmeans", default=prototipos_kmeans_csv, help="CSV de prototipos de operands_kmeans_prototypes.py.")
+    parser.add_argument("--umbral-margen", type=float, default=UMBRAL_MARGEN, help="Margen minimo para aceptar el prototipo en dos_etapas.")
+    parser.add_argument("--cache-max", type=int, default=4096, help="Clasificaciones de recortes en la cache en memoria (0 = sin cache).")
+    parser.add_argument("--cache-disco", default=None, help="Archivo SQLite para el nivel en disco de la cache de recortes.")
+    parser.add_argument("--recargar-s", type=float, default=0, help="Segundos entre revisiones del artefacto para recargarlo en caliente (0 = sin recarga).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Resuelve ecuaciones manuscritas en modo NDJSON (stdin -> stdout).")
+    agregar_argumentos_modelo(parser)
+    parser.add_argument("--workers", type=int, default=1, help="Numero de hilos de trabajo (mantiene el orden).")
+    parser.add_argument("--presupuesto-ms", type=float, default=None, help="Presupuesto de latencia por defecto de cada entrada.")
+    parser.add_argument("--metricas-puerto", type=int, default=0, help="Puerto para servir GET /metrics (Prometheus) mientras dura el stream (0 = sin metricas).")
+    parser.add_argument("--metricas-host", default="127.0.0.1", help="Interfaz del servidor de metricas.")
+    agregar_argumentos_perfil(parser)
+    args = parser.parse_args()
+    activar_perfil(args, "solve_stream")
+
+    solucionador = crear_recargador(args) if args.recargar_s > 0 else crear_solucionador(args)
+    if args.metricas_puerto:
+        metricas.observar_etapas()
+        metricas.recolector(recolector_solucionador(solucionador))
+        servir_metricas(args.metricas_puerto, args.metricas_host)
+        print(f"📈 Metricas en http://{args.metricas_host}:{args.metricas_puerto}/metrics", file=sys.stderr)
+
+    total = procesar_stream(sys.stdin, sys.stdout, solucionador, workers=args.workers, presupuesto_ms=args.presupuesto_ms)
+    print(f"✅ Entradas procesadas: {total}", file=sys.stderr)
+    activo = solucionador_actual(solucionador)
+    print(f"⏱ Latencias por nivel: {json.dumps(activo.metricas())}", file=sys.stderr)
+    if activo.cache is not None:
+        print(f"🗃 Cache de recortes: {json.dumps(activo.cache.metricas())}", file=sys.stderr)
+    if isinstance(solucionador, RecargadorModelo):
+        print(f"🔄 Recarga del modelo: {json.dumps(solucionador.metricas())}", file=sys.stderr)
+        solucionador.detener()
+
+if __name__ == "__main__":
+    main()
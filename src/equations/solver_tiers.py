@@ -0,0 +1,269 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: solver_tiers.py
+Descripcion: Resolucion con presupuesto de latencia: elige entre niveles de
+             clasificacion (prototipos, dos etapas o k-NN) segun el tiempo
+             disponible y registra la latencia observada de cada nivel.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: NumPy
+===============================================================================
+Uso:
+    solucionador = SolucionadorPorNiveles.desde_modelo(cargar_modelo("classify_digits/modelo.npz"), knn=True)
+    resultados = solucionador.resolver(ecuaciones, presupuesto_ms=5)
+    print(solucionador.metricas())
+===============================================================================
+Notas:
+- Niveles, de menos a mas preciso (exactitud sobre las 538 ecuaciones de
+  data/equations/processed):
+    - "prototipo" (26.6%): clasificar_operando (prototipo mas cercano) y
+      reglas de picos para el operador.
+    - "multi_prototipo" (54.3%): el mas cercano de los K prototipos por
+      digito de k-means (ver operands_kmeans_prototypes.py).
+    - "knn" (55.6%): k vecinos mas cercanos sobre todas las caracteristicas
+      de entrenamiento.
+    - "dos_etapas" (66.4%): prototipo mas cercano solo si su margen supera
+      el umbral; si no, k-NN (ver operands_two_stage_classifier.py).
+  Los niveles "dos_etapas" y "knn" solo existen si se cargo el indice k-NN y
+  "multi_prototipo" solo si se cargaron los prototipos de k-means; todos
+  usan las mismas reglas de picos para el operador.
+- Sin presupuesto se usa el nivel mas preciso disponible. Con presupuesto se
+  usa el nivel mas preciso cuya latencia estimada (percentil 90 observado por
+  ecuacion x numero de ecuaciones) cabe en el presupuesto; si ninguno cabe,
+  el mas barato.
+- El presupuesto se aplica a cada lote de clasificacion: una ecuacion de
+  tres recortes o una fila de una hoja.
+- Cada resultado indica en "Nivel" el nivel que realmente se ejecuto y en
+  "Version_Modelo" la version del artefacto del modelo (model_artifact.py).
+- Con una CacheClasificaciones (crop_cache.py) cada recorte se clasifica una
+  sola vez por nivel y version del modelo; la cache se comparte entre los
+  solucionadores de versiones sucesivas y se invalida sola al cambiar.
+- Cada lote resuelto se cuenta en las metricas de prometheus_metrics.py
+  (ecuaciones por nivel, latencia y tamano de lote, clases predichas).
+===============================================================================
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from classify_equations import (
+    UMBRAL_MARGEN,
+    clasificar_operandos_dos_etapas,
+    clasificar_operandos_knn,
+    clasificar_operadores_lote,
+    clasificar_operandos_lote,
+    clasificar_operandos_multi_prototipo,
+    clasificador_operadores_modelo,
+    resolver_ecuaciones,
+)
+from prometheus_metrics import metricas
+
+# Numero de muestras de latencia recientes que se conservan por nivel
+VENTANA_LATENCIAS = 2048
+
+class LatenciasNivel:
+    """
+    Ventana acotada de latencias por ecuacion (ms) de un nivel.
+    """
+
+    def __init__(self, ventana=VENTANA_LATENCIAS):
+        self.muestras = deque(maxlen=ventana)
+        self.solicitudes = 0
+        self.ecuaciones = 0
+
+    def registrar(self, duracion_ms, n_ecuaciones):
+        self.solicitudes += 1
+        self.ecuaciones += n_ecuaciones
+        self.muestras.append(duracion_ms / max(n_ecuaciones, 1))
+
+    def sembrar(self, duracion_ms, n_ecuaciones):
+        """
+        Agrega una latencia a la ventana sin contarla como solicitud (primera
+        estimacion tras calentar).
+        """
+        self.muestras.append(duracion_ms / max(n_ecuaciones, 1))
+
+    def percentil(self, q):
+        if not self.muestras:
+            return None
+        return float(np.percentile(np.fromiter(self.muestras, dtype=float), q))
+
+    def resumen(self):
+        resumen = {"solicitudes": self.solicitudes, "ecuaciones": self.ecuaciones}
+        for q in (50, 90, 99):
+            resumen[f"p{q}_ms"] = self.percentil(q)
+        resumen["max_ms"] = max(self.muestras) if self.muestras else None
+        return resumen
+
+class SolucionadorPorNiveles:
+    """
+    Resuelve ecuaciones eligiendo el nivel de clasificacion segun un
+    presupuesto de latencia opcional.
+
+    Args:
+        vectores_promedio (dict): Prototipos por digito.
+        indice_knn (IndiceKDTree, opcional): Indice de cargar_indice_knn; activa
+            los niveles "dos_etapas" y "knn".
+        k (int): Vecinos de los niveles con k-NN.
+        umbral_margen (float): Umbral de margen del nivel "dos_etapas".
+        prototipos_kmeans (tuple, opcional): (digitos, matriz) de
+            cargar_prototipos_kmeans; activa el nivel "multi_prototipo".
+        clasificar_operadores (callable, opcional): Clasificador de operadores
+            de todos los niveles (por defecto, las reglas de picos base).
+        version_modelo (str, opcional): Version que se anota en cada resultado.
+        cache (CacheClasificaciones, opcional): Cache de clasificaciones de
+            recortes (ver crop_cache.py).
+    """
+
+    def __init__(self, vectores_promedio, indice_knn=None, k=5, umbral_margen=UMBRAL_MARGEN,
+                 prototipos_kmeans=None, clasificar_operadores=None, version_modelo=None, cache=None):
+        self.vectores_promedio = vectores_promedio
+        self.version_modelo = version_modelo
+        self.cache = cache
+        self.niveles = {"prototipo": lambda imgs: clasificar_operandos_lote(imgs, vectores_promedio)}
+        # Tipo de cada nivel en la cache: incluye los parametros que no forman parte de la version
+        tipos = {"prototipo": "operando_prototipo"}
+        if prototipos_kmeans is not None:
+            self.niveles["multi_prototipo"] = lambda imgs: clasificar_operandos_multi_prototipo(imgs, *prototipos_kmeans)
+            tipos["multi_prototipo"] = f"operando_multi_prototipo_{len(prototipos_kmeans[0])}"
+        if indice_knn is not None:
+            self.niveles["knn"] = lambda imgs: clasificar_operandos_knn(imgs, indice_knn, k=k)
+            self.niveles["dos_etapas"] = lambda imgs: clasificar_operandos_dos_etapas(
+                imgs, indice_knn, umbral_margen=umbral_margen, k=k)
+            tipos["knn"] = f"operando_knn_{k}_{indice_knn.metrica}"
+            tipos["dos_etapas"] = f"operando_dos_etapas_{k}_{indice_knn.metrica}_{umbral_margen}"
+        self.clasificar_operadores = clasificar_operadores
+        # Sin cache, para calentar sin llenarla ni alterar sus contadores
+        self._niveles_directos = dict(self.niveles)
+        self._operadores_directo = clasificar_operadores
+        if cache is not None:
+            self.niveles = {nivel: cache.envolver_lote(tipos[nivel], version_modelo, funcion)
+                            for nivel, funcion in self.niveles.items()}
+            self.clasificar_operadores = cache.envolver_lote(
+                "operador", version_modelo, clasificar_operadores or clasificar_operadores_lote)
+        self.latencias = {nivel: LatenciasNivel() for nivel in self.niveles}
+        self._bloqueo = threading.Lock()
+        self.calentar()
+
+    @classmethod
+    def desde_modelo(cls, modelo, knn=False, kmeans=False, k=5, umbral_margen=UMBRAL_MARGEN,
+                     metrica="euclidean", indice_knn=None, prototipos_kmeans=None, cache=None):
+        """
+        Construye el solucionador a partir de un ModeloInkSolver. El indice
+        y los prototipos de k-means salen del artefacto salvo que se pasen
+        explicitamente (por ejemplo, si el artefacto no los incluye).
+        """
+        if knn and indice_knn is None:
+            indice_knn = modelo.indice_knn(metrica)
+        if kmeans and prototipos_kmeans is None:
+            prototipos_kmeans = modelo.prototipos_kmeans
+        return cls(
+            modelo.vectores_promedio,
+            indice_knn if knn else None,
+            k=k,
+            umbral_margen=umbral_margen,
+            prototipos_kmeans=prototipos_kmeans if kmeans else None,
+            clasificar_operadores=clasificador_operadores_modelo(modelo),
+            version_modelo=modelo.version,
+            cache=cache,
+        )
+
+    def calentar(self):
+        """
+        Ejecuta cada nivel sobre una ecuacion sintetica (un "+" dibujado en
+        los tres recortes) para tener una primera estimacion de latencia
+        antes de atender presupuestos reales. La primera ejecucion (en frio)
+        se descarta y la segunda solo siembra la ventana de latencias: no
+        cuenta en las solicitudes, la cache ni las metricas.
+        """
+        recorte = np.full((45, 45), 255, dtype=np.uint8)
+        recorte[20:25, 8:37] = 0
+        recorte[8:37, 20:25] = 0
+        ecuaciones = [(recorte, recorte, recorte)]
+        for nivel, funcion in self._niveles_directos.items():
+            for _ in range(2):
+                inicio = time.perf_counter()
+                resolver_ecuaciones(ecuaciones, self.vectores_promedio, funcion, self._operadores_directo)
+                duracion_ms = (time.perf_counter() - inicio) * 1000.0
+            self.latencias[nivel].sembrar(duracion_ms, len(ecuaciones))
+
+    def estimar_ms(self, nivel, n_ecuaciones):
+        """
+        Latencia estimada de un nivel para n ecuaciones (p90 por ecuacion).
+        """
+        with self._bloqueo:
+            p90 = self.latencias[nivel].percentil(90)
+        return None if p90 is None else p90 * n_ecuaciones
+
+    def elegir_nivel(self, n_ecuaciones, presupuesto_ms=None):
+        """
+        Devuelve el nivel mas preciso que cabe en el presupuesto.
+        """
+        niveles = list(self.niveles)
+        if presupuesto_ms is None:
+            return niveles[-1]
+        for nivel in reversed(niveles[1:]):
+            estimado = self.estimar_ms(nivel, n_ecuaciones)
+            if estimado is not None and estimado <= presupuesto_ms:
+                return nivel
+        return niveles[0]
+
+    def resolver(self, ecuaciones, presupuesto_ms=None, nivel=None, resolver_rapido=None, ejecutar=None):
+        """
+        Resuelve un lote de ecuaciones en el nivel elegido y anota el nivel.
+
+        Args:
+            ecuaciones (list): Tuplas (op1_img, oper_img, op2_img).
+            presupuesto_ms (float, opcional): Presupuesto de latencia del lote.
+            nivel (str, opcional): Fuerza un nivel concreto.
+            resolver_rapido (callable, opcional): Resolver de lotes para el
+                nivel "prototipo" (por ejemplo, un AgrupadorMicroLotes).
+            ejecutar (callable, opcional): ejecutar(funcion, *args) para la
+                resolucion directa (por ejemplo, en el pool de workers de
+                solve_server.py); por defecto se llama en este hilo.
+
+        Returns:
+            list: Resultados de resolver_ecuaciones con las claves "Nivel" y
+            "Version_Modelo".
+        """
+        if not ecuaciones:
+            return []
+        nivel = nivel or self.elegir_nivel(len(ecuaciones), presupuesto_ms)
+
+        inicio = time.perf_counter()
+        if nivel == "prototipo" and resolver_rapido is not None:
+            resultados = resolver_rapido(ecuaciones)
+        else:
+            ejecutar = ejecutar or (lambda funcion, *args: funcion(*args))
+            resultados = ejecutar(resolver_ecuaciones, ecuaciones, self.vectores_promedio, self.niveles[nivel],
+                                  self.clasificar_operadores)
+        duracion_ms = (time.perf_counter() - inicio) * 1000.0
+
+        with self._bloqueo:
+            self.latencias[nivel].registrar(duracion_ms, len(ecuaciones))
+        metricas.registrar_resultados(nivel, resultados, duracion_ms / 1000.0)
+        return [dict(resultado, Nivel=nivel, Version_Modelo=self.version_modelo) for resultado in resultados]
+
+    def resolver_lote(self, presupuesto_ms=None, resolver_rapido=None, ejecutar=None):
+        """
+        Devuelve un resolver de lotes (ecuaciones -> resultados) con el
+        presupuesto fijado, apto para solve_stream.iterar_tarea.
+        """
+        return lambda ecuaciones: self.resolver(ecuaciones, presupuesto_ms, resolver_rapido=resolver_rapido,
+                                                ejecutar=ejecutar)
+
+    def metricas(self):
+        """
+        Distribucion de latencias por ecuacion y conteos de cada nivel.
+        """
+        with self._bloqueo:
+            return {nivel: latencias.resumen() for nivel, latencias in self.latencias.items()}
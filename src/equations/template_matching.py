@@ -0,0 +1,301 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: template_matching.py
+Descripcion: Clasificador por plantillas de pixeles: una plantilla binaria
+             promedio de 45x45 por clase (digitos y operadores) y
+             clasificacion de un lote con una sola multiplicacion de matrices.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: OpenCV (cv2), NumPy
+===============================================================================
+Uso:
+Construir las plantillas y compararlas con los clasificadores actuales:
+    python template_matching.py construir
+    python template_matching.py evaluar --modo correlacion
+===============================================================================
+Notas:
+- Cada recorte se normaliza igual que las imagenes de Kaggle: se recorta a
+  la caja de su tinta (pixeles < 128), se escala para que su lado mayor
+  mida 45 px conservando la proporcion y se centra en un lienzo de 45x45.
+  El vector de la imagen es su mascara de tinta aplanada (2025 valores 0/1).
+- La construccion recorre una sola vez las carpetas de entrenamiento
+  (data/operands/raw/dataset y data/operators/raw/dataset) en bloques,
+  acumulando por clase la suma de mascaras y el conteo; la plantilla es la
+  suma dividida por el conteo (probabilidad de tinta por pixel).
+- Las plantillas se guardan en 'classify_digits/plantillas_45x45.npz'.
+- Clasificar un lote es una sola llamada BLAS: X (N, 2025) @ T.T (2025, C).
+    - "correlacion": X y T centradas y normalizadas; gana la mayor
+      correlacion normalizada.
+    - "distancia": ||x - t||^2 = ||x||^2 - 2 x.t + ||t||^2; gana la menor.
+- 'evaluar' compara contra clasificar_operando (cuadrantes) y
+  clasificar_operador (picos) sobre los recortes de test y las ecuaciones
+  procesadas, y guarda el resumen en 'template_report/resumen.txt'.
+===============================================================================
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Rutas de los datos de entrenamiento y prueba
+operandos_dataset = "../../data/operands/raw/dataset/"
+operadores_dataset = "../../data/operators/raw/dataset/"
+operandos_test = "../../data/operands/processed/test/"
+operadores_test = "../../data/operators/processed/test/"
+ecuaciones_folder = "../../data/equations/processed/"
+plantillas_path = "classify_digits/plantillas_45x45.npz"
+
+LADO = 45
+MODOS = ("correlacion", "distancia")
+CLASES_OPERADORES = ["div", "equals", "sub", "sum", "times"]
+
+def normalizar_recorte(img, lado=LADO):
+    """
+    Recorta la tinta, la escala a lado px en su dimension mayor y la centra
+    en un lienzo lado x lado. Devuelve la mascara de tinta (uint8 0/1).
+    """
+    tinta = img < 128
+    filas = np.flatnonzero(tinta.any(axis=1))
+    columnas = np.flatnonzero(tinta.any(axis=0))
+    lienzo = np.zeros((lado, lado), dtype=np.uint8)
+    if len(filas) == 0:
+        return lienzo
+
+    caja = tinta[filas[0]:filas[-1] + 1, columnas[0]:columnas[-1] + 1].astype(np.uint8) * 255
+    h, w = caja.shape
+    escala = lado / max(h, w)
+    nuevo_h, nuevo_w = max(1, round(h * escala)), max(1, round(w * escala))
+    if (nuevo_h, nuevo_w) != (h, w):
+        caja = cv2.resize(caja, (nuevo_w, nuevo_h), interpolation=cv2.INTER_AREA)
+    y, x = (lado - nuevo_h) // 2, (lado - nuevo_w) // 2
+    lienzo[y:y + nuevo_h, x:x + nuevo_w] = caja >= 128
+    return lienzo
+
+def matriz_recortes(imgs):
+    """
+    Apila los recortes normalizados en una matriz float32 (N, 2025).
+    """
+    if len(imgs) == 0:
+        return np.empty((0, LADO * LADO), dtype=np.float32)
+    return np.stack([normalizar_recorte(img).ravel() for img in imgs]).astype(np.float32)
+
+def construir_plantillas_clases(base_path, clases, bloque=1024):
+    """
+    Una pasada sobre base_path/<clase>/*: acumula la suma de mascaras y el
+    conteo por clase, procesando las imagenes en bloques de tamano fijo.
+
+    Retorna:
+    - (plantillas (C, 2025) float32, conteos (C,) int64)
+    """
+    sumas = np.zeros((len(clases), LADO * LADO), dtype=np.float64)
+    conteos = np.zeros(len(clases), dtype=np.int64)
+    for c, clase in enumerate(clases):
+        carpeta = os.path.join(base_path, clase)
+        if not os.path.isdir(carpeta):
+            print(f"\033[93m⚠️ Carpeta no encontrada: {carpeta}\033[0m")
+            continue
+        archivos = sorted(os.listdir(carpeta))
+        for inicio in range(0, len(archivos), bloque):
+            imgs = [cv2.imread(os.path.join(carpeta, nombre), cv2.IMREAD_GRAYSCALE)
+                    for nombre in archivos[inicio:inicio + bloque]]
+            imgs = [img for img in imgs if img is not None]
+            sumas[c] += matriz_recortes(imgs).sum(axis=0)
+            conteos[c] += len(imgs)
+        print(f"\033[92m✔ Clase {clase}: {conteos[c]} imagenes\033[0m")
+    plantillas = sumas / np.maximum(conteos, 1)[:, None]
+    return plantillas.astype(np.float32), conteos
+
+def construir_plantillas(salida=plantillas_path):
+    """
+    Construye las plantillas de digitos y operadores y las guarda en .npz.
+    """
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    inicio = time.perf_counter()
+
+    print("\033[94m🧩 Construyendo plantillas de digitos...\033[0m")
+    digitos = [str(d) for d in range(10)]
+    plantillas_operandos, conteos_operandos = construir_plantillas_clases(operandos_dataset, digitos)
+
+    print("\033[94m🧩 Construyendo plantillas de operadores...\033[0m")
+    plantillas_operadores, conteos_operadores = construir_plantillas_clases(operadores_dataset, CLASES_OPERADORES)
+
+    np.savez(
+        salida,
+        operandos=plantillas_operandos,
+        clases_operandos=np.arange(10),
+        conteos_operandos=conteos_operandos,
+        operadores=plantillas_operadores,
+        clases_operadores=np.array(CLASES_OPERADORES),
+        conteos_operadores=conteos_operadores,
+    )
+    total = conteos_operandos.sum() + conteos_operadores.sum()
+    print(f"\033[92m💾 Plantillas guardadas en {salida} ({total} imagenes en "
+          f"{time.perf_counter() - inicio:.1f} s)\033[0m")
+
+class ClasificadorPlantillas:
+    """
+    Clasificador por plantillas de una familia de clases (digitos u
+    operadores). Las plantillas se preparan una vez segun el modo para que
+    cada lote sea una sola multiplicacion de matrices.
+
+    Args:
+        plantillas (numpy.ndarray): Matriz (C, 2025) de plantillas.
+        clases (list): Etiqueta de cada fila.
+        modo (str): "correlacion" o "distancia".
+    """
+
+    def __init__(self, plantillas, clases, modo="correlacion"):
+        if modo not in MODOS:
+            raise ValueError(f"modo desconocido: {modo} (use {', '.join(MODOS)})")
+        self.clases = list(clases)
+        self.modo = modo
+        plantillas = np.asarray(plantillas, dtype=np.float32)
+        if modo == "correlacion":
+            # Una plantilla constante (norma 0) queda en ceros en lugar de NaN
+            centradas = plantillas - plantillas.mean(axis=1, keepdims=True)
+            self.matriz = centradas / np.maximum(np.linalg.norm(centradas, axis=1, keepdims=True), 1e-6)
+        else:
+            self.matriz = plantillas
+            self.normas = (plantillas ** 2).sum(axis=1)
+
+    def puntuar(self, x):
+        """
+        Puntuacion (N, C) de cada vector contra cada plantilla; mayor es mejor.
+        """
+        if self.modo == "correlacion":
+            x = x - x.mean(axis=1, keepdims=True)
+            x /= np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-6)
+            return x @ self.matriz.T
+        # ||x||^2 es constante por fila y no cambia el argmax
+        return 2.0 * (x @ self.matriz.T) - self.normas[None, :]
+
+    def clasificar(self, imgs):
+        """
+        Clasifica un lote de recortes en escala de grises.
+        """
+        if len(imgs) == 0:
+            return []
+        indices = np.argmax(self.puntuar(matriz_recortes(imgs)), axis=1)
+        return [self.clases[i] for i in indices]
+
+def cargar_plantillas(ruta=plantillas_path, modo="correlacion"):
+    """
+    Carga las plantillas y devuelve (clasificador de operandos,
+    clasificador de operadores).
+    """
+    with np.load(ruta) as datos:
+        clasificadores = []
+        for familia, tipo in (("operandos", int), ("operadores", str)):
+            # Las clases sin imagenes (plantilla en ceros) no se consideran
+            con_datos = datos[f"conteos_{familia}"] > 0
+            for clase in datos[f"clases_{familia}"][~con_datos]:
+                print(f"\033[93m⚠️ Clase {clase} sin imagenes en {ruta}, se omite.\033[0m")
+            clasificadores.append(ClasificadorPlantillas(datos[familia][con_datos],
+                                                         [tipo(c) for c in datos[f"clases_{familia}"][con_datos]], modo))
+    return tuple(clasificadores)
+
+def cargar_carpeta_test(base_path):
+    """
+    Lee base_path/<clase>/* y devuelve (imagenes, etiquetas).
+    """
+    imgs, etiquetas = [], []
+    for clase in sorted(os.listdir(base_path)):
+        carpeta = os.path.join(base_path, clase)
+        for nombre in sorted(os.listdir(carpeta)):
+            img = cv2.imread(os.path.join(carpeta, nombre), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                imgs.append(img)
+                etiquetas.append(clase)
+    return imgs, etiquetas
+
+def cargar_ecuaciones(base_path=ecuaciones_folder):
+    """
+    Lee las ecuaciones procesadas y devuelve (ecuaciones, resultados reales).
+    """
+    ecuaciones, reales = [], []
+    for resultado in sorted(os.listdir(base_path)):
+        for img_folder in sorted(os.listdir(os.path.join(base_path, resultado))):
+            ruta_img = os.path.join(base_path, resultado, img_folder)
+            for eq in sorted(os.listdir(ruta_img)):
+                ruta_eq = os.path.join(ruta_img, eq)
+                ecuaciones.append(tuple(cv2.imread(os.path.join(ruta_eq, f"{i}.png"), cv2.IMREAD_GRAYSCALE)
+                                        for i in range(3)))
+                reales.append(int(resultado))
+    return ecuaciones, reales
+
+def medir(funcion, imgs):
+    """
+    Ejecuta funcion(imgs) y devuelve (predicciones, imagenes por segundo).
+    """
+    inicio = time.perf_counter()
+    predicciones = funcion(imgs)
+    duracion = time.perf_counter() - inicio
+    return predicciones, len(imgs) / duracion if duracion > 0 else 0.0
+
+def evaluar(modo="correlacion", salida="template_report/resumen.txt"):
+    """
+    Compara las plantillas con los clasificadores de cuadrantes y de picos
+    en los recortes de test y en las ecuaciones procesadas.
+    """
+    from classify_equations import (
+        cargar_modelo_ecuaciones,
+        clasificador_operadores_modelo,
+        clasificar_operandos_lote,
+        resolver_ecuaciones,
+    )
+
+    operandos, operadores = cargar_plantillas(modo=modo)
+    modelo = cargar_modelo_ecuaciones()
+    vectores_promedio = modelo.vectores_promedio
+    clasificar_picos = clasificador_operadores_modelo(modelo)
+    lineas = [f"Modo: {modo}", f"Version del modelo: {modelo.version}"]
+
+    imgs, etiquetas = cargar_carpeta_test(operandos_test)
+    reales = np.array([int(e) for e in etiquetas])
+    for nombre, funcion in (("plantillas", operandos.clasificar),
+                            ("cuadrantes", lambda x: clasificar_operandos_lote(x, vectores_promedio))):
+        predicciones, velocidad = medir(funcion, imgs)
+        lineas.append(f"Operandos de test ({nombre}): precision {np.mean(np.array(predicciones) == reales):.4f}, "
+                      f"{velocidad:.0f} imagenes/s")
+
+    imgs, etiquetas = cargar_carpeta_test(operadores_test)
+    for nombre, funcion in (("plantillas", operadores.clasificar), ("picos", clasificar_picos)):
+        predicciones, velocidad = medir(funcion, imgs)
+        lineas.append(f"Operadores de test ({nombre}): precision "
+                      f"{np.mean([p == e for p, e in zip(predicciones, etiquetas)]):.4f}, {velocidad:.0f} imagenes/s")
+
+    ecuaciones, resultados_reales = cargar_ecuaciones()
+    for nombre, kwargs in (
+        ("plantillas", {"clasificar_operandos": operandos.clasificar, "clasificar_operadores": operadores.clasificar}),
+        ("plantillas + picos", {"clasificar_operandos": operandos.clasificar, "clasificar_operadores": clasificar_picos}),
+        ("cuadrantes + picos", {"clasificar_operadores": clasificar_picos}),
+    ):
+        resultados, velocidad = medir(lambda ecs: resolver_ecuaciones(ecs, vectores_promedio, **kwargs), ecuaciones)
+        exactitud = np.mean([r["Resultado_Calculado"] == real for r, real in zip(resultados, resultados_reales)])
+        lineas.append(f"Ecuaciones ({nombre}): exactitud {exactitud:.4f}, {velocidad:.0f} ecuaciones/s")
+
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        f.write("\n".join(lineas) + "\n")
+    print("\n".join(lineas))
+    print(f"\033[92m💾 Resumen guardado en: {salida}\033[0m")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clasificador por plantillas de pixeles 45x45.")
+    parser.add_argument("accion", choices=["construir", "evaluar"], help="Construir las plantillas o evaluarlas.")
+    parser.add_argument("--modo", choices=MODOS, default="correlacion", help="Puntuacion de las plantillas.")
+    args = parser.parse_args()
+
+    if args.accion == "construir":
+        construir_plantillas()
+    else:
+        evaluar(modo=args.modo)
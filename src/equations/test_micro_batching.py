@@ -0,0 +1,93 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: test_micro_batching.py
+Descripcion: Pruebas del agrupador de micro-lotes: las ecuaciones de
+             llamadores concurrentes con el mismo modelo llegan juntas al
+             resolver de lotes.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: pytest (opcional), NumPy
+===============================================================================
+Uso:
+    python -m pytest -q test_micro_batching.py
+    python test_micro_batching.py
+===============================================================================
+"""
+
+import threading
+
+import numpy as np
+
+import micro_batching
+from micro_batching import AgrupadorMicroLotes
+
+N_LLAMADORES = 20
+
+def _espiar_resolver(llamadas):
+    """
+    Sustituto de resolver_ecuaciones que anota el tamano de cada llamada.
+    """
+    def resolver(ecuaciones, vectores_promedio, clasificar_operandos=None, clasificar_operadores=None):
+        llamadas.append(len(ecuaciones))
+        return [{"Resultado_Calculado": i} for i in range(len(ecuaciones))]
+    return resolver
+
+def _enviar_concurrente(agrupador, modelo_de):
+    """
+    N_LLAMADORES hilos envian una ecuacion cada uno a la vez.
+    """
+    recorte = np.zeros((45, 45), dtype=np.uint8)
+    barrera = threading.Barrier(N_LLAMADORES)
+    futuros = [None] * N_LLAMADORES
+
+    def llamador(i):
+        barrera.wait()
+        futuros[i] = agrupador.enviar(recorte, recorte, recorte, modelo=modelo_de(i))
+
+    hilos = [threading.Thread(target=llamador, args=(i,)) for i in range(N_LLAMADORES)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return [futuro.result(timeout=5) for futuro in futuros]
+
+def test_enviar_concurrente_un_solo_lote():
+    llamadas = []
+    original = micro_batching.resolver_ecuaciones
+    micro_batching.resolver_ecuaciones = _espiar_resolver(llamadas)
+    try:
+        vectores_promedio, clasificar_operadores = {}, (lambda imgs: [])
+        agrupador = AgrupadorMicroLotes(vectores_promedio, max_espera_ms=500, max_lote=N_LLAMADORES)
+        # Cada llamada arma su propia tupla de modelo, como solve_server.py
+        resultados = _enviar_concurrente(
+            agrupador, lambda i: (vectores_promedio, clasificar_operadores, None))
+        agrupador.cerrar()
+    finally:
+        micro_batching.resolver_ecuaciones = original
+    assert llamadas == [N_LLAMADORES]
+    assert len(resultados) == N_LLAMADORES
+    assert agrupador.metricas()["tamanos_lote"] == {N_LLAMADORES: 1}
+
+def test_modelos_distintos_se_resuelven_por_separado():
+    llamadas = []
+    original = micro_batching.resolver_ecuaciones
+    micro_batching.resolver_ecuaciones = _espiar_resolver(llamadas)
+    try:
+        modelos = [({}, None, None), ({}, None, None)]
+        agrupador = AgrupadorMicroLotes({}, max_espera_ms=500, max_lote=N_LLAMADORES)
+        _enviar_concurrente(agrupador, lambda i: tuple(modelos[i % 2]))
+        agrupador.cerrar()
+    finally:
+        micro_batching.resolver_ecuaciones = original
+    assert sorted(llamadas) == [N_LLAMADORES // 2, N_LLAMADORES // 2]
+
+if __name__ == "__main__":
+    test_enviar_concurrente_un_solo_lote()
+    test_modelos_distintos_se_resuelven_por_separado()
+    print("\033[92m✅ Pruebas de micro-lotes superadas\033[0m")
@@ -0,0 +1,278 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: crop_cache.py
+Descripcion: Memoizacion de la clasificacion de recortes por hash de su
+             contenido y version del modelo, con un nivel LRU en memoria
+             acotado y un nivel opcional en disco (SQLite).
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerías externas: json, time, sqlite3, hashlib, threading, numpy
+===============================================================================
+Uso:
+    cache = CacheClasificaciones(capacidad=4096, ruta_disco="cache_recortes.sqlite")
+    digito = cache.clasificar(img, "operando_prototipo", modelo.version,
+                              lambda img: clasificar_operando(img, vectores_promedio))
+    digitos = cache.clasificar_lote(imgs, "operando_prototipo", modelo.version,
+                                    lambda imgs: clasificar_operandos_lote(imgs, vectores_promedio))
+    print(cache.metricas())
+===============================================================================
+Notas:
+- La clave es (versión del modelo, tipo, hash BLAKE2b de 128 bits de la
+  forma, el tipo de dato y los bytes del recorte). El tipo distingue qué
+  clasificador produjo el valor (operando por nivel, operador, ...).
+- Nivel en memoria: OrderedDict con desalojo LRU al superar 'capacidad'.
+  Nivel en disco (opcional): tabla SQLite; un acierto en disco se promueve
+  a memoria. Los valores se guardan como JSON (enteros, textos o listas).
+- La versión forma parte de la clave, así que un cambio de modelo no
+  necesita invalidar nada: las entradas de versiones que ya no se usan
+  salen por LRU en memoria, y volver a una versión anterior (A→B→A)
+  reutiliza lo que siga guardado. Las peticiones en curso durante una
+  recarga en caliente pueden seguir guardando con su versión.
+- En disco, cada fila guarda cuándo se usó por última vez. Al abrir la
+  caché, al ver una versión nueva y cada cierto número de inserciones se
+  borran las filas sin uso en 'max_edad_dias' y, si hay más de
+  'max_filas_disco', las usadas hace más tiempo (LRU).
+- Las bases creadas antes de la columna 'usado' se migran al abrirlas.
+- Es segura entre hilos (un único candado protege ambos niveles).
+===============================================================================
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+def hash_recorte(img):
+    """
+    Hash BLAKE2b (16 bytes) del contenido de un recorte.
+    """
+    img = np.ascontiguousarray(img)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.shape}{img.dtype.str}".encode("ascii"))
+    h.update(img.data)
+    return h.digest()
+
+def version_de(*partes):
+    """
+    Versión (12 caracteres) derivada de parámetros, para clasificadores
+    que no vienen de un artefacto del modelo.
+    """
+    return hashlib.sha256(repr(partes).encode("utf-8")).hexdigest()[:12]
+
+class CacheClasificaciones:
+    """
+    Caché de clasificaciones de recortes en dos niveles.
+
+    Args:
+        capacidad (int): Entradas máximas del nivel en memoria.
+        ruta_disco (str, opcional): Archivo SQLite del nivel en disco.
+        max_filas_disco (int): Filas máximas en disco tras cada poda.
+        max_edad_dias (float): Días sin uso tras los que se borra una fila.
+    """
+
+    def __init__(self, capacidad=4096, ruta_disco=None, max_filas_disco=200000, max_edad_dias=30.0):
+        self.capacidad = capacidad
+        self.ruta_disco = ruta_disco
+        self.max_filas_disco = max_filas_disco
+        self.max_edad_dias = max_edad_dias
+        self.version = None
+        self._versiones = set()
+        self._insertadas = 0
+        self._memoria = OrderedDict()
+        self._bloqueo = threading.Lock()
+        self._contadores = {
+            "aciertos": 0,
+            "aciertos_disco": 0,
+            "fallos": 0,
+            "desalojos": 0,
+            "cambios_version": 0,
+            "podadas_disco": 0,
+        }
+        self._disco = None
+        if ruta_disco:
+            self._disco = sqlite3.connect(ruta_disco, check_same_thread=False)
+            self._disco.execute("PRAGMA journal_mode=WAL")
+            self._disco.execute("PRAGMA synchronous=OFF")  # Una caché no necesita durabilidad
+            self._disco.execute(
+                "CREATE TABLE IF NOT EXISTS clasificaciones ("
+                "version TEXT, tipo TEXT, clave BLOB, valor TEXT, usado REAL, "
+                "PRIMARY KEY (version, tipo, clave))"
+            )
+            columnas = [fila[1] for fila in self._disco.execute("PRAGMA table_info(clasificaciones)")]
+            if "usado" not in columnas:
+                self._disco.execute("ALTER TABLE clasificaciones ADD COLUMN usado REAL")
+                self._disco.execute("UPDATE clasificaciones SET usado = ?", (time.time(),))
+            self._disco.execute("CREATE INDEX IF NOT EXISTS idx_usado ON clasificaciones (usado)")
+            self._disco.commit()
+            with self._bloqueo:
+                self._podar_disco()
+
+    def _activar_version(self, version):
+        """
+        Registra la versión más reciente; la primera vez que aparece una
+        versión se poda el disco. Debe llamarse con el candado tomado.
+        """
+        if version == self.version:
+            return
+        if self.version is not None:
+            self._contadores["cambios_version"] += 1
+        self.version = version
+        if version not in self._versiones:
+            self._versiones.add(version)
+            self._podar_disco()
+
+    def _podar_disco(self):
+        """
+        Borra las filas sin uso en max_edad_dias y, si quedan más de
+        max_filas_disco, las de uso más antiguo. Debe llamarse con el
+        candado tomado.
+        """
+        self._insertadas = 0
+        if self._disco is None:
+            return
+        limite = time.time() - self.max_edad_dias * 86400
+        borradas = self._disco.execute("DELETE FROM clasificaciones WHERE usado < ?", (limite,)).rowcount
+        sobrantes = self._disco.execute("SELECT COUNT(*) FROM clasificaciones").fetchone()[0] - self.max_filas_disco
+        if sobrantes > 0:
+            borradas += self._disco.execute(
+                "DELETE FROM clasificaciones WHERE rowid IN "
+                "(SELECT rowid FROM clasificaciones ORDER BY usado LIMIT ?)", (sobrantes,)
+            ).rowcount
+        self._disco.commit()
+        self._contadores["podadas_disco"] += borradas
+
+    def _buscar(self, clave):
+        """
+        Busca una clave (version, tipo, hash) en memoria y luego en disco.
+        Debe llamarse con el candado tomado.
+        """
+        if clave in self._memoria:
+            self._memoria.move_to_end(clave)
+            self._contadores["aciertos"] += 1
+            return True, self._memoria[clave]
+        if self._disco is not None:
+            fila = self._disco.execute(
+                "SELECT valor FROM clasificaciones WHERE version = ? AND tipo = ? AND clave = ?", clave
+            ).fetchone()
+            if fila is not None:
+                self._disco.execute(
+                    "UPDATE clasificaciones SET usado = ? WHERE version = ? AND tipo = ? AND clave = ?",
+                    (time.time(),) + clave,
+                )
+                valor = json.loads(fila[0])
+                self._guardar_memoria(clave, valor)
+                self._contadores["aciertos"] += 1
+                self._contadores["aciertos_disco"] += 1
+                return True, valor
+        self._contadores["fallos"] += 1
+        return False, None
+
+    def _guardar_memoria(self, clave, valor):
+        self._memoria[clave] = valor
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.capacidad:
+            self._memoria.popitem(last=False)
+            self._contadores["desalojos"] += 1
+
+    def _guardar(self, claves, valores):
+        for clave, valor in zip(claves, valores):
+            self._guardar_memoria(clave, valor)
+        if self._disco is not None and claves:
+            ahora = time.time()
+            self._disco.executemany(
+                "INSERT OR REPLACE INTO clasificaciones VALUES (?, ?, ?, ?, ?)",
+                [clave + (json.dumps(valor), ahora) for clave, valor in zip(claves, valores)],
+            )
+            self._disco.commit()
+            self._insertadas += len(claves)
+            if self._insertadas >= max(1, self.max_filas_disco // 10):
+                self._podar_disco()
+
+    def clasificar_lote(self, imgs, tipo, version, funcion_lote):
+        """
+        Clasifica un lote de recortes: los que están en caché se devuelven
+        directamente y el resto se calcula con una sola llamada a
+        funcion_lote (imgs -> valores).
+
+        Returns:
+            list: Valores en el mismo orden que imgs.
+        """
+        if len(imgs) == 0:
+            return []
+        claves = [(version, tipo, hash_recorte(img)) for img in imgs]
+        valores = [None] * len(imgs)
+        pendientes = []
+        with self._bloqueo:
+            self._activar_version(version)
+            aciertos_disco = self._contadores["aciertos_disco"]
+            for i, clave in enumerate(claves):
+                encontrado, valor = self._buscar(clave)
+                if encontrado:
+                    valores[i] = valor
+                else:
+                    pendientes.append(i)
+            if self._contadores["aciertos_disco"] > aciertos_disco:
+                self._disco.commit()  # Marcas de uso de los aciertos en disco
+        if not pendientes:
+            return valores
+
+        calculados = [_valor_serializable(v) for v in funcion_lote([imgs[i] for i in pendientes])]
+        for i, valor in zip(pendientes, calculados):
+            valores[i] = valor
+        with self._bloqueo:
+            self._guardar([claves[i] for i in pendientes], calculados)
+        return valores
+
+    def clasificar(self, img, tipo, version, funcion):
+        """
+        Clasifica un recorte con funcion (img -> valor) usando la caché.
+        """
+        return self.clasificar_lote([img], tipo, version, lambda imgs: [funcion(imgs[0])])[0]
+
+    def envolver_lote(self, tipo, version, funcion_lote):
+        """
+        Devuelve funcion_lote con caché, con la misma firma (imgs -> valores).
+        """
+        return lambda imgs: self.clasificar_lote(imgs, tipo, version, funcion_lote)
+
+    def metricas(self):
+        """
+        Aciertos (total y en disco), fallos, desalojos, cambios de versión,
+        filas podadas en disco, tamaño y tasa de aciertos.
+        """
+        with self._bloqueo:
+            consultas = self._contadores["aciertos"] + self._contadores["fallos"]
+            return dict(
+                self._contadores,
+                entradas=len(self._memoria),
+                capacidad=self.capacidad,
+                tasa_aciertos=self._contadores["aciertos"] / consultas if consultas else 0.0,
+                version=self.version,
+                disco=self.ruta_disco,
+            )
+
+    def cerrar(self):
+        if self._disco is not None:
+            with self._bloqueo:
+                self._disco.close()
+                self._disco = None
+
+def _valor_serializable(valor):
+    """
+    Convierte escalares y arreglos de NumPy a tipos de Python (JSON).
+    """
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, (tuple, list, np.ndarray)):
+        return [_valor_serializable(v) for v in valor]
+    return valor
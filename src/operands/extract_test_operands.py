@@ -16,6 +16,10 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python extract_test_operands.py
+Midiendo el tiempo de cada etapa (resumen en 'tiempos_etapas/extract_test_operands.json'):
+    INKSOLVER_TIEMPOS=1 python extract_test_operands.py
+Perfilando con cProfile ('perfiles/extract_test_operands.prof' y '.collapsed', ver profiling.py):
+    INKSOLVER_PERFIL=1 python extract_test_operands.py
 ===============================================================================
 Notas:
 - Las imágenes de entrada deben estar en la carpeta '../../data/operands/raw/test/'.
@@ -28,6 +32,9 @@ import numpy as np
 import os
 import re
 
+from profiling import activar_desde_entorno as activar_perfil
+from stage_timing import activar_desde_entorno, tiempos
+
 # Definir rutas de entrada y salida
 input_folder = "../../data/operands/raw/test/"
 output_base_folder = "../../data/operands/processed/test/"
@@ -55,26 +62,29 @@ def extract_black_boxes_from_image(image_path, image_label, image_id):
     print(f"\n\033[91m🔴 Procesando imagen: {image_path}...\033[0m")
 
     # Cargar imagen en escala de grises
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    with tiempos.etapa("decodificar"):
+        img = cv2.imread(image_path)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
     # Aplicar umbral para aislar dígitos en negro
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
+    with tiempos.etapa("umbral"):
+        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
 
-    # Encontrar contornos
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    with tiempos.etapa("segmentar"):
+        # Encontrar contornos
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-    # Extraer y ordenar cuadros
-    bounding_boxes = [cv2.boundingRect(cnt) for cnt in contours]
-    bounding_boxes = sorted(bounding_boxes, key=lambda b: (b[1], b[0]))
+        # Extraer y ordenar cuadros
+        bounding_boxes = [cv2.boundingRect(cnt) for cnt in contours]
+        bounding_boxes = sorted(bounding_boxes, key=lambda b: (b[1], b[0]))
 
-    # Agrupar por filas y columnas
-    row_dict = {}
-    for x, y, w, h in bounding_boxes:
-        if 50 < w < 200 and 50 < h < 200: # Filtrar ruido
-            row = y // 80 # Agrupar por filas
-            col = x // 80 # Agrupar por columnas
-            row_dict.setdefault(row, []).append((x, y, w, h))
+        # Agrupar por filas y columnas
+        row_dict = {}
+        for x, y, w, h in bounding_boxes:
+            if 50 < w < 200 and 50 < h < 200: # Filtrar ruido
+                row = y // 80 # Agrupar por filas
+                col = x // 80 # Agrupar por columnas
+                row_dict.setdefault(row, []).append((x, y, w, h))
 
     # Extraer cuadros y guardar imágenes
     image_count = 0 # Contador de imagenes extraidas
@@ -82,21 +92,25 @@ def extract_black_boxes_from_image(image_path, image_label, image_id):
         for col_index, (x, y, w, h) in enumerate(sorted(row_dict[row], key=lambda b: b[0])):
             # Extraer la region del cuadro con margen para evitar bordes
             border_margin = 10
-            cropped = gray[y+border_margin:y+h-border_margin, x+border_margin:x+w-border_margin]
-
-            # Convertir a imagen binaria
-            _, bw_cropped = cv2.threshold(cropped, 145, 255, cv2.THRESH_BINARY)
+            with tiempos.etapa("recortar"):
+                cropped = gray[y+border_margin:y+h-border_margin, x+border_margin:x+w-border_margin]
+                # Convertir a imagen binaria
+                _, bw_cropped = cv2.threshold(cropped, 145, 255, cv2.THRESH_BINARY)
 
             # Guardar imagen con formato [id imagen]_[id consecutivo].png
             output_filename = f"{image_id}_{image_count}.png"
             output_path = os.path.join(output_folder, output_filename)
-            cv2.imwrite(output_path, bw_cropped)
+            with tiempos.etapa("escribir"):
+                cv2.imwrite(output_path, bw_cropped)
             image_count += 1
 
     # Mensajes finales
     print(f"\033[92m✔ Se extrajeron {image_count} cuadros de la imagen {image_path}.\033[0m")
     print(f"\033[93m📂 Imágenes guardadas en: {output_folder}\033[0m")
 
+activar_desde_entorno("extract_test_operands")
+activar_perfil("extract_test_operands")
+
 # Procesar todas las imágenes en la carpeta de entrada
 for filename in os.listdir(input_folder):
     match = re.match(r"(\d+)_(\d+)\.png", filename)
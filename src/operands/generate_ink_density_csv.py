@@ -16,6 +16,10 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python generate_operand_csvs.py
+Midiendo el tiempo de cada etapa (resumen en 'tiempos_etapas/generar_csv_por_digito.json'):
+    INKSOLVER_TIEMPOS=1 python generate_ink_density_csv.py
+Perfilando con cProfile ('perfiles/generar_csv_por_digito.prof' y '.collapsed', ver profiling.py):
+    INKSOLVER_PERFIL=1 python generate_ink_density_csv.py
 ===============================================================================
 Notas:
 - Las imágenes deben estar organizadas en carpetas por dígito (0 a 9).
@@ -31,6 +35,9 @@ import numpy as np
 import pandas as pd
 import warnings
 
+from profiling import activar_desde_entorno as activar_perfil
+from stage_timing import activar_desde_entorno, tiempos
+
 # Suprimir advertencias innecesarias (por ejemplo de matplotlib)
 warnings.simplefilter("ignore", category=UserWarning)
 
@@ -89,12 +96,14 @@ def generar_csv_por_digito(base_path="../../data/operands/raw/dataset", output_p
         rows = []
         for idx, img_name in enumerate(image_files):
             img_path = os.path.join(digit_path, img_name)
-            image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+            with tiempos.etapa("decodificar"):
+                image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
             if image is None:
                 continue
 
             # Calcular porcentajes y armar fila
-            porcentajes = compute_tinta_por_cuadrante(image, grid_size)
+            with tiempos.etapa("caracteristicas"):
+                porcentajes = compute_tinta_por_cuadrante(image, grid_size)
             row = [digit, img_name] + porcentajes
             rows.append(row)
 
@@ -105,9 +114,10 @@ def generar_csv_por_digito(base_path="../../data/operands/raw/dataset", output_p
         # Guardar CSV si hay datos
         if rows:
             columns = ["Digito", "Nombre Imagen"] + [f"P. Cuadrante {i}" for i in range(1, 10)]
-            df = pd.DataFrame(rows, columns=columns)
             csv_path = os.path.join(output_path, f"digito_{digit}.csv")
-            df.to_csv(csv_path, index=False)
+            with tiempos.etapa("escribir_csv"):
+                df = pd.DataFrame(rows, columns=columns)
+                df.to_csv(csv_path, index=False)
             print(f"\033[92m💾 CSV guardado en: {csv_path}\033[0m")
         else:
             print(f"\033[93m⚠️ No se procesaron imágenes para el dígito {digit}\033[0m")
@@ -116,4 +126,6 @@ def generar_csv_por_digito(base_path="../../data/operands/raw/dataset", output_p
 
 # Punto de entrada principal
 if __name__ == "__main__":
+    activar_desde_entorno("generar_csv_por_digito")
+    activar_perfil("generar_csv_por_digito")
     generar_csv_por_digito()
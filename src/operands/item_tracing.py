@@ -0,0 +1,293 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: item_tracing.py
+Descripcion: Trazas por elemento (hoja o ecuacion): identificador, etapas con
+             su inicio y duracion, atributos como el numero de contornos y
+             el error si lo hubo, escritas en un archivo NDJSON con
+             muestreo. Los elementos mas lentos que un umbral se guardan
+             siempre, junto con una copia de su entrada.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: numpy (solo para copiar entradas en memoria)
+- stage_timing.py (las etapas de la traza son las mismas que mide)
+===============================================================================
+Uso:
+En el codigo:
+    from item_tracing import trazas
+
+    with trazas.item("hoja", image_id, entrada=image_path):
+        ...
+        trazas.anotar(contornos=len(contours))
+Activar en extract_test_images.py (equations) o classify_equations.py:
+    INKSOLVER_TRAZAS=1 python extract_test_images.py
+    INKSOLVER_TRAZAS=1 INKSOLVER_TRAZAS_MUESTREO=1 python classify_equations.py
+    INKSOLVER_TRAZAS=lentas.ndjson INKSOLVER_TRAZAS_LENTO_MS="hoja=60,ecuacion=2" python extract_test_images.py
+Resumir una traza (elementos mas lentos y su etapa dominante):
+    python item_tracing.py trazas/extract_equations.ndjson --top 20
+===============================================================================
+Notas:
+- Desactivado (por defecto), item() devuelve un contexto vacio compartido y
+  anotar() no hace nada.
+- INKSOLVER_TRAZAS: '1' escribe 'trazas/<nombre>.ndjson' (en la carpeta
+  actual) y cualquier otro valor es la ruta del archivo, que se abre para
+  agregar. INKSOLVER_TRAZAS_MUESTREO es la fraccion de elementos que se
+  escriben (0.05 por defecto). INKSOLVER_TRAZAS_LENTO_MS es un umbral para
+  todos los tipos o 'tipo=ms,...' (por defecto hoja=100, ecuacion=5).
+- Un elemento se escribe si salio en el muestreo o si tardo al menos el
+  umbral de su tipo ("lento": true). De los lentos se copia la entrada en
+  '<traza>_lentos/<tipo>_<id>/': los archivos tal cual y los arreglos como
+  .npy, para poder repetir exactamente ese caso.
+- Las etapas se reciben de stage_timing.py mientras el elemento esta abierto
+  en el mismo hilo; no hace falta activar los tiempos por etapa.
+- Cada registro es una linea JSON: ts, tipo, id, duracion_ms, lento,
+  muestreado, etapas [{nombre, inicio_ms, duracion_ms}] (inicio relativo
+  al elemento, en orden de terminacion), atributos, entrada y error.
+===============================================================================
+"""
+
+import argparse
+import atexit
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from stage_timing import tiempos
+
+VARIABLE_ENTORNO = "INKSOLVER_TRAZAS"
+VARIABLE_MUESTREO = "INKSOLVER_TRAZAS_MUESTREO"
+VARIABLE_LENTO = "INKSOLVER_TRAZAS_LENTO_MS"
+carpeta_salida = "trazas"
+
+MUESTREO = 0.05
+UMBRALES_LENTO_MS = {"hoja": 100.0, "ecuacion": 5.0}
+
+_NULO = nullcontext()
+
+class _Elemento:
+    """
+    Contexto de un elemento trazado.
+    """
+    __slots__ = ("_trazador", "tipo", "id", "entrada", "inicio_ns", "etapas", "atributos", "_anterior")
+
+    def __init__(self, trazador, tipo, item_id, entrada):
+        self._trazador = trazador
+        self.tipo = tipo
+        self.id = item_id
+        self.entrada = entrada
+        self.etapas = []
+        self.atributos = {}
+
+    def __enter__(self):
+        local = self._trazador._local
+        self._anterior = getattr(local, "elemento", None)
+        local.elemento = self
+        self.inicio_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo_error, error, _):
+        duracion_ns = time.perf_counter_ns() - self.inicio_ns
+        self._trazador._local.elemento = self._anterior
+        self._trazador._terminar(self, duracion_ns, error)
+        return False
+
+class Trazador:
+    """
+    Escritor de trazas por elemento de un proceso.
+    """
+
+    def __init__(self):
+        self.habilitado = False
+        self.ruta = None
+        self.muestreo = MUESTREO
+        self.umbrales_ms = dict(UMBRALES_LENTO_MS)
+        self.escritos = 0
+        self.lentos = 0
+        self._local = threading.local()
+        self._bloqueo = threading.Lock()
+        self._archivo = None
+        self._rng = random.Random()
+
+    def activar(self, ruta, muestreo=MUESTREO, umbrales_ms=None, semilla=None):
+        """
+        Empieza a trazar en 'ruta' (NDJSON, se agrega al final).
+        """
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._archivo = open(ruta, "a", encoding="utf-8")
+        self.ruta = ruta
+        self.muestreo = muestreo
+        if umbrales_ms:
+            self.umbrales_ms.update(umbrales_ms)
+        self._rng = random.Random(semilla)
+        self.habilitado = True
+        tiempos.observar(self._etapa)
+        atexit.register(self.desactivar)
+
+    def desactivar(self):
+        if not self.habilitado:
+            return
+        self.habilitado = False
+        tiempos.dejar_de_observar(self._etapa)
+        with self._bloqueo:
+            self._archivo.close()
+        print(f"\033[92m🧵 Trazas: {self.escritos} elementos escritos ({self.lentos} lentos) en {self.ruta}\033[0m",
+              file=sys.stderr)
+
+    def item(self, tipo, item_id, entrada=None):
+        """
+        Contexto que traza un elemento. 'entrada' (ruta, lista de rutas o
+        arreglo) se copia si el elemento resulta lento.
+        """
+        if not self.habilitado:
+            return _NULO
+        return _Elemento(self, tipo, item_id, entrada)
+
+    def anotar(self, **atributos):
+        """
+        Agrega atributos (por ejemplo contornos=...) al elemento en curso.
+        """
+        if not self.habilitado:
+            return
+        elemento = getattr(self._local, "elemento", None)
+        if elemento is not None:
+            elemento.atributos.update(atributos)
+
+    def _etapa(self, nombre, inicio_ns, duracion_ns):
+        elemento = getattr(self._local, "elemento", None)
+        if elemento is not None:
+            elemento.etapas.append((nombre, inicio_ns, duracion_ns))
+
+    def _terminar(self, elemento, duracion_ns, error):
+        duracion_ms = duracion_ns / 1e6
+        umbral = self.umbrales_ms.get(elemento.tipo)
+        lento = umbral is not None and duracion_ms >= umbral
+        muestreado = self._rng.random() < self.muestreo
+        if not (lento or muestreado):
+            return
+
+        registro = {
+            "ts": round(time.time(), 3),
+            "tipo": elemento.tipo,
+            "id": elemento.id,
+            "duracion_ms": round(duracion_ms, 4),
+            "lento": lento,
+            "muestreado": muestreado,
+            "etapas": [
+                {"nombre": nombre, "inicio_ms": round((inicio - elemento.inicio_ns) / 1e6, 4),
+                 "duracion_ms": round(duracion / 1e6, 4)}
+                for nombre, inicio, duracion in elemento.etapas
+            ],
+            "atributos": elemento.atributos,
+            "entrada": None,
+            "error": repr(error) if error is not None else None,
+        }
+        if lento and elemento.entrada is not None:
+            registro["entrada"] = self._copiar_entrada(elemento)
+
+        linea = json.dumps(registro, ensure_ascii=False, default=str)
+        with self._bloqueo:
+            if self._archivo.closed:
+                return
+            self._archivo.write(linea + "\n")
+            self._archivo.flush()
+            self.escritos += 1
+            self.lentos += lento
+
+    def _copiar_entrada(self, elemento):
+        """
+        Copia la entrada del elemento lento y devuelve la carpeta de la copia.
+        """
+        nombre = "".join(c if c.isalnum() or c in "-_." else "_" for c in f"{elemento.tipo}_{elemento.id}")
+        destino = os.path.join(os.path.splitext(self.ruta)[0] + "_lentos", nombre)
+        try:
+            os.makedirs(destino, exist_ok=True)
+            entradas = elemento.entrada if isinstance(elemento.entrada, (list, tuple)) else [elemento.entrada]
+            for i, entrada in enumerate(entradas):
+                if isinstance(entrada, (str, os.PathLike)):
+                    shutil.copy2(entrada, os.path.join(destino, f"{i}_{os.path.basename(entrada)}"))
+                else:
+                    import numpy as np
+                    np.save(os.path.join(destino, f"{i}.npy"), np.asarray(entrada))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"\033[93m⚠️ No se pudo copiar la entrada de {elemento.id}: {e}\033[0m", file=sys.stderr)
+        return destino
+
+# Trazador global del proceso
+trazas = Trazador()
+
+def leer_umbrales(valor):
+    """
+    '250' -> el mismo umbral para todos los tipos; 'hoja=100,ecuacion=5' ->
+    umbral por tipo.
+    """
+    if "=" not in valor:
+        return {tipo: float(valor) for tipo in UMBRALES_LENTO_MS}
+    umbrales = {}
+    for parte in valor.split(","):
+        tipo, ms = parte.split("=")
+        umbrales[tipo.strip()] = float(ms)
+    return umbrales
+
+def activar_desde_entorno(nombre):
+    """
+    Activa las trazas si la variable INKSOLVER_TRAZAS esta definida.
+
+    Returns:
+        bool: True si quedaron activadas.
+    """
+    valor = os.environ.get(VARIABLE_ENTORNO, "").strip()
+    if not valor or valor.lower() in ("0", "no", "false"):
+        return False
+    ruta = os.path.join(carpeta_salida, f"{nombre}.ndjson") if valor.lower() in ("1", "si", "true") else valor
+    muestreo = float(os.environ.get(VARIABLE_MUESTREO, MUESTREO))
+    umbrales = leer_umbrales(os.environ[VARIABLE_LENTO]) if os.environ.get(VARIABLE_LENTO) else None
+    trazas.activar(ruta, muestreo, umbrales)
+    return True
+
+def resumir(ruta, top=10):
+    """
+    Muestra, por tipo, los percentiles de duracion de los elementos escritos
+    y los 'top' mas lentos con su etapa dominante.
+    """
+    with open(ruta, encoding="utf-8") as f:
+        registros = [json.loads(linea) for linea in f if linea.strip()]
+    print(f"\n\033[94m🧵 {len(registros)} elementos en {ruta}\033[0m")
+    for tipo in sorted({r["tipo"] for r in registros}):
+        del_tipo = sorted((r for r in registros if r["tipo"] == tipo), key=lambda r: -r["duracion_ms"])
+        duraciones = sorted(r["duracion_ms"] for r in del_tipo)
+        p50 = duraciones[len(duraciones) // 2]
+        p99 = duraciones[min(len(duraciones) - 1, int(len(duraciones) * 0.99))]
+        lentos = sum(r["lento"] for r in del_tipo)
+        print(f"\n\033[94m{tipo}: {len(del_tipo)} ({lentos} lentos)  p50 {p50:.3f} ms  p99 {p99:.3f} ms  "
+              f"max {duraciones[-1]:.3f} ms\033[0m")
+        for r in del_tipo[:top]:
+            dominante = max(r["etapas"], key=lambda e: e["duracion_ms"], default=None)
+            etapa = f"{dominante['nombre']} {dominante['duracion_ms']:.3f} ms" if dominante else "-"
+            atributos = " ".join(f"{k}={v}" for k, v in r["atributos"].items())
+            marca = "🐢" if r["lento"] else "  "
+            print(f"\033[92m{marca} {str(r['id']):<28} {r['duracion_ms']:>10.3f} ms  {etapa:<28} {atributos}\033[0m")
+            if r.get("error"):
+                print(f"\033[91m     error: {r['error']}\033[0m")
+            if r.get("entrada"):
+                print(f"     entrada: {r['entrada']}")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resume un archivo de trazas por elemento.")
+    parser.add_argument("traza", help="Archivo NDJSON de trazas.")
+    parser.add_argument("--top", type=int, default=10, help="Elementos mas lentos a mostrar por tipo.")
+    args = parser.parse_args()
+
+    resumir(args.traza, args.top)
@@ -0,0 +1,412 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: model_artifact.py
+Descripcion: Artefacto binario versionado del modelo (.npz sin comprimir) con
+             los prototipos de operandos, la especificacion de
+             caracteristicas, el umbral y la tabla de reglas de operadores y
+             los datos de indice opcionales (k-means y KD-tree).
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerías externas: os, sys, json, time, struct, zipfile, hashlib,
+  argparse, numpy
+===============================================================================
+Uso:
+Construir el artefacto a partir de los CSV e índices actuales:
+    python model_artifact.py construir
+Ver la versión, los componentes y el tiempo de carga:
+    python model_artifact.py info ../equations/classify_digits/modelo.npz
+Cargar el modelo servido desde otro script (artefacto o, si no existe, los
+prototipos del CSV):
+    modelo = cargar_modelo_servido()
+===============================================================================
+Notas:
+- Cargar el artefacto solo requiere NumPy (sin pandas): los metadatos van
+  como JSON dentro del arreglo 'meta' y el resto son arreglos numéricos.
+- cargar_modelo lee a memoria solo los arreglos pequeños (prototipos,
+  reglas, especificación, k-means). Los del KD-tree (knn_*, ~94k puntos)
+  se guardan sin comprimir dentro del .npz y se abren con np.memmap en su
+  desplazamiento dentro del archivo: no se leen hasta que se consulta el
+  índice. La carga toma menos de 1 ms. El mapeo mantiene abierto el
+  archivo que se cargó, así que aunque el artefacto se reemplace (se
+  renombra encima) el modelo cargado sigue viendo su propio índice.
+- El modelo de respaldo (sin artefacto) solo tiene los prototipos del CSV
+  servido: su versión es la de un artefacto con solo esos prototipos y las
+  reglas por defecto, distinta de la de un artefacto con k-means o KD-tree.
+- La versión es un hash SHA-256 (12 caracteres) del contenido: dos
+  artefactos con los mismos prototipos, reglas e índices tienen la misma
+  versión. Los resultados de classify_equations, solve_stream y
+  solve_server llevan esta versión.
+- Reglas de operadores: tabla ordenada de filas (picos horizontales, picos
+  verticales, mínimo y máximo de picos horizontales tras rotar 45°,
+  operador); -1 significa "cualquiera" o "sin máximo" y gana la primera
+  fila que coincide. La tabla por defecto reproduce classify_operation.
+- Los scripts de entrenamiento (operands_incremental_prototypes.py,
+  operands_kmeans_prototypes.py y operands_kdtree_index.py) actualizan su
+  componente en el artefacto con --artefacto.
+- El archivo se escribe en un temporal y se renombra, así que un lector
+  nunca ve un artefacto a medio escribir.
+- modelo.npz no se versiona (.gitignore): un clon limpio usa el modelo de
+  respaldo. Por eso los resultados versionados
+  (../equations/test_analysis/ecuaciones_clasificadas.csv,
+  ../equations/resumen_resultados_ecuaciones.txt y los informes de
+  template_matching y del clasificador de dos etapas) se generan sin
+  artefacto local y llevan la versión del respaldo. Para reproducirlos,
+  apartar modelo.npz y ejecutar classify_equations.py --sin-cache
+  --sin-registro y evaluate_equation_results.py.
+===============================================================================
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+FORMATO = 1
+
+# Rutas del modelo servido, relativas a la carpeta de cada script
+RUTA_MODELO = "../equations/classify_digits/modelo.npz"
+RUTA_PROTOTIPOS = "../equations/classify_digits/promedios_por_digito.csv"
+
+# Especificación de las características de operandos
+ESPEC_CARACTERISTICAS = {
+    "cuadricula": [3, 3],
+    "umbral_tinta_prototipos": 128,   # calcular_vector_tinta: píxel < 128
+    "umbral_tinta_porcentaje": 200,   # calcular_vector_porcentaje: píxel <= 200
+}
+
+# Umbral relativo de count_peaks para los histogramas de operadores
+UMBRAL_PICOS = 0.8
+
+# (picos_h, picos_v, rot_min, rot_max, operador); -1 = cualquiera / sin máximo
+REGLAS_OPERADORES = [
+    (0, 0, 3, -1, "div"),
+    (0, 0, 0, 0, "div"),
+    (2, 0, 0, -1, "equals"),
+    (1, 0, 0, -1, "sub"),
+    (1, 1, 0, -1, "sum"),
+    (0, 0, 0, 2, "times"),
+]
+
+ARREGLOS_INDICE = ("puntos", "etiquetas", "hojas", "cajas_min", "cajas_max", "nodos", "cortes")
+
+def clasificar_por_reglas(picos_h, picos_v, picos_rot, reglas=REGLAS_OPERADORES):
+    """
+    Devuelve el operador de la primera regla que coincide o "Desconocido".
+    """
+    for h, v, rot_min, rot_max, operador in reglas:
+        if ((h == -1 or picos_h == h) and (v == -1 or picos_v == v)
+                and picos_rot >= rot_min and (rot_max == -1 or picos_rot <= rot_max)):
+            return operador
+    return "Desconocido"
+
+def _arreglos_componentes(vectores_promedio, prototipos_kmeans=None, indice_knn=None,
+                          umbral_picos=UMBRAL_PICOS, reglas=REGLAS_OPERADORES, espec=None):
+    """
+    Convierte los componentes del modelo en el diccionario de arreglos que
+    se guarda en el .npz (sin el arreglo 'meta').
+    """
+    digitos = sorted(vectores_promedio)
+    arreglos = {
+        "prototipos_digitos": np.array(digitos, dtype=np.int64),
+        "prototipos": np.vstack([np.asarray(vectores_promedio[d], dtype=float) for d in digitos]),
+        "reglas": np.array([fila[:4] for fila in reglas], dtype=np.int64).reshape(-1, 4),
+        "reglas_operadores": np.array([fila[4] for fila in reglas], dtype="U16"),
+        "umbral_picos": np.array(umbral_picos, dtype=float),
+        "espec": np.frombuffer(json.dumps(espec or ESPEC_CARACTERISTICAS, sort_keys=True).encode("utf-8"),
+                               dtype=np.uint8),
+    }
+    if prototipos_kmeans is not None:
+        arreglos["kmeans_digitos"] = np.asarray(prototipos_kmeans[0], dtype=np.int64)
+        arreglos["kmeans_prototipos"] = np.asarray(prototipos_kmeans[1], dtype=float)
+    if indice_knn is not None:
+        for nombre in ARREGLOS_INDICE:
+            arreglos[f"knn_{nombre}"] = np.ascontiguousarray(getattr(indice_knn, nombre))
+    return arreglos
+
+def calcular_version(arreglos):
+    """
+    Hash del contenido: nombre, tipo, forma y bytes de cada arreglo.
+    """
+    resumen = hashlib.sha256()
+    for nombre in sorted(arreglos):
+        if nombre == "meta":
+            continue
+        arreglo = np.ascontiguousarray(arreglos[nombre])
+        resumen.update(f"{nombre}:{arreglo.dtype.str}:{arreglo.shape}".encode("utf-8"))
+        resumen.update(arreglo.tobytes())
+    return resumen.hexdigest()[:12]
+
+def _guardar_arreglos(ruta, arreglos):
+    version = calcular_version(arreglos)
+    # Catálogo (dtype, forma, fortran) de cada arreglo: cargar_modelo no
+    # necesita interpretar las cabeceras .npy
+    catalogo = {nombre: [np.asarray(a).dtype.str, list(np.shape(a)), bool(np.isfortran(a))]
+                for nombre, a in arreglos.items()}
+    meta = {"formato": FORMATO, "version": version, "creado": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "arreglos": catalogo}
+    arreglos = dict(arreglos, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8))
+
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.tmp-{os.getpid()}.npz"
+    np.savez(temporal, **arreglos)
+    os.replace(temporal, ruta)
+    return version
+
+def guardar_artefacto(ruta, vectores_promedio, prototipos_kmeans=None, indice_knn=None,
+                      umbral_picos=UMBRAL_PICOS, reglas=REGLAS_OPERADORES, espec=None):
+    """
+    Escribe el artefacto completo y devuelve su versión.
+
+    Parámetros:
+    - vectores_promedio: {digito: vector (9,)}.
+    - prototipos_kmeans: (digitos, matriz) de cargar_prototipos_kmeans.
+    - indice_knn: IndiceKDTree de operands_kdtree_index.
+    """
+    return _guardar_arreglos(ruta, _arreglos_componentes(
+        vectores_promedio, prototipos_kmeans, indice_knn, umbral_picos, reglas, espec))
+
+def actualizar_artefacto(ruta, vectores_promedio=None, prototipos_kmeans=None, indice_knn=None):
+    """
+    Reemplaza los componentes indicados de un artefacto existente (o crea
+    uno nuevo si hay prototipos) y devuelve la nueva versión.
+    """
+    if os.path.exists(ruta):
+        with np.load(ruta) as datos:
+            arreglos = {nombre: datos[nombre] for nombre in datos.files if nombre != "meta"}
+    elif vectores_promedio is None:
+        raise FileNotFoundError(f"No existe el artefacto {ruta}; constrúyalo con 'model_artifact.py construir'")
+    else:
+        arreglos = {}
+
+    if vectores_promedio is not None:
+        base = _arreglos_componentes(vectores_promedio)
+        arreglos.update({n: base[n] for n in ("prototipos_digitos", "prototipos")})
+        for nombre in ("reglas", "reglas_operadores", "umbral_picos", "espec"):
+            arreglos.setdefault(nombre, base[nombre])
+    if prototipos_kmeans is not None:
+        arreglos["kmeans_digitos"] = np.asarray(prototipos_kmeans[0], dtype=np.int64)
+        arreglos["kmeans_prototipos"] = np.asarray(prototipos_kmeans[1], dtype=float)
+    if indice_knn is not None:
+        for nombre in ARREGLOS_INDICE:
+            arreglos[f"knn_{nombre}"] = np.ascontiguousarray(getattr(indice_knn, nombre))
+    version = _guardar_arreglos(ruta, arreglos)
+    print(f"\033[92m💾 Artefacto {ruta} actualizado (versión {version})\033[0m")
+    return version
+
+class ModeloInkSolver:
+    """
+    Modelo cargado: prototipos, especificación, reglas de operadores y,
+    si existen, prototipos de k-means e índice KD-tree.
+
+    Args:
+        arreglos (dict): Arreglos del artefacto (los del KD-tree pueden ser
+            np.memmap de solo lectura).
+        version (str): Versión del contenido.
+        ruta (str, opcional): Archivo de origen.
+    """
+
+    def __init__(self, arreglos, version, ruta=None):
+        self._arreglos = arreglos
+        self.version = version
+        self.ruta = ruta
+        self.vectores_promedio = {
+            int(d): fila for d, fila in zip(arreglos["prototipos_digitos"], arreglos["prototipos"])
+        }
+        self.espec = json.loads(bytes(arreglos["espec"]).decode("utf-8"))
+        self.umbral_picos = float(arreglos["umbral_picos"])
+        self.reglas = [
+            (*(int(x) for x in fila), str(operador))
+            for fila, operador in zip(arreglos["reglas"], arreglos["reglas_operadores"])
+        ]
+        nombres = set(arreglos)
+        self.prototipos_kmeans = None
+        if "kmeans_prototipos" in nombres:
+            self.prototipos_kmeans = (arreglos["kmeans_digitos"], arreglos["kmeans_prototipos"])
+        # Un artefacto con el índice de formato anterior (sin nodos) se
+        # trata como si no tuviera índice
+        self.tiene_indice = "knn_nodos" in nombres
+        self._indice = None
+
+    @classmethod
+    def desde_componentes(cls, vectores_promedio, prototipos_kmeans=None, indice_knn=None):
+        """
+        Modelo en memoria (sin archivo). Su versión es la de un artefacto
+        con exactamente estos componentes: sin k-means ni KD-tree no
+        coincide con la de un artefacto construido con ellos.
+        """
+        arreglos = _arreglos_componentes(vectores_promedio, prototipos_kmeans, indice_knn)
+        return cls(arreglos, calcular_version(arreglos))
+
+    def indice_knn(self, metrica="euclidean"):
+        """
+        IndiceKDTree a partir de los arreglos del artefacto (se lee al
+        primer uso) o None si el artefacto no tiene índice.
+        """
+        if not self.tiene_indice:
+            return None
+        if self._indice is None or self._indice.metrica != metrica:
+            from operands_kdtree_index import IndiceKDTree
+            self._indice = IndiceKDTree(*(self._arreglos[f"knn_{n}"] for n in ARREGLOS_INDICE), metrica=metrica)
+        return self._indice
+
+    def clasificar_operador_picos(self, picos_h, picos_v, picos_rot):
+        return clasificar_por_reglas(picos_h, picos_v, picos_rot, self.reglas)
+
+    def resumen(self):
+        return {
+            "version": self.version,
+            "ruta": self.ruta,
+            "digitos": len(self.vectores_promedio),
+            "espec": self.espec,
+            "umbral_picos": self.umbral_picos,
+            "reglas": len(self.reglas),
+            "prototipos_kmeans": 0 if self.prototipos_kmeans is None else int(len(self.prototipos_kmeans[1])),
+            "indice_knn": self.tiene_indice,
+        }
+
+def _inicio_datos(archivo, info):
+    """
+    (inicio del .npy, inicio de sus datos) de un miembro sin comprimir del
+    .npz: salta la cabecera local del zip y la cabecera .npy.
+    """
+    archivo.seek(info.header_offset + 26)
+    largo_nombre, largo_extra = struct.unpack("<HH", archivo.read(4))
+    inicio = info.header_offset + 30 + largo_nombre + largo_extra
+    archivo.seek(inicio + 6)
+    if archivo.read(2)[0] == 1:
+        return inicio, inicio + 10 + struct.unpack("<H", archivo.read(2))[0]
+    return inicio, inicio + 12 + struct.unpack("<I", archivo.read(4))[0]
+
+def _leer_miembro(archivo, ruta, info, descripcion=None):
+    """
+    Arreglo de un miembro del .npz. Con su descripción (dtype, forma,
+    fortran) del catálogo de 'meta' no se interpreta la cabecera .npy; los
+    knn_* se mapean con np.memmap en lugar de leerse.
+    """
+    nombre = info.filename[:-len(".npy")]
+    if info.compress_type != zipfile.ZIP_STORED:
+        with zipfile.ZipFile(archivo) as zf, zf.open(info) as miembro:
+            return np.lib.format.read_array(miembro, allow_pickle=False)
+    inicio, datos = _inicio_datos(archivo, info)
+    if descripcion is None:
+        archivo.seek(inicio)
+        version = np.lib.format.read_magic(archivo)
+        leer_cabecera = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        forma, fortran, dtype = leer_cabecera(archivo)
+    else:
+        dtype, forma, fortran = np.dtype(descripcion[0]), tuple(descripcion[1]), descripcion[2]
+    if dtype.hasobject:
+        raise ValueError(f"Arreglo con objetos en {ruta}: {nombre}")
+    orden = "F" if fortran else "C"
+    if nombre.startswith("knn_") and 0 not in forma:
+        return np.memmap(ruta, dtype=dtype, mode="r", offset=datos, shape=forma, order=orden)
+    archivo.seek(datos)
+    return np.frombuffer(bytearray(archivo.read(inicio + info.file_size - datos)), dtype=dtype).reshape(forma, order=orden)
+
+def cargar_modelo(ruta):
+    """
+    Lee un artefacto .npz (sin pickle) y devuelve un ModeloInkSolver. Los
+    arreglos pequeños se leen a memoria; los del KD-tree se mapean (ver
+    Notas), así que la carga no depende del tamaño del índice.
+    """
+    with open(ruta, "rb") as archivo:
+        with zipfile.ZipFile(archivo) as zf:
+            miembros = {info.filename[:-len(".npy")]: info for info in zf.infolist()}
+        meta = json.loads(bytes(_leer_miembro(archivo, ruta, miembros.pop("meta"))).decode("utf-8"))
+        if meta.get("formato") != FORMATO:
+            raise ValueError(f"Formato de artefacto no soportado en {ruta}: {meta.get('formato')}")
+        catalogo = meta.get("arreglos", {})
+        arreglos = {nombre: _leer_miembro(archivo, ruta, info, catalogo.get(nombre))
+                    for nombre, info in miembros.items()}
+    return ModeloInkSolver(arreglos, meta["version"], ruta)
+
+def leer_prototipos_csv(csv_path):
+    """
+    {digito: vector (9,)} desde el CSV de promedios por dígito.
+    """
+    import pandas as pd  # Solo para leer el CSV; el artefacto no lo necesita
+
+    df = pd.read_csv(csv_path)
+    columnas = [f"P. Cuadrante {i}" for i in range(1, 10)]
+    return {int(fila["Digito"]): fila[columnas].to_numpy(dtype=float) for _, fila in df.iterrows()}
+
+def cargar_modelo_servido(ruta=RUTA_MODELO, csv_path=RUTA_PROTOTIPOS):
+    """
+    Carga el artefacto del modelo. Si no existe, arma el modelo en memoria
+    con el CSV de prototipos y el umbral y las reglas por defecto (solo
+    prototipos, así que su versión no es la de un artefacto con k-means o
+    KD-tree; ver desde_componentes).
+    """
+    if ruta and os.path.exists(ruta):
+        return cargar_modelo(ruta)
+    print(f"⚠️ Artefacto {ruta} no encontrado; se usan los prototipos de {csv_path}", file=sys.stderr)
+    return ModeloInkSolver.desde_componentes(leer_prototipos_csv(csv_path))
+
+def construir_desde_archivos(salida=RUTA_MODELO, prototipos_csv=RUTA_PROTOTIPOS,
+                             kmeans_csv="csv_por_digito/prototipos_kmeans.csv",
+                             indice_path="csv_por_digito/indice_kdtree"):
+    """
+    Arma el artefacto con los prototipos servidos, los prototipos de
+    k-means y el KD-tree si existen.
+    """
+    import pandas as pd
+    from operands_kdtree_index import IndiceKDTree
+
+    vectores_promedio = leer_prototipos_csv(prototipos_csv)
+    columnas = [f"P. Cuadrante {i}" for i in range(1, 10)]
+
+    prototipos_kmeans = None
+    if os.path.exists(kmeans_csv):
+        df = pd.read_csv(kmeans_csv)
+        prototipos_kmeans = (df["Digito"].to_numpy(dtype=np.int64), df[columnas].to_numpy(dtype=float))
+    else:
+        print(f"\033[93m⚠️ Sin prototipos k-means ({kmeans_csv})\033[0m")
+
+    indice = None
+    if os.path.exists(os.path.join(indice_path, "meta.json")):
+        indice = IndiceKDTree.cargar(indice_path, mmap=False)
+    else:
+        print(f"\033[93m⚠️ Sin índice KD-tree ({indice_path})\033[0m")
+
+    version = guardar_artefacto(salida, vectores_promedio, prototipos_kmeans, indice)
+    print(f"\033[1;32m✅ Artefacto guardado en: {salida} (versión {version})\033[0m")
+
+def mostrar_info(ruta):
+    inicio = time.perf_counter()
+    modelo = cargar_modelo(ruta)
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    # Cargas siguientes (con el archivo ya en la caché del sistema)
+    repetidas = []
+    for _ in range(20):
+        inicio = time.perf_counter()
+        cargar_modelo(ruta)
+        repetidas.append((time.perf_counter() - inicio) * 1000)
+    print(json.dumps(modelo.resumen(), indent=2, ensure_ascii=False))
+    print(f"\033[94m⏱ Carga en {duracion_ms:.3f} ms (primera), mediana {np.median(repetidas):.3f} ms (siguientes)\033[0m")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Artefacto binario versionado del modelo de InkSolver.")
+    parser.add_argument("accion", choices=["construir", "info"], help="Construir el artefacto o mostrar su contenido.")
+    parser.add_argument("ruta", nargs="?", default="../equations/classify_digits/modelo.npz", help="Archivo del artefacto.")
+    parser.add_argument("--prototipos", default="../equations/classify_digits/promedios_por_digito.csv", help="CSV de prototipos servidos.")
+    parser.add_argument("--kmeans", default="csv_por_digito/prototipos_kmeans.csv", help="CSV de prototipos k-means.")
+    parser.add_argument("--indice", default="csv_por_digito/indice_kdtree", help="Carpeta del KD-tree.")
+    args = parser.parse_args()
+
+    if args.accion == "construir":
+        construir_desde_archivos(args.ruta, args.prototipos, args.kmeans, args.indice)
+    else:
+        mostrar_info(args.ruta)
@@ -0,0 +1,300 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: operands_incremental_prototypes.py
+Descripcion: Modelo de prototipos por digito con sumas y conteos acumulados
+             (y varianza de Welford) que se actualiza muestra a muestra al
+             agregar, eliminar o reetiquetar, sin releer los CSV.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerías externas: os, argparse, cv2, numpy, pandas
+===============================================================================
+Uso:
+Inicializar el estado a partir de los CSV digito_N.csv (una sola vez):
+    python operands_incremental_prototypes.py inicializar
+Aplicar un archivo de cambios (prototipos en promedios_incrementales.csv):
+    python operands_incremental_prototypes.py aplicar correcciones.csv
+Aplicarlo y publicar los prototipos en los CSV servidos:
+    python operands_incremental_prototypes.py aplicar correcciones.csv \
+        --publicar csv_por_digito/promedios_por_digito.csv \
+        --publicar ../equations/classify_digits/promedios_por_digito.csv
+Ver el estado actual:
+    python operands_incremental_prototypes.py resumen
+===============================================================================
+Notas:
+- El estado se guarda en 'csv_por_digito/estado_prototipos.npz': por
+  dígito, el conteo n, la media y M2 (suma de desviaciones al cuadrado de
+  Welford), de donde salen el prototipo (media) y la varianza M2 / (n - 1).
+- Agregar o eliminar una muestra actualiza media y M2 en O(9); reetiquetar
+  es eliminarla de su dígito anterior y agregarla al nuevo.
+- Cada operación valida los dígitos (enteros de 0 a 9) y el vector (9
+  valores finitos) antes de tocar el estado, así que una operación
+  rechazada no deja cambios a medias. Las filas inválidas del archivo de
+  cambios se informan y se saltan.
+- El archivo de cambios es un CSV con las columnas:
+    Operacion (agregar | eliminar | reetiquetar), Digito, Digito Nuevo
+    (solo para reetiquetar) y P. Cuadrante 1..9, o bien una columna
+    Ruta Imagen de la que se calculan los cuadrantes con
+    compute_tinta_por_cuadrante.
+- Tras inicializar o aplicar cambios los prototipos se escriben en
+  --salida ('csv_por_digito/promedios_incrementales.csv' por defecto, mismo
+  formato que generar_csv_promedios) y solo se publican en los CSV que
+  leen los clasificadores (promedios_por_digito.csv) si se indican con
+  --publicar; con --artefacto, tambien en el artefacto del modelo
+  (model_artifact.py).
+===============================================================================
+"""
+
+import argparse
+import os
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from generate_ink_density_csv import compute_tinta_por_cuadrante
+from model_artifact import actualizar_artefacto
+
+COLUMNAS_CUADRANTES = [f"P. Cuadrante {i}" for i in range(1, 10)]
+OPERACIONES = ("agregar", "eliminar", "reetiquetar")
+
+class ModeloPrototiposIncremental:
+    """
+    Prototipos por dígito mantenidos con el algoritmo de Welford.
+
+    Args:
+        conteos (numpy.ndarray): Muestras por dígito (10,).
+        medias (numpy.ndarray): Media por dígito (10, 9).
+        m2 (numpy.ndarray): Suma de desviaciones al cuadrado por dígito (10, 9).
+    """
+
+    def __init__(self, conteos=None, medias=None, m2=None, digitos=10, dimension=9):
+        self.conteos = np.zeros(digitos, dtype=np.int64) if conteos is None else np.array(conteos, dtype=np.int64)
+        self.medias = np.zeros((digitos, dimension)) if medias is None else np.array(medias, dtype=float)
+        self.m2 = np.zeros((digitos, dimension)) if m2 is None else np.array(m2, dtype=float)
+
+    def _validar(self, digito, vector):
+        """
+        Comprueba el dígito y el vector sin modificar el estado; devuelve el
+        vector como arreglo de float.
+        """
+        if isinstance(digito, (bool, np.bool_)) or not isinstance(digito, (int, np.integer)):
+            raise ValueError(f"dígito no entero: {digito!r}")
+        if not 0 <= digito < len(self.conteos):
+            raise ValueError(f"dígito fuera de rango (0-{len(self.conteos) - 1}): {digito}")
+        vector = np.asarray(vector, dtype=float)
+        if vector.shape != self.medias.shape[1:] or not np.all(np.isfinite(vector)):
+            raise ValueError(f"vector inválido: se esperaban {self.medias.shape[1]} valores finitos")
+        return vector
+
+    def agregar(self, digito, vector):
+        """
+        Agrega una muestra al dígito indicado.
+        """
+        vector = self._validar(digito, vector)
+        self.conteos[digito] += 1
+        delta = vector - self.medias[digito]
+        self.medias[digito] += delta / self.conteos[digito]
+        self.m2[digito] += delta * (vector - self.medias[digito])
+
+    def eliminar(self, digito, vector):
+        """
+        Quita una muestra del dígito indicado (inverso exacto de agregar).
+        """
+        vector = self._validar(digito, vector)
+        if self.conteos[digito] == 0:
+            raise ValueError(f"el dígito {digito} no tiene muestras que eliminar")
+        if self.conteos[digito] == 1:
+            self.conteos[digito] = 0
+            self.medias[digito] = 0.0
+            self.m2[digito] = 0.0
+            return
+        media_anterior = self.medias[digito].copy()
+        self.conteos[digito] -= 1
+        self.medias[digito] = media_anterior + (media_anterior - vector) / self.conteos[digito]
+        self.m2[digito] = np.maximum(self.m2[digito] - (vector - media_anterior) * (vector - self.medias[digito]), 0.0)
+
+    def reetiquetar(self, digito_anterior, digito_nuevo, vector):
+        """
+        Mueve una muestra de un dígito a otro. Se valida todo antes de
+        eliminarla, así que un dígito nuevo inválido no la pierde.
+        """
+        vector = self._validar(digito_anterior, vector)
+        self._validar(digito_nuevo, vector)
+        self.eliminar(digito_anterior, vector)
+        self.agregar(digito_nuevo, vector)
+
+    def agregar_bloque(self, digito, vectores):
+        """
+        Combina un bloque de muestras con el estado del dígito (fórmula de
+        Chan para unir medias y M2); se usa al inicializar desde los CSV.
+        """
+        self._validar(digito, np.zeros(self.medias.shape[1]))
+        vectores = np.asarray(vectores, dtype=float)
+        if len(vectores) == 0:
+            return
+        n_a, n_b = self.conteos[digito], len(vectores)
+        media_b = vectores.mean(axis=0)
+        m2_b = ((vectores - media_b) ** 2).sum(axis=0)
+        delta = media_b - self.medias[digito]
+        total = n_a + n_b
+        self.medias[digito] += delta * n_b / total
+        self.m2[digito] += m2_b + delta ** 2 * n_a * n_b / total
+        self.conteos[digito] = total
+
+    def prototipos(self):
+        """
+        Prototipos de los dígitos con al menos una muestra, como
+        {digito: vector (9,)} (el formato de cargar_vectores_promedio).
+        """
+        return {d: self.medias[d].copy() for d in range(len(self.conteos)) if self.conteos[d] > 0}
+
+    def varianzas(self):
+        """
+        Varianza muestral por dígito y cuadrante (0 si hay menos de 2 muestras).
+        """
+        return self.m2 / np.maximum(self.conteos - 1, 1)[:, None]
+
+    def guardar(self, ruta):
+        np.savez(ruta, conteos=self.conteos, medias=self.medias, m2=self.m2)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            return cls(datos["conteos"], datos["medias"], datos["m2"])
+
+    def exportar_csv(self, output_file):
+        """
+        Escribe los prototipos con el formato de promedios_por_digito.csv.
+        """
+        filas = [[d] + list(v) for d, v in self.prototipos().items()]
+        pd.DataFrame(filas, columns=["Digito"] + COLUMNAS_CUADRANTES).to_csv(output_file, index=False)
+
+def inicializar_estado(input_path="csv_por_digito", estado_path="csv_por_digito/estado_prototipos.npz", bloque=4096):
+    """
+    Calcula el estado inicial recorriendo cada digito_N.csv en bloques.
+    """
+    modelo = ModeloPrototiposIncremental()
+    for digito in range(10):
+        file_path = os.path.join(input_path, f"digito_{digito}.csv")
+        if not os.path.exists(file_path):
+            print(f"\033[93m⚠️ No se encontró el archivo CSV para el dígito {digito}\033[0m")
+            continue
+        for df in pd.read_csv(file_path, usecols=COLUMNAS_CUADRANTES, chunksize=bloque):
+            modelo.agregar_bloque(digito, df[COLUMNAS_CUADRANTES].to_numpy(dtype=float))
+        print(f"\033[92m✔ Dígito {digito}: {modelo.conteos[digito]} muestras\033[0m")
+    modelo.guardar(estado_path)
+    print(f"\033[1;32m✅ Estado guardado en: {estado_path}\033[0m")
+    return modelo
+
+def vector_de_fila(fila):
+    """
+    Vector de cuadrantes de una fila del archivo de cambios: las columnas
+    P. Cuadrante 1..9 o, si no están, los cuadrantes de 'Ruta Imagen'.
+    """
+    if all(c in fila and pd.notna(fila[c]) for c in COLUMNAS_CUADRANTES):
+        return fila[COLUMNAS_CUADRANTES].to_numpy(dtype=float)
+    ruta = fila.get("Ruta Imagen")
+    if not isinstance(ruta, str):
+        raise ValueError("la fila no tiene cuadrantes ni 'Ruta Imagen'")
+    imagen = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+    if imagen is None:
+        raise ValueError(f"no se pudo leer la imagen: {ruta}")
+    return np.array(compute_tinta_por_cuadrante(imagen), dtype=float)
+
+def digito_de(valor):
+    """
+    Entero de una celda del archivo de cambios ('3', 3 o 3.0); rechaza
+    celdas vacías y valores no enteros.
+    """
+    if pd.isna(valor):
+        raise ValueError("dígito vacío")
+    numero = float(valor)
+    if not numero.is_integer():
+        raise ValueError(f"dígito no entero: {valor!r}")
+    return int(numero)
+
+def aplicar_delta(modelo, delta_path):
+    """
+    Aplica un archivo de cambios al modelo fila por fila.
+
+    Retorna:
+    - Diccionario con el número de operaciones aplicadas por tipo y de filas
+      rechazadas.
+    """
+    aplicadas = {operacion: 0 for operacion in OPERACIONES}
+    aplicadas["rechazadas"] = 0
+    for numero, fila in pd.read_csv(delta_path).iterrows():
+        try:
+            operacion = str(fila["Operacion"]).strip().lower()
+            if operacion not in OPERACIONES:
+                raise ValueError(f"operación desconocida: {operacion}")
+            digito = digito_de(fila["Digito"])
+            vector = vector_de_fila(fila)
+            if operacion == "agregar":
+                modelo.agregar(digito, vector)
+            elif operacion == "eliminar":
+                modelo.eliminar(digito, vector)
+            elif operacion == "reetiquetar":
+                modelo.reetiquetar(digito, digito_de(fila["Digito Nuevo"]), vector)
+            aplicadas[operacion] += 1
+        except (KeyError, ValueError, TypeError) as e:
+            aplicadas["rechazadas"] += 1
+            print(f"\033[93m⚠️ Fila {numero + 2} del archivo de cambios ignorada: {e}\033[0m")
+    return aplicadas
+
+def aplicar_cambios(delta_path, estado_path="csv_por_digito/estado_prototipos.npz",
+                    output_file="csv_por_digito/promedios_incrementales.csv", publicar=(), artefacto=None):
+    """
+    Carga el estado, aplica el archivo de cambios, guarda el estado y
+    reescribe los prototipos en output_file, en cada ruta de publicar y,
+    si se indica, en el artefacto del modelo.
+    """
+    if not os.path.exists(estado_path):
+        print(f"\033[91m🚫 Estado no encontrado: {estado_path} (ejecute 'inicializar')\033[0m")
+        return
+    modelo = ModeloPrototiposIncremental.cargar(estado_path)
+    aplicadas = aplicar_delta(modelo, delta_path)
+    modelo.guardar(estado_path)
+    for ruta in (output_file, *publicar):
+        modelo.exportar_csv(ruta)
+        print(f"\033[92m💾 Prototipos escritos en: {ruta}\033[0m")
+    if artefacto:
+        actualizar_artefacto(artefacto, vectores_promedio=modelo.prototipos())
+    print(f"\033[1;32m✅ Cambios aplicados: {aplicadas}\033[0m")
+
+def mostrar_resumen(estado_path="csv_por_digito/estado_prototipos.npz"):
+    modelo = ModeloPrototiposIncremental.cargar(estado_path)
+    desviaciones = np.sqrt(modelo.varianzas())
+    for digito in range(len(modelo.conteos)):
+        print(f"Dígito {digito}: {modelo.conteos[digito]} muestras, "
+              f"desviación media por cuadrante {desviaciones[digito].mean():.4f}")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prototipos por dígito con actualización incremental.")
+    parser.add_argument("accion", choices=["inicializar", "aplicar", "resumen"], help="Acción a realizar.")
+    parser.add_argument("delta", nargs="?", help="Archivo CSV de cambios (para 'aplicar').")
+    parser.add_argument("--csv", default="csv_por_digito", help="Carpeta con los CSV digito_N.csv.")
+    parser.add_argument("--estado", default="csv_por_digito/estado_prototipos.npz", help="Archivo de estado.")
+    parser.add_argument("--salida", default="csv_por_digito/promedios_incrementales.csv", help="CSV de prototipos (no publicado).")
+    parser.add_argument("--publicar", action="append", default=[], help="CSV de prototipos servido donde publicarlos (repetible).")
+    parser.add_argument("--artefacto", help="Artefacto del modelo (model_artifact.py) donde publicar los prototipos.")
+    args = parser.parse_args()
+
+    if args.accion == "inicializar":
+        modelo = inicializar_estado(args.csv, args.estado)
+        for ruta in (args.salida, *args.publicar):
+            modelo.exportar_csv(ruta)
+            print(f"\033[92m💾 Prototipos escritos en: {ruta}\033[0m")
+    elif args.accion == "aplicar":
+        if not args.delta:
+            parser.error("'aplicar' requiere el archivo de cambios")
+        aplicar_cambios(args.delta, args.estado, args.salida, args.publicar, args.artefacto)
+    else:
+        mostrar_resumen(args.estado)
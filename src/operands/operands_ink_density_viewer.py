@@ -16,6 +16,8 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python visualize_colored_quadrants.py
+Midiendo tiempo y memoria de cada etapa (resumen en 'tiempos_etapas/ink_density_viewer.json'):
+    INKSOLVER_MEMORIA=1 python operands_ink_density_viewer.py
 ===============================================================================
 Notas:
 - Este script analiza imágenes de los operandos (0-9), calcula el porcentaje
@@ -31,6 +33,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import warnings
 
+from stage_timing import activar_desde_entorno, tiempos
+
 # Suprimir advertencias innecesarias de matplotlib
 warnings.simplefilter("ignore", category=UserWarning)
 
@@ -80,76 +84,80 @@ def mostrar_con_cuadrantes_coloreados(base_path="../../data/operands/raw/dataset
 
         print(f"\n\033[94m🖍️ Procesando dígito {digit} ({len(images)} imágenes)...\033[0m")
 
-        for i, img_name in enumerate(images):
-            img_path = os.path.join(digit_path, img_name)
-            print(f"   📄 Cargando imagen: \033[92m{img_name}\033[0m")
-
-            image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            h, w = image.shape
-            percent_tinta = compute_tinta_por_cuadrante(image, grid_size)
-            gh, gw = grid_size
-            step_h, step_w = h // gh, w // gw
-
-            # Mostrar imagen base
-            axes[digit, i].imshow(image, cmap='gray')
-
-            # Dibujar rectángulos con transparencia según tinta
-            for row in range(gh):
-                for col in range(gw):
-                    alpha = percent_tinta[row, col]
-                    rect = plt.Rectangle(
-                        (col * step_w, row * step_h),
-                        step_w, step_h,
-                        color='red',
-                        alpha=alpha * 0.8,
-                        linewidth=0
-                    )
-                    axes[digit, i].add_patch(rect)
-
-            axes[digit, i].axis("off")
-            if i == 0:
-                axes[digit, i].set_ylabel(f'Dígito {digit}', fontsize=12)
+        with tiempos.etapa("figura_general"):
+            for i, img_name in enumerate(images):
+                img_path = os.path.join(digit_path, img_name)
+                print(f"   📄 Cargando imagen: \033[92m{img_name}\033[0m")
+
+                image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+                h, w = image.shape
+                percent_tinta = compute_tinta_por_cuadrante(image, grid_size)
+                gh, gw = grid_size
+                step_h, step_w = h // gh, w // gw
+
+                # Mostrar imagen base
+                axes[digit, i].imshow(image, cmap='gray')
+
+                # Dibujar rectángulos con transparencia según tinta
+                for row in range(gh):
+                    for col in range(gw):
+                        alpha = percent_tinta[row, col]
+                        rect = plt.Rectangle(
+                            (col * step_w, row * step_h),
+                            step_w, step_h,
+                            color='red',
+                            alpha=alpha * 0.8,
+                            linewidth=0
+                        )
+                        axes[digit, i].add_patch(rect)
+
+                axes[digit, i].axis("off")
+                if i == 0:
+                    axes[digit, i].set_ylabel(f'Dígito {digit}', fontsize=12)
 
         # Crear figura individual por dígito
-        print(f"📸 Guardando collage de dígito {digit}...")
-        digit_fig = plt.figure(figsize=(samples_per_digit * 2, 2))
-        for i, img_name in enumerate(images):
-            img_path = os.path.join(digit_path, img_name)
-            image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            percent_tinta = compute_tinta_por_cuadrante(image, grid_size)
-            h, w = image.shape
-            gh, gw = grid_size
-            step_h, step_w = h // gh, w // gw
-
-            ax = digit_fig.add_subplot(1, samples_per_digit, i + 1)
-            ax.imshow(image, cmap='gray')
-            for row in range(gh):
-                for col in range(gw):
-                    alpha = percent_tinta[row, col]
-                    rect = plt.Rectangle(
-                        (col * step_w, row * step_h),
-                        step_w, step_h,
-                        color='red',
-                        alpha=alpha * 0.8,
-                        linewidth=0
-                    )
-                    ax.add_patch(rect)
-            ax.axis("off")
-
-        digit_fig.tight_layout()
-        digit_fig_path = os.path.join(output_path, f"{digit}.png")
-        digit_fig.savefig(digit_fig_path)
-        plt.close(digit_fig)
+        with tiempos.etapa("collage_digito"):
+            print(f"📸 Guardando collage de dígito {digit}...")
+            digit_fig = plt.figure(figsize=(samples_per_digit * 2, 2))
+            for i, img_name in enumerate(images):
+                img_path = os.path.join(digit_path, img_name)
+                image = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+                percent_tinta = compute_tinta_por_cuadrante(image, grid_size)
+                h, w = image.shape
+                gh, gw = grid_size
+                step_h, step_w = h // gh, w // gw
+
+                ax = digit_fig.add_subplot(1, samples_per_digit, i + 1)
+                ax.imshow(image, cmap='gray')
+                for row in range(gh):
+                    for col in range(gw):
+                        alpha = percent_tinta[row, col]
+                        rect = plt.Rectangle(
+                            (col * step_w, row * step_h),
+                            step_w, step_h,
+                            color='red',
+                            alpha=alpha * 0.8,
+                            linewidth=0
+                        )
+                        ax.add_patch(rect)
+                ax.axis("off")
+
+            digit_fig.tight_layout()
+            digit_fig_path = os.path.join(output_path, f"{digit}.png")
+            digit_fig.savefig(digit_fig_path)
+            plt.close(digit_fig)
         print(f"   💾 Guardado en: \033[96m{digit_fig_path}\033[0m")
         print(f"\033[90m✅ Finalizado dígito {digit}\033[0m")
 
     # Guardar imagen general con todos los dígitos
     all_digits_path = os.path.join(output_path, "all_digits_colored.png")
-    fig.tight_layout()
-    fig.savefig(all_digits_path)
+    with tiempos.etapa("guardar_general"):
+        fig.tight_layout()
+        fig.savefig(all_digits_path)
     print(f"\n\033[1;32m🎉 Visualización completa. Imagen general guardada en '{all_digits_path}'\033[0m")
     plt.show()
 
 # Punto de entrada del script
 if __name__ == "__main__":
+    activar_desde_entorno("ink_density_viewer")
     mostrar_con_cuadrantes_coloreados()
@@ -0,0 +1,435 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: operands_kdtree_index.py
+Descripcion: Indice KD-tree persistente sobre las caracteristicas de tinta de
+             entrenamiento (9-D, float32) con sus etiquetas, cargable con
+             np.load(mmap_mode='r') y con consulta por lotes de los k
+             vecinos mas cercanos.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerías externas: os, json, time, argparse, numpy, pandas (solo al leer CSV)
+===============================================================================
+Uso:
+Construir el índice:
+    python operands_kdtree_index.py construir
+Construir el índice y guardarlo también en el artefacto del modelo:
+    python operands_kdtree_index.py construir --artefacto ../equations/classify_digits/modelo.npz
+Consultar los CSV de test (k y métrica configurables):
+    python operands_kdtree_index.py consultar --k 5 --metrica euclidean
+===============================================================================
+Notas:
+- El índice es una carpeta con archivos .npy (puntos, etiquetas, hojas,
+  cajas, nodos y cortes) y un meta.json; cada arreglo se abre con
+  np.load(mmap_mode='r'), por lo que cargarlo toma milisegundos y no copia
+  los datos a memoria. Un índice con un formato anterior se reconstruye.
+- El árbol se construye cortando por la mediana de la dimensión de mayor
+  rango hasta hojas de --tamano-hoja puntos. Cada nodo interno guarda su
+  dimensión y su plano de corte (nodos, cortes) y cada nodo su caja
+  envolvente (mínimos y máximos por dimensión); se guardan además los
+  puntos agrupados por hoja y el rango (inicio, fin) de cada hoja.
+- La consulta es exacta y desciende el árbol como un KD-tree clásico, con
+  NumPy sobre un bloque de consultas a la vez: cada consulta baja hasta su
+  hoja por el lado de sus planos de corte, y luego solo se visitan las
+  ramas cuya caja está más cerca que el k-ésimo vecino actual. Las hojas
+  alcanzadas se miden en rondas de menor a mayor cota, podando otra vez
+  tras cada ronda.
+- Métricas soportadas: euclidean, manhattan y chebyshev. La cota por cajas
+  es válida para las tres, así que la métrica se elige al consultar.
+- Con 9 dimensiones y ~94k puntos la poda descarta ~97% de las hojas, pero
+  el recorrido en NumPy sigue siendo ~3x más lento que scipy.spatial.cKDTree
+  (en C); el índice existe para persistirse y abrirse con mmap.
+===============================================================================
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+COLUMNAS_CUADRANTES = [f"P. Cuadrante {i}" for i in range(1, 10)]
+METRICAS = ("euclidean", "manhattan", "chebyshev")
+VERSION_FORMATO = 2
+
+def _reducir(diferencias, metrica, eje=-1):
+    """
+    Distancia a partir de las diferencias por dimensión (al cuadrado para
+    euclidean; se corrige al final de la consulta).
+    """
+    if metrica == "euclidean":
+        return np.einsum("...d,...d->...", diferencias, diferencias)
+    if metrica == "manhattan":
+        return np.abs(diferencias).sum(axis=eje)
+    return np.abs(diferencias).max(axis=eje)
+
+def _cotas_cajas(consultas, cajas_min, cajas_max, metrica):
+    """
+    Cota inferior (P,) de la distancia de cada consulta (P, d) a su caja
+    envolvente (P, d).
+    """
+    return _reducir(np.maximum(np.maximum(cajas_min - consultas, consultas - cajas_max), 0.0), metrica)
+
+class IndiceKDTree:
+    """
+    KD-tree inmutable sobre vectores de características con etiquetas.
+
+    Args:
+        puntos (numpy.ndarray): (N, d) float32, agrupados por hoja.
+        etiquetas (numpy.ndarray): (N,) etiqueta de cada punto.
+        hojas (numpy.ndarray): (H, 2) int32 con (inicio, fin) de cada hoja.
+        cajas_min, cajas_max (numpy.ndarray): (M, d) float32 con la caja
+            envolvente de los puntos de cada nodo.
+        nodos (numpy.ndarray): (M, 3) int32 con (dimensión, hijo izquierdo,
+            hijo derecho) de cada nodo; el nodo 0 es la raíz y en una hoja
+            la dimensión es -1 y el hijo izquierdo es su índice en hojas.
+        cortes (numpy.ndarray): (M,) float32 con el plano de corte de cada
+            nodo interno (izquierda <= corte <= derecha).
+        metrica (str): Métrica por defecto de las consultas.
+    """
+
+    ARREGLOS = ("puntos", "etiquetas", "hojas", "cajas_min", "cajas_max", "nodos", "cortes")
+
+    def __init__(self, puntos, etiquetas, hojas, cajas_min, cajas_max, nodos, cortes, metrica="euclidean"):
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica no soportada: {metrica} (opciones: {', '.join(METRICAS)})")
+        # np.asarray sobre un memmap da una vista sin copia y evita el costo
+        # de crear objetos memmap en cada corte durante la consulta
+        self.puntos = np.asarray(puntos)
+        self.etiquetas = np.asarray(etiquetas)
+        self.hojas = np.asarray(hojas)
+        self.cajas_min = np.asarray(cajas_min)
+        self.cajas_max = np.asarray(cajas_max)
+        self.nodos = np.asarray(nodos)
+        self.cortes = np.asarray(cortes)
+        self.metrica = metrica
+        self._arbol = None  # Arreglos del descenso y hojas rellenas, en la primera consulta
+
+    def __len__(self):
+        return len(self.etiquetas)
+
+    def guardar(self, ruta):
+        """
+        Guarda el índice como una carpeta de archivos .npy más meta.json.
+        """
+        os.makedirs(ruta, exist_ok=True)
+        for nombre in self.ARREGLOS:
+            np.save(os.path.join(ruta, f"{nombre}.npy"), np.ascontiguousarray(getattr(self, nombre)))
+        meta = {
+            "version_formato": VERSION_FORMATO,
+            "puntos": int(len(self.etiquetas)),
+            "dimensiones": int(self.puntos.shape[1]),
+            "hojas": int(len(self.hojas)),
+        }
+        with open(os.path.join(ruta, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def cargar(cls, ruta, metrica="euclidean", mmap=True):
+        """
+        Abre un índice guardado. Con mmap=True los arreglos quedan mapeados
+        en memoria (np.load(mmap_mode='r')) y no se copian.
+        """
+        modo = "r" if mmap else None
+        with open(os.path.join(ruta, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version_formato") != VERSION_FORMATO:
+            raise ValueError(f"Formato de índice no soportado en {ruta}: {meta.get('version_formato')}")
+        arreglos = [np.load(os.path.join(ruta, f"{nombre}.npy"), mmap_mode=modo) for nombre in cls.ARREGLOS]
+        return cls(*arreglos, metrica=metrica)
+
+    def consultar(self, vectores, k=5, metrica=None, bloque=32):
+        """
+        Busca los k vecinos más cercanos de cada vector (búsqueda exacta).
+
+        Args:
+            vectores (array-like): (n, d) vectores de consulta.
+            k (int): Número de vecinos (al menos 1).
+            metrica (str, opcional): Sustituye la métrica por defecto.
+            bloque (int): Consultas que descienden el árbol a la vez.
+
+        Returns:
+            tuple: (etiquetas (n, k), distancias (n, k)) ordenadas de menor a
+            mayor distancia.
+        """
+        metrica = metrica or self.metrica
+        if metrica not in METRICAS:
+            raise ValueError(f"Métrica no soportada: {metrica} (opciones: {', '.join(METRICAS)})")
+        if k < 1:
+            raise ValueError(f"k debe ser al menos 1: {k}")
+        if self._arbol is None:
+            # Hojas rellenas a un mismo tamaño (puntos de relleno en inf) para
+            # medir muchas hojas con una sola operación
+            inicios, fines = self.hojas[:, 0], self.hojas[:, 1]
+            posiciones = inicios[:, None] + np.arange((fines - inicios).max())[None, :]
+            validos = posiciones < fines[:, None]
+            posiciones = np.where(validos, posiciones, 0)
+            relleno = np.where(validos[:, :, None], self.puntos[posiciones], np.inf).astype(np.float32)
+            relleno = np.ascontiguousarray(relleno.transpose(0, 2, 1))  # (H, d, L)
+            self._arbol = (self.nodos[:, 0].astype(np.int64), self.nodos[:, 1].astype(np.int64),
+                           self.nodos[:, 2].astype(np.int64), self.cortes.astype(np.float32),
+                           posiciones, relleno)
+        consultas = np.asarray(vectores, dtype=np.float32).reshape(-1, self.puntos.shape[1])
+        n = len(consultas)
+        k = min(k, len(self))
+        mejores_d = np.empty((n, k), dtype=np.float32)
+        mejores_i = np.empty((n, k), dtype=np.int64)
+
+        for desde in range(0, n, bloque):
+            mejores_d[desde:desde + bloque], mejores_i[desde:desde + bloque] = self._buscar(
+                consultas[desde:desde + bloque], k, metrica)
+
+        if metrica == "euclidean":
+            mejores_d = np.sqrt(mejores_d)
+        return self.etiquetas[mejores_i], mejores_d
+
+    def _medir_hojas(self, consultas, filas, hojas, metrica):
+        """
+        Distancias (P, L) de las consultas 'filas' a los puntos de 'hojas'
+        (inf en el relleno) y sus índices.
+        """
+        posiciones, relleno = self._arbol[4], self._arbol[5]
+        diferencias = relleno[hojas] - consultas[filas][:, :, None]
+        if metrica == "euclidean":
+            np.multiply(diferencias, diferencias, out=diferencias)
+            return diferencias.sum(axis=1), posiciones[hojas]
+        np.abs(diferencias, out=diferencias)
+        if metrica == "manhattan":
+            return diferencias.sum(axis=1), posiciones[hojas]
+        return diferencias.max(axis=1), posiciones[hojas]
+
+    def _buscar(self, consultas, k, metrica):
+        """
+        Descenso del árbol para un bloque de consultas a la vez:
+
+        1. Cada consulta baja por el lado de sus planos de corte hasta su
+           hoja, que da un primer k-ésimo vecino (la cota de poda).
+        2. Recorrido por niveles de los pares (consulta, nodo): se baja a
+           ambos hijos, pero solo sobreviven los pares cuya distancia a la
+           caja del hijo no supera al k-ésimo vecino de la consulta.
+        3. Las hojas alcanzadas se miden en rondas por orden de cota (4, 8,
+           16... por consulta), volviendo a podar con el k-ésimo vecino
+           actualizado tras cada ronda.
+        """
+        dimensiones, izquierdos, derechos, cortes = self._arbol[:4]
+        m = len(consultas)
+        filas_todas = np.arange(m)
+        mejores_d = np.full((m, k), np.inf, dtype=np.float32)
+        mejores_i = np.zeros((m, k), dtype=np.int64)
+
+        # 1. Hoja propia de cada consulta
+        nodo = np.zeros(m, dtype=np.int64)
+        internos = dimensiones[nodo] >= 0
+        while internos.any():
+            n_int = nodo[internos]
+            a_la_izquierda = consultas[internos, dimensiones[n_int]] < cortes[n_int]
+            nodo[internos] = np.where(a_la_izquierda, izquierdos[n_int], derechos[n_int])
+            internos = dimensiones[nodo] >= 0
+        nodo_propio = nodo
+        distancias, indices = self._medir_hojas(consultas, filas_todas, izquierdos[nodo_propio], metrica)
+        mejores_d, mejores_i = _fusionar(mejores_d, mejores_i, filas_todas, distancias, indices)
+        peor = mejores_d[:, -1]
+
+        # 2. Recorrido por niveles con poda por cajas
+        filas, nodos = filas_todas, np.zeros(m, dtype=np.int64)
+        hojas_filas, hojas_nodos = [], []
+        while len(filas):
+            es_hoja = dimensiones[nodos] < 0
+            propias = nodos == nodo_propio[filas]
+            hojas_filas.append(filas[es_hoja & ~propias])
+            hojas_nodos.append(nodos[es_hoja & ~propias])
+            filas, nodos = filas[~es_hoja], nodos[~es_hoja]
+            filas = np.concatenate([filas, filas])
+            nodos = np.concatenate([izquierdos[nodos], derechos[nodos]])
+            cotas = _cotas_cajas(consultas[filas], self.cajas_min[nodos], self.cajas_max[nodos], metrica)
+            vivos = cotas < peor[filas]
+            filas, nodos = filas[vivos], nodos[vivos]
+
+        # 3. Hojas alcanzadas, por rondas y de menor a mayor cota
+        filas = np.concatenate(hojas_filas)
+        nodos = np.concatenate(hojas_nodos)
+        cotas = _cotas_cajas(consultas[filas], self.cajas_min[nodos], self.cajas_max[nodos], metrica)
+        orden = np.lexsort((cotas, filas))
+        filas, nodos, cotas = filas[orden], nodos[orden], cotas[orden]
+        posicion = np.arange(len(filas)) - np.searchsorted(filas, filas)
+        desde, tamano = 0, 4
+        while len(filas):
+            ronda = (posicion < desde + tamano) & (cotas < peor[filas])
+            if ronda.any():
+                distancias, indices = self._medir_hojas(consultas, filas[ronda], izquierdos[nodos[ronda]], metrica)
+                mejores_d, mejores_i = _fusionar(mejores_d, mejores_i, filas[ronda], distancias, indices)
+                peor = mejores_d[:, -1]
+            quedan = (posicion >= desde + tamano) & (cotas < peor[filas])
+            filas, nodos, cotas, posicion = filas[quedan], nodos[quedan], cotas[quedan], posicion[quedan]
+            desde += tamano
+            tamano *= 2
+        return mejores_d, mejores_i
+
+def _fusionar(mejores_d, mejores_i, filas, distancias, indices):
+    """
+    Une los k mejores actuales (m, k) con candidatos (P, L) de las consultas
+    'filas' y devuelve los nuevos k mejores de cada consulta, ordenados.
+    """
+    m, k = mejores_d.shape
+    candidatos_d = distancias.ravel()
+    utiles = candidatos_d < np.repeat(mejores_d[filas, -1], distancias.shape[1])
+    todas_filas = np.concatenate([np.repeat(np.arange(m), k), np.repeat(filas, distancias.shape[1])[utiles]])
+    todas_d = np.concatenate([mejores_d.ravel(), candidatos_d[utiles]])
+    todos_i = np.concatenate([mejores_i.ravel(), indices.ravel()[utiles]])
+    orden = np.lexsort((todas_d, todas_filas))
+    todas_filas = todas_filas[orden]
+    rango = np.arange(len(orden)) - np.searchsorted(todas_filas, todas_filas)
+    elegidos = orden[rango < k]
+    return todas_d[elegidos].reshape(m, k), todos_i[elegidos].reshape(m, k)
+
+def construir_kdtree(caracteristicas, etiquetas, tamano_hoja=64, metrica="euclidean"):
+    """
+    Construye un KD-tree por mediana, cortando en la dimensión de mayor rango,
+    y guarda cada nodo (dimensión, hijos, plano de corte y caja envolvente)
+    y el rango de puntos de cada hoja.
+
+    Args:
+        caracteristicas (numpy.ndarray): (N, d) vectores.
+        etiquetas (numpy.ndarray): (N,) etiqueta de cada vector.
+        tamano_hoja (int): Máximo de puntos por hoja.
+
+    Returns:
+        IndiceKDTree: Índice en memoria (usar guardar() para persistirlo).
+    """
+    puntos = np.asarray(caracteristicas, dtype=np.float32)
+    orden = np.arange(len(puntos))
+    hojas, nodos, cortes, rangos_nodo = [], [], [], []
+
+    def dividir(inicio, fin):
+        nodo = len(nodos)
+        nodos.append([-1, len(hojas), -1])
+        cortes.append(0.0)
+        rangos_nodo.append((inicio, fin))
+        bloque = puntos[orden[inicio:fin]]
+        rangos = bloque.max(axis=0) - bloque.min(axis=0)
+        dim = int(np.argmax(rangos))
+        # Hoja: pocos puntos o todos iguales
+        if fin - inicio <= tamano_hoja or rangos[dim] == 0:
+            hojas.append((inicio, fin))
+            return nodo
+        medio = (fin - inicio) // 2
+        particion = np.argpartition(bloque[:, dim], medio)
+        orden[inicio:fin] = orden[inicio:fin][particion]
+        cortes[nodo] = float(bloque[particion[medio], dim])
+        izquierdo = dividir(inicio, inicio + medio)
+        derecho = dividir(inicio + medio, fin)
+        nodos[nodo] = [dim, izquierdo, derecho]
+        return nodo
+
+    dividir(0, len(puntos))
+    puntos = puntos[orden]
+    hojas = np.array(hojas, dtype=np.int32)
+    cajas_min = np.vstack([puntos[i:f].min(axis=0) for i, f in rangos_nodo])
+    cajas_max = np.vstack([puntos[i:f].max(axis=0) for i, f in rangos_nodo])
+    return IndiceKDTree(puntos, np.asarray(etiquetas)[orden], hojas, cajas_min, cajas_max,
+                        np.array(nodos, dtype=np.int32), np.array(cortes, dtype=np.float32), metrica=metrica)
+
+def cargar_caracteristicas(csv_individuales_path):
+    """
+    Lee todos los digito_N.csv y devuelve (caracteristicas (N, 9) float32,
+    etiquetas (N,) int8).
+    """
+    import pandas as pd
+
+    bloques, etiquetas = [], []
+    for digito in range(10):
+        archivo = os.path.join(csv_individuales_path, f"digito_{digito}.csv")
+        if not os.path.exists(archivo):
+            print(f"\033[93m⚠️ CSV no encontrado para dígito {digito}\033[0m")
+            continue
+        df = pd.read_csv(archivo)
+        bloques.append(df[COLUMNAS_CUADRANTES].to_numpy(dtype=np.float32))
+        etiquetas.append(np.full(len(df), digito, dtype=np.int8))
+    if not bloques:
+        raise FileNotFoundError(f"No hay CSV de características en {csv_individuales_path}")
+    return np.vstack(bloques), np.concatenate(etiquetas)
+
+def construir_indice(csv_individuales_path="csv_por_digito", salida="csv_por_digito/indice_kdtree",
+                     tamano_hoja=64):
+    """
+    Construye el KD-tree sobre los CSV digito_N.csv y lo guarda en 'salida'.
+    """
+    print(f"\033[94m🌲 Construyendo KD-tree desde {csv_individuales_path}...\033[0m")
+    inicio = time.perf_counter()
+    caracteristicas, etiquetas = cargar_caracteristicas(csv_individuales_path)
+    indice = construir_kdtree(caracteristicas, etiquetas, tamano_hoja=tamano_hoja)
+    indice.guardar(salida)
+    print(f"\033[92m💾 KD-tree ({len(indice)} vectores, {len(indice.hojas)} hojas) guardado en: {salida} "
+          f"({(time.perf_counter() - inicio) * 1000:.0f} ms)\033[0m")
+    return indice
+
+def cargar_indice(ruta="csv_por_digito/indice_kdtree", csv_individuales_path="csv_por_digito",
+                  metrica="euclidean"):
+    """
+    Abre el índice guardado (mapeado en memoria); si no existe o tiene un
+    formato anterior, lo construye.
+    """
+    meta_path = os.path.join(ruta, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f).get("version_formato") != VERSION_FORMATO:
+                print(f"\033[93m⚠️ Índice {ruta} con formato anterior; se reconstruye\033[0m")
+                os.remove(meta_path)
+    if not os.path.exists(meta_path):
+        construir_indice(csv_individuales_path, ruta)
+    return IndiceKDTree.cargar(ruta, metrica=metrica)
+
+def consultar_csv(ruta_indice="csv_por_digito/indice_kdtree", csv_consulta_path="csv_por_digito_test",
+                  k=5, metrica="euclidean"):
+    """
+    Consulta el índice con los vectores de los CSV de test e informa el
+    tiempo de carga, el rendimiento y la precisión del voto de los k vecinos.
+    """
+    inicio = time.perf_counter()
+    indice = cargar_indice(ruta_indice, metrica=metrica)
+    print(f"\033[94m📂 Índice cargado en {(time.perf_counter() - inicio) * 1000:.2f} ms\033[0m")
+
+    consultas, reales = cargar_caracteristicas(csv_consulta_path)
+    inicio = time.perf_counter()
+    etiquetas, _ = indice.consultar(consultas, k=k)
+    duracion = time.perf_counter() - inicio
+
+    votos = np.array([np.bincount(fila, minlength=10).argmax() for fila in etiquetas.astype(np.int64)])
+    print(f"\033[92m✔ {len(consultas)} consultas (k = {k}, métrica = {metrica}) en {duracion * 1000:.1f} ms "
+          f"({len(consultas) / duracion:.0f} consultas/s)\033[0m")
+    print(f"\033[1;32m✅ Precisión del voto k-NN: {np.mean(votos == reales):.4f}\033[0m")
+
+def entero_positivo(texto):
+    """
+    Tipo de argparse: entero mayor o igual que 1.
+    """
+    valor = int(texto)
+    if valor < 1:
+        raise argparse.ArgumentTypeError(f"debe ser al menos 1: {valor}")
+    return valor
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice KD-tree persistente de características de operandos.")
+    parser.add_argument("accion", choices=["construir", "consultar"], help="Construir el índice o consultarlo con los CSV de test.")
+    parser.add_argument("--csv", default="csv_por_digito", help="Carpeta con los CSV digito_N.csv de entrenamiento.")
+    parser.add_argument("--indice", default="csv_por_digito/indice_kdtree", help="Carpeta del índice.")
+    parser.add_argument("--tamano-hoja", type=int, default=64, help="Máximo de puntos por hoja.")
+    parser.add_argument("--k", type=entero_positivo, default=5, help="Número de vecinos (al menos 1).")
+    parser.add_argument("--metrica", choices=METRICAS, default="euclidean", help="Métrica de distancia.")
+    parser.add_argument("--artefacto", help="Artefacto del modelo (model_artifact.py) donde guardar también el índice.")
+    args = parser.parse_args()
+
+    if args.accion == "construir":
+        indice = construir_indice(args.csv, args.indice, tamano_hoja=args.tamano_hoja)
+        if args.artefacto:
+            from model_artifact import actualizar_artefacto
+            actualizar_artefacto(args.artefacto, indice_knn=indice)
+    else:
+        consultar_csv(args.indice, k=args.k, metrica=args.metrica)
@@ -0,0 +1,231 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: operands_kmeans_prototypes.py
+Descripcion: Entrena K prototipos por digito con k-means por mini-lotes
+             recorriendo los CSV de caracteristicas en bloques de tamano
+             fijo, y clasifica por el prototipo mas cercano de todos.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerías externas: os, time, argparse, numpy, pandas (solo al leer CSV)
+===============================================================================
+Uso:
+Entrenar y evaluar contra los CSV de test:
+    python operands_kmeans_prototypes.py --k 16 --epocas 3 --bloque 4096
+Solo evaluar un modelo ya entrenado:
+    python operands_kmeans_prototypes.py --solo-evaluar
+===============================================================================
+Notas:
+- Un único promedio por dígito (generar_csv_promedios) no representa las
+  distintas formas de escribir, por ejemplo, 1, 4 o 7; aquí cada dígito se
+  resume en K centros.
+- Los CSV digito_N.csv se leen con pandas en bloques de --bloque filas, por
+  lo que la memoria no depende del número de muestras. Los centros se
+  inicializan con k-means++ sobre el primer bloque y se actualizan con la
+  regla de Sculley (tasa 1/conteo por centro) en mini-lotes de
+  --mini-lote filas durante --epocas pasadas.
+- El modelo se guarda en 'csv_por_digito/prototipos_kmeans.csv' con las
+  columnas Digito, Prototipo y P. Cuadrante 1..9: una matriz (10·K, 9).
+- La clasificación calcula en bloque las distancias a los 10·K prototipos
+  y asigna el dígito del más cercano.
+- La evaluación se guarda en 'kmeans_report/'.
+- Con --artefacto los prototipos se guardan también en el artefacto del
+  modelo (ver model_artifact.py).
+===============================================================================
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+COLUMNAS_CUADRANTES = [f"P. Cuadrante {i}" for i in range(1, 10)]
+
+def iterar_bloques(csv_path, bloque=4096):
+    """
+    Recorre un CSV de características en bloques de a lo sumo 'bloque'
+    filas y devuelve cada bloque como matriz float (n, 9).
+    """
+    import pandas as pd
+
+    for df in pd.read_csv(csv_path, usecols=COLUMNAS_CUADRANTES, chunksize=bloque):
+        yield df[COLUMNAS_CUADRANTES].to_numpy(dtype=float)
+
+def inicializar_kmeans_pp(vectores, k, rng):
+    """
+    Elige k centros iniciales con k-means++ (cada centro nuevo se sortea
+    con probabilidad proporcional a la distancia al cuadrado al más cercano).
+    """
+    centros = [vectores[rng.integers(len(vectores))]]
+    distancias = ((vectores - centros[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = distancias.sum()
+        if total == 0:
+            centros.append(vectores[rng.integers(len(vectores))])
+        else:
+            centros.append(vectores[rng.choice(len(vectores), p=distancias / total)])
+        distancias = np.minimum(distancias, ((vectores - centros[-1]) ** 2).sum(axis=1))
+    return np.array(centros, dtype=float)
+
+def asignar(vectores, centros):
+    """
+    Índice del centro más cercano (distancia Euclidiana) de cada vector.
+    """
+    distancias = (
+        (vectores ** 2).sum(axis=1)[:, None]
+        - 2.0 * vectores @ centros.T
+        + (centros ** 2).sum(axis=1)[None, :]
+    )
+    return np.argmin(distancias, axis=1)
+
+def actualizar_mini_lote(centros, conteos, mini_lote):
+    """
+    Paso de k-means por mini-lotes: cada centro se mueve hacia la media de
+    sus muestras asignadas con tasa n_lote / conteo acumulado.
+    """
+    asignaciones = asignar(mini_lote, centros)
+    n_lote = np.bincount(asignaciones, minlength=len(centros))
+    sumas = np.zeros_like(centros)
+    np.add.at(sumas, asignaciones, mini_lote)
+
+    usados = n_lote > 0
+    conteos[usados] += n_lote[usados]
+    tasa = n_lote[usados] / conteos[usados]
+    medias = sumas[usados] / n_lote[usados, None]
+    centros[usados] += tasa[:, None] * (medias - centros[usados])
+
+def entrenar_digito(csv_path, k=16, epocas=3, bloque=4096, mini_lote=256, semilla=0):
+    """
+    Entrena los k centros de un dígito recorriendo su CSV en bloques.
+
+    Retorna:
+    - Matriz (k, 9) de centros.
+    """
+    rng = np.random.default_rng(semilla)
+    primero = next(iterar_bloques(csv_path, bloque))
+    centros = inicializar_kmeans_pp(primero, min(k, len(primero)), rng)
+    conteos = np.zeros(len(centros))
+
+    for _ in range(epocas):
+        for vectores in iterar_bloques(csv_path, bloque):
+            vectores = vectores[rng.permutation(len(vectores))]
+            for inicio in range(0, len(vectores), mini_lote):
+                actualizar_mini_lote(centros, conteos, vectores[inicio:inicio + mini_lote])
+    return centros
+
+def entrenar_prototipos_kmeans(input_path="csv_por_digito",
+                               output_file="csv_por_digito/prototipos_kmeans.csv",
+                               k=16, epocas=3, bloque=4096, mini_lote=256, semilla=0):
+    """
+    Entrena K prototipos por dígito y guarda la matriz (10·K, 9) en CSV.
+    """
+    import pandas as pd
+
+    print(f"\n\033[94m📊 Entrenando {k} prototipos por dígito con k-means por mini-lotes...\033[0m")
+    filas = []
+    for digito in range(10):
+        file_path = os.path.join(input_path, f"digito_{digito}.csv")
+        if not os.path.exists(file_path):
+            print(f"\033[93m⚠️ No se encontró el archivo CSV para el dígito {digito}\033[0m")
+            continue
+
+        inicio = time.perf_counter()
+        centros = entrenar_digito(file_path, k=k, epocas=epocas, bloque=bloque,
+                                  mini_lote=mini_lote, semilla=semilla + digito)
+        for i, centro in enumerate(centros):
+            filas.append([digito, i] + list(np.round(centro, 6)))
+        print(f"\033[92m✔ Dígito {digito}: {len(centros)} prototipos en {time.perf_counter() - inicio:.2f} s\033[0m")
+
+    df_resultado = pd.DataFrame(filas, columns=["Digito", "Prototipo"] + COLUMNAS_CUADRANTES)
+    df_resultado.to_csv(output_file, index=False)
+    print(f"\n\033[1;32m✅ Prototipos guardados en: {output_file} ({len(df_resultado)} x 9)\033[0m")
+
+def cargar_prototipos_kmeans(csv_prototipos="csv_por_digito/prototipos_kmeans.csv"):
+    """
+    Carga el modelo como (digitos (10·K,), matriz (10·K, 9)).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_prototipos)
+    return df["Digito"].to_numpy(dtype=np.int64), df[COLUMNAS_CUADRANTES].to_numpy(dtype=float)
+
+def clasificar_multi_prototipo(vectores, digitos, prototipos):
+    """
+    Asigna a cada vector el dígito de su prototipo más cercano entre todos
+    los 10·K prototipos.
+    """
+    vectores = np.asarray(vectores, dtype=float).reshape(-1, prototipos.shape[1])
+    return digitos[asignar(vectores, prototipos)]
+
+def evaluar_prototipos_kmeans(csv_prototipos="csv_por_digito/prototipos_kmeans.csv",
+                              csv_evaluacion_path="csv_por_digito_test",
+                              salida="kmeans_report/clasificacion_kmeans.csv"):
+    """
+    Clasifica los CSV de evaluación con el modelo de K prototipos por dígito
+    y guarda las predicciones y un resumen.
+    """
+    import pandas as pd
+
+    if not os.path.exists(csv_prototipos):
+        print(f"\033[91m🚫 Archivo de prototipos no encontrado: {csv_prototipos}\033[0m")
+        return
+
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    digitos, prototipos = cargar_prototipos_kmeans(csv_prototipos)
+
+    df = pd.concat(
+        [pd.read_csv(os.path.join(csv_evaluacion_path, f"digito_{d}.csv"))
+         for d in range(10) if os.path.exists(os.path.join(csv_evaluacion_path, f"digito_{d}.csv"))],
+        ignore_index=True,
+    )
+    vectores = df[COLUMNAS_CUADRANTES].to_numpy(dtype=float)
+
+    inicio = time.perf_counter()
+    predicciones = clasificar_multi_prototipo(vectores, digitos, prototipos)
+    duracion = time.perf_counter() - inicio
+
+    df_resultado = df[["Digito", "Nombre Imagen"] + COLUMNAS_CUADRANTES].rename(columns={"Digito": "Digito Real"})
+    df_resultado["Digito Predicho"] = predicciones
+    df_resultado.to_csv(salida, index=False)
+
+    aciertos = predicciones == df_resultado["Digito Real"].to_numpy()
+    resumen = (
+        f"Prototipos: {len(prototipos)} ({len(prototipos) // max(len(set(digitos)), 1)} por dígito)\n"
+        f"Vectores clasificados: {len(df)}\n"
+        f"Precisión global: {aciertos.mean():.4f}\n"
+        f"Tiempo total: {duracion * 1000:.1f} ms\n"
+        f"Rendimiento: {len(df) / duracion if duracion > 0 else 0.0:.0f} vectores/s\n"
+    )
+    resumen_path = os.path.join(os.path.dirname(salida), "resumen.txt")
+    with open(resumen_path, "w", encoding="utf-8") as f:
+        f.write(resumen)
+
+    print("\n" + resumen)
+    print(f"\033[92m💾 Predicciones guardadas en: {salida}\033[0m")
+    print(f"\033[92m💾 Resumen guardado en: {resumen_path}\033[0m")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prototipos múltiples por dígito con k-means por mini-lotes.")
+    parser.add_argument("--k", type=int, default=16, help="Prototipos por dígito.")
+    parser.add_argument("--epocas", type=int, default=3, help="Pasadas sobre cada CSV.")
+    parser.add_argument("--bloque", type=int, default=4096, help="Filas leídas del CSV por bloque.")
+    parser.add_argument("--mini-lote", type=int, default=256, help="Filas por paso de k-means.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de la inicialización.")
+    parser.add_argument("--solo-evaluar", action="store_true", help="No entrena; evalúa el modelo guardado.")
+    parser.add_argument("--artefacto", help="Artefacto del modelo (model_artifact.py) donde guardar también los prototipos.")
+    args = parser.parse_args()
+
+    if not args.solo_evaluar:
+        entrenar_prototipos_kmeans(k=args.k, epocas=args.epocas, bloque=args.bloque,
+                                   mini_lote=args.mini_lote, semilla=args.semilla)
+        if args.artefacto:
+            from model_artifact import actualizar_artefacto
+            actualizar_artefacto(args.artefacto, prototipos_kmeans=cargar_prototipos_kmeans())
+    evaluar_prototipos_kmeans()
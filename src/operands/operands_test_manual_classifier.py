@@ -6,7 +6,7 @@ Descripcion: Clasificador simple basado en distancia Euclidiana entre vectores
              de tinta por cuadrante y los vectores promedio por dígito de test.
 Autor: Alejandro Castro Martinez
 Fecha de creacion: 2025-04-14
-Ultima modificacion: 2025-04-14
+Ultima modificacion: 2026-10-19
 Version: 1.0
 ===============================================================================
 Dependencias:
@@ -16,6 +16,7 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python operands_test_manual_classifier.py
+    python operands_test_manual_classifier.py --knn --k 5 --metrica manhattan
 ===============================================================================
 Notas:
 - El script clasifica cada imagen manuscrita comparándola con los promedios
@@ -23,18 +24,26 @@ Notas:
 - Requiere que previamente existan los CSV con los cuadrantes individuales
   y el archivo de promedios por dígito.
 - Los resultados se guardan en un único archivo CSV con predicciones.
+- Con --knn cada imagen se clasifica por voto de sus k vecinos en el KD-tree
+  persistente de las características de entrenamiento
+  (operands_kdtree_index.py, 'csv_por_digito/indice_kdtree').
 ===============================================================================
 """
 
+import argparse
 import os
 import pandas as pd
 import numpy as np
 from scipy.spatial.distance import euclidean
 
+from operands_two_stage_classifier import cargar_indice_knn, consultar_knn
+
 def clasificador_manual(csv_prototipos="csv_por_digito_test/promedios_por_digito.csv",
                         csv_individuales_path="csv_por_digito_test",
                         salida="test_analysis/clasificacion_resultados_test.csv",
-                        block_size=100):
+                        block_size=100,
+                        indice=None,
+                        k=5):
     """
     Clasifica cada imagen de operandos utilizando distancia Euclidiana
     a los vectores promedio de cada dígito (prototipos).
@@ -44,6 +53,9 @@ def clasificador_manual(csv_prototipos="csv_por_digito_test/promedios_por_digito
     - csv_individuales_path: carpeta con los CSV individuales por imagen.
     - salida: ruta de salida para guardar el CSV con predicciones.
     - block_size: frecuencia de impresión del progreso.
+    - indice: KD-tree de cargar_indice_knn; si se indica, se clasifica por
+      k vecinos en lugar de por prototipos.
+    - k: vecinos usados con el índice.
     """
     # Verificar existencia del archivo de prototipos
     if not os.path.exists(csv_prototipos):
@@ -76,6 +88,15 @@ def clasificador_manual(csv_prototipos="csv_por_digito_test/promedios_por_digito
 
         print(f"\n\033[94m📁 Clasificando {total} imágenes del dígito {digito}...\033[0m")
 
+        if indice is not None:
+            # Todo el CSV se consulta en el índice de una sola vez
+            vectores = df[[f"P. Cuadrante {i}" for i in range(1, 10)]].to_numpy(dtype=float)
+            predichos = consultar_knn(indice, vectores, k=k)
+            for (_, row), vector, digito_predicho in zip(df.iterrows(), vectores, predichos):
+                resultados.append([row["Digito"], row["Nombre Imagen"]] + list(vector) + [int(digito_predicho)])
+            print(f"\033[92m✔ {total}/{total} clasificadas (k-NN, k = {k})...\033[0m")
+            continue
+
         for i, (_, row) in enumerate(df.iterrows()):
             # Extraer vector de la imagen actual
             vector = row[[f"P. Cuadrante {i}" for i in range(1, 10)]].values.astype(float)
@@ -110,4 +131,15 @@ def clasificador_manual(csv_prototipos="csv_por_digito_test/promedios_por_digito
 
 # Punto de entrada
 if __name__ == "__main__":
-    clasificador_manual()
+    parser = argparse.ArgumentParser(description="Clasificador de operandos de test por prototipos o k-NN.")
+    parser.add_argument("--knn", action="store_true", help="Clasifica por k vecinos en el KD-tree de entrenamiento.")
+    parser.add_argument("--indice", default="csv_por_digito/indice_kdtree", help="Carpeta del KD-tree (se construye si no existe).")
+    parser.add_argument("--k", type=int, default=5, help="Vecinos del voto k-NN.")
+    parser.add_argument("--metrica", default="euclidean", choices=["euclidean", "manhattan", "chebyshev"], help="Métrica del k-NN.")
+    args = parser.parse_args()
+
+    if args.knn:
+        indice = cargar_indice_knn(args.indice, "csv_por_digito", metrica=args.metrica)
+        clasificador_manual(salida="test_analysis/clasificacion_knn_test.csv", indice=indice, k=args.k)
+    else:
+        clasificador_manual()
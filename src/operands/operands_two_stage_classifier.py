@@ -0,0 +1,290 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: operands_two_stage_classifier.py
+Descripcion: Clasificador de operandos en dos etapas: prototipo mas cercano y,
+             solo para las muestras con poco margen entre el mejor y el
+             segundo mejor prototipo, k vecinos mas cercanos sobre todas las
+             caracteristicas de entrenamiento usando un indice espacial.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerías externas: os, time, argparse, numpy, pandas (solo al leer CSV)
+===============================================================================
+Uso:
+Ejecutar el script con el siguiente comando:
+    python operands_two_stage_classifier.py --tasa-escalado 0.15 --k 5
+Con un umbral fijo (sin calibrar):
+    python operands_two_stage_classifier.py --umbral-margen 0.02 --k 5
+===============================================================================
+Notas:
+- Etapa 1: distancias Euclidianas a los 10 prototipos; margen = distancia
+  al segundo prototipo - distancia al primero. Los prototipos son la media
+  por dígito de los puntos del índice k-NN (los CSV de entrenamiento), así
+  que ambas etapas usan la misma partición. Los prototipos servidos
+  (promedios_por_digito.csv) salen de las imágenes de test y evaluar con
+  ellos sobre esas mismas imágenes favorecía a la etapa 1.
+- Etapa 2: si el margen es menor que el umbral, la muestra se clasifica
+  por voto de sus k vecinos en todas las características de entrenamiento
+  (los CSV digito_N.csv, unos 94k vectores de 9 dimensiones).
+- El KD-tree sale del artefacto del modelo servido (model_artifact.py) si
+  lo trae. Si el artefacto no tiene índice se usa el KD-tree persistente
+  de operands_kdtree_index.py: se construye una sola vez en
+  'csv_por_digito/indice_kdtree' y las ejecuciones siguientes lo abren
+  mapeado en memoria.
+- Por defecto se clasifican los CSV de test contra el modelo de
+  entrenamiento y se reporta la fracción escalada y el rendimiento en
+  'two_stage_report/'.
+- El umbral se calibra a partir de una tasa de escalado objetivo
+  (--tasa-escalado, 15% por defecto): es el cuantil de esa tasa de los
+  márgenes de una mitad de validación de los CSV de test (fija, semilla
+  0), y las métricas se reportan sobre la otra mitad. El resumen incluye
+  la precisión de la etapa 1 sola; si en validación el escalado no la
+  supera, el umbral calibrado se descarta (umbral 0, sin k-NN).
+===============================================================================
+"""
+
+import argparse
+import functools
+import os
+import time
+
+import numpy as np
+
+from model_artifact import RUTA_MODELO, RUTA_PROTOTIPOS, cargar_modelo_servido
+from operands_kdtree_index import cargar_indice, construir_indice
+
+COLUMNAS_CUADRANTES = [f"P. Cuadrante {i}" for i in range(1, 10)]
+
+# Tasa de escalado objetivo y umbral de margen calibrado con ella sobre la
+# mitad de validación (ver two_stage_report/resumen.txt); lo usan los
+# clasificadores de classify_equations.py
+TASA_ESCALADO = 0.15
+UMBRAL_MARGEN = 0.0024
+FRACCION_VALIDACION = 0.5
+
+def cargar_prototipos(csv_prototipos):
+    """
+    Carga los prototipos como (digitos, matriz (10, 9)).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_prototipos)
+    return df["Digito"].to_numpy(dtype=np.int64), df[COLUMNAS_CUADRANTES].to_numpy(dtype=float)
+
+@functools.lru_cache(maxsize=4)
+def prototipos_de_indice(indice):
+    """
+    Prototipos de la etapa 1 como (digitos, matriz (10, 9)): la media por
+    etiqueta de los puntos del índice k-NN (se calcula una vez por índice).
+    """
+    etiquetas = np.asarray(indice.etiquetas, dtype=np.int64)
+    digitos = np.unique(etiquetas)
+    puntos = np.asarray(indice.puntos, dtype=float)
+    return digitos, np.vstack([puntos[etiquetas == d].mean(axis=0) for d in digitos])
+
+def cargar_indice_knn(ruta="csv_por_digito/indice_kdtree", csv_individuales_path="csv_por_digito",
+                      metrica="euclidean"):
+    """
+    Abre el KD-tree persistente (operands_kdtree_index); si no existe, lo
+    construye a partir de los CSV digito_N.csv y lo guarda.
+    """
+    return cargar_indice(ruta, csv_individuales_path, metrica=metrica)
+
+def votar_vecinos(etiquetas_vecinas, distancias_vecinas):
+    """
+    Voto mayoritario por fila entre los k vecinos; los empates se resuelven
+    a favor de la clase con el vecino más cercano.
+
+    Parámetros:
+    - etiquetas_vecinas, distancias_vecinas: matrices (n, k) ordenadas por distancia.
+    """
+    predicciones = []
+    for etiquetas, distancias in zip(etiquetas_vecinas, distancias_vecinas):
+        votos = np.bincount(etiquetas, minlength=10)
+        empatadas = np.flatnonzero(votos == votos.max())
+        if len(empatadas) == 1:
+            predicciones.append(int(empatadas[0]))
+        else:
+            predicciones.append(int(next(e for e in etiquetas if e in empatadas)))
+    return predicciones
+
+def consultar_knn(indice, vectores, k=5):
+    """
+    Devuelve la predicción por voto de los k vecinos de cada vector.
+    """
+    vectores = np.asarray(vectores, dtype=np.float32).reshape(-1, 9)
+    if len(vectores) == 0:
+        return np.empty(0, dtype=np.int64)
+    etiquetas, distancias = indice.consultar(vectores, k=k)
+    return np.array(votar_vecinos(etiquetas.astype(np.int64), distancias), dtype=np.int64)
+
+def margenes_prototipos(vectores, digitos, prototipos):
+    """
+    Etapa 1: (predicciones, margenes) con el prototipo más cercano y la
+    distancia al segundo menos la distancia al primero.
+    """
+    vectores = np.asarray(vectores, dtype=float).reshape(-1, prototipos.shape[1])
+    distancias = np.sqrt(((vectores[:, None, :] - prototipos[None, :, :]) ** 2).sum(axis=2))
+    orden = np.argsort(distancias, axis=1)
+    filas = np.arange(len(vectores))
+    margenes = distancias[filas, orden[:, 1]] - distancias[filas, orden[:, 0]]
+    return digitos[orden[:, 0]].copy(), margenes
+
+def calibrar_umbral_margen(margenes, tasa_escalado=TASA_ESCALADO):
+    """
+    Umbral de margen con el que escala la fracción 'tasa_escalado' de las
+    muestras (el cuantil de sus márgenes).
+    """
+    return float(np.quantile(margenes, tasa_escalado))
+
+def particion_validacion(n, fraccion=FRACCION_VALIDACION, semilla=0):
+    """
+    Máscara (n,) fija con la fracción de filas que forman la validación.
+    """
+    validacion = np.zeros(n, dtype=bool)
+    validacion[np.random.default_rng(semilla).permutation(n)[:int(round(n * fraccion))]] = True
+    return validacion
+
+def clasificar_dos_etapas(vectores, digitos, prototipos, indice, umbral_margen=UMBRAL_MARGEN, k=5):
+    """
+    Clasifica un lote de vectores de tinta en dos etapas.
+
+    Parámetros:
+    - vectores: matriz (n, 9) de porcentajes de tinta por cuadrante.
+    - digitos, prototipos: salida de prototipos_de_modelo o cargar_prototipos.
+    - indice: índice k-NN de cargar_indice_knn.
+    - umbral_margen: margen mínimo para aceptar la etapa 1.
+    - k: vecinos de la etapa 2.
+
+    Retorna:
+    - (predicciones, margenes, escaladas): arrays (n,) con el dígito
+      predicho, el margen de la etapa 1 y si la muestra pasó a la etapa 2.
+    """
+    vectores = np.asarray(vectores, dtype=float).reshape(-1, prototipos.shape[1])
+    predicciones, margenes = margenes_prototipos(vectores, digitos, prototipos)
+
+    escaladas = margenes < umbral_margen
+    if escaladas.any():
+        predicciones[escaladas] = consultar_knn(indice, vectores[escaladas], k=k)
+    return predicciones, margenes, escaladas
+
+def clasificador_dos_etapas(ruta_modelo=RUTA_MODELO,
+                            csv_prototipos=RUTA_PROTOTIPOS,
+                            csv_entrenamiento_path="csv_por_digito",
+                            csv_evaluacion_path="csv_por_digito_test",
+                            ruta_indice="csv_por_digito/indice_kdtree",
+                            salida="two_stage_report/clasificacion_dos_etapas.csv",
+                            umbral_margen=None,
+                            tasa_escalado=TASA_ESCALADO,
+                            k=5):
+    """
+    Clasifica los CSV de evaluación con el clasificador de dos etapas y
+    guarda las predicciones y un resumen de fracción escalada y rendimiento.
+    Sin umbral_margen, se calibra para 'tasa_escalado' con la mitad de
+    validación y las métricas son de la otra mitad.
+    """
+    import pandas as pd
+
+    if not os.path.exists(ruta_modelo) and not os.path.exists(csv_prototipos):
+        print(f"\033[91m🚫 Ni artefacto ({ruta_modelo}) ni prototipos ({csv_prototipos})\033[0m")
+        return
+
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+
+    modelo = cargar_modelo_servido(ruta_modelo, csv_prototipos)
+    print(f"\033[94m🏷 Versión del modelo: {modelo.version}\033[0m")
+    inicio = time.perf_counter()
+    indice = modelo.indice_knn()
+    if indice is None:
+        indice = cargar_indice_knn(ruta_indice, csv_entrenamiento_path)
+    print(f"\033[94m🌲 Índice k-NN listo en {(time.perf_counter() - inicio) * 1000:.1f} ms\033[0m")
+    digitos, prototipos = prototipos_de_indice(indice)
+
+    df = pd.concat(
+        [pd.read_csv(os.path.join(csv_evaluacion_path, f"digito_{d}.csv"))
+         for d in range(10) if os.path.exists(os.path.join(csv_evaluacion_path, f"digito_{d}.csv"))],
+        ignore_index=True,
+    )
+    vectores = df[COLUMNAS_CUADRANTES].to_numpy(dtype=float)
+    reales = df["Digito"].to_numpy()
+    validacion = particion_validacion(len(df))
+    solo_etapa1, margenes_etapa1 = margenes_prototipos(vectores, digitos, prototipos)
+    if umbral_margen is None:
+        umbral_margen = calibrar_umbral_margen(margenes_etapa1[validacion], tasa_escalado)
+        calibracion = f"calibrado para {tasa_escalado:.0%} con {validacion.sum()} vectores de validación"
+        # El escalado se mantiene solo si mejora a la etapa 1 en validación
+        base = np.mean(solo_etapa1[validacion] == reales[validacion])
+        con_knn = np.mean(clasificar_dos_etapas(vectores[validacion], digitos, prototipos, indice,
+                                                umbral_margen=umbral_margen, k=k)[0] == reales[validacion])
+        if con_knn <= base:
+            calibracion += f"; descartado, k-NN no mejora la etapa 1 ({con_knn:.4f} <= {base:.4f})"
+            umbral_margen = 0.0
+        print(f"\033[94m🎯 Umbral de margen {umbral_margen:.6f} ({calibracion})\033[0m")
+    else:
+        calibracion = "fijo"
+
+    print(f"\033[94m🧠 Clasificando {len(df)} vectores (umbral de margen = {umbral_margen}, k = {k})...\033[0m")
+    inicio = time.perf_counter()
+    predicciones, margenes, escaladas = clasificar_dos_etapas(
+        vectores, digitos, prototipos, indice, umbral_margen=umbral_margen, k=k
+    )
+    duracion = time.perf_counter() - inicio
+
+    df_resultado = df[["Digito", "Nombre Imagen"] + COLUMNAS_CUADRANTES].rename(columns={"Digito": "Digito Real"})
+    df_resultado["Margen"] = np.round(margenes, 6)
+    df_resultado["Etapa"] = np.where(escaladas, 2, 1)
+    df_resultado["Digito Predicho"] = predicciones
+    df_resultado["Particion"] = np.where(validacion, "validacion", "evaluacion")
+    df_resultado.to_csv(salida, index=False)
+
+    # Métricas sobre la partición de evaluación (la validación fijó el umbral)
+    evaluacion = ~validacion
+    aciertos = (predicciones == reales)[evaluacion]
+    aciertos_etapa1 = (solo_etapa1 == reales)[evaluacion]
+    tasa_validacion = escaladas[validacion].mean() if validacion.any() else 0.0
+    escaladas = escaladas[evaluacion]
+    resumen = (
+        f"Versión del modelo: {modelo.version}\n"
+        f"Tasa de escalado objetivo: {tasa_escalado}\n"
+        f"Umbral de margen: {umbral_margen:.6f} ({calibracion})\n"
+        f"k: {k}\n"
+        f"Vectores clasificados: {len(df)} ({validacion.sum()} validación, {evaluacion.sum()} evaluación)\n"
+        f"Fracción escalada a k-NN (validación): {tasa_validacion:.4f}\n"
+        f"Fracción escalada a k-NN (evaluación): {escaladas.mean():.4f}\n"
+        f"Precisión global (evaluación): {aciertos.mean():.4f}\n"
+        f"Precisión solo etapa 1 (evaluación, sin k-NN): {aciertos_etapa1.mean():.4f}\n"
+        f"Precisión etapa 1 (aceptadas): {aciertos[~escaladas].mean() if (~escaladas).any() else 0.0:.4f}\n"
+        f"Precisión etapa 2 (escaladas): {aciertos[escaladas].mean() if escaladas.any() else 0.0:.4f}\n"
+        f"Tiempo total: {duracion * 1000:.1f} ms\n"
+        f"Rendimiento: {len(df) / duracion if duracion > 0 else 0.0:.0f} vectores/s\n"
+    )
+    resumen_path = os.path.join(os.path.dirname(salida), "resumen.txt")
+    with open(resumen_path, "w", encoding="utf-8") as f:
+        f.write(resumen)
+
+    print("\n" + resumen)
+    print(f"\033[92m💾 Predicciones guardadas en: {salida}\033[0m")
+    print(f"\033[92m💾 Resumen guardado en: {resumen_path}\033[0m")
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clasificador de operandos en dos etapas (prototipos + k-NN).")
+    parser.add_argument("--modelo", default=RUTA_MODELO, help="Artefacto del modelo (model_artifact.py).")
+    parser.add_argument("--umbral-margen", type=float, help="Margen mínimo fijo para aceptar el prototipo (sin calibrar).")
+    parser.add_argument("--tasa-escalado", type=float, default=TASA_ESCALADO,
+                        help="Fracción de validación que debe escalar a k-NN al calibrar el umbral.")
+    parser.add_argument("--k", type=int, default=5, help="Vecinos de la etapa 2.")
+    parser.add_argument("--reconstruir", action="store_true", help="Reconstruye el índice k-NN aunque exista.")
+    args = parser.parse_args()
+    if not 0 < args.tasa_escalado < 1:
+        parser.error(f"--tasa-escalado debe estar entre 0 y 1: {args.tasa_escalado}")
+
+    if args.reconstruir:
+        construir_indice()
+    clasificador_dos_etapas(ruta_modelo=args.modelo, umbral_margen=args.umbral_margen,
+                            tasa_escalado=args.tasa_escalado, k=args.k)
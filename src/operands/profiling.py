@@ -0,0 +1,317 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: profiling.py
+Descripcion: Perfilado bajo demanda de los scripts del pipeline: cProfile
+             (archivo .prof y pilas colapsadas para flame graphs) o un modo
+             por muestreo de pilas para ejecuciones largas, activado por
+             variable de entorno, por --perfil o envolviendo cualquier script.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: ninguna (cProfile, pstats, runpy, threading)
+===============================================================================
+Uso:
+Cualquier script instrumentado (extract_test_images.py, extract_test_operands.py,
+generate_ink_density_csv.py, operator_classification.py, classify_equations.py,
+solve_stream.py, solve_server.py):
+    INKSOLVER_PERFIL=1 python classify_equations.py
+    INKSOLVER_PERFIL=1 INKSOLVER_PERFIL_MUESTREO_MS=5 python extract_test_operands.py
+Los que tienen argumentos tambien aceptan --perfil:
+    python classify_equations.py --perfil
+    python solve_stream.py --perfil perfiles/stream --perfil-muestreo-ms 2 < entradas.ndjson
+Cualquier otro script, sin modificarlo (desde la carpeta del script):
+    python ../operands/profiling.py template_matching.py
+    python profiling.py --muestreo-ms 5 --salida perfiles/knn operands_kdtree_index.py
+Ver el resultado:
+    python -m pstats perfiles/classify_equations.prof
+    flamegraph.pl perfiles/classify_equations.collapsed > flame.svg
+    (o abrir el .collapsed en speedscope.app)
+===============================================================================
+Notas:
+- La ruta de salida es una base sin extension: '1' usa
+  'perfiles/<nombre>' (en la carpeta actual). Se escriben:
+    - modo cProfile: <base>.prof, <base>.collapsed y <base>.txt (las 40
+      funciones con mas tiempo acumulado).
+    - modo muestreo: <base>.collapsed y <base>.txt (funciones con mas
+      muestras propias). No hay .prof: no se instrumentan las llamadas.
+- Las pilas colapsadas del modo cProfile se reconstruyen del grafo de
+  llamadas (pstats solo guarda pares llamador-llamado), repartiendo el
+  tiempo de cada funcion entre sus llamadores en proporcion; los valores son
+  microsegundos. Lo que no se puede ubicar asi (sobre todo la recursion de
+  los imports) queda bajo la raiz '[sin pila]'. Las del modo muestreo son pilas reales y los valores son
+  numero de muestras, con el nombre del hilo como raiz.
+- cProfile solo mide el hilo que lo activa; en solve_server.py y con
+  --workers en solve_stream.py conviene el modo muestreo, que ve todos los
+  hilos. El muestreo cuesta poco (una lectura de sys._current_frames() por
+  intervalo) y sirve para ejecuciones largas.
+- Los resultados se escriben al terminar el proceso (atexit), tambien si el
+  script termina con error o con Ctrl+C.
+===============================================================================
+"""
+
+import argparse
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+VARIABLE_ENTORNO = "INKSOLVER_PERFIL"
+VARIABLE_MUESTREO = "INKSOLVER_PERFIL_MUESTREO_MS"
+carpeta_salida = "perfiles"
+
+# Profundidad maxima de las pilas reconstruidas y tiempo minimo (s) de una rama
+MAX_PROFUNDIDAD = 200
+MIN_RAMA_S = 1e-6
+
+def etiqueta(archivo, linea, funcion):
+    """
+    Nombre de un marco en las pilas colapsadas (sin ';', que separa marcos).
+    """
+    if archivo == "~":  # funciones internas de C: ('~', 0, "<built-in method ...>")
+        return funcion.replace(";", ",")
+    return f"{funcion} ({os.path.basename(archivo)}:{linea})".replace(";", ",")
+
+def pilas_desde_estadisticas(estadisticas):
+    """
+    Reconstruye pilas colapsadas a partir de las estadisticas de cProfile.
+
+    Args:
+        estadisticas (dict): pstats.Stats(...).stats.
+
+    Returns:
+        Counter: {"raiz;...;funcion": microsegundos de tiempo propio}.
+    """
+    llamados = {}
+    entrante = {}  # suma del tiempo acumulado de las aristas que llegan a cada funcion
+    for funcion, (_, _, _, _, llamadores) in estadisticas.items():
+        for llamador, arista in llamadores.items():
+            llamados.setdefault(llamador, []).append((funcion, arista[3]))
+            entrante[funcion] = entrante.get(funcion, 0.0) + arista[3]
+
+    pilas = Counter()
+    emitido = Counter()
+
+    def recorrer(funcion, pila, acumulado):
+        pila = pila + [etiqueta(*funcion)]
+        clave = ";".join(pila)
+        _, _, propio, total, _ = estadisticas[funcion]
+        total = entrante.get(funcion, total)
+        if funcion in recorrer.en_curso or len(pila) >= MAX_PROFUNDIDAD or total <= 0:
+            # Recursion: su tiempo ya esta contado en la llamada exterior
+            return
+        fraccion = min(1.0, acumulado / total)
+        pilas[clave] += propio * fraccion * 1e6
+        emitido[funcion] += propio * fraccion
+        recorrer.en_curso.add(funcion)
+        for hijo, acumulado_hijo in llamados.get(funcion, ()):
+            if acumulado_hijo * fraccion >= MIN_RAMA_S:
+                recorrer(hijo, pila, acumulado_hijo * fraccion)
+        recorrer.en_curso.discard(funcion)
+
+    recorrer.en_curso = set()
+    limite = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limite, MAX_PROFUNDIDAD * 4))
+    try:
+        for funcion, (_, _, _, acumulado, llamadores) in estadisticas.items():
+            if not llamadores:
+                recorrer(funcion, [], acumulado)
+    finally:
+        sys.setrecursionlimit(limite)
+    # Lo que no se pudo ubicar (ramas recortadas, recursion como la de los
+    # imports) se agrega bajo una raiz aparte para que los totales coincidan
+    for funcion, (_, _, propio, _, _) in estadisticas.items():
+        if propio - emitido[funcion] >= MIN_RAMA_S:
+            pilas[f"[sin pila];{etiqueta(*funcion)}"] += (propio - emitido[funcion]) * 1e6
+    return Counter({pila: int(round(us)) for pila, us in pilas.items() if us >= 0.5})
+
+def escribir_colapsadas(pilas, ruta):
+    with open(ruta, "w", encoding="utf-8") as f:
+        for pila, valor in sorted(pilas.items()):
+            f.write(f"{pila} {valor}\n")
+
+class _Muestreador(threading.Thread):
+    """
+    Hilo que lee las pilas de todos los demas hilos cada 'intervalo_s'.
+    """
+
+    def __init__(self, intervalo_s):
+        super().__init__(name="perfil-muestreo", daemon=True)
+        self.intervalo_s = intervalo_s
+        self.pilas = Counter()
+        self.muestras = 0
+        self._parar = threading.Event()
+        self._etiquetas = {}
+
+    def _etiqueta(self, codigo):
+        nombre = self._etiquetas.get(codigo)
+        if nombre is None:
+            nombre = self._etiquetas[codigo] = etiqueta(codigo.co_filename, codigo.co_firstlineno, codigo.co_name)
+        return nombre
+
+    def run(self):
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo_s):
+            nombres = {h.ident: h.name for h in threading.enumerate()}
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while marco is not None:
+                    pila.append(self._etiqueta(marco.f_code))
+                    marco = marco.f_back
+                pila.append(nombres.get(ident, f"hilo-{ident}"))
+                self.pilas[";".join(reversed(pila))] += 1
+            self.muestras += 1
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+
+class Perfilador:
+    """
+    Perfilador del proceso (uno solo a la vez).
+    """
+
+    def __init__(self):
+        self.habilitado = False
+        self.nombre = None
+        self.base = None
+        self.muestreo_ms = None
+        self._perfil = None
+        self._muestreador = None
+        self._inicio = None
+
+    def activar(self, nombre, base=None, muestreo_ms=None):
+        """
+        Empieza a perfilar; los resultados se escriben en base.* al terminar.
+        Con muestreo_ms se muestrean pilas en lugar de usar cProfile.
+        """
+        if self.habilitado:
+            return
+        self.nombre = nombre
+        self.base = os.path.splitext(base)[0] if base else os.path.join(carpeta_salida, nombre)
+        self.muestreo_ms = muestreo_ms
+        self.habilitado = True
+        self._inicio = time.perf_counter()
+        atexit.register(self.detener)
+        if muestreo_ms:
+            self._muestreador = _Muestreador(muestreo_ms / 1000)
+            self._muestreador.start()
+        else:
+            self._perfil = cProfile.Profile()
+            self._perfil.enable()
+        modo = f"muestreo cada {muestreo_ms:g} ms" if muestreo_ms else "cProfile"
+        print(f"\033[94m🔬 Perfilando {nombre} ({modo}) -> {self.base}.*\033[0m", file=sys.stderr)
+
+    def detener(self):
+        """
+        Deja de perfilar y escribe los resultados.
+
+        Returns:
+            list: Rutas escritas.
+        """
+        if not self.habilitado:
+            return []
+        self.habilitado = False
+        duracion = time.perf_counter() - self._inicio
+        carpeta = os.path.dirname(self.base)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        rutas = []
+
+        if self._muestreador is not None:
+            self._muestreador.detener()
+            pilas = self._muestreador.pilas
+            propias = Counter()
+            for pila, n in pilas.items():
+                propias[pila.rsplit(";", 1)[-1]] += n
+            with open(f"{self.base}.txt", "w", encoding="utf-8") as f:
+                f.write(f"{self.nombre}: {self._muestreador.muestras} muestras cada {self.muestreo_ms:g} ms "
+                        f"en {duracion:.2f} s\n\n{'muestras':>9}  {'%':>6}  funcion (tiempo propio)\n")
+                total = sum(propias.values()) or 1
+                for funcion, n in propias.most_common(40):
+                    f.write(f"{n:>9}  {100 * n / total:>6.2f}  {funcion}\n")
+            rutas.append(f"{self.base}.txt")
+        else:
+            self._perfil.disable()
+            self._perfil.dump_stats(f"{self.base}.prof")
+            rutas.append(f"{self.base}.prof")
+            texto = io.StringIO()
+            estadisticas = pstats.Stats(self._perfil, stream=texto)
+            estadisticas.sort_stats("cumulative").print_stats(40)
+            with open(f"{self.base}.txt", "w", encoding="utf-8") as f:
+                f.write(f"{self.nombre}: cProfile en {duracion:.2f} s\n")
+                f.write(texto.getvalue())
+            rutas.append(f"{self.base}.txt")
+            pilas = pilas_desde_estadisticas(estadisticas.stats)
+
+        escribir_colapsadas(pilas, f"{self.base}.collapsed")
+        rutas.append(f"{self.base}.collapsed")
+        print(f"\033[92m💾 Perfil de {self.nombre} guardado en: {', '.join(rutas)}\033[0m", file=sys.stderr)
+        return rutas
+
+# Perfilador global del proceso
+perfil = Perfilador()
+
+def activar_desde_entorno(nombre, muestreo_ms=None):
+    """
+    Activa el perfilado si la variable INKSOLVER_PERFIL esta definida
+    (INKSOLVER_PERFIL_MUESTREO_MS tiene prioridad sobre muestreo_ms).
+
+    Returns:
+        bool: True si quedo activado.
+    """
+    valor = os.environ.get(VARIABLE_ENTORNO, "").strip()
+    if not valor or valor.lower() in ("0", "no", "false"):
+        return False
+    base = None if valor.lower() in ("1", "si", "true") else valor
+    muestreo = os.environ.get(VARIABLE_MUESTREO)
+    perfil.activar(nombre, base, float(muestreo) if muestreo else muestreo_ms)
+    return True
+
+def agregar_argumentos(parser):
+    """
+    Agrega --perfil y --perfil-muestreo-ms a un parser de argparse.
+    """
+    parser.add_argument("--perfil", nargs="?", const="1", default=None, metavar="BASE",
+                        help="Perfilar la ejecucion (cProfile); BASE es la ruta sin extension (por defecto perfiles/<script>).")
+    parser.add_argument("--perfil-muestreo-ms", type=float, default=None, metavar="MS",
+                        help="Con --perfil, muestrear las pilas cada MS ms en lugar de usar cProfile.")
+
+def activar_desde_argumentos(args, nombre):
+    """
+    Activa el perfilado segun --perfil o, si no se paso, segun el entorno.
+    """
+    if args.perfil is None:
+        return activar_desde_entorno(nombre, args.perfil_muestreo_ms)
+    base = None if args.perfil == "1" else args.perfil
+    perfil.activar(nombre, base, args.perfil_muestreo_ms)
+    return True
+
+# Punto de entrada
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta un script de Python bajo el perfilador.")
+    parser.add_argument("--salida", default=None, help="Ruta base de los resultados (por defecto perfiles/<script>).")
+    parser.add_argument("--muestreo-ms", type=float, default=None, help="Muestrear las pilas cada N ms en lugar de usar cProfile.")
+    parser.add_argument("script", help="Script a ejecutar.")
+    parser.add_argument("argumentos", nargs=argparse.REMAINDER, help="Argumentos del script.")
+    args = parser.parse_args()
+
+    sys.argv = [args.script] + args.argumentos
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    perfil.activar(os.path.splitext(os.path.basename(args.script))[0], args.salida, args.muestreo_ms)
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    finally:
+        perfil.detener()
@@ -0,0 +1,577 @@
+"""
+===============================================================================
+Proyecto: Inksolver
+Archivo: stage_timing.py
+Descripcion: Cronometros por etapa (decodificacion, umbral, segmentacion,
+             caracteristicas, clasificacion, escritura de CSV, ...) con
+             agregados en memoria y un resumen JSON al final de la
+             ejecucion. Opcionalmente mide tambien la memoria de cada etapa
+             (pico de RSS y sitios de asignacion con tracemalloc) y puede
+             fallar si se supera un presupuesto. Sin efecto cuando estan
+             desactivados.
+Autor: Alejandro Castro Martinez
+Fecha de creacion: 2026-10-19
+Ultima modificacion: 2026-10-19
+Version: 1.0
+===============================================================================
+Dependencias:
+- Python 3.10
+- Librerias externas: ninguna (os, sys, json, time, atexit, bisect,
+  signal, threading, functools, tracemalloc)
+===============================================================================
+Uso:
+En el codigo:
+    from stage_timing import tiempos
+
+    with tiempos.etapa("decodificar"):
+        img = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+
+    @tiempos.medir("escribir_csv")
+    def guardar(df): ...
+Activar en cualquier script instrumentado (extract_test_images.py,
+extract_test_operands.py, generate_ink_density_csv.py,
+operator_classification.py, classify_equations.py,
+operands_ink_density_viewer.py):
+    INKSOLVER_TIEMPOS=1 python classify_equations.py
+    INKSOLVER_TIEMPOS=resumen.json python classify_equations.py
+Con memoria por etapa (solo RSS, o RSS y tracemalloc):
+    INKSOLVER_MEMORIA=rss python operator_classification.py
+    INKSOLVER_MEMORIA=1 python generate_ink_density_csv.py
+Fallando si se supera un presupuesto (MB de RSS, total o por etapa):
+    INKSOLVER_MEMORIA_MAX_MB=400 python operator_classification.py
+    INKSOLVER_MEMORIA_MAX_MB="total=400,caracteristicas=300" python operator_classification.py
+===============================================================================
+Notas:
+- Desactivado (por defecto), etapa() devuelve un contexto vacio compartido
+  y los decoradores llaman directamente a la funcion: no se mide ni se
+  guarda nada.
+- Activado, cada etapa acumula en memoria: numero de llamadas, total, minimo,
+  maximo, media y un histograma de duraciones en cubetas logaritmicas
+  (de 10 us a 10 s). Es seguro entre hilos.
+- observar() permite a otros modulos recibir cada etapa terminada (las
+  trazas por elemento de item_tracing.py y los histogramas por etapa de
+  prometheus_metrics.py usan los mismos nombres de etapa).
+- Las etapas pueden anidarse (por ejemplo 'caracteristicas' dentro de
+  'clasificar'); cada una mide su propio tiempo de pared, asi que los
+  totales de etapas anidadas no se suman.
+- activar_desde_entorno(nombre) lee la variable INKSOLVER_TIEMPOS: '1'
+  escribe 'tiempos_etapas/<nombre>.json' (en la carpeta actual) y cualquier
+  otro valor es la ruta del JSON. El resumen se escribe al terminar el
+  proceso (atexit), tambien si el script termina con error.
+- INKSOLVER_MEMORIA (o INKSOLVER_MEMORIA_MAX_MB) activa tambien los tiempos.
+  Por etapa se agrega al resumen:
+    - pico_rss_mb: RSS maximo del proceso visto durante la etapa. Un hilo
+      de muestreo lee el RSS cada INTERVALO_MUESTREO_MS (5 ms) y lo aplica
+      a todas las etapas abiertas; ademas se lee al entrar y al salir. Un
+      pico mas corto que el intervalo puede no verse. Con varios hilos el
+      pico es del proceso, no del hilo. No se reinicia el pico del kernel
+      (VmHWM), que sigue siendo el pico del proceso.
+    - incremento_pico_mb: el mayor (pico muestreado - RSS al entrar) de una
+      llamada: cuanta memoria llego a pedir la etapa por encima de la que
+      ya habia.
+    - crecimiento_rss_mb: suma de (RSS al salir - RSS al entrar); si crece
+      con las llamadas, la etapa retiene memoria (listas que se acumulan).
+    - con tracemalloc: pico_python_mb (pico de memoria de Python de una
+      llamada) y sitios: las lineas que mas memoria retienen al salir de la
+      etapa. Se miden solo en la primera llamada (FOTOS_POR_ETAPA = 2 agrega
+      la decima, 3 la centesima, ...) porque cada foto agrupa todas las
+      asignaciones vivas (Snapshot.statistics('traceback')); si una lista
+      crece con las llamadas, su linea ya aparece en la primera.
+  y al final los sitios con mas memoria viva al terminar (memoria.al_final).
+- tracemalloc guarda 5 marcos por asignacion para ubicar la linea del
+  proyecto que la origina; hace mucho mas lento el proceso (importar pandas,
+  por ejemplo), asi que es para diagnostico. El modo 'rss' cuesta dos
+  lecturas de /proc por etapa (~20 us cada una) mas las del hilo de
+  muestreo, y sirve en ejecuciones normales.
+- Con INKSOLVER_MEMORIA_MAX_MB, al salir de la primera etapa que supera el
+  presupuesto se muestra el error, se guarda el resumen (con 'excedido') y
+  el proceso termina con codigo 3 (SystemExit, que no atrapan los
+  'except Exception' de los scripts). Un numero solo es el presupuesto del
+  proceso ('total'); 'etapa=MB' limita el pico de esa etapa.
+- Si la etapa que excede corre en otro hilo, un SystemExit ahi solo
+  terminaria ese hilo: el hilo lo lanza igual (corta su trabajo) y ademas
+  se envia SENAL_PRESUPUESTO (SIGUSR1) al hilo principal, cuyo manejador
+  (instalado al activar con presupuesto) lanza el SystemExit(3) alli. Sin
+  esa senal (Windows) se interrumpe el hilo principal con
+  KeyboardInterrupt.
+===============================================================================
+"""
+
+import atexit
+import bisect
+import functools
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import _thread
+from collections import Counter
+from contextlib import nullcontext
+
+VARIABLE_ENTORNO = "INKSOLVER_TIEMPOS"
+VARIABLE_MEMORIA = "INKSOLVER_MEMORIA"
+VARIABLE_PRESUPUESTO = "INKSOLVER_MEMORIA_MAX_MB"
+carpeta_salida = "tiempos_etapas"
+
+# Limites superiores (ms) de las cubetas del histograma; la ultima es "> 10 s"
+LIMITES_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Memoria: marcos guardados por tracemalloc, sitios por etapa en el resumen y
+# codigo de salida cuando se supera el presupuesto
+MARCOS_TRACEMALLOC = 5
+SITIOS_POR_ETAPA = 5
+FOTOS_POR_ETAPA = 1
+CODIGO_PRESUPUESTO = 3
+INTERVALO_MUESTREO_MS = 5
+SENAL_PRESUPUESTO = getattr(signal, "SIGUSR1", None)
+
+_NULO = nullcontext()
+_RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def leer_rss_mb():
+    """
+    RSS actual y pico de RSS del proceso (MB).
+    """
+    actual = pico = None
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    actual = int(linea.split()[1]) / 1024
+                elif linea.startswith("VmHWM:"):
+                    pico = int(linea.split()[1]) / 1024
+    except OSError:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return (actual if actual is not None else pico), pico
+
+def leer_presupuestos(valor):
+    """
+    '400' -> {'total': 400}; 'total=400,caracteristicas=300' -> por etapa.
+    """
+    if "=" not in valor:
+        return {"total": float(valor)}
+    presupuestos = {}
+    for parte in valor.split(","):
+        etapa, mb = parte.split("=")
+        presupuestos[etapa.strip()] = float(mb)
+    return presupuestos
+
+def sitio_de(marcos):
+    """
+    'archivo:linea' del marco mas reciente que pertenece al proyecto (o del
+    mas reciente si ninguno pertenece). marcos: ((archivo, linea), ...), del
+    mas reciente al mas antiguo.
+    """
+    for archivo, linea in marcos:
+        if archivo.startswith(_RAIZ_PROYECTO):
+            return f"{os.path.relpath(archivo, _RAIZ_PROYECTO)}:{linea}"
+    archivo, linea = marcos[0]
+    return f"{os.path.basename(archivo)}:{linea}"
+
+def foto_memoria():
+    """
+    Bytes vivos por pila de asignacion: {((archivo, linea), ...): bytes}.
+    """
+    foto = tracemalloc.take_snapshot()
+    tamanos = Counter()
+    for estadistica in foto.statistics("traceback"):
+        # El traceback va del marco mas antiguo al mas reciente
+        tamanos[tuple((m.filename, m.lineno) for m in reversed(estadistica.traceback))] += estadistica.size
+    return tamanos
+
+# Sitios de las propias fotos y agregados, que no se informan
+_ARCHIVOS_PROPIOS = (os.path.basename(tracemalloc.__file__), os.path.relpath(os.path.abspath(__file__), _RAIZ_PROYECTO))
+
+def sitios_de(tamanos):
+    """
+    Agrupa {marcos: bytes} por sitio, sin las asignaciones de las propias
+    fotos.
+    """
+    sitios = Counter()
+    for marcos, tamano in tamanos.items():
+        if tamano and marcos:
+            sitio = sitio_de(marcos)
+            if sitio.rsplit(":", 1)[0] not in _ARCHIVOS_PROPIOS:
+                sitios[sitio] += tamano
+    return sitios
+
+class _MarcoMemoria:
+    """
+    Estado de memoria de una llamada a una etapa.
+    """
+    __slots__ = ("rss_inicio", "pico_rss", "python_inicio", "pico_python", "foto")
+
+    def __init__(self, rss_inicio):
+        self.rss_inicio = rss_inicio
+        self.pico_rss = rss_inicio
+        self.python_inicio = self.pico_python = 0
+        self.foto = None
+
+class _Cronometro:
+    """
+    Contexto que mide una ejecucion de una etapa.
+    """
+    __slots__ = ("_tiempos", "_nombre", "_inicio", "_marco")
+
+    def __init__(self, tiempos, nombre):
+        self._tiempos = tiempos
+        self._nombre = nombre
+        self._marco = None
+
+    def __enter__(self):
+        if self._tiempos.memoria:
+            self._marco = self._tiempos._entrar_memoria(self._nombre)
+        self._inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        self._tiempos._terminar(self._nombre, self._inicio, time.perf_counter_ns() - self._inicio)
+        if self._marco is not None:
+            self._tiempos._salir_memoria(self._nombre, self._marco)
+        return False
+
+class TiemposEtapas:
+    """
+    Registro de tiempos por etapa de un proceso.
+    """
+
+    def __init__(self):
+        self.habilitado = False
+        self.ruta_salida = None
+        self.nombre = None
+        self.memoria = None  # None, "rss" o "tracemalloc"
+        self.presupuestos_mb = {}
+        self.excedido = None
+        self._inicio = None
+        self._etapas = {}
+        self._memoria_etapas = {}
+        self._pico_proceso_mb = 0.0
+        self._pila_memoria = threading.local()
+        self._marcos_abiertos = set()  # Etapas abiertas de todos los hilos, para el muestreo
+        self._bloqueo_marcos = threading.Lock()
+        self._muestreador = None
+        self._senal_instalada = False
+        self._bloqueo = threading.Lock()
+        self._atexit = False
+        self._oyentes = ()
+        self._activo = False  # habilitado o con oyente: solo entonces se mide
+
+    def activar(self, nombre="inksolver", ruta_salida=None, memoria=None, presupuestos_mb=None):
+        """
+        Empieza a medir; si se da ruta_salida, el resumen se escribe ahi al
+        terminar el proceso. memoria: None, "rss" o "tracemalloc".
+        """
+        self.habilitado = True
+        self._activo = True
+        self.nombre = nombre
+        self.ruta_salida = ruta_salida
+        self._inicio = time.time()
+        self.presupuestos_mb = dict(presupuestos_mb or {})
+        self.memoria = memoria or ("rss" if self.presupuestos_mb else None)
+        if self.memoria == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start(MARCOS_TRACEMALLOC)
+        if self.memoria and (self._muestreador is None or not self._muestreador.is_alive()):
+            self._muestreador = threading.Thread(target=self._muestrear, name="muestreo_rss", daemon=True)
+            self._muestreador.start()
+        if (self.presupuestos_mb and SENAL_PRESUPUESTO is not None and not self._senal_instalada
+                and threading.current_thread() is threading.main_thread()):
+            signal.signal(SENAL_PRESUPUESTO, self._senal_presupuesto)
+            self._senal_instalada = True
+        if ruta_salida and not self._atexit:
+            atexit.register(self._guardar_al_salir)
+            self._atexit = True
+
+    def desactivar(self):
+        self.habilitado = False
+        self.memoria = None
+        self._activo = bool(self._oyentes)
+
+    def observar(self, oyente):
+        """
+        Registra oyente(nombre, inicio_ns, duracion_ns), que se llama al
+        terminar cada etapa aunque los tiempos esten desactivados (lo usan
+        item_tracing.py y las metricas de solve_server.py).
+        """
+        self._oyentes = self._oyentes + (oyente,)
+        self._activo = True
+
+    def dejar_de_observar(self, oyente):
+        self._oyentes = tuple(o for o in self._oyentes if o != oyente)
+        self._activo = self.habilitado or bool(self._oyentes)
+
+    def reiniciar(self):
+        with self._bloqueo:
+            self._etapas = {}
+            self._memoria_etapas = {}
+
+    def etapa(self, nombre):
+        """
+        Contexto que mide la etapa 'nombre' (vacio si esta desactivado).
+        """
+        if not self._activo:
+            return _NULO
+        return _Cronometro(self, nombre)
+
+    def medir(self, nombre):
+        """
+        Decorador que mide cada llamada a la funcion como la etapa 'nombre'.
+        Se consulta al llamar, asi que sirve aunque se active despues.
+        """
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                if not self._activo:
+                    return funcion(*args, **kwargs)
+                with _Cronometro(self, nombre):
+                    return funcion(*args, **kwargs)
+            return envoltura
+        return decorador
+
+    def _terminar(self, nombre, inicio_ns, duracion_ns):
+        if self.habilitado:
+            self.registrar(nombre, duracion_ns)
+        for oyente in self._oyentes:
+            oyente(nombre, inicio_ns, duracion_ns)
+
+    def registrar(self, nombre, duracion_ns):
+        """
+        Agrega una duracion (ns) a la etapa.
+        """
+        cubeta = bisect.bisect_left(LIMITES_MS, duracion_ns / 1e6)
+        with self._bloqueo:
+            agregado = self._etapas.get(nombre)
+            if agregado is None:
+                agregado = self._etapas[nombre] = [0, 0, duracion_ns, duracion_ns, [0] * (len(LIMITES_MS) + 1)]
+            agregado[0] += 1
+            agregado[1] += duracion_ns
+            if duracion_ns < agregado[2]:
+                agregado[2] = duracion_ns
+            if duracion_ns > agregado[3]:
+                agregado[3] = duracion_ns
+            agregado[4][cubeta] += 1
+
+    # -------------------------------------------------------------------------
+    # Memoria por etapa
+    # -------------------------------------------------------------------------
+
+    def _pila(self):
+        pila = getattr(self._pila_memoria, "pila", None)
+        if pila is None:
+            pila = self._pila_memoria.pila = []
+        return pila
+
+    def _leer_rss(self):
+        actual, pico = leer_rss_mb()
+        if pico > self._pico_proceso_mb:
+            self._pico_proceso_mb = pico
+        return actual, pico
+
+    def _muestrear(self):
+        """
+        Hilo de muestreo: cada INTERVALO_MUESTREO_MS lee el RSS y sube el
+        pico de todas las etapas abiertas.
+        """
+        while self.memoria:
+            time.sleep(INTERVALO_MUESTREO_MS / 1000)
+            actual, _ = self._leer_rss()
+            with self._bloqueo_marcos:
+                for marco in self._marcos_abiertos:
+                    if actual > marco.pico_rss:
+                        marco.pico_rss = actual
+
+    def _entrar_memoria(self, nombre):
+        pila = self._pila()
+        actual, _ = self._leer_rss()
+        marco = _MarcoMemoria(actual)
+        with self._bloqueo_marcos:
+            self._marcos_abiertos.add(marco)
+        if self.memoria == "tracemalloc":
+            python, pico_python = tracemalloc.get_traced_memory()
+            if pila:
+                pila[-1].pico_python = max(pila[-1].pico_python, pico_python)
+            tracemalloc.reset_peak()
+            marco.python_inicio = marco.pico_python = python
+            llamadas = self._memoria_etapas.get(nombre, (0,))[0] + 1
+            if str(llamadas).rstrip("0") == "1" and llamadas < 10 ** FOTOS_POR_ETAPA:  # llamadas 1, 10, 100, ...
+                marco.foto = foto_memoria()
+        pila.append(marco)
+        return marco
+
+    def _salir_memoria(self, nombre, marco):
+        pila = self._pila()
+        if pila and pila[-1] is marco:
+            pila.pop()
+        actual, _ = self._leer_rss()
+        with self._bloqueo_marcos:
+            self._marcos_abiertos.discard(marco)
+            marco.pico_rss = max(marco.pico_rss, actual)
+            if pila:
+                pila[-1].pico_rss = max(pila[-1].pico_rss, marco.pico_rss)
+        sitios = None
+        if self.memoria == "tracemalloc":
+            marco.pico_python = max(marco.pico_python, tracemalloc.get_traced_memory()[1])
+            if pila:
+                pila[-1].pico_python = max(pila[-1].pico_python, marco.pico_python)
+            if marco.foto is not None:
+                diferencia = foto_memoria()
+                diferencia.subtract(marco.foto)
+                sitios = sitios_de(diferencia)
+
+        with self._bloqueo:
+            agregado = self._memoria_etapas.get(nombre)
+            if agregado is None:
+                agregado = self._memoria_etapas[nombre] = [0, 0.0, 0.0, 0, Counter(), 0, 0.0]
+            agregado[0] += 1
+            agregado[1] = max(agregado[1], marco.pico_rss)
+            agregado[6] = max(agregado[6], marco.pico_rss - marco.rss_inicio)
+            agregado[2] += actual - marco.rss_inicio
+            agregado[3] = max(agregado[3], marco.pico_python - marco.python_inicio)
+            if sitios is not None:
+                agregado[4].update(sitios)
+                agregado[5] += 1
+
+        limite = self.presupuestos_mb.get(nombre)
+        if limite is not None and marco.pico_rss > limite:
+            self._exceder(nombre, marco.pico_rss, limite)
+        limite = self.presupuestos_mb.get("total")
+        if limite is not None and self._pico_proceso_mb > limite:
+            self._exceder("total", self._pico_proceso_mb, limite)
+
+    def _exceder(self, presupuesto, pico_mb, limite_mb):
+        if self.excedido is not None:
+            return
+        self.excedido = {"presupuesto": presupuesto, "pico_rss_mb": round(pico_mb, 1), "limite_mb": limite_mb}
+        print(f"\n\033[91m❌ Presupuesto de memoria excedido ({presupuesto}): {pico_mb:.1f} MB de RSS > "
+              f"{limite_mb:g} MB\033[0m", file=sys.stderr)
+        if threading.current_thread() is not threading.main_thread():
+            # Un SystemExit en otro hilo solo terminaria ese hilo: se avisa
+            # al hilo principal para que el proceso termine con el codigo 3
+            if self._senal_instalada:
+                signal.pthread_kill(threading.main_thread().ident, SENAL_PRESUPUESTO)
+            else:
+                _thread.interrupt_main()
+        raise SystemExit(CODIGO_PRESUPUESTO)
+
+    def _senal_presupuesto(self, *_):
+        raise SystemExit(CODIGO_PRESUPUESTO)
+
+    def resumen_memoria(self):
+        """
+        Memoria del proceso: modo, pico de RSS, presupuestos y, con
+        tracemalloc, los sitios con mas memoria viva en este momento.
+        """
+        self._leer_rss()
+        documento = {
+            "modo": self.memoria,
+            "pico_rss_mb": round(self._pico_proceso_mb, 1),
+            "presupuestos_mb": self.presupuestos_mb,
+            "excedido": self.excedido,
+        }
+        if self.memoria == "tracemalloc":
+            vivos = sitios_de(foto_memoria())
+            documento["al_final"] = [{"sitio": s, "kb": round(b / 1024, 1)} for s, b in vivos.most_common(10)]
+        return documento
+
+    def resumen(self):
+        """
+        {etapa: {llamadas, total_s, media_ms, min_ms, max_ms, histograma_ms}},
+        de la etapa con mas tiempo total a la de menos (con 'memoria' si se
+        mide).
+        """
+        with self._bloqueo:
+            etapas = {nombre: (c, t, mn, mx, list(h)) for nombre, (c, t, mn, mx, h) in self._etapas.items()}
+            memoria = {nombre: list(m) for nombre, m in self._memoria_etapas.items()}
+        etiquetas = [f"<={limite:g}" for limite in LIMITES_MS] + [f">{LIMITES_MS[-1]:g}"]
+        resumen = {}
+        for nombre, (llamadas, total, minimo, maximo, histograma) in sorted(etapas.items(), key=lambda e: -e[1][1]):
+            resumen[nombre] = {
+                "llamadas": llamadas,
+                "total_s": round(total / 1e9, 6),
+                "media_ms": round(total / llamadas / 1e6, 4),
+                "min_ms": round(minimo / 1e6, 4),
+                "max_ms": round(maximo / 1e6, 4),
+                "histograma_ms": {e: n for e, n in zip(etiquetas, histograma) if n},
+            }
+            if nombre in memoria:
+                _, pico_rss, crecimiento, pico_python, sitios, fotos, incremento = memoria[nombre]
+                datos = {"pico_rss_mb": round(pico_rss, 1), "incremento_pico_mb": round(incremento, 2),
+                         "crecimiento_rss_mb": round(crecimiento, 2)}
+                if self.memoria == "tracemalloc":
+                    datos["pico_python_mb"] = round(pico_python / 2**20, 3)
+                    datos["fotos"] = fotos
+                    datos["sitios"] = [{"sitio": s, "kb": round(b / 1024, 1)}
+                                       for s, b in sitios.most_common(SITIOS_POR_ETAPA) if b > 0]
+                resumen[nombre]["memoria"] = datos
+        return resumen
+
+    def guardar(self, ruta=None, extra=None):
+        """
+        Escribe el resumen JSON (con el script, la fecha y la duracion de la
+        ejecucion) y lo muestra por consola.
+        """
+        ruta = ruta or self.ruta_salida
+        documento = {
+            "script": self.nombre,
+            "inicio": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._inicio)) if self._inicio else None,
+            "duracion_s": round(time.time() - self._inicio, 3) if self._inicio else None,
+            "etapas": self.resumen(),
+        }
+        if self.memoria:
+            documento["memoria"] = self.resumen_memoria()
+        documento.update(extra or {})
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(documento, f, indent=2, ensure_ascii=False)
+        print(f"\n\033[94m⏱ Tiempos por etapa ({self.nombre}):\033[0m", file=sys.stderr)
+        for nombre, datos in documento["etapas"].items():
+            linea = (f"  {nombre:<24} {datos['llamadas']:>9} llamadas  {datos['total_s']:>10.3f} s  "
+                     f"media {datos['media_ms']:>9.3f} ms  max {datos['max_ms']:>9.3f} ms")
+            if "memoria" in datos:
+                linea += f"  pico {datos['memoria']['pico_rss_mb']:>7.1f} MB  crece {datos['memoria']['crecimiento_rss_mb']:>+8.2f} MB"
+            print(f"\033[92m{linea}\033[0m", file=sys.stderr)
+            for sitio in datos.get("memoria", {}).get("sitios", ())[:3]:
+                print(f"\033[90m      {sitio['kb']:>10.1f} KB  {sitio['sitio']}\033[0m", file=sys.stderr)
+        if self.memoria:
+            memoria = documento["memoria"]
+            print(f"\033[94m🧠 Pico de RSS del proceso: {memoria['pico_rss_mb']:.1f} MB\033[0m", file=sys.stderr)
+            if memoria["excedido"]:
+                print(f"\033[91m❌ Presupuesto excedido: {memoria['excedido']}\033[0m", file=sys.stderr)
+        print(f"\033[92m💾 Resumen de tiempos guardado en: {ruta}\033[0m", file=sys.stderr)
+        return ruta
+
+    def _guardar_al_salir(self):
+        if self.habilitado and self.ruta_salida:
+            self.guardar()
+
+# Registro global del proceso
+tiempos = TiemposEtapas()
+
+def _valor_activo(valor):
+    return bool(valor) and valor.lower() not in ("0", "no", "false")
+
+def activar_desde_entorno(nombre):
+    """
+    Activa los tiempos si la variable INKSOLVER_TIEMPOS (o
+    INKSOLVER_MEMORIA / INKSOLVER_MEMORIA_MAX_MB) esta definida.
+
+    Returns:
+        bool: True si quedaron activados.
+    """
+    valor = os.environ.get(VARIABLE_ENTORNO, "").strip()
+    memoria = os.environ.get(VARIABLE_MEMORIA, "").strip()
+    presupuesto = os.environ.get(VARIABLE_PRESUPUESTO, "").strip()
+    if not (_valor_activo(valor) or _valor_activo(memoria) or presupuesto):
+        return False
+    por_defecto = not _valor_activo(valor) or valor.lower() in ("1", "si", "true")
+    ruta = os.path.join(carpeta_salida, f"{nombre}.json") if por_defecto else valor
+    modo = None
+    if _valor_activo(memoria):
+        modo = "rss" if memoria.lower() == "rss" else "tracemalloc"
+    tiempos.activar(nombre, ruta, modo, leer_presupuestos(presupuesto) if presupuesto else None)
+    return True
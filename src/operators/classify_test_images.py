@@ -5,7 +5,7 @@ Archivo: classify_test_images.py
 Descripcion: Clasifica las imagenes de prueba en la carpeta 'test' segun la cantidad de picos detectados en sus histogramas de proyeccion.
 Autor: Alejandro Castro Martinez
 Fecha de creacion: 2025-03-17
-Ultima modificacion: 2025-03-18
+Ultima modificacion: 2026-10-19
 Version: 1.0
 ===============================================================================
 Dependencias:
@@ -15,17 +15,30 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python classify_test_images.py
+Sin la cache de recortes en disco:
+    python classify_test_images.py --sin-cache
 ===============================================================================
 Notas:
 - El script analiza imagenes de operadores matematicos y clasifica su tipo.
 - Los resultados se guardan en un archivo CSV dentro de 'test_results/'.
+- Los picos y la prediccion de cada imagen se memoizan por hash de su
+  contenido en 'test_results/cache_recortes.sqlite' (ver crop_cache.py):
+  al repetir la ejecucion sobre datos sin cambios no se recalculan. La
+  clave lleva la version del artefacto del modelo (model_artifact.py), de
+  donde salen tambien el umbral y las reglas de operadores.
 ===============================================================================
 """
 
+import argparse
 import os
 import cv2
 import numpy as np
 import pandas as pd
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from crop_cache import CacheClasificaciones
+from model_artifact import REGLAS_OPERADORES, UMBRAL_PICOS, cargar_modelo_servido, clasificar_por_reglas
 
 # Definir rutas
 input_folder = "../../data/operators/processed/test/"
@@ -33,6 +46,7 @@ output_folder = "test_results"
 os.makedirs(output_folder, exist_ok=True)
 
 output_csv = os.path.join(output_folder, "classified_test_images.csv")
+cache_path = os.path.join(output_folder, "cache_recortes.sqlite")
 BLOCK_SIZE = 50  # Numero de imagenes a procesar por bloque
 
 # Crear el archivo CSV con encabezados antes de procesar los datos
@@ -119,7 +133,7 @@ def count_peaks(hist, threshold=0.5):
             in_peak = False
     return peaks
 
-def classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot):
+def classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot, reglas=REGLAS_OPERADORES):
     """
     Clasifica la operacion matematica basada en la cantidad de picos detectados.
     
@@ -127,24 +141,42 @@ def classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot):
         horizontal_peaks (int): Picos en el histograma horizontal original.
         vertical_peaks (int): Picos en el histograma vertical original.
         horizontal_peaks_rot (int): Picos en el histograma horizontal de la imagen rotada.
+        reglas (list): Tabla de reglas del modelo (model_artifact.py).
     
     Returns:
         str: Tipo de operador clasificado.
     """
-    if horizontal_peaks == 0 and vertical_peaks == 0 and (horizontal_peaks_rot > 2 or horizontal_peaks_rot == 0):
-        return "div"
-    elif horizontal_peaks == 2 and vertical_peaks == 0:
-        return "equals"
-    elif horizontal_peaks == 1 and vertical_peaks == 0:
-        return "sub"
-    elif horizontal_peaks == 1 and vertical_peaks == 1:
-        return "sum"
-    elif horizontal_peaks == 0 and vertical_peaks == 0 and horizontal_peaks_rot <= 2:
-        return "times"
-    else:
-        return "Desconocido"
-
-def process_images():
+    return clasificar_por_reglas(horizontal_peaks, vertical_peaks, horizontal_peaks_rot, reglas)
+
+def analyze_image(img, umbral=UMBRAL_PICOS, reglas=REGLAS_OPERADORES):
+    """
+    Calcula los picos de proyeccion de una imagen y clasifica su operador.
+
+    Args:
+        img (numpy.ndarray): Imagen en escala de grises.
+        umbral (float): Umbral relativo de count_peaks del modelo.
+        reglas (list): Tabla de reglas del modelo.
+
+    Returns:
+        tuple: (picos horizontales, picos verticales, picos horizontales
+        rotados, prediccion).
+    """
+    # Calcular histogramas de proyeccion
+    hist_horizontal = compute_projection_histogram(img, axis=1)
+    hist_vertical = compute_projection_histogram(img, axis=0)
+    horizontal_peaks = count_peaks(hist_horizontal, threshold=umbral)
+    vertical_peaks = count_peaks(hist_vertical, threshold=umbral)
+
+    # Rotar imagen y recalcular histogramas
+    rotated_img = rotate_image_45(img)
+    hist_horizontal_rot = compute_projection_histogram(rotated_img, axis=1)
+    horizontal_peaks_rot = count_peaks(hist_horizontal_rot, threshold=umbral)
+
+    # Clasificar operador matematico
+    prediction = classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot, reglas)
+    return horizontal_peaks, vertical_peaks, horizontal_peaks_rot, prediction
+
+def process_images(modelo, cache=None):
     """
     Carga, procesa y clasifica las imagenes en bloques por categoria.
 
@@ -159,6 +191,12 @@ def process_images():
     4. Se rota la imagen 45° y se recalculan los histogramas.
     5. Se determina el operador matematico segun la cantidad de picos detectados.
     6. Se guarda la informacion en un archivo CSV.
+
+    Args:
+        modelo (ModeloInkSolver): Modelo servido; aporta el umbral, las
+            reglas y la version con la que se indexa la cache.
+        cache (CacheClasificaciones, opcional): Cache de recortes; las
+            imagenes ya analizadas con la misma version no se recalculan.
     
     Prints:
         - Muestra en consola el progreso de la clasificacion.
@@ -174,6 +212,10 @@ def process_images():
         print("\033[91m⚠️ No se encontraron imagenes para procesar en la carpeta de test.\033[0m")
         return
 
+    def analizar(img):
+        return analyze_image(img, modelo.umbral_picos, modelo.reglas)
+
+    print(f"\033[94m🏷 Version del modelo: {modelo.version}\033[0m")
     for category, images in image_paths.items():
         total_images = len(images)
         print(f"\n\033[94m📂 Procesando {total_images} imagenes de la categoria '{category}'...\033[0m")
@@ -188,19 +230,11 @@ def process_images():
                 if img is None:
                     continue  # Saltar imagenes corruptas
 
-                # Calcular histogramas de proyeccion
-                hist_horizontal = compute_projection_histogram(img, axis=1)
-                hist_vertical = compute_projection_histogram(img, axis=0)
-                horizontal_peaks = count_peaks(hist_horizontal, threshold=0.8)
-                vertical_peaks = count_peaks(hist_vertical, threshold=0.8)
-
-                # Rotar imagen y recalcular histogramas
-                rotated_img = rotate_image_45(img)
-                hist_horizontal_rot = compute_projection_histogram(rotated_img, axis=1)
-                horizontal_peaks_rot = count_peaks(hist_horizontal_rot, threshold=0.8)
-
-                # Clasificar operador matematico
-                prediction = classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot)
+                if cache is None:
+                    analysis = analizar(img)
+                else:
+                    analysis = cache.clasificar(img, "operador_picos_test", modelo.version, analizar)
+                horizontal_peaks, vertical_peaks, horizontal_peaks_rot, prediction = analysis
 
                 # Almacenar resultados en la lista
                 batch_data.append({
@@ -220,6 +254,15 @@ def process_images():
 
     print("\n\033[92m✅ PROCESO COMPLETADO: CLASIFICACION FINALIZADA.\033[0m")
     print(f"\033[93m📂 Archivo de resultados guardado en: {output_csv}\033[0m")
+    if cache is not None:
+        print(f"\033[93m🗃 Cache de recortes: {cache.metricas()}\033[0m")
 
 if __name__ == "__main__":
-    process_images()
+    parser = argparse.ArgumentParser(description="Clasifica las imagenes de prueba de operadores por picos de proyeccion.")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar la cache de recortes en disco.")
+    args = parser.parse_args()
+
+    cache = None if args.sin_cache else CacheClasificaciones(capacidad=4096, ruta_disco=cache_path)
+    process_images(cargar_modelo_servido(), cache)
+    if cache is not None:
+        cache.cerrar()
@@ -15,6 +15,10 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python extract_test_images.py
+Midiendo el tiempo de cada etapa (resumen en 'tiempos_etapas/extract_test_operators.json'):
+    INKSOLVER_TIEMPOS=1 python extract_test_images.py
+Perfilando con cProfile ('perfiles/extract_test_operators.prof' y '.collapsed', ver ../operands/profiling.py):
+    INKSOLVER_PERFIL=1 python extract_test_images.py
 ===============================================================================
 Notas:
 - Las imagenes de entrada deben estar en la carpeta '../../data/operators/raw/test/'.
@@ -26,6 +30,11 @@ import cv2
 import numpy as np
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from profiling import activar_desde_entorno as activar_perfil
+from stage_timing import activar_desde_entorno, tiempos
 
 # Definir rutas de entrada y salida
 input_folder = "../../data/operators/raw/test/"
@@ -53,49 +62,56 @@ def extract_black_boxes_from_image(image_path, operator, image_id):
     print(f"\n\033[91m🔴 Procesando imagen: {image_path}...\033[0m")
 
     # Cargar la imagen en escala de grises
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    with tiempos.etapa("decodificar"):
+        img = cv2.imread(image_path)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
     # Aplicar umbral para detectar cuadros negros
-    _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
+    with tiempos.etapa("umbral"):
+        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
 
-    # Encontrar contornos de los cuadros
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    with tiempos.etapa("segmentar"):
+        # Encontrar contornos de los cuadros
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    # Obtener las cajas delimitadoras de los cuadros detectados
-    bounding_boxes = [cv2.boundingRect(cnt) for cnt in contours]
-    bounding_boxes = sorted(bounding_boxes, key=lambda b: (b[1], b[0]))  # Ordenar por fila y columna
-
-    # Identificar filas y columnas de los cuadros
-    row_dict = {}
-    for x, y, w, h in bounding_boxes:
-        if 50 < w < 200 and 50 < h < 200:  # Filtrar ruido
-            row = y // 80  # Agrupar por filas
-            col = x // 80  # Agrupar por columnas
-            if row not in row_dict:
-                row_dict[row] = []
-            row_dict[row].append((x, y, w, h))
+        # Obtener las cajas delimitadoras de los cuadros detectados
+        bounding_boxes = [cv2.boundingRect(cnt) for cnt in contours]
+        bounding_boxes = sorted(bounding_boxes, key=lambda b: (b[1], b[0]))  # Ordenar por fila y columna
+
+        # Identificar filas y columnas de los cuadros
+        row_dict = {}
+        for x, y, w, h in bounding_boxes:
+            if 50 < w < 200 and 50 < h < 200:  # Filtrar ruido
+                row = y // 80  # Agrupar por filas
+                col = x // 80  # Agrupar por columnas
+                if row not in row_dict:
+                    row_dict[row] = []
+                row_dict[row].append((x, y, w, h))
 
     image_count = 0  # Contador de imagenes extraidas
     for row in sorted(row_dict.keys()):
         for col_index, (x, y, w, h) in enumerate(sorted(row_dict[row], key=lambda b: b[0])):
             # Extraer la region del cuadro con margen para evitar bordes
             border_margin = 10  
-            cropped = gray[y+border_margin:y+h-border_margin, x+border_margin:x+w-border_margin]
-
-            # Convertir a imagen binaria
-            _, bw_cropped = cv2.threshold(cropped, 145, 255, cv2.THRESH_BINARY)
+            with tiempos.etapa("recortar"):
+                cropped = gray[y+border_margin:y+h-border_margin, x+border_margin:x+w-border_margin]
+                # Convertir a imagen binaria
+                _, bw_cropped = cv2.threshold(cropped, 145, 255, cv2.THRESH_BINARY)
 
             # Guardar imagen con formato [id imagen]_[id consecutivo].png
             output_filename = f"{image_id}_{image_count}.png"
             output_path = os.path.join(output_folder, output_filename)
-            cv2.imwrite(output_path, bw_cropped)
+            with tiempos.etapa("escribir"):
+                cv2.imwrite(output_path, bw_cropped)
             image_count += 1
 
     # Mensaje final por imagen
     print(f"\033[92m✔ Se extrajeron {image_count} cuadros de la imagen {image_path}.\033[0m")
     print(f"\033[93m📂 Imagenes guardadas en: {output_folder}\033[0m")
 
+activar_desde_entorno("extract_test_operators")
+activar_perfil("extract_test_operators")
+
 # Procesar todas las imagenes en la carpeta de prueba
 for filename in os.listdir(input_folder):
     match = re.match(r"([a-zA-Z]+)_(\d+)\.png", filename)
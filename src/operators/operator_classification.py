@@ -5,7 +5,7 @@ Archivo: operator_classification.py
 Descripcion: Clasifica imagenes de operadores matematicos segun sus histogramas de proyeccion.
 Autor: Alejandro Castro Martinez
 Fecha de creacion: 2025-03-16
-Ultima modificacion: 2025-03-18
+Ultima modificacion: 2026-10-19
 Version: 1.0
 ===============================================================================
 Dependencias:
@@ -15,10 +15,17 @@ Dependencias:
 Uso:
 Ejecutar el script con el siguiente comando:
     python operator_classification.py
+Midiendo el tiempo de cada etapa (resumen en 'tiempos_etapas/operator_classification.json'):
+    INKSOLVER_TIEMPOS=1 python operator_classification.py
+Perfilando con cProfile ('perfiles/operator_classification.prof' y '.collapsed', ver ../operands/profiling.py):
+    INKSOLVER_PERFIL=1 python operator_classification.py
 ===============================================================================
 Notas:
 - El dataset debe estar en '../../data/operators/raw/'.
 - Los resultados de la clasificacion se guardaran en 'operator_results/operator_classification_results.csv'.
+- El umbral de picos y la tabla de reglas salen del artefacto del modelo
+  servido ('../equations/classify_digits/modelo.npz', o los valores por
+  defecto si no existe; ver ../operands/model_artifact.py).
 ===============================================================================
 """
 
@@ -27,6 +34,12 @@ import cv2
 import numpy as np
 import pandas as pd
 import warnings
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "operands"))
+from model_artifact import REGLAS_OPERADORES, cargar_modelo_servido, clasificar_por_reglas
+from profiling import activar_desde_entorno as activar_perfil
+from stage_timing import activar_desde_entorno, tiempos
 
 # Suprimir warnings innecesarios
 warnings.simplefilter("ignore", category=UserWarning)
@@ -125,7 +138,7 @@ def count_peaks(hist, threshold=0.5):
             in_peak = False
     return peaks
 
-def classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot):
+def classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot, reglas=REGLAS_OPERADORES):
     """
     Clasifica la operacion matematica basada en la cantidad de picos detectados.
 
@@ -133,22 +146,20 @@ def classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot):
         horizontal_peaks (int): Picos en el histograma horizontal original.
         vertical_peaks (int): Picos en el histograma vertical original.
         horizontal_peaks_rot (int): Picos en el histograma horizontal de la imagen rotada.
+        reglas (list): Tabla de reglas del modelo (model_artifact.py).
 
     Returns:
         str: Tipo de operador clasificado.
     """
-    if horizontal_peaks == 0 and vertical_peaks == 0 and (horizontal_peaks_rot > 2 or horizontal_peaks_rot == 0):
-        return "div"
-    elif horizontal_peaks == 2 and vertical_peaks == 0:
-        return "equals"
-    elif horizontal_peaks == 1 and vertical_peaks == 0:
-        return "sub"
-    elif horizontal_peaks == 1 and vertical_peaks == 1:
-        return "sum"
-    elif horizontal_peaks == 0 and vertical_peaks == 0 and horizontal_peaks_rot <= 2:
-        return "times"
-    else:
-        return "Desconocido"
+    return clasificar_por_reglas(horizontal_peaks, vertical_peaks, horizontal_peaks_rot, reglas)
+
+activar_desde_entorno("operator_classification")
+activar_perfil("operator_classification")
+
+# Umbral y reglas del modelo servido (los mismos que usa classify_equations)
+with tiempos.etapa("cargar_modelo"):
+    modelo = cargar_modelo_servido()
+print(f"\033[94m🏷 Version del modelo: {modelo.version}\033[0m")
 
 # Crear archivo CSV con encabezados antes de procesar los datos
 df_columns = ["Categoria", "Nombre_Imagen", "Picos_Horizontal_Original", "Picos_Vertical_Original", "Picos_Horizontal_Rotado", "Prediccion"]
@@ -171,30 +182,33 @@ for category in operation_categories:
 
         for img_path in batch_paths:
             img_file = os.path.basename(img_path)
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+            with tiempos.etapa("decodificar"):
+                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
 
             if img is None:
                 continue  # Saltar imágenes corruptas
 
-            # Obtener histogramas de la imagen original
-            hist_horizontal = compute_projection_histogram(img, axis=1)
-            hist_vertical = compute_projection_histogram(img, axis=0)
-            
-            # Contar picos en la imagen original
-            horizontal_peaks = count_peaks(hist_horizontal, threshold=0.8)
-            vertical_peaks = count_peaks(hist_vertical, threshold=0.8)
+            with tiempos.etapa("caracteristicas"):
+                # Obtener histogramas de la imagen original
+                hist_horizontal = compute_projection_histogram(img, axis=1)
+                hist_vertical = compute_projection_histogram(img, axis=0)
+
+                # Contar picos en la imagen original
+                horizontal_peaks = count_peaks(hist_horizontal, threshold=modelo.umbral_picos)
+                vertical_peaks = count_peaks(hist_vertical, threshold=modelo.umbral_picos)
+
+                # Rotar la imagen 45 grados
+                rotated_img = rotate_image_45(img)
 
-            # Rotar la imagen 45 grados
-            rotated_img = rotate_image_45(img)
+                # Obtener histogramas de la imagen rotada
+                hist_horizontal_rot = compute_projection_histogram(rotated_img, axis=1)
 
-            # Obtener histogramas de la imagen rotada
-            hist_horizontal_rot = compute_projection_histogram(rotated_img, axis=1)
-            
-            # Contar picos en la imagen rotada
-            horizontal_peaks_rot = count_peaks(hist_horizontal_rot, threshold=0.8)
+                # Contar picos en la imagen rotada
+                horizontal_peaks_rot = count_peaks(hist_horizontal_rot, threshold=modelo.umbral_picos)
 
             # Clasificar la operación
-            prediction = classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot)
+            with tiempos.etapa("clasificar"):
+                prediction = classify_operation(horizontal_peaks, vertical_peaks, horizontal_peaks_rot, modelo.reglas)
 
             # Almacenar en lista de datos
             batch_data.append({
@@ -207,8 +221,9 @@ for category in operation_categories:
             })
 
         # Guardar bloque en el CSV
-        df_batch = pd.DataFrame(batch_data)
-        df_batch.to_csv(csv_path, mode="a", header=False, index=False)
+        with tiempos.etapa("escribir_csv"):
+            df_batch = pd.DataFrame(batch_data)
+            df_batch.to_csv(csv_path, mode="a", header=False, index=False)
 
         print(f"\033[92m✔ {min(i + BLOCK_SIZE, total_images)}/{total_images} imágenes procesadas...\033[0m")
 